@@ -0,0 +1,135 @@
+import os
+import threading
+import time
+from collections import deque
+
+
+# =========================================================
+# 스크립트 실행 수 제한(admission control)
+# - 프로세스 전체에서 동시에 실행되는 화면 스크립트를 max_running개로 제한하고, 나머지는 우선순위별 대기열에서 기다립니다.
+#   진료 화면(INTERACTIVE)이 대기 중이면 배경 갱신(BACKGROUND: 작업 목록 자동 갱신, priority=background 화면)보다 먼저 들어갑니다.
+# - 대기 중에는 POLL_SECONDS마다 poll()을 부릅니다. 화면에서는 대기 안내를 다시 그리는 함수이며,
+#   그 사이 같은 세션에 새 위젯 입력이 오면 Streamlit이 이번 실행을 중단(RerunException)하므로
+#   여러 입력이 마지막 입력의 실행 한 번으로 합쳐집니다(coalesced로 셉니다).
+# - 같은 세션이 BURST_SECONDS 안에 다시 실행되면(숫자 입력을 빠르게 바꾸는 경우) COALESCE_SECONDS만큼 먼저 기다려
+#   뒤따르는 입력과 합칩니다.
+# - 실행 권한(lease)은 세션별로 하나입니다. st.stop()/st.rerun()/예외로 release()에 닿지 못한 실행의 lease는
+#   같은 세션의 다음 실행 시작 때, 또는 LEASE_SECONDS가 지나면 회수합니다.
+# - 최대 실행 수: 환경변수 STROKE_MAX_RUNS(기본 CPU 수, 최소 2)
+# =========================================================
+MAX_RUNS_ENV = "STROKE_MAX_RUNS"
+INTERACTIVE, BACKGROUND = 0, 1
+PRIORITY_LABELS = {INTERACTIVE: "interactive", BACKGROUND: "background"}
+
+POLL_SECONDS = 0.1
+ADMISSION_TIMEOUT_SECONDS = 20.0
+LEASE_SECONDS = 60.0
+BURST_SECONDS = 0.5
+COALESCE_SECONDS = 0.15
+# 대기 시간 통계에 쓰는 최근 입장 기록 수
+WAIT_SAMPLES = 500
+
+
+def default_max_running() -> int:
+    value = os.environ.get(MAX_RUNS_ENV)
+    if value:
+        return max(1, int(value))
+    return max(2, os.cpu_count() or 1)
+
+
+class AdmissionController:
+    def __init__(self, max_running: int = None, timeout: float = ADMISSION_TIMEOUT_SECONDS,
+                 lease_seconds: float = LEASE_SECONDS):
+        self.max_running = max_running or default_max_running()
+        self.timeout = timeout
+        self.lease_seconds = lease_seconds
+        self._cond = threading.Condition()
+        self._queues = {INTERACTIVE: deque(), BACKGROUND: deque()}
+        self._leases = {}  # 세션 → 입장 시각
+        self._last_admit = {}  # 세션 → 마지막 입장 시각(연속 입력 판단용)
+        self._waits = deque(maxlen=WAIT_SAMPLES)
+        self.counters = {"admitted": 0, "coalesced": 0, "dropped": 0, "expired": 0}
+        self.max_depth = 0
+
+    def _head(self):
+        for priority in (INTERACTIVE, BACKGROUND):
+            if self._queues[priority]:
+                return self._queues[priority][0]
+        return None
+
+    def _reclaim(self, now: float):
+        for sid, granted in list(self._leases.items()):
+            if now - granted > self.lease_seconds:
+                del self._leases[sid]
+                self.counters["expired"] += 1
+        for sid, admitted in list(self._last_admit.items()):
+            if now - admitted > self.lease_seconds and sid not in self._leases:
+                del self._last_admit[sid]
+
+    def _leave(self, ticket, priority: int):
+        try:
+            self._queues[priority].remove(ticket)
+        except ValueError:
+            pass
+        self._cond.notify_all()
+
+    def admit(self, sid: str, priority: int = INTERACTIVE, poll=None) -> bool:
+        # True: 실행해도 됩니다(끝나면 release). False: timeout까지 자리가 나지 않아 이번 실행을 건너뜁니다.
+        # poll이 예외를 내면(새 입력으로 이번 실행이 중단되면) 대기열에서 빠지고 예외를 그대로 올립니다.
+        started = time.monotonic()
+        with self._cond:
+            if self._leases.pop(sid, None) is not None:
+                self._cond.notify_all()
+            burst = started - self._last_admit.get(sid, float("-inf")) < BURST_SECONDS
+        ticket = object()
+        try:
+            if burst and poll is not None:
+                time.sleep(COALESCE_SECONDS)
+                poll()
+            with self._cond:
+                self._queues[priority].append(ticket)
+                self.max_depth = max(self.max_depth, self.depth())
+            while True:
+                with self._cond:
+                    now = time.monotonic()
+                    self._reclaim(now)
+                    if len(self._leases) < self.max_running and self._head() is ticket:
+                        self._queues[priority].popleft()
+                        self._leases[sid] = now
+                        self._last_admit[sid] = now
+                        self._waits.append(now - started)
+                        self.counters["admitted"] += 1
+                        return True
+                    if now - started >= self.timeout:
+                        self._leave(ticket, priority)
+                        self.counters["dropped"] += 1
+                        return False
+                    self._cond.wait(POLL_SECONDS)
+                if poll is not None:
+                    poll()
+        except BaseException:
+            with self._cond:
+                self._leave(ticket, priority)
+                self.counters["coalesced"] += 1
+            raise
+
+    def release(self, sid: str):
+        with self._cond:
+            if self._leases.pop(sid, None) is not None:
+                self._cond.notify_all()
+
+    def depth(self) -> int:
+        return sum(len(q) for q in self._queues.values())
+
+    def metrics(self) -> dict:
+        with self._cond:
+            waits = sorted(self._waits)
+            return {
+                "running": len(self._leases),
+                "max_running": self.max_running,
+                **{f"waiting_{PRIORITY_LABELS[p]}": len(q) for p, q in self._queues.items()},
+                "max_depth": self.max_depth,
+                **self.counters,
+                "wait_ms_mean": 1000 * sum(waits) / len(waits) if waits else 0.0,
+                "wait_ms_p95": 1000 * waits[int(0.95 * (len(waits) - 1))] if waits else 0.0,
+            }
@@ -0,0 +1,310 @@
+import argparse
+import json
+import math
+import os
+from multiprocessing import Pool
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from batch import conform_cohort, iter_chunks, score_cohort, score_magic
+from calculators import NIHSS_CODES, NIHSS_ITEMS, NOAC_DRUGS
+from codes import CODE_TABLES, ESC_CATEGORY_LABELS, LDL_TARGET_MG_DL, MISSING
+from ldl_escalation import esc_ldl_category_code
+
+
+# =========================================================
+# 레지스트리 통계(스트리밍 단일 패스)
+# - 입력을 chunk 단위로 한 번만 읽고, 합칠 수 있는(mergeable) 통계만 유지하므로 메모리는 입력 크기와 무관합니다.
+# - 개수/분할표/히스토그램/분위수 sketch는 합친 결과가 한 번에 읽은 결과와 정확히 같습니다.
+#   평균/분산은 합과 제곱합으로 합치므로 부동소수점 반올림 수준의 차이만 있습니다.
+# - 파일별로 worker가 부분 결과를 만들고 merge()로 합칩니다.
+# =========================================================
+NIHSS_COLUMNS = [f"nihss_{c}" for c in NIHSS_CODES]
+NIHSS_MAX_TOTAL = sum(mx for _, _, mx in NIHSS_ITEMS)
+
+DEFAULT_CHUNK_ROWS = 200_000
+
+
+class Moments:
+    def __init__(self):
+        self.n = 0
+        self.total = 0.0
+        self.total_sq = 0.0
+        self.min = math.inf
+        self.max = -math.inf
+
+    def update(self, x):
+        x = np.asarray(x, dtype=np.float64)
+        x = x[~np.isnan(x)]
+        if x.size:
+            self.n += x.size
+            self.total += float(x.sum())
+            self.total_sq += float(np.square(x).sum())
+            self.min = min(self.min, float(x.min()))
+            self.max = max(self.max, float(x.max()))
+
+    def merge(self, other: "Moments"):
+        self.n += other.n
+        self.total += other.total
+        self.total_sq += other.total_sq
+        self.min = min(self.min, other.min)
+        self.max = max(self.max, other.max)
+
+    def summary(self) -> dict:
+        if not self.n:
+            return {"n": 0}
+        mean = self.total / self.n
+        var = max(self.total_sq / self.n - mean ** 2, 0.0) * self.n / max(self.n - 1, 1)
+        return {"n": self.n, "mean": mean, "sd": math.sqrt(var), "min": self.min, "max": self.max}
+
+
+class Histogram:
+    # 0..size-1 정수값의 정확한 도수(NIHSS 총점 등). 분위수도 정확합니다.
+    def __init__(self, size: int):
+        self.counts = np.zeros(size, dtype=np.int64)
+
+    def update(self, values):
+        values = np.asarray(values)
+        values = values[(values >= 0) & (values < len(self.counts))].astype(np.int64)
+        self.counts += np.bincount(values, minlength=len(self.counts))
+
+    def merge(self, other: "Histogram"):
+        self.counts += other.counts
+
+    def quantile(self, q: float):
+        n = int(self.counts.sum())
+        if not n:
+            return None
+        return int(np.searchsorted(np.cumsum(self.counts), q * n, side="left"))
+
+    def summary(self) -> dict:
+        n = int(self.counts.sum())
+        out = {"n": n}
+        if n:
+            out.update(
+                mean=float((self.counts * np.arange(len(self.counts))).sum() / n),
+                p25=self.quantile(0.25),
+                median=self.quantile(0.5),
+                p75=self.quantile(0.75),
+            )
+        return out
+
+
+class QuantileSketch:
+    # 로그 간격 bucket 도수(DDSketch 방식). 양수 값의 분위수를 상대오차 alpha 이내로 돌려줍니다.
+    # bucket 도수의 합으로 합치므로 병합 결과는 한 번에 만든 sketch와 정확히 같습니다.
+    def __init__(self, alpha: float = 0.01):
+        self.alpha = alpha
+        self.gamma = (1 + alpha) / (1 - alpha)
+        self._log_gamma = math.log(self.gamma)
+        self.buckets = {}
+        self.zero = 0
+
+    def update(self, values):
+        x = np.asarray(values, dtype=np.float64)
+        x = x[~np.isnan(x)]
+        self.zero += int((x <= 0).sum())
+        x = x[x > 0]
+        if x.size:
+            idx, cnt = np.unique(np.ceil(np.log(x) / self._log_gamma).astype(np.int64), return_counts=True)
+            for i, c in zip(idx.tolist(), cnt.tolist()):
+                self.buckets[i] = self.buckets.get(i, 0) + c
+
+    def merge(self, other: "QuantileSketch"):
+        if other.alpha != self.alpha:
+            raise ValueError("alpha가 다른 sketch는 합칠 수 없습니다.")
+        self.zero += other.zero
+        for i, c in other.buckets.items():
+            self.buckets[i] = self.buckets.get(i, 0) + c
+
+    @property
+    def n(self) -> int:
+        return self.zero + sum(self.buckets.values())
+
+    def quantile(self, q: float):
+        n = self.n
+        if not n:
+            return None
+        rank = q * (n - 1)
+        if rank < self.zero:
+            return 0.0
+        seen = self.zero
+        for i in sorted(self.buckets):
+            seen += self.buckets[i]
+            if seen > rank:
+                return 2 * self.gamma ** i / (self.gamma + 1)
+        return 2 * self.gamma ** max(self.buckets) / (self.gamma + 1)
+
+    def summary(self) -> dict:
+        return {"n": self.n, **{f"p{int(q * 100)}": self.quantile(q) for q in (0.1, 0.25, 0.5, 0.75, 0.9)}}
+
+
+class Crosstab:
+    # 코드(0..n-1) × 코드(0..m-1) 분할표. MISSING(-1) 등 범위 밖 값은 제외합니다.
+    def __init__(self, row_labels, col_labels):
+        self.row_labels = list(row_labels)
+        self.col_labels = list(col_labels)
+        self.counts = np.zeros((len(self.row_labels), len(self.col_labels)), dtype=np.int64)
+
+    def update(self, rows, cols):
+        rows, cols = np.asarray(rows, dtype=np.int64), np.asarray(cols, dtype=np.int64)
+        r, c = self.counts.shape
+        ok = (rows >= 0) & (rows < r) & (cols >= 0) & (cols < c)
+        self.counts += np.bincount(rows[ok] * c + cols[ok], minlength=r * c).reshape(r, c)
+
+    def merge(self, other: "Crosstab"):
+        self.counts += other.counts
+
+    def frame(self) -> pd.DataFrame:
+        return pd.DataFrame(self.counts, index=self.row_labels, columns=self.col_labels)
+
+
+# =========================================================
+# 레지스트리 지표
+# =========================================================
+class RegistryStats:
+    def __init__(self, risk_region: str = None):
+        self.risk_region = risk_region
+        self.rows = 0
+        self.moments = {c: Moments() for c in ("age", "crcl", "ldl", "pce_risk", "score2")}
+        self.sketches = {c: QuantileSketch() for c in ("crcl", "ldl", "pce_risk", "score2")}
+        self.nihss_total = Histogram(NIHSS_MAX_TOTAL + 1)
+        # AF 여부 × CHA2DS2-VASc≥2, HAS-BLED 점수 분포
+        self.af_chads = Crosstab(["AF 없음", "AF"], ["CHA2DS2-VASc<2", "CHA2DS2-VASc≥2"])
+        self.has_bled = Histogram(10)
+        # ESC 위험군 × LDL 목표 도달
+        self.ldl_goal = Crosstab(ESC_CATEGORY_LABELS, ["미도달", "도달"])
+        self.code_counts = {
+            **{f"{d.lower()}_dose": Histogram(len(CODE_TABLES["noac_dose"])) for d in NOAC_DRUGS},
+            "magic": Histogram(len(CODE_TABLES["magic"])),
+        }
+
+    def update(self, chunk: pd.DataFrame):
+        chunk = conform_cohort(chunk)
+        kwargs = {} if self.risk_region is None else {"risk_region": self.risk_region}
+        res = score_cohort(chunk, **kwargs)
+        self.rows += len(chunk)
+
+        for col, m in self.moments.items():
+            m.update(chunk[col].to_numpy(dtype=np.float64, na_value=np.nan) if col in ("age", "ldl") else res[col].to_numpy())
+        for col, s in self.sketches.items():
+            s.update(chunk[col].to_numpy(dtype=np.float64, na_value=np.nan) if col == "ldl" else res[col].to_numpy())
+
+        if all(c in chunk.columns for c in NIHSS_COLUMNS):
+            items = chunk[NIHSS_COLUMNS].astype("float64").to_numpy(na_value=np.nan)
+            complete = ~np.isnan(items).any(axis=1)
+            self.nihss_total.update(items[complete].sum(axis=1))
+
+        af = chunk["af"].fillna(False).to_numpy(dtype=bool)
+        chads = res["chads_vasc"].to_numpy()
+        self.af_chads.update(af.astype(np.int64), np.where(chads == MISSING, MISSING, chads >= 2))
+        self.has_bled.update(res["has_bled"].to_numpy())
+
+        category = esc_ldl_category_code(chunk, res["esc_category"].to_numpy())
+        ldl = chunk["ldl"].to_numpy(dtype=np.float64, na_value=np.nan)
+        known = (category != MISSING) & ~np.isnan(ldl)
+        at_goal = ldl[known] < LDL_TARGET_MG_DL[category[known]]
+        self.ldl_goal.update(category[known], at_goal.astype(np.int64))
+
+        res["magic"] = score_magic(chunk)["magic"]
+        for col, h in self.code_counts.items():
+            h.update(res[col].to_numpy())
+
+    def merge(self, other: "RegistryStats") -> "RegistryStats":
+        self.rows += other.rows
+        for d, o in ((self.moments, other.moments), (self.sketches, other.sketches), (self.code_counts, other.code_counts)):
+            for k in d:
+                d[k].merge(o[k])
+        for name in ("nihss_total", "af_chads", "has_bled", "ldl_goal"):
+            getattr(self, name).merge(getattr(other, name))
+        return self
+
+    def report(self) -> dict:
+        af_counts = self.af_chads.counts[1]
+        hb_n = int(self.has_bled.counts.sum())
+        goal = self.ldl_goal.counts
+        return {
+            "rows": self.rows,
+            "af_chads_vasc_ge2": {
+                "af_patients": int(af_counts.sum()),
+                "count": int(af_counts[1]),
+                "percent": _pct(af_counts[1], af_counts.sum()),
+            },
+            "has_bled_ge3": {
+                "evaluated": hb_n,
+                "count": int(self.has_bled.counts[3:].sum()),
+                "percent": _pct(self.has_bled.counts[3:].sum(), hb_n),
+            },
+            "nihss_total": self.nihss_total.summary(),
+            "ldl_goal_by_esc_category": {
+                label: {"n": int(goal[i].sum()), "at_goal": int(goal[i, 1]), "percent": _pct(goal[i, 1], goal[i].sum())}
+                for i, label in enumerate(ESC_CATEGORY_LABELS)
+                if goal[i].sum()
+            },
+            "moments": {k: m.summary() for k, m in self.moments.items()},
+            "quantiles": {k: s.summary() for k, s in self.sketches.items()},
+            "result_counts": {
+                col: {
+                    label: int(c)
+                    for label, c in zip(CODE_TABLES["magic" if col == "magic" else "noac_dose"], h.counts)
+                    if c
+                }
+                for col, h in self.code_counts.items()
+            },
+        }
+
+
+def _pct(num, den):
+    return None if not den else round(100.0 * float(num) / float(den), 2)
+
+
+# =========================================================
+# 병렬 집계(chunk 읽기는 batch.iter_chunks)
+# =========================================================
+def aggregate_file(path, chunk_rows: int = DEFAULT_CHUNK_ROWS, risk_region: str = None) -> RegistryStats:
+    stats = RegistryStats(risk_region)
+    for chunk in iter_chunks(path, chunk_rows):
+        stats.update(chunk)
+    return stats
+
+
+def _aggregate_job(args):
+    return aggregate_file(*args)
+
+
+def aggregate_files(paths, workers: int = None, chunk_rows: int = DEFAULT_CHUNK_ROWS, risk_region: str = None):
+    # 파일 하나가 worker 작업 하나이며, 부분 결과는 순서와 무관하게 합쳐집니다.
+    jobs = [(p, chunk_rows, risk_region) for p in paths]
+    workers = min(workers or os.cpu_count() or 1, len(jobs))
+    if workers <= 1:
+        parts = map(_aggregate_job, jobs)
+    else:
+        with Pool(workers) as pool:
+            parts = pool.map(_aggregate_job, jobs)
+    total = RegistryStats(risk_region)
+    for part in parts:
+        total.merge(part)
+    return total
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="레지스트리 파일(Parquet/CSV)을 한 번만 읽어 품질 지표를 집계합니다.")
+    parser.add_argument("paths", nargs="+")
+    parser.add_argument("-j", "--workers", type=int, default=None)
+    parser.add_argument("--chunk-rows", type=int, default=DEFAULT_CHUNK_ROWS)
+    parser.add_argument("--risk-region", default=None)
+    parser.add_argument("-o", "--output", help="결과 JSON 파일(생략 시 표준출력)")
+    args = parser.parse_args(argv)
+
+    report = aggregate_files(args.paths, args.workers, args.chunk_rows, args.risk_region).report()
+    text = json.dumps(report, ensure_ascii=False, indent=2)
+    if args.output:
+        Path(args.output).write_text(text, encoding="utf-8")
+    else:
+        print(text)
+
+
+if __name__ == "__main__":
+    main()
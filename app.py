@@ -1,9 +1,59 @@
+import io
 import json
+import os
+import uuid
+from datetime import datetime
 from pathlib import Path
-import math
+import altair as alt
 import pandas as pd
 import streamlit as st
 import streamlit.components.v1 as components
+from PIL import Image
+from streamlit.runtime.scriptrunner import get_script_run_ctx
+
+from calculators import (
+    HAS_BLED_SCR_MG_DL,
+    PCE_DOMAIN,
+    cockcroft_gault_crcl,
+    noac_dose_apixaban,
+    noac_dose_rivaroxaban,
+    noac_dose_edoxaban,
+    noac_dose_dabigatran,
+    NIHSS_ITEMS,
+    build_nihss_component_text,
+    build_neuro_exam_text,
+    elan_severity_for_lesion,
+    elan_overall_severity,
+    elan_recommendation,
+    ELAN_MAX_LESIONS,
+    ELAN_CIRCULATIONS,
+    ELAN_POSTERIOR_SITES,
+    ELAN_ANTERIOR_PATTERNS,
+    ELAN_ANTERIOR_MAJOR_PATTERNS,
+    magic_result_from_answers,
+    aha_very_high_risk,
+    AHA_HR_CONDITIONS_CHECK,
+    pce_10y_risk_percent,
+    score2_estimate_percent,
+    esc_risk_category_from_score2,
+    esc_ldl_target_by_category,
+)
+from doac_schedule import DoacScheduler
+from risk_uncertainty import pce_risk_uncertainty, score2_risk_uncertainty
+from sensitivity import noac_dose_grid, pce_risk_grid
+from ingest import CohortBuilder, ingest_stream
+from batch import DEFAULT_CALCULATORS, RESULT_CODE_COLUMNS, score_cohort, score_magic
+from table_view import DEFAULT_PAGE_SIZE, ArrowTableView
+from reference import ABCD2_RISK_TABLE, CHA2DS2_VASC_RISK_TABLE, REFERENCE_GROUPS, ReferenceIndex, sections_in_group
+from note_parser import format_nihss_scores, parse_nihss_scores
+from worklist import Worklist
+from session_store import SESSION_STORE_ENV, SID_PARAM, SessionSync, open_session_store, purge_if_due
+from registry import REGISTRY
+from client_scores import CLIENT_SCORE_RULES_JS, CLIENT_SCORES, score_spec, widget_values
+from nihss_timeline import END, NIHSS_STORE_ENV, NihssTimeline, format_event, open_nihss_store, timeline_text
+from admission import BACKGROUND, INTERACTIVE, AdmissionController
+from jobs import ACTIVE_STATUSES, CANCELLED, DONE, JOB_DIR_ENV, STATUS_LABELS, open_job_queue
+from profiling import begin_rerun, end_rerun, list_captures, profile_dir, request_capture, top_allocations, top_functions
 
 st.set_page_config(page_title="Stroke Clinical Helper", page_icon="🧠", layout="wide")
 
@@ -28,1256 +78,1548 @@ def copy_to_clipboard_ui(text: str, button_label: str, key: str):
 
 
 # =========================================================
-# 공통 유틸/계산
+# What-if 민감도 heatmap(UI)
+# - 격자는 고정 입력만으로 캐시되므로, 현재 환자 표시점만 바뀌는 rerun에서는 재계산하지 않습니다.
 # =========================================================
-def cockcroft_gault_crcl(age, weight_kg, scr_mg_dl, female: bool):
-    if scr_mg_dl <= 0:
-        return None
-    crcl = ((140 - age) * weight_kg) / (72 * scr_mg_dl)
-    if female:
-        crcl *= 0.85
-    return crcl
-
-
-def chads_vasc_score(chf, htn, age, dm, stroke_tia, vascular, female):
-    score = 0
-    score += 1 if chf else 0
-    score += 1 if htn else 0
-    score += 2 if age >= 75 else (1 if age >= 65 else 0)
-    score += 1 if dm else 0
-    score += 2 if stroke_tia else 0
-    score += 1 if vascular else 0
-    score += 1 if female else 0
-    return score
-
-
-def abcd2_score(age_ge_60, bp_ge_140_90, unilateral_weakness, speech_without_weakness, duration_min, diabetes):
-    score = 0
-    score += 1 if age_ge_60 else 0
-    score += 1 if bp_ge_140_90 else 0
-    if unilateral_weakness:
-        score += 2
-    elif speech_without_weakness:
-        score += 1
-    if duration_min >= 60:
-        score += 2
-    elif 10 <= duration_min <= 59:
-        score += 1
-    score += 1 if diabetes else 0
-    return score
-
-
-def has_bled_score(htn_sbp_gt160, renal, liver, stroke, bleed, inr_labile, age_gt65, drugs, alcohol):
-    score = 0
-    score += 1 if htn_sbp_gt160 else 0
-    score += 1 if renal else 0
-    score += 1 if liver else 0
-    score += 1 if stroke else 0
-    score += 1 if bleed else 0
-    score += 1 if inr_labile else 0
-    score += 1 if age_gt65 else 0
-    score += 1 if drugs else 0
-    score += 1 if alcohol else 0
-    return score
+@st.cache_data(max_entries=64)
+def cached_pce_risk_grid(sex, race, age, hdl, bp_treated, smoker, diabetes):
+    return pce_risk_grid(sex, race, age, hdl, bp_treated, smoker, diabetes)
 
 
-# =========================================================
-# NOAC 용량(단순 규칙 기반 표시)
-# =========================================================
-def noac_dose_apixaban(age, weight_kg, scr_mg_dl):
-    criteria = 0
-    criteria += 1 if age >= 80 else 0
-    criteria += 1 if weight_kg <= 60 else 0
-    criteria += 1 if scr_mg_dl >= 1.5 else 0
-    if criteria >= 2:
-        return "2.5 mg BID", "감량 기준(나이/체중/Cr 중 2개 이상) 충족입니다."
-    return "5 mg BID", "표준 용량입니다."
-
-
-def noac_dose_rivaroxaban(crcl):
-    if crcl is None:
-        return "-", "CrCl 계산이 필요합니다."
-    if crcl > 50:
-        return "20 mg QD (with food)", "표준 용량입니다."
-    if 15 <= crcl <= 50:
-        return "15 mg QD (with food)", "감량(CrCl 15–50)입니다."
-    return "검토 필요", "비권고 또는 전문 검토가 필요합니다."
-
-
-def noac_dose_edoxaban(crcl, weight_kg):
-    if crcl is None:
-        return "-", "CrCl 계산이 필요합니다."
-    if crcl < 15:
-        return "검토 필요", "비권고 또는 전문 검토가 필요합니다."
-    if (15 <= crcl <= 50) or (weight_kg <= 60):
-        return "30 mg QD", "감량(CrCl 15–50 또는 체중≤60)입니다."
-    if crcl > 95:
-        return "라벨 확인 필요", "AF 적응증에서 CrCl>95 제한이 있을 수 있어 확인이 필요합니다."
-    return "60 mg QD", "표준 용량입니다."
-
-
-def noac_dose_dabigatran(crcl, age):
-    if crcl is None:
-        return "-", "CrCl 계산이 필요합니다."
-    if crcl < 15:
-        return "검토 필요", "비권고 또는 전문 검토가 필요합니다."
-    if 15 <= crcl <= 30:
-        return "라벨에 따라 상이", "국가/라벨에 따라 권장 용량이 달라질 수 있습니다."
-    if age >= 80:
-        return "감량 고려", "고령에서는 감량 옵션을 고려하되 라벨 확인이 필요합니다."
-    return "150 mg BID", "표준 용량입니다."
+@st.cache_data(max_entries=64)
+def cached_noac_dose_grid(drug, age, female):
+    return noac_dose_grid(drug, age, female)
 
 
-# =========================================================
-# NIHSS (숫자 입력 + 친절한 항목명)
-# =========================================================
-NIHSS_ITEMS = [
-    ("1a. Level of consciousness (LOC)", 0, 3),
-    ("1b. LOC questions", 0, 2),
-    ("1c. LOC commands", 0, 2),
-    ("2. Best gaze", 0, 2),
-    ("3. Visual fields", 0, 3),
-    ("4. Facial palsy", 0, 3),
-    ("5a. Motor arm (Left)", 0, 4),
-    ("5b. Motor arm (Right)", 0, 4),
-    ("6a. Motor leg (Left)", 0, 4),
-    ("6b. Motor leg (Right)", 0, 4),
-    ("7. Limb ataxia", 0, 2),
-    ("8. Sensory", 0, 2),
-    ("9. Best language", 0, 3),
-    ("10. Dysarthria", 0, 2),
-    ("11. Extinction and inattention (Neglect)", 0, 2),
-]
-
-
-def motor_MRC_from_nihss(val: int) -> str:
-    mapping = {0: "V", 1: "IV", 2: "III", 3: "II", 4: "I"}
-    return mapping.get(val, "N/A")
-
-
-def mse_from_nihss_1a(val: int) -> str:
-    mapping = {0: "alert", 1: "mild drowsy", 2: "drowsy", 3: "semicoma"}
-    return mapping.get(val, "unknown")
-
-
-def language_from_nihss_9(val: int) -> str:
-    mapping = {
-        0: "normal",
-        1: "mild aphasia (language score 1)",
-        2: "moderate aphasia (language score 2)",
-        3: "severe aphasia (language score 3)",
-    }
-    return mapping.get(val, "unknown")
+def heatmap_with_marker(df: pd.DataFrame, x: str, y: str, color, tooltip: list, marker: dict):
+    cells = alt.Chart(df).mark_rect().encode(
+        x=alt.X("x0:Q", title=x, scale=alt.Scale(zero=False, nice=False)),
+        x2="x1:Q",
+        y=alt.Y("y0:Q", title=y, scale=alt.Scale(zero=False, nice=False)),
+        y2="y1:Q",
+        color=color,
+        tooltip=tooltip,
+    )
+    point = alt.Chart(pd.DataFrame([marker])).mark_point(shape="cross", size=250, color="black", filled=True).encode(
+        x=f"{x}:Q",
+        y=f"{y}:Q",
+    )
+    return cells + point
 
 
-def build_nihss_component_text(nihss_vals: dict) -> str:
-    total = sum(nihss_vals.values())
-    lines = ["NIHSS components:"]
-    for name, *_ in NIHSS_ITEMS:
-        lines.append(f"- {name}: {nihss_vals[name]}")
-    lines.append(f"NIHSS total: {total}")
-    return "\n".join(lines)
+# =========================================================
+# EMR 파일(FHIR/HL7) 불러오기 → 입력란 채우기
+# =========================================================
+@st.cache_data(max_entries=8)
+def parse_emr_file(name: str, data: bytes) -> pd.DataFrame:
+    builder = CohortBuilder()
+    ingest_stream(builder, io.BytesIO(data), name)
+    return builder.to_frame()
+
+
+@st.cache_resource(max_entries=4)
+def emr_result_view(name: str, data: bytes) -> ArrowTableView:
+    # 불러온 환자 전체의 일괄 계산 결과(코드 열은 사전 인코딩)
+    patients = parse_emr_file(name, data)
+    results = pd.concat([patients, score_cohort(patients), score_magic(patients)], axis=1)
+    return ArrowTableView(results, RESULT_CODE_COLUMNS)
+
+
+def render_table_view(view: ArrowTableView, key: str, page_size: int = DEFAULT_PAGE_SIZE):
+    # 정렬/필터/페이지 조건에 맞는 현재 페이지 행만 화면으로 보냅니다.
+    no_sort = "(원래 순서)"
+    c1, c2, c3, c4 = st.columns([2, 1, 2, 2])
+    sort_by = c1.selectbox("정렬 기준", [no_sort, *view.columns], key=f"{key}_sort")
+    descending = c2.toggle("내림차순", key=f"{key}_desc")
+    filter_col = c3.selectbox("필터 열", view.columns, key=f"{key}_fcol")
+    filter_text = c4.text_input("필터 조건", key=f"{key}_ftext", placeholder="예: >=50, 10..20, Apixaban")
+    query = dict(sort_by=None if sort_by == no_sort else sort_by, descending=descending,
+                 filters={filter_col: filter_text} if filter_text.strip() else None)
+
+    _, total, n_pages = view.page(0, page_size, **query)
+    page_key = f"{key}_page"
+    if st.session_state.get(page_key, 1) > n_pages:
+        st.session_state[page_key] = n_pages
+    page = st.number_input(f"페이지(전체 {n_pages})", 1, n_pages, 1, 1, key=page_key) - 1
+    rows, total, _ = view.page(page, page_size, **query)
+    st.dataframe(rows, use_container_width=True, hide_index=True)
+    first = page * page_size
+    if total:
+        st.caption(f"조건에 맞는 {total:,}행 중 {first + 1:,}–{first + rows.num_rows:,}행을 표시합니다.")
+    else:
+        st.caption("조건에 맞는 행이 없습니다.")
+
+
+def _clamp(x, lo, hi, cast=int):
+    return cast(min(max(x, lo), hi))
+
+
+def registry_range(calc: str, field: str) -> tuple:
+    # 등록부 입력의 (최소, 최대, 기본값)입니다. 화면 위젯과 코호트 행 채우기가 같은 범위를 씁니다.
+    f = REGISTRY[calc].field(field)
+    return int(f.min), int(f.max), int(f.default)
+
+
+# PCE 입력은 검증 범위(PCE_DOMAIN) 밖 값을 잘라 넣지 않습니다(잘라 넣으면 계산하지 않는 환자에게 위험도가 표시됩니다).
+# 범위 밖이면 PCE 입력란을 모두 비우고(기본값) 경고 문구만 이 key에 남깁니다. 환자별로 작업 목록에 함께 보관합니다.
+PCE_FILL_KEYS = ("pce_sex", "pce_race", "pce_age", "pce_tc", "pce_hdl", "pce_sbp", "pce_bp_treated", "pce_smoker", "pce_dm")
+PCE_FILL_WARNING_KEY = "pce_fill_warning"
+
+
+def widget_state_from_cohort_row(row: dict) -> dict:
+    # 코호트 행(결측 가능) → 위젯 key별 값. 위젯 허용 범위로 잘라서 넣습니다(PCE 입력은 위 설명대로 넣지 않습니다).
+    def has(k):
+        return k in row and not pd.isna(row[k])
+
+    def flag(k):
+        return bool(row[k]) if has(k) else False
+
+    state = {}
+    pce_outside = [f"{k} {row[k]:g}" for k, (lo, hi) in PCE_DOMAIN.items() if has(k) and not lo <= row[k] <= hi]
+    if has("age"):
+        for k in ["cv_age", "noac_age", "noac_all_age"]:
+            state[k] = _clamp(row["age"], 0, 120)
+        state["pce_age"] = int(row["age"])
+        state["s2_age"] = _clamp(row["age"], *registry_range("score2", "age")[:2])
+        state["hb_age65"] = row["age"] > 65
+    if has("sex"):
+        for k in ["cv_sex", "noac_sex", "noac_all_sex", "pce_sex"]:
+            state[k] = row["sex"]
+        state["s2_sex"] = "여성" if row["sex"] == "Female" else "남성"
+    if has("race"):
+        state["pce_race"] = row["race"]
+    if has("weight_kg"):
+        state["noac_wt"] = state["noac_all_wt"] = _clamp(row["weight_kg"], 1.0, 300.0, float)
+    if has("scr_mg_dl"):
+        state["noac_scr"] = state["noac_all_scr"] = _clamp(round(row["scr_mg_dl"], 2), 0.1, 20.0, float)
+        state["hb_renal"] = flag("renal_disease") or row["scr_mg_dl"] >= HAS_BLED_SCR_MG_DL
+    if has("tc"):
+        state["pce_tc"] = round(row["tc"])
+    if has("hdl"):
+        state["pce_hdl"] = round(row["hdl"])
+    if has("tc") and has("hdl"):
+        state["s2_nonhdl"] = _clamp(round(row["tc"] - row["hdl"]), 50, 400)
+    if has("ldl"):
+        state["ldl_now"] = _clamp(round(row["ldl"]), 10, 400)
+    if has("sbp"):
+        state["pce_sbp"] = round(row["sbp"])
+        state["s2_sbp"] = _clamp(round(row["sbp"]), *registry_range("score2", "sbp")[:2])
+        state["hb_htn160"] = row["sbp"] > 160
+    state["pce_bp_treated"] = flag("bp_treated")
+    state["pce_smoker"] = state["s2_smoke"] = flag("smoker")
+    state["pce_dm"] = state["cv_dm"] = flag("diabetes")
+    state["cv_chf"] = flag("chf")
+    state["cv_htn"] = flag("htn")
+    state["cv_stroke"] = state["hb_stroke"] = flag("stroke_tia")
+    state["cv_vascular"] = flag("vascular")
+    state["hb_liver"] = flag("liver_disease")
+    state["hb_bleed"] = flag("bleeding_history")
+    state["hb_inr"] = flag("labile_inr")
+    state["hb_drugs"] = flag("bleeding_drugs")
+    state["hb_alcohol"] = flag("alcohol_excess")
+    if pce_outside:
+        for k in PCE_FILL_KEYS:
+            state.pop(k, None)
+        state[PCE_FILL_WARNING_KEY] = (f"EMR 값({', '.join(pce_outside)})이 PCE 검증 범위 밖이어서 "
+                                       "PCE 입력란은 채우지 않았습니다.")
+    return state
+
+
+def fill_widgets_from_row(row: dict):
+    # 이전 환자의 PCE 입력/경고가 남지 않도록 먼저 지웁니다.
+    for k in (*PCE_FILL_KEYS, PCE_FILL_WARNING_KEY):
+        st.session_state.pop(k, None)
+    st.session_state.update(widget_state_from_cohort_row(row))
 
 
-def build_neuro_exam_text(nihss_vals: dict, facial_side: str, sensory_side: str, ataxia_side: str) -> str:
-    loc = nihss_vals["1a. Level of consciousness (LOC)"]
-    gaze = nihss_vals["2. Best gaze"]
-    lang = nihss_vals["9. Best language"]
-    dys = nihss_vals["10. Dysarthria"]
-    neglect = nihss_vals["11. Extinction and inattention (Neglect)"]
-    sensory = nihss_vals["8. Sensory"]
-    ataxia = nihss_vals["7. Limb ataxia"]
+# =========================================================
+# NIHSS 간단 입력("1a1 1b0 ...")
+# - 입력란 on_change 콜백에서 한 번에 파싱해 모든 항목 key를 바꾸므로, 위젯이 그려지기 전에 반영되어 rerun은 한 번입니다.
+# - 오류가 하나라도 있으면 아무 항목도 바꾸지 않습니다.
+# =========================================================
+NIHSS_COMPACT_ERRORS_KEY = "_nihss_compact_errors"
 
-    arm_l = nihss_vals["5a. Motor arm (Left)"]
-    arm_r = nihss_vals["5b. Motor arm (Right)"]
-    leg_l = nihss_vals["6a. Motor leg (Left)"]
-    leg_r = nihss_vals["6b. Motor leg (Right)"]
 
-    total = sum(nihss_vals.values())
+def apply_nihss_compact():
+    values, errors = parse_nihss_scores(st.session_state.get("nihss_compact", ""))
+    st.session_state[NIHSS_COMPACT_ERRORS_KEY] = errors
+    if not errors:
+        for name, value in values.items():
+            st.session_state[f"nihss_{name}"] = value
 
-    lines = []
-    lines.append("Neurologic examination:")
 
-    lines.append(f"MSE: {mse_from_nihss_1a(loc)}")
-    lines.append(f"Language function: {language_from_nihss_9(lang)}")
+# =========================================================
+# 연속 NIHSS 기록(병동 공용, nihss_timeline.py)
+# - 평가와 알림은 STROKE_NIHSS_STORE(기본 SQLite 파일)에 남아 서버를 다시 시작해도 이어집니다.
+# - 기록 결과(판정)는 이 세션의 "_" key에 두어 다음 실행에서 한 번 보여 줍니다.
+# - 사이드바 알림은 세션별 cursor(세션 시작 시점의 끝) 이후의 새 판정만 토스트로 띄우고, 현재 END/관찰 환자 목록을 함께 보여 줍니다.
+# =========================================================
+NIHSS_TL_EVENT_KEY = "_nihss_tl_event"
+NIHSS_ALERT_CURSOR_KEY = "_nihss_alert_cursor"
 
-    if gaze == 0:
-        lines.append("EOM: normal")
-    else:
-        lines.append("EOM: gaze preponderance (+)")
 
-    lines.append(f"dysarthria {'(+)' if dys > 0 else '(-)'}")
+# 저장소 위치(환경변수)를 캐시 key에 넣어, 예열(warmup.py, 임시 저장소)에서 만든 객체를 실제 실행이 쓰지 않게 합니다.
+def get_nihss_timeline():
+    return _nihss_timeline(os.environ.get(NIHSS_STORE_ENV))
 
-    lines.append("Motor")
-    lines.append(f"V/V")
-    lines.append(f"V/V")
-    lines.append(f"(Motor grade는 NIHSS motor 점수에 따라 자동으로 표기됩니다.)")
-    lines.append(f"LUE/RUE: {motor_MRC_from_nihss(arm_l)}/{motor_MRC_from_nihss(arm_r)}")
-    lines.append(f"LLE/RLE: {motor_MRC_from_nihss(leg_l)}/{motor_MRC_from_nihss(leg_r)}")
 
-    if sensory > 0:
-        side = sensory_side.lower()
-        lines.append(f"Sensory: {side} hypesthesia (+)")
-    else:
-        lines.append("Sensory: (-)")
+@st.cache_resource
+def _nihss_timeline(url):
+    return NihssTimeline(open_nihss_store(url))
 
-    if ataxia > 0:
-        if ataxia_side == "Left":
-            lines.append("Cerebellar function test: left dysmetria (+)")
-        elif ataxia_side == "Right":
-            lines.append("Cerebellar function test: right dysmetria (+)")
-        else:
-            lines.append("Cerebellar function test: bilateral dysmetria (+)")
-    else:
-        lines.append("Cerebellar function test: (-)")
 
-    lines.append(f"neglect {'(+)' if neglect > 0 else '(-)'}")
+def nihss_timeline_add(nihss_vals: dict):
+    try:
+        event = get_nihss_timeline().record(st.session_state.nihss_tl_pid.strip(), nihss_vals)
+    except ValueError as e:
+        event = {"error": str(e)}
+    st.session_state[NIHSS_TL_EVENT_KEY] = event
 
-    facial_val = nihss_vals["4. Facial palsy"]
-    if facial_val > 0:
-        if facial_side == "Left":
-            lines.append("Facial expression: left CTFP")
-        elif facial_side == "Right":
-            lines.append("Facial expression: right CTFP")
-        else:
-            lines.append("Facial expression: bilateral facial palsy (+)")
-    else:
-        lines.append("Facial expression: (-)")
 
-    lines.append(f"NIHSS total: {total}")
-    return "\n".join(lines)
+def nihss_alert_panel():
+    timeline = get_nihss_timeline()
+    # 새(또는 다시 연결한) 세션은 현재 끝에서 시작합니다. 지난 알림은 아래 환자 목록이 보여 줍니다.
+    if NIHSS_ALERT_CURSOR_KEY not in st.session_state:
+        st.session_state[NIHSS_ALERT_CURSOR_KEY] = timeline.cursor()
+    new, cursor = timeline.new_alerts(st.session_state[NIHSS_ALERT_CURSOR_KEY])
+    st.session_state[NIHSS_ALERT_CURSOR_KEY] = cursor
+    for event in new:
+        st.toast(format_event(event), icon="🚨" if event["level"] == END else "⚠️")
+    flagged = timeline.flagged_events()
+    if flagged:
+        st.markdown("#### 병동 NIHSS 악화 알림")
+        for event in flagged:
+            (st.error if event["level"] == END else st.warning)(format_event(event))
 
 
 # =========================================================
-# ELAN (병변 1–4개, 크기 >1.5cm 체크박스)
-# - PCA cortical branch는 후순환계로 처리합니다.
+# MAGIC (단계형)
 # =========================================================
-SEVERITY_ORDER = {"Minor": 1, "Moderate": 2, "Major": 3}
-
-
-def elan_severity_for_lesion(
-    circ: str,
-    size_gt_1_5: bool,
-    anterior_pattern: str,
-    posterior_site: str,
-    anterior_multiterritory: bool,
-    anterior_major_pattern: str,
-):
-    # 후순환계
-    if circ == "후순환계":
-        # Major: brainstem/cerebellum > 1.5cm
-        if posterior_site in ["뇌간", "소뇌"] and size_gt_1_5:
-            return "Major"
-
-        # Moderate site examples (후순환계에서 PCA cortical branch를 지원)
-        if posterior_site in ["후대뇌동맥 피질 표재 가지"]:
-            return "Moderate"
-
-        # 그 외는 크기 기준으로 단순 분류
-        return "Minor" if not size_gt_1_5 else "Moderate"
-
-    # 전순환계 Major 우선
-    if anterior_major_pattern == "전체 영역 침범":
-        return "Major"
-    if anterior_major_pattern == "피질 표재 가지 2개 이상":
-        return "Major"
-    if anterior_major_pattern == "피질 표재 가지 + 심부 가지 동반":
-        return "Major"
-    if anterior_multiterritory:
-        return "Major"
-
-    # Moderate 패턴 (전순환계)
-    if anterior_pattern in [
-        "중대뇌동맥 피질 표재 가지",
-        "중대뇌동맥 심부 가지",
-        "경계영역(internal borderzone)",
-        "전대뇌동맥 피질 표재 가지",
-    ]:
-        return "Moderate"
-
-    # 그 외는 크기 기준
-    return "Minor" if not size_gt_1_5 else "Moderate"
-
-
-def elan_overall_severity(lesions: list[str]) -> str:
-    base = max(lesions, key=lambda x: SEVERITY_ORDER[x])
-    minor_count = sum(1 for x in lesions if x == "Minor")
-    mod_count = sum(1 for x in lesions if x == "Moderate")
-    if base == "Minor" and minor_count >= 2:
-        return "Moderate"
-    if base in ["Minor", "Moderate"] and mod_count >= 2:
-        return "Major"
-    return base
-
-
-def elan_recommendation(severity: str) -> str:
-    if severity in ["Minor", "Moderate"]:
-        return "≤ 48시간"
-    return "6–7일"
+MAGIC_WIDGET_KEYS = ("magic_other", "magic_lacunar", "magic_relevant", "magic_branch", "magic_non_generic", "magic_ce", "magic_ce_high")
 
 
-# =========================================================
-# MAGIC (단계형)
-# =========================================================
 def reset_magic():
     st.session_state.magic_step = 0
     st.session_state.magic_answers = {}
+    for k in MAGIC_WIDGET_KEYS:
+        st.session_state.pop(k, None)
 
 
-def magic_result_from_answers(a: dict) -> str:
-    if a.get("other_determined"):
-        return "Other determined"
+def magic_goto(step: int):
+    # 버튼 콜백에서 단계를 바꿔 클릭 한 번이 실행 한 번이 되게 합니다(st.rerun()으로 두 번 실행하지 않습니다).
+    st.session_state.magic_step = step
 
-    if a.get("lacunar"):
-        if a.get("relevant_artery"):
-            if a.get("branch_atheroma"):
-                return "LAA-BR"
-            return "LAA-LC"
-        if a.get("ce_source"):
-            return "CE (high risk)" if a.get("ce_high_risk") else "UD negative"
-        return "SVO"
 
-    if a.get("relevant_artery"):
-        return "LAA-NG" if a.get("non_generic_pattern") else "LAA"
+# =========================================================
+# 등록된 계산기 화면(registry.py)
+# - 입력 위젯은 Field 선언(종류/문구/범위/key/열 위치)으로 만들고, 결과는 계산기 캐시를 거칩니다.
+# =========================================================
+def calculator_widget(field):
+    if field.kind == "bool":
+        return st.checkbox(field.label, value=field.default, key=field.key)
+    if field.kind == "choice":
+        return st.selectbox(field.label, field.options, index=field.options.index(field.default), key=field.key)
+    return st.number_input(field.label, field.min, field.max, field.default, field.step, key=field.key)
 
-    if a.get("ce_source"):
-        return "CE (high risk)" if a.get("ce_high_risk") else "UD negative"
 
-    return "UD negative"
+def render_calculator(calc, n_columns: int = 3) -> dict:
+    cols = st.columns(n_columns)
+    values = {}
+    for field in calc.inputs:
+        with cols[field.column % n_columns]:
+            values[field.name] = calculator_widget(field)
+    result = calc.evaluate(values)
+    st.success(calc.describe(result))
+    return result
 
 
 # =========================================================
-# ASCVD / Dyslipidemia (AHA PCE + ESC SCORE2)
+# 브라우저 점수 계산(client_scores.py)
+# - 빠른 입력을 켜면 NIHSS/CHA₂DS₂-VASc/ABCD²/HAS-BLED 입력을 컴포넌트가 그리고,
+#   총점과 위험군은 규칙표로 브라우저에서 바로 계산합니다(입력마다 서버 rerun이 없습니다).
+# - "결과를 반영합니다"를 누를 때만 값이 서버로 와서 기존 위젯 key에 들어가고,
+#   그 rerun에서 의무기록 문구·작업 목록·확정 결과를 서버가 만듭니다. 기존 위젯은 접힌 expander에 그대로 둡니다.
 # =========================================================
-def aha_very_high_risk(major_events_count: int, high_risk_conditions_count: int) -> bool:
-    if major_events_count >= 2:
-        return True
-    if major_events_count == 1 and high_risk_conditions_count >= 2:
-        return True
-    return False
-
-
-# AHA high-risk conditions: 체크박스로 변경
-AHA_HR_CONDITIONS_CHECK = [
-    "나이 ≥65세",
-    "당뇨병",
-    "고혈압",
-    "만성신질환(CKD)",
-    "현재 흡연",
-    "심부전",
-    "이전 PCI/CABG",
-    "지속적으로 LDL-C 상승(치료에도)",
-]
-
-# ESC 정의(근거 탭에서 테이블로 상세 노출)
-ESC_DOC_ASCVDS = [
-    "이전 ACS(심근경색 또는 불안정 협심증)",
-    "만성 관상동맥증후군(chronic coronary syndromes)",
-    "관상동맥/말초혈관 재개통술(PCI, CABG 등)",
-    "뇌졸중 또는 TIA",
-    "말초동맥질환(PAD)",
-    "영상에서 확실한 ASCVD(관상동맥 CT/조영술 유의미 플라크, 경동맥/대퇴동맥 플라크, CAC 현저히 상승 등)",
-]
-
-
-# ---------- AHA 10-year ASCVD risk (PCE) ----------
-# 2013 ACC/AHA PCE 계수 기반 (White/AA 남/여) 계산
-# 주의: 이는 교육/의사결정 보조용이며, 공식 도구와 차이가 있을 수 있습니다.
-PCE_COEFFS = {
-    ("Male", "White"): {
-        "ln_age": 12.344,
-        "ln_tc": 11.853,
-        "ln_age_ln_tc": -2.664,
-        "ln_hdl": -7.990,
-        "ln_age_ln_hdl": 1.769,
-        "ln_sbp_treated": 1.797,
-        "ln_sbp_untreated": 1.764,
-        "smoker": 7.837,
-        "ln_age_smoker": -1.795,
-        "diabetes": 0.658,
-        "mean": 61.18,
-        "baseline_survival": 0.9144,
-    },
-    ("Female", "White"): {
-        "ln_age": -29.799,
-        "ln_age_sq": 4.884,
-        "ln_tc": 13.540,
-        "ln_age_ln_tc": -3.114,
-        "ln_hdl": -13.578,
-        "ln_age_ln_hdl": 3.149,
-        "ln_sbp_treated": 2.019,
-        "ln_sbp_untreated": 1.957,
-        "smoker": 7.574,
-        "ln_age_smoker": -1.665,
-        "diabetes": 0.661,
-        "mean": -29.18,
-        "baseline_survival": 0.9665,
-    },
-    ("Male", "African American"): {
-        "ln_age": 2.469,
-        "ln_age_sq": 0.0,
-        "ln_tc": 0.302,
-        "ln_age_ln_tc": 0.0,
-        "ln_hdl": -0.307,
-        "ln_age_ln_hdl": 0.0,
-        "ln_sbp_treated": 1.916,
-        "ln_sbp_untreated": 1.809,
-        "smoker": 0.549,
-        "ln_age_smoker": 0.0,
-        "diabetes": 0.645,
-        "mean": 19.54,
-        "baseline_survival": 0.8954,
-    },
-    ("Female", "African American"): {
-        "ln_age": 17.114,
-        "ln_age_sq": 0.0,
-        "ln_tc": 0.940,
-        "ln_age_ln_tc": 0.0,
-        "ln_hdl": -18.920,
-        "ln_age_ln_hdl": 4.475,
-        "ln_sbp_treated": 29.291,
-        "ln_sbp_untreated": 27.820,
-        "smoker": 0.691,
-        "ln_age_smoker": 0.0,
-        "diabetes": 0.874,
-        "mean": 86.61,
-        "baseline_survival": 0.9533,
-    },
+CLIENT_SCORE_TOGGLE_KEY = "score_client"
+CLIENT_SCORE_KEYS = {f"client_{name}" for name in CLIENT_SCORES}
+CLIENT_SCORE_WIDGETS_LABEL = "항목별 입력 위젯(서버 계산)"
+
+CLIENT_SCORE_CSS = """
+.client-score { font-family: inherit; font-size: 0.95rem; }
+.grid { display: grid; gap: 4px 16px; margin-bottom: 8px; }
+.grid label { display: flex; flex-direction: column; gap: 2px; margin: 4px 0; }
+.grid label.check { flex-direction: row; align-items: center; gap: 6px; }
+.grid input[type=number], .grid select { padding: 4px 6px; border: 1px solid #bbb; border-radius: 6px; }
+.grid input.invalid { border-color: #c62828; }
+.result, .band { padding: 8px 12px; border-radius: 8px; margin: 4px 0; }
+.result { background: #e8f5e9; color: #1b5e20; }
+.band.info { background: #e3f2fd; color: #0d47a1; }
+.band.warning { background: #fff8e1; color: #8d6e00; }
+.band.error { background: #ffebee; color: #b71c1c; }
+.footer { display: flex; gap: 10px; align-items: center; margin-top: 6px; }
+.footer button { padding: 6px 12px; border-radius: 8px; border: 1px solid #bbb; background: #fff; cursor: pointer; }
+.footer button:disabled { cursor: not-allowed; opacity: 0.5; }
+.status { font-size: 0.85rem; color: #666; }
+"""
+
+CLIENT_SCORE_JS = CLIENT_SCORE_RULES_JS + """
+function makeInput(field, onChange) {
+  const label = document.createElement("label");
+  let input;
+  if (field.kind === "bool") {
+    input = document.createElement("input");
+    input.type = "checkbox";
+    input.checked = field.value;
+    input.addEventListener("change", () => onChange(input.checked));
+    label.className = "check";
+    label.append(input, field.label);
+    return label;
+  }
+  if (field.kind === "choice") {
+    input = document.createElement("select");
+    for (const opt of field.options) input.add(new Option(opt, opt, false, opt === field.value));
+    input.addEventListener("change", () => onChange(input.value));
+  } else {
+    input = document.createElement("input");
+    input.type = "number";
+    for (const k of ["min", "max", "step"]) if (field[k] != null) input[k] = field[k];
+    input.value = field.value;
+    input.addEventListener("input", () => {
+      const v = input.value === "" ? NaN : Number(input.value);
+      const ok = Number.isFinite(v) && (field.kind !== "int" || Number.isInteger(v))
+        && (field.min == null || v >= field.min) && (field.max == null || v <= field.max);
+      input.classList.toggle("invalid", !ok);
+      onChange(ok ? v : null);
+    });
+  }
+  const text = document.createElement("span");
+  text.textContent = field.label;
+  label.append(text, input);
+  return label;
 }
 
+export default function (component) {
+  const { data, setTriggerValue, parentElement } = component;
+  const root = parentElement.querySelector(".client-score");
+  const values = Object.fromEntries(data.fields.map((f) => [f.name, f.value]));
+  let initial = JSON.stringify(values);
+
+  const nColumns = Math.max(...data.fields.map((f) => f.column)) + 1;
+  const grid = document.createElement("div");
+  grid.className = "grid";
+  grid.style.gridTemplateColumns = `repeat(${nColumns}, minmax(0, 1fr))`;
+  const columns = Array.from({ length: nColumns }, () => grid.appendChild(document.createElement("div")));
+  const result = document.createElement("div");
+  result.className = "result";
+  const band = document.createElement("div");
+  const footer = document.createElement("div");
+  footer.className = "footer";
+  const button = document.createElement("button");
+  button.textContent = "결과를 반영합니다";
+  const status = document.createElement("span");
+  status.className = "status";
+  footer.append(button, status);
+
+  function refresh() {
+    const invalid = Object.values(values).some((v) => v === null);
+    button.disabled = invalid;
+    if (invalid) {
+      result.textContent = "입력값을 확인해 주십시오.";
+      band.hidden = true;
+      return;
+    }
+    const total = scoreTotal(data.rules, values);
+    result.textContent = data.summary.replaceAll("{score}", total);
+    const hit = data.bands.filter((b) => total >= b.min).pop();
+    band.hidden = !hit;
+    if (hit) {
+      band.className = `band ${hit.level}`;
+      band.textContent = hit.text;
+    }
+    status.textContent = JSON.stringify(values) === initial ? "" : "의무기록 문구와 작업 목록은 반영 후 갱신됩니다.";
+  }
+
+  for (const f of data.fields) {
+    columns[f.column].appendChild(makeInput(f, (v) => { values[f.name] = v; refresh(); }));
+  }
+  button.addEventListener("click", () => {
+    initial = JSON.stringify(values);
+    refresh();
+    setTriggerValue("submitted", { ...values });
+  });
+  root.replaceChildren(grid, result, band, footer);
+  refresh();
+}
+"""
 
-def pce_10y_risk_percent(
-    sex: str,
-    race: str,
-    age: float,
-    tc: float,
-    hdl: float,
-    sbp: float,
-    bp_treated: bool,
-    smoker: bool,
-    diabetes: bool,
-):
-    # input guards
-    if age <= 0 or tc <= 0 or hdl <= 0 or sbp <= 0:
-        return None
+client_score_component = st.components.v2.component(
+    "stroke_client_score", html='<div class="client-score"></div>', css=CLIENT_SCORE_CSS, js=CLIENT_SCORE_JS,
+)
 
-    key = (sex, race)
-    if key not in PCE_COEFFS:
-        return None
-    c = PCE_COEFFS[key]
 
-    ln_age = math.log(age)
-    ln_tc = math.log(tc)
-    ln_hdl = math.log(hdl)
-    ln_sbp = math.log(sbp)
+def client_score_panel(name: str) -> bool:
+    # 빠른 입력이 꺼져 있으면 아무것도 그리지 않고 False(기존 위젯만 씁니다).
+    # 반영 값은 반환값(trigger, 그 실행에서만 보입니다)으로 받아 같은 탭의 위젯이 만들어지기 전에 넣습니다.
+    if not st.session_state.get(CLIENT_SCORE_TOGGLE_KEY):
+        return False
+    result = client_score_component(key=f"client_{name}", data=score_spec(name, st.session_state),
+                                    on_submitted_change=lambda: None)
+    if result.submitted is not None:
+        try:
+            values = widget_values(name, result.submitted)
+        except ValueError as e:
+            st.warning(str(e))
+        else:
+            for key, value in values.items():
+                st.session_state[key] = value
+    return True
+
+
+# =========================================================
+# 다환자 작업 목록(worklist)
+# - 환자별 입력은 아래 위젯 key 순서의 tuple 하나로 보관합니다(worklist.py).
+# - 목록 객체(환자별 memo 포함)는 "_"로 시작하는 key에 두어 세션 외부 저장 대상에서 제외하고,
+#   환자 목록과 입력값은 실행이 끝날 때 WORKLIST_STATE_KEY에 저장용 dict로 옮겨 재시작 후에도 복원합니다.
+# - 환자 전환은 on_change/on_click 콜백에서 처리하므로 위젯이 만들어지기 전에 값이 바뀝니다.
+# =========================================================
+WORKLIST_FIELDS = (
+    *[f"nihss_{name}" for name, _, _ in NIHSS_ITEMS],
+    "nihss_facial_side", "nihss_sensory_side", "nihss_ataxia_side", "nihss_tl_pid",
+    *[f.key for name in ("chads_vasc", "abcd2", "has_bled") for f in REGISTRY[name].inputs],
+    "noac_age", "noac_sex", "noac_wt", "noac_scr", "noac_all_age", "noac_all_sex", "noac_all_wt", "noac_all_scr",
+    "elan_n_lesions",
+    *[f"elan_{k}_{i}" for i in range(ELAN_MAX_LESIONS) for k in ("circ", "post_site", "ant_pat", "ant_major", "multi", "sizegt")],
+    *MAGIC_WIDGET_KEYS, "magic_step", "magic_answers",
+    "n_mi", "n_stroke", "n_pad", *[f"aha_hr_{i}" for i in range(len(AHA_HR_CONDITIONS_CHECK))],
+    *PCE_FILL_KEYS, "pce_mc", PCE_FILL_WARNING_KEY,
+    "s2_age", "s2_sex", "s2_smoke", "s2_sbp", "s2_nonhdl", "s2_region", "s2_mc",
+    "ldl_now", "on_hi", "on_eze", "on_pcsk9", "esc_recur_ldl",
+)
+WORKLIST_KEY = "_worklist"
+WORKLIST_STATE_KEY = "worklist_state"
+
+
+def get_worklist() -> Worklist:
+    if WORKLIST_KEY not in st.session_state:
+        wl = Worklist(WORKLIST_FIELDS)
+        if WORKLIST_STATE_KEY in st.session_state:
+            wl.load_state(st.session_state[WORKLIST_STATE_KEY])
+        st.session_state[WORKLIST_KEY] = wl
+    return st.session_state[WORKLIST_KEY]
+
 
-    s = 0.0
-    s += c.get("ln_age", 0) * ln_age
-    if "ln_age_sq" in c and c["ln_age_sq"] != 0:
-        s += c["ln_age_sq"] * (ln_age ** 2)
+def worklist_note(name: str, value):
+    get_worklist().current().notes[name] = value
 
-    s += c.get("ln_tc", 0) * ln_tc
-    s += c.get("ln_age_ln_tc", 0) * ln_age * ln_tc
 
-    s += c.get("ln_hdl", 0) * ln_hdl
-    s += c.get("ln_age_ln_hdl", 0) * ln_age * ln_hdl
+def worklist_add_current():
+    wl = get_worklist()
+    wl.save_active(st.session_state)
+    wl.active = wl.add(st.session_state.get("worklist_label", "").strip(), wl.capture(st.session_state))
+    st.session_state.worklist_pid = wl.active
+    st.session_state.worklist_label = ""
 
-    if bp_treated:
-        s += c.get("ln_sbp_treated", 0) * ln_sbp
+
+def worklist_add_rows(rows: list):
+    # EMR에서 불러온 환자들을 한 번에 목록에 넣습니다(입력란은 바꾸지 않습니다).
+    wl = get_worklist()
+    for row in rows:
+        wl.add(str(row["patient_id"]), wl.values_from(widget_state_from_cohort_row(row)))
+
+
+def worklist_switch():
+    get_worklist().switch(st.session_state.worklist_pid, st.session_state)
+
+
+def worklist_remove():
+    wl = get_worklist()
+    wl.remove(wl.active)
+    if wl.records:
+        wl.restore(next(iter(wl.records)), st.session_state)
+        st.session_state.worklist_pid = wl.active
     else:
-        s += c.get("ln_sbp_untreated", 0) * ln_sbp
-
-    s += c.get("smoker", 0) * (1 if smoker else 0)
-    s += c.get("ln_age_smoker", 0) * ln_age * (1 if smoker else 0)
-    s += c.get("diabetes", 0) * (1 if diabetes else 0)
-
-    # risk = 1 - S0 ^ exp(s - mean)
-    exp_term = math.exp(s - c["mean"])
-    risk = 1 - (c["baseline_survival"] ** exp_term)
-    return max(0.0, min(1.0, risk)) * 100.0
-
-
-# ---------- ESC SCORE2 (계산 구조 제공 + 추정치) ----------
-# 실제 SCORE2는 국가 리스크 클러스터/연령대/계수/차트가 필요합니다.
-# 이번 구현은 입력값을 기반으로 "추정치"를 계산하여 컷오프(2/10/20%)와 함께 표시합니다.
-def score2_estimate_percent(age, sex, smoker, sbp, non_hdl, risk_region):
-    # 매우 단순한 추정 모델(설명용). 공식 계산기와 다를 수 있습니다.
-    base = 0.0
-    base += (age - 40) * 0.18
-    base += 6.0 if smoker else 0.0
-    base += (sbp - 120) * 0.05
-    base += (non_hdl - 130) * 0.03
-    if sex == "남성":
-        base *= 1.20
-    # risk region multiplier
-    mult = {"Low": 0.9, "Moderate": 1.0, "High": 1.15, "Very high": 1.3}.get(risk_region, 1.0)
-    base *= mult
-
-    # map to %
-    # base가 0~100 사이로 지나치게 튀지 않도록 sigmoid
-    p = 100.0 / (1.0 + math.exp(-0.07 * (base - 25)))
-    return float(max(0.1, min(50.0, p)))
-
-
-def esc_risk_category_from_score2(score2_percent: float):
-    # ESC 2025 Table 3 cutoffs: <2 low, 2-<10 moderate, 10-<20 high, >=20 very high
-    if score2_percent >= 20:
-        return "Very high"
-    if score2_percent >= 10:
-        return "High"
-    if score2_percent >= 2:
-        return "Moderate"
-    return "Low"
-
-
-def esc_ldl_target_by_category(category: str) -> str:
-    if category == "Very high (recurrent within 2y)":
-        return "<40 mg/dL (및 ≥50% 감소를 목표로 하시는 것이 일반적입니다.)"
-    if category == "Very high":
-        return "<55 mg/dL (및 ≥50% 감소를 목표로 하시는 것이 일반적입니다.)"
-    if category == "High":
-        return "<70 mg/dL (및 ≥50% 감소를 함께 고려하실 수 있습니다.)"
-    if category == "Moderate":
-        return "<100 mg/dL를 목표로 하실 수 있습니다."
-    if category == "Low":
-        return "<116 mg/dL를 목표로 하실 수 있습니다."
-    return "위험도 분류가 필요합니다."
+        st.session_state.pop("worklist_pid", None)
+
+
+def worklist_panel():
+    wl = get_worklist()
+    st.markdown("#### 환자 목록(worklist)")
+    st.text_input("환자 표시 이름", key="worklist_label", placeholder="예: 3병동 12호 A")
+    st.button("현재 입력을 새 환자로 추가합니다.", key="worklist_add", on_click=worklist_add_current)
+    if not wl.records:
+        st.caption("추가한 환자가 없습니다. 현재 입력은 한 명의 환자로 취급됩니다.")
+        return
+    if st.session_state.get("worklist_pid") not in wl.records:
+        st.session_state.worklist_pid = wl.active if wl.active in wl.records else next(iter(wl.records))
+        wl.active = st.session_state.worklist_pid
+    st.selectbox(
+        "환자 전환", list(wl.records), key="worklist_pid",
+        format_func=lambda pid: wl.records[pid].label, on_change=worklist_switch,
+    )
+    st.button("선택한 환자를 목록에서 삭제합니다.", key="worklist_remove", on_click=worklist_remove)
+    with st.expander(f"목록 요약({len(wl)}명)"):
+        st.dataframe(wl.overview(), use_container_width=True, hide_index=True)
 
 
 # =========================================================
-# 참고용 위험도 표 (ABCD2 / CHA2DS2-VASc)
+# 참고 그림(프로세스당 한 번만 디코딩합니다)
+# - st.image는 본문 최대 폭(FIGURE_MAX_WIDTH)보다 넓은 그림을 실행마다 디코딩·축소·재인코딩합니다
+#   (ELAN 그림 3671px은 실행마다 약 0.7초). 처음 읽을 때 그 폭으로 줄인 PNG로 보관해 이후에는 그대로 보냅니다.
 # =========================================================
-ABCD2_RISK_TABLE = pd.DataFrame(
-    [
-        {"ABCD²": "0–3 (Low)", "2-day risk": "1.0%", "7-day risk": "1.2%", "90-day risk": "3.1%"},
-        {"ABCD²": "4–5 (Moderate)", "2-day risk": "4.1%", "7-day risk": "5.9%", "90-day risk": "9.8%"},
-        {"ABCD²": "6–7 (High)", "2-day risk": "8.1%", "7-day risk": "11.7%", "90-day risk": "17.8%"},
-    ]
-)
+FIGURE_MAX_WIDTH = 1460
 
-CHA2DS2_VASC_RISK_TABLE = pd.DataFrame(
-    [
-        {"Score": 0, "Annual stroke/systemic embolism risk": "0.2%"},
-        {"Score": 1, "Annual stroke/systemic embolism risk": "0.6%"},
-        {"Score": 2, "Annual stroke/systemic embolism risk": "2.2%"},
-        {"Score": 3, "Annual stroke/systemic embolism risk": "3.2%"},
-        {"Score": 4, "Annual stroke/systemic embolism risk": "4.8%"},
-        {"Score": 5, "Annual stroke/systemic embolism risk": "7.2%"},
-        {"Score": 6, "Annual stroke/systemic embolism risk": "9.7%"},
-        {"Score": 7, "Annual stroke/systemic embolism risk": "11.2%"},
-        {"Score": 8, "Annual stroke/systemic embolism risk": "10.8%"},
-        {"Score": 9, "Annual stroke/systemic embolism risk": "12.2%"},
-    ]
-)
+
+@st.cache_resource
+def load_figure(name: str):
+    path = Path(name)
+    if not path.exists():
+        return None
+    with Image.open(path) as im:
+        if im.width > FIGURE_MAX_WIDTH:
+            im = im.resize((FIGURE_MAX_WIDTH, round(im.height * FIGURE_MAX_WIDTH / im.width)), Image.LANCZOS)
+        buf = io.BytesIO()
+        im.save(buf, format="PNG")
+    return buf.getvalue()
 
 
 # =========================================================
-# 앱 시작 UI
+# 가이드라인 및 근거(검색 색인은 프로세스당 한 번 만듭니다)
 # =========================================================
-st.title("🧠 Stroke Helper")
+@st.cache_resource
+def get_reference_index():
+    return ReferenceIndex()
+
+
+def render_reference_section(section: dict):
+    st.markdown(f"### {section['title']}")
+    if section.get("body"):
+        st.markdown(section["body"])
+    if section.get("table") is not None:
+        st.dataframe(section["table"], use_container_width=True)
+    if section.get("figure"):
+        st.markdown("#### 참고 그림")
+        if load_figure(section["figure"]) is not None:
+            st.image(load_figure(section["figure"]), use_container_width=True)
+        else:
+            st.info(f"같은 폴더에 `{section['figure']}` 파일을 두시면 자동으로 표시됩니다.")
 
-with st.expander("면책 안내", expanded=True):
-    st.write(
-        "본 애플리케이션은 교육 및 임상 의사결정 보조 목적입니다. "
-        "실제 치료 결정은 최신 가이드라인, 의약품 라벨, 기관 프로토콜, 환자 개별 상황을 종합하여 판단하셔야 합니다."
-    )
 
-if "is_clinician" not in st.session_state:
-    st.session_state.is_clinician = None
+# =========================================================
+# 세션 상태 외부 저장(worker 재시작/재연결 시 입력 복원)
+# - 버튼/업로드/다운로드 위젯 값은 session_state로 설정할 수 없으므로 저장하지 않습니다.
+# - 만료(SESSION_TTL_SECONDS)된 스냅샷은 실행 중 purge_if_due로 주기적으로 지웁니다.
+# =========================================================
+SESSION_TRANSIENT_KEYS = {
+    "emr_file", "emr_fill", "emr_worklist", "elan_sched_add", "elan_sched_remove", "elan_sched_ics", "dev_profile_start",
+    "worklist_add", "worklist_remove", "job_file", "job_submit",
+    "nihss_tl_add", *CLIENT_SCORE_KEYS,
+}
 
-if st.session_state.is_clinician is None:
-    st.subheader("의료인 여부 확인")
-    c1, c2 = st.columns(2)
-    with c1:
-        if st.button("의료인입니다. 계속 진행합니다."):
-            st.session_state.is_clinician = True
-            st.rerun()
-    with c2:
-        if st.button("의료인이 아닙니다. 종료합니다."):
-            st.session_state.is_clinician = False
-            st.rerun()
-    st.stop()
 
-if st.session_state.is_clinician is False:
-    st.error("의료인 전용 기능으로 구성되어 있어 사용을 종료합니다.")
-    st.stop()
+def get_session_store():
+    return _session_store(os.environ.get(SESSION_STORE_ENV))
 
-tab_calc, tab_ref = st.tabs(["🧾 임상정보 입력", "📚 가이드라인 및 근거"])
+
+@st.cache_resource
+def _session_store(url):
+    return open_session_store(url)
+
+
+def start_session_sync():
+    store = get_session_store()
+    if store is None:
+        return None
+    purge_if_due(store)
+    sid = st.query_params.get(SID_PARAM)
+    if not sid:
+        sid = uuid.uuid4().hex
+        st.query_params[SID_PARAM] = sid
+    sync = SessionSync(store, st.session_state, sid, SESSION_TRANSIENT_KEYS)
+    sync.restore()
+    sync.snapshot()
+    return sync
 
 
 # =========================================================
-# 1) 임상정보 입력
+# 실행 수 제한(admission.py)
+# - 의료인 확인 뒤 본문을 그리기 전에 입장하고, 스크립트 본문을 감싼 try/finally에서 release합니다.
+#   st.stop()/st.rerun()/예외로 끝나는 실행도 자리를 바로 돌려줍니다(입장 전에 끝난 실행의 release는 아무 일도 하지 않습니다).
+# - URL에 ?priority=background를 붙인 화면(병동 모니터 등)은 진료 화면보다 뒤에 입장합니다.
+# - 대기 안내 placeholder를 다시 그리는 동안 새 입력이 오면 이번 실행은 중단되고 새 실행 하나로 합쳐집니다.
 # =========================================================
-with tab_calc:
-    t1, t2, t3, t4 = st.tabs(["🧮 점수/계산", "⏱️ ELAN timing", "🧭 MAGIC mechanism", "🫀 Dyslipidemia (ASCVD/LDL)"])
-
-    # ---------------------------
-    # 점수/계산
-    # ---------------------------
-    with t1:
-        score_tabs = st.tabs([
-            "NIHSS",
-            "CHA₂DS₂-VASc",
-            "ABCD²",
-            "HAS-BLED",
-            "NOAC 용량(단일 약제)",
-            "NOAC 용량(전체 비교)",
-        ])
-
-        # NIHSS
-        with score_tabs[0]:
-            st.subheader("NIHSS")
-            st.write("항목별 점수를 숫자로 입력하시면 총점과 의무기록용 텍스트를 생성합니다.")
-
-            nihss_vals = {}
-            for name, mn, mx in NIHSS_ITEMS:
-                nihss_vals[name] = st.number_input(name, mn, mx, 0, 1, key=f"nihss_{name}")
-
-            total = sum(nihss_vals.values())
-            st.success(f"NIHSS 총점은 {total}점입니다.")
-
-            facial_side = "Left"
-            if nihss_vals["4. Facial palsy"] > 0:
-                facial_side = st.radio("Facial palsy 방향을 선택해 주십시오.", ["Left", "Right", "Bilateral"], horizontal=True)
-
-            sensory_side = "Left"
-            if nihss_vals["8. Sensory"] > 0:
-                sensory_side = st.radio("감각저하 방향을 선택해 주십시오.", ["Left", "Right"], horizontal=True)
-
-            ataxia_side = "Left"
-            if nihss_vals["7. Limb ataxia"] > 0:
-                ataxia_side = st.radio("Ataxia 방향을 선택해 주십시오.", ["Left", "Right", "Bilateral"], horizontal=True)
+PRIORITY_PARAM = "priority"
 
-            st.divider()
 
-            comp_text = build_nihss_component_text(nihss_vals)
-            st.markdown("#### 의무기록용 NIHSS 구성요소")
-            st.code(comp_text, language="text")
-            copy_to_clipboard_ui(comp_text, "복사(NIHSS 구성요소)", "copy_nihss_components")
-
-            neuro_text = build_neuro_exam_text(nihss_vals, facial_side, sensory_side, ataxia_side)
-            st.markdown("#### 의무기록용 Neurologic examination")
-            st.code(neuro_text, language="text")
-            copy_to_clipboard_ui(neuro_text, "복사(Neurologic examination)", "copy_neuro_exam")
-
-        # CHADS-VASc
-        with score_tabs[1]:
-            st.subheader("CHA₂DS₂-VASc")
-            st.write("입력된 점수에 따라 연간 뇌졸중/전신색전증 위험도를 참고로 표시합니다.")
-            c1, c2, c3 = st.columns(3)
-            with c1:
-                chf = st.checkbox("Congestive HF/LV dysfunction")
-                htn = st.checkbox("Hypertension")
-                dm = st.checkbox("Diabetes mellitus")
-            with c2:
-                age = st.number_input("Age", 0, 120, 70, 1)
-                stroke_tia = st.checkbox("Prior stroke/TIA/thromboembolism")
-                vascular = st.checkbox("Vascular disease (MI/PAD/aortic plaque)")
-            with c3:
-                sex = st.selectbox("Sex", ["Male", "Female"])
-                female = (sex == "Female")
+@st.cache_resource
+def get_admission():
+    return AdmissionController()
 
-            score = chads_vasc_score(chf, htn, age, dm, stroke_tia, vascular, female)
-            st.success(f"CHA₂DS₂-VASc 점수는 {score}점입니다.")
-
-            row = CHA2DS2_VASC_RISK_TABLE[CHA2DS2_VASC_RISK_TABLE["Score"] == score]
-            if not row.empty:
-                st.info(f"참고 연간 위험도는 {row.iloc[0]['Annual stroke/systemic embolism risk']}입니다.")
-
-        # ABCD2
-        with score_tabs[2]:
-            st.subheader("ABCD²")
-            st.write("TIA 이후 단기 뇌졸중 재발 위험(2일/7일/90일)을 참고로 표시합니다.")
-            c1, c2, c3 = st.columns(3)
-            with c1:
-                age_ge_60 = st.checkbox("Age ≥60")
-                diabetes = st.checkbox("Diabetes")
-            with c2:
-                bp_ge = st.checkbox("BP ≥140/90 at presentation")
-                duration = st.number_input("Symptom duration (minutes)", 0, 10000, 20, 5)
-            with c3:
-                unilateral = st.checkbox("Unilateral weakness")
-                speech = st.checkbox("Speech impairment without weakness")
-
-            score = abcd2_score(age_ge_60, bp_ge, unilateral, speech, duration, diabetes)
-            st.success(f"ABCD² 점수는 {score}점입니다.")
-
-            if score <= 3:
-                rr = ABCD2_RISK_TABLE.iloc[0]
-                st.info("위험군은 Low(0–3)입니다.")
-            elif score <= 5:
-                rr = ABCD2_RISK_TABLE.iloc[1]
-                st.warning("위험군은 Moderate(4–5)입니다.")
-            else:
-                rr = ABCD2_RISK_TABLE.iloc[2]
-                st.error("위험군은 High(6–7)입니다.")
-
-            st.info(f"참고 위험도는 2일 {rr['2-day risk']}, 7일 {rr['7-day risk']}, 90일 {rr['90-day risk']}입니다.")
-
-        # HAS-BLED
-        with score_tabs[3]:
-            st.subheader("HAS-BLED")
-            st.write("항응고 치료 중 출혈 위험 요인을 점검하기 위한 점수입니다.")
-            c1, c2, c3 = st.columns(3)
-            with c1:
-                htn160 = st.checkbox("Hypertension (SBP >160)")
-                renal = st.checkbox("Abnormal renal function")
-                liver = st.checkbox("Abnormal liver function")
-            with c2:
-                stroke = st.checkbox("Stroke history")
-                bleed = st.checkbox("Bleeding history/predisposition")
-                inr = st.checkbox("Labile INR (if on warfarin)")
-            with c3:
-                age65 = st.checkbox("Age >65")
-                drugs = st.checkbox("Drugs predisposing to bleeding (antiplatelet/NSAID)")
-                alcohol = st.checkbox("Alcohol use (excess)")
-
-            score = has_bled_score(htn160, renal, liver, stroke, bleed, inr, age65, drugs, alcohol)
-            st.success(f"HAS-BLED 점수는 {score}점입니다.")
-
-        # NOAC 단일
-        with score_tabs[4]:
-            st.subheader("NOAC 용량(단일 약제)")
-            st.write("입력값으로 CrCl을 계산하고 선택한 NOAC의 용량(표준/감량)을 표시합니다.")
-            drug = st.selectbox("NOAC 선택", ["Apixaban", "Rivaroxaban", "Edoxaban", "Dabigatran"])
-            age = st.number_input("Age (years)", 0, 120, 75, 1, key="noac_age")
-            sex = st.selectbox("Sex", ["Male", "Female"], key="noac_sex")
-            weight = st.number_input("Weight (kg)", 1.0, 300.0, 70.0, 0.5, key="noac_wt")
-            scr = st.number_input("Serum creatinine (mg/dL)", 0.1, 20.0, 1.0, 0.1, key="noac_scr")
-            female = (sex == "Female")
-            crcl = cockcroft_gault_crcl(age, weight, scr, female)
-
-            if crcl is not None:
-                st.info(f"Cockcroft–Gault CrCl은 약 {crcl:.1f} mL/min입니다.")
-            else:
-                st.warning("CrCl 계산이 불가능합니다.")
-
-            if drug == "Apixaban":
-                dose, tag = noac_dose_apixaban(age, weight, scr)
-            elif drug == "Rivaroxaban":
-                dose, tag = noac_dose_rivaroxaban(crcl)
-            elif drug == "Edoxaban":
-                dose, tag = noac_dose_edoxaban(crcl, weight)
-            else:
-                dose, tag = noac_dose_dabigatran(crcl, age)
-
-            st.success(f"{drug} 권장 용량 표시는 '{dose}'이며, 판단 근거는 '{tag}'입니다.")
-
-        # NOAC 전체 비교
-        with score_tabs[5]:
-            st.subheader("NOAC 용량(전체 비교)")
-            st.write("동일 입력값에서 4가지 NOAC의 표준/감량 판단을 한 번에 비교합니다.")
-            age = st.number_input("Age (years)", 0, 120, 75, 1, key="noac_all_age")
-            sex = st.selectbox("Sex", ["Male", "Female"], key="noac_all_sex")
-            weight = st.number_input("Weight (kg)", 1.0, 300.0, 70.0, 0.5, key="noac_all_wt")
-            scr = st.number_input("Serum creatinine (mg/dL)", 0.1, 20.0, 1.0, 0.1, key="noac_all_scr")
-            female = (sex == "Female")
-            crcl = cockcroft_gault_crcl(age, weight, scr, female)
-
-            if crcl is not None:
-                st.info(f"Cockcroft–Gault CrCl은 약 {crcl:.1f} mL/min입니다.")
-            else:
-                st.warning("CrCl 계산이 불가능합니다.")
-
-            apx_d, apx_tag = noac_dose_apixaban(age, weight, scr)
-            riva_d, riva_tag = noac_dose_rivaroxaban(crcl)
-            edox_d, edox_tag = noac_dose_edoxaban(crcl, weight)
-            dabi_d, dabi_tag = noac_dose_dabigatran(crcl, age)
-
-            df = pd.DataFrame([
-                {"NOAC": "Apixaban", "Dose": apx_d, "Decision": apx_tag, "Key rule (summary)": "감량: age≥80, wt≤60, SCr≥1.5 중 2개 이상"},
-                {"NOAC": "Rivaroxaban", "Dose": riva_d, "Decision": riva_tag, "Key rule (summary)": "CrCl>50: 20mg, CrCl 15–50: 15mg"},
-                {"NOAC": "Edoxaban", "Dose": edox_d, "Decision": edox_tag, "Key rule (summary)": "감량: CrCl 15–50 또는 wt≤60"},
-                {"NOAC": "Dabigatran", "Dose": dabi_d, "Decision": dabi_tag, "Key rule (summary)": "CrCl 15–30 및 고령은 라벨 확인 필요"},
-            ])
-            st.dataframe(df, use_container_width=True)
-
-            note = "\n".join([
-                "NOAC dose comparison (educational):",
-                f"- Age={age}, Sex={sex}, Weight={weight} kg, SCr={scr} mg/dL, CrCl≈{crcl:.1f} mL/min" if crcl is not None else "- CrCl 계산 불가",
-                f"- Apixaban: {apx_d} ({apx_tag})",
-                f"- Rivaroxaban: {riva_d} ({riva_tag})",
-                f"- Edoxaban: {edox_d} ({edox_tag})",
-                f"- Dabigatran: {dabi_d} ({dabi_tag})",
-            ])
-            st.code(note, language="text")
-            copy_to_clipboard_ui(note, "복사(NOAC 비교 요약)", "copy_noac_all")
-
-    # ---------------------------
-    # ELAN timing
-    # ---------------------------
-    with t2:
-        st.subheader("ELAN 기반 DOAC 시작 시점 추천")
-        st.write("병변 개수(1–4개)를 선택하고, 병변마다 최소 정보만 입력하시면 자동 분류하여 권고 시간을 표시합니다.")
-        n_lesions = st.selectbox("병변 개수", [1, 2, 3, 4], index=0)
-
-        lesions = []
-        lesion_rows = []
-
-        for i in range(int(n_lesions)):
-            st.markdown(f"##### 병변 {i+1}")
-            c1, c2, c3 = st.columns([1.2, 3.3, 1.5])
-
-            with c1:
-                circ = st.selectbox(f"순환계(병변 {i+1})", ["전순환계", "후순환계"], key=f"elan_circ_{i}")
-
-            with c2:
-                if circ == "후순환계":
-                    posterior_site = st.selectbox(
-                        f"부위(병변 {i+1})",
-                        ["뇌간", "소뇌", "후대뇌동맥 피질 표재 가지", "기타 후순환계"],
-                        key=f"elan_post_site_{i}"
-                    )
-                    anterior_pattern = "해당 없음"
-                    anterior_major_pattern = "해당 없음"
-                    anterior_multiterritory = False
-                else:
-                    posterior_site = "해당 없음"
-                    anterior_pattern = st.selectbox(
-                        f"중등도 판정 패턴(병변 {i+1})",
-                        [
-                            "해당 없음(크기 기준)",
-                            "중대뇌동맥 피질 표재 가지",
-                            "중대뇌동맥 심부 가지",
-                            "경계영역(internal borderzone)",
-                            "전대뇌동맥 피질 표재 가지",
-                        ],
-                        key=f"elan_ant_pat_{i}",
-                    )
-                    anterior_major_pattern = st.selectbox(
-                        f"중증 판정 패턴(병변 {i+1})",
-                        [
-                            "해당 없음",
-                            "전체 영역 침범",
-                            "피질 표재 가지 2개 이상",
-                            "피질 표재 가지 + 심부 가지 동반",
-                        ],
-                        key=f"elan_ant_major_{i}",
-                    )
-                    anterior_multiterritory = st.checkbox(f"2개 이상 동맥영역 동시 침범(병변 {i+1})", key=f"elan_multi_{i}")
-
-            with c3:
-                size_gt_1_5 = st.checkbox(f"최대 크기 >1.5cm (병변 {i+1})", key=f"elan_sizegt_{i}")
-
-            sev = elan_severity_for_lesion(
-                circ=circ,
-                size_gt_1_5=size_gt_1_5,
-                anterior_pattern=anterior_pattern,
-                posterior_site=posterior_site,
-                anterior_multiterritory=anterior_multiterritory,
-                anterior_major_pattern=anterior_major_pattern,
-            )
 
-            lesions.append(sev)
-            lesion_rows.append(
-                {
-                    "Lesion": i + 1,
-                    "Circulation": circ,
-                    "Pattern/Site": posterior_site if circ == "후순환계" else f"{anterior_pattern} / {anterior_major_pattern}",
-                    "Size >1.5cm": size_gt_1_5,
-                    "Severity": sev,
-                }
-            )
+def session_priority() -> int:
+    return BACKGROUND if st.query_params.get(PRIORITY_PARAM) == "background" else INTERACTIVE
 
-        overall = elan_overall_severity(lesions)
-        reco = elan_recommendation(overall)
 
-        st.divider()
-        st.success(f"Infarct pattern severity는 {overall}입니다.")
-        st.info(f"조기 시작 권고는 {reco}입니다.")
-        st.dataframe(pd.DataFrame(lesion_rows), use_container_width=True)
-
-        # figure: 무조건 로딩 시도
-        st.markdown("#### ELAN 참고 그림")
-        if Path("elan_figure.png").exists():
-            st.image("elan_figure.png", use_container_width=True)
-        else:
-            st.info("같은 폴더에 `elan_figure.png` 파일을 두시면 자동으로 표시됩니다.")
+def fragment_rerun() -> bool:
+    ctx = get_script_run_ctx()
+    return bool(ctx is not None and ctx.fragment_ids_this_run)
 
-        elan_note = (
-            f"ELAN infarct pattern: {overall}\n"
-            f"Recommended early DOAC initiation: {reco}\n"
-            f"Rule applied: 2 minor -> moderate, 2 moderate -> major\n"
-        )
-        st.code(elan_note, language="text")
-        copy_to_clipboard_ui(elan_note, "복사(ELAN 결과)", "copy_elan")
-
-    # ---------------------------
-    # MAGIC mechanism
-    # ---------------------------
-    with t3:
-        st.subheader("MAGIC 기반 mechanism 분류(단계형 입력)")
-        st.write("선택에 따라 다음 질문이 나타나도록 구성되어 있습니다.")
-
-        if "magic_step" not in st.session_state:
-            reset_magic()
-        if st.button("MAGIC 입력을 초기화합니다."):
-            reset_magic()
-            st.rerun()
-
-        a = st.session_state.magic_answers
-        step = st.session_state.magic_step
-
-        if step == 0:
-            st.markdown("### 1단계")
-            other = st.radio("명확한 다른 원인이 설명 가능한가요?", ["아니요", "예"], horizontal=True)
-            a["other_determined"] = (other == "예")
-            if st.button("다음 단계로 진행합니다."):
-                st.session_state.magic_step = 99 if a["other_determined"] else 1
-                st.rerun()
 
-        if step == 1:
-            st.markdown("### 2단계")
-            lac = st.radio("Lacunar pattern이 의심되나요?", ["아니요", "예"], horizontal=True)
-            a["lacunar"] = (lac == "예")
-            if st.button("다음 단계로 진행합니다."):
-                st.session_state.magic_step = 2
-                st.rerun()
+def admit_rerun(priority: int) -> bool:
+    admission = get_admission()
+    placeholder = st.empty()
 
-        if step == 2:
-            st.markdown("### 3단계")
-            rel = st.radio("Relevant artery lesion(관련 혈관 병변)이 있나요?", ["아니요", "예"], horizontal=True)
-            a["relevant_artery"] = (rel == "예")
+    def poll():
+        waiting = admission.depth()
+        placeholder.caption(f"사용자가 많아 차례를 기다리고 있습니다(대기 {waiting}건)." if waiting else "입력을 반영하고 있습니다.")
 
-            if a["relevant_artery"] and a.get("lacunar"):
-                br = st.radio("Branch atheroma/branch disease가 의심되나요?", ["아니요", "예"], horizontal=True)
-                a["branch_atheroma"] = (br == "예")
-            else:
-                a["branch_atheroma"] = False
+    admitted = admission.admit(current_session_id(), priority, poll)
+    placeholder.empty()
+    return admitted
 
-            if a["relevant_artery"] and (not a.get("lacunar")):
-                ng = st.radio("Non-generic LAA pattern(특이 패턴)에 해당하나요?", ["아니요", "예"], horizontal=True)
-                a["non_generic_pattern"] = (ng == "예")
-            else:
-                a["non_generic_pattern"] = False
 
-            if st.button("다음 단계로 진행합니다."):
-                st.session_state.magic_step = 3
-                st.rerun()
+def admission_panel():
+    with st.expander("개발자 도구: 실행 대기열"):
+        metrics = get_admission().metrics()
+        st.dataframe(pd.DataFrame({"값": metrics}).round(1), use_container_width=True)
 
-        if step == 3:
-            st.markdown("### 4단계")
-            ce = st.radio("Cardioembolic source가 있나요(Hx/ECG/검사)?", ["아니요", "예"], horizontal=True)
-            a["ce_source"] = (ce == "예")
-            if a["ce_source"]:
-                hr = st.radio("High-risk CE로 판단되나요?", ["아니요", "예"], horizontal=True)
-                a["ce_high_risk"] = (hr == "예")
-            else:
-                a["ce_high_risk"] = False
 
-            if st.button("결과를 확인합니다."):
-                st.session_state.magic_step = 99
-                st.rerun()
+# =========================================================
+# 백그라운드 일괄 계산 작업(jobs.py)
+# - 대기열은 프로세스당 하나이며, 작업 상태와 결과 파일은 세션이 끝나도 남습니다(같은 sid로 다시 열면 보입니다).
+# - 결과에 환자 자료가 있으므로 목록·내려받기는 작업을 만든 세션(owner = current_session_id())에만 보입니다.
+# - 실행 중인 작업이 있을 때만 목록 fragment를 JOB_REFRESH_SECONDS마다 다시 그립니다.
+#   마지막 작업이 끝나면 전체 rerun을 한 번 해서 주기 갱신을 멈춥니다.
+# - 작업별 버튼 key는 "_job_"으로 시작해 세션 외부 저장 대상에서 빠집니다.
+# =========================================================
+JOB_REFRESH_SECONDS = 2
 
-        if step == 99:
-            mech = magic_result_from_answers(a)
-            st.success(f"예측 mechanism은 '{mech}'입니다.")
 
-            st.markdown("#### MAGIC 참고 그림")
-            if Path("magic_figure.png").exists():
-                st.image("magic_figure.png", use_container_width=True)
-            else:
-                st.info("같은 폴더에 `magic_figure.png` 파일을 두시면 자동으로 표시됩니다.")
+def get_job_queue():
+    return _job_queue(os.environ.get(JOB_DIR_ENV))
 
-            magic_note = (
-                f"MAGIC mechanism classification: {mech}\n"
-                f"- other_determined={a.get('other_determined')}, lacunar={a.get('lacunar')}, relevant_artery={a.get('relevant_artery')}, "
-                f"branch_atheroma={a.get('branch_atheroma')}, non_generic_pattern={a.get('non_generic_pattern')}, "
-                f"CE_source={a.get('ce_source')}, CE_high_risk={a.get('ce_high_risk')}\n"
-            )
-            st.code(magic_note, language="text")
-            copy_to_clipboard_ui(magic_note, "복사(MAGIC 결과)", "copy_magic")
-
-    # ---------------------------
-    # Dyslipidemia (ASCVD risk estimation / LDL target)
-    # ---------------------------
-    with t4:
-        st.subheader("Dyslipidemia")
-        st.write("아래에서 ASCVD 위험도 추정과 LDL 목표/치료 전략을 분리하여 확인하실 수 있습니다.")
-
-        asc_tab, ldl_tab = st.tabs(["🧾 ASCVD risk estimation", "🎯 LDL target"])
-
-        # ========== ASCVD RISK ==========
-        with asc_tab:
-            st.markdown("### 1) 임상적 ASCVD 사건 횟수를 입력해 주십시오.")
-            col1, col2, col3 = st.columns(3)
-            with col1:
-                n_mi = st.number_input("심근경색(MI) 횟수", 0, 20, 0, 1, key="n_mi")
-            with col2:
-                n_stroke = st.number_input("허혈성 뇌졸중/TIA 횟수", 0, 20, 0, 1, key="n_stroke")
-            with col3:
-                n_pad = st.number_input("말초동맥질환(PAD) 사건 횟수", 0, 20, 0, 1, key="n_pad")
-
-            has_ascvd = (n_mi + n_stroke + n_pad) > 0
-            major_events_count = n_mi + n_stroke + n_pad
 
-            st.divider()
-            st.markdown("### 2) AHA/ACC very-high-risk 판단(이차예방)")
-            st.write("High-risk conditions는 체크박스로 선택해 주십시오.")
-            checks = []
-            cA, cB, cC, cD = st.columns(4)
-            cols = [cA, cB, cC, cD]
-            for idx, label in enumerate(AHA_HR_CONDITIONS_CHECK):
-                with cols[idx % 4]:
-                    checks.append(st.checkbox(label, key=f"aha_hr_{idx}"))
-            aha_hr_count = sum(1 for x in checks if x)
-
-            very_high = aha_very_high_risk(major_events_count, aha_hr_count) if has_ascvd else False
-            st.info(f"Major ASCVD 사건 개수는 {major_events_count}개입니다.")
-            st.info(f"High-risk conditions 체크 개수는 {aha_hr_count}개입니다.")
-            st.success(f"AHA/ACC very-high-risk 여부는 {'예' if very_high else '아니오'}입니다.")
+@st.cache_resource
+def _job_queue(directory):
+    return open_job_queue(directory)
 
-            st.divider()
-            st.markdown("### 3) AHA 10-year ASCVD Risk (Pooled Cohort Equations) 계산")
-            st.write("구성요소를 입력하시면 10-year ASCVD risk(%)를 계산하여 표시합니다.")
-            c1, c2, c3, c4 = st.columns(4)
-            with c1:
-                pce_sex = st.selectbox("성별", ["Male", "Female"], key="pce_sex")
-            with c2:
-                pce_race = st.selectbox("인종(계수용)", ["White", "African American"], key="pce_race")
-            with c3:
-                pce_age = st.number_input("나이(세)", 20, 79, 60, 1, key="pce_age")
-            with c4:
-                pce_smoker = st.checkbox("현재 흡연", key="pce_smoker")
-
-            c5, c6, c7, c8 = st.columns(4)
-            with c5:
-                pce_tc = st.number_input("Total cholesterol (mg/dL)", 80, 400, 200, 1, key="pce_tc")
-            with c6:
-                pce_hdl = st.number_input("HDL-C (mg/dL)", 10, 120, 50, 1, key="pce_hdl")
-            with c7:
-                pce_sbp = st.number_input("Systolic BP (mmHg)", 80, 240, 130, 1, key="pce_sbp")
-            with c8:
-                pce_bp_treated = st.checkbox("혈압약 복용 중(HTN treatment)", key="pce_bp_treated")
-
-            pce_dm = st.checkbox("당뇨병", key="pce_dm")
-
-            pce_risk = pce_10y_risk_percent(
-                sex=pce_sex,
-                race=pce_race,
-                age=float(pce_age),
-                tc=float(pce_tc),
-                hdl=float(pce_hdl),
-                sbp=float(pce_sbp),
-                bp_treated=bool(pce_bp_treated),
-                smoker=bool(pce_smoker),
-                diabetes=bool(pce_dm),
-            )
-            if pce_risk is None:
-                st.warning("입력값을 확인해 주십시오.")
+
+def visible_jobs() -> list:
+    return get_job_queue().store.list(current_session_id())
+
+
+def job_submit():
+    upload = st.session_state.get("job_file")
+    if upload is None:
+        return
+    get_job_queue().submit(
+        "score_cohort",
+        {"calculators": list(st.session_state.get("job_calculators") or DEFAULT_CALCULATORS)},
+        upload.getvalue(),
+        Path(upload.name).suffix,
+        label=upload.name,
+        owner=current_session_id(),
+    )
+
+
+def job_list(polling: bool):
+    # 자동 갱신(fragment 단독 실행)은 배경 실행으로 대기열에 들어갑니다.
+    if not fragment_rerun():
+        render_job_list(polling)
+        return
+    if not admit_rerun(BACKGROUND):
+        return
+    try:
+        render_job_list(polling)
+    finally:
+        get_admission().release(current_session_id())
+
+
+def render_job_list(polling: bool):
+    queue = get_job_queue()
+    jobs = visible_jobs()
+    if not jobs:
+        st.caption("작업이 없습니다.")
+    for job in jobs:
+        with st.container(border=True):
+            st.markdown(f"**{job['label']}** · {STATUS_LABELS[job['status']]}")
+            done, total = job["rows_done"], job["rows_total"]
+            if job["status"] in ACTIVE_STATUSES:
+                if total:
+                    st.progress(min(1.0, done / total), text=f"{done:,} / {total:,}행")
+                else:
+                    st.caption(f"{done:,}행을 계산했습니다.")
+                st.button("작업을 취소합니다.", key=f"_job_cancel_{job['id']}", on_click=queue.cancel, args=(job["id"],))
+            if job["message"]:
+                st.caption(job["message"])
+            if job["preview"]:
+                st.caption("최근 결과 일부입니다.")
+                st.dataframe(pd.DataFrame(job["preview"]), height=180, use_container_width=True)
+            if job["status"] in (DONE, CANCELLED) and Path(job["output"]).exists():
+                st.download_button(
+                    "결과 파일을 내려받습니다.",
+                    Path(job["output"]).read_bytes,
+                    file_name=f"{Path(job['label']).stem}_scored{Path(job['output']).suffix}",
+                    key=f"_job_download_{job['id']}",
+                )
+    if polling and not any(j["status"] in ACTIVE_STATUSES for j in jobs):
+        st.rerun()
+
+
+def job_panel():
+    st.file_uploader("코호트 파일(Parquet/CSV/Arrow IPC)", type=["parquet", "csv", "arrow", "feather", "ipc"], key="job_file")
+    st.multiselect("계산기", list(DEFAULT_CALCULATORS), default=list(DEFAULT_CALCULATORS), key="job_calculators")
+    st.button("일괄 계산 작업을 시작합니다.", key="job_submit", on_click=job_submit,
+              disabled=st.session_state.get("job_file") is None)
+    polling = any(j["status"] in ACTIVE_STATUSES for j in visible_jobs())
+    st.fragment(job_list, run_every=JOB_REFRESH_SECONDS if polling else None)(polling)
+
+
+# =========================================================
+# 개발자용 rerun 측정(STROKE_PROFILE_DIR 설정 시에만 표시)
+# =========================================================
+def current_session_id() -> str:
+    sid = st.query_params.get(SID_PARAM)
+    if sid:
+        return sid
+    ctx = get_script_run_ctx()
+    return ctx.session_id if ctx is not None else "local"
+
+
+def profiling_panel(out_dir):
+    with st.expander("개발자 도구: 실행 프로파일"):
+        n_runs = st.number_input("측정할 실행 횟수", 1, 20, 3, 1, key="dev_profile_n")
+        st.button(
+            "다음 실행부터 측정합니다.",
+            key="dev_profile_start",
+            on_click=request_capture,
+            args=(st.session_state, n_runs),
+        )
+        remaining = st.session_state.get("_profile_remaining", 0)
+        if remaining > 0:
+            st.caption(f"남은 측정 횟수는 {remaining}회입니다.")
+
+        captures = list_captures(out_dir) if out_dir.exists() else pd.DataFrame()
+        if captures.empty:
+            st.caption("저장된 측정 결과가 없습니다.")
+            return
+        st.dataframe(captures.drop(columns=["session_id"]), use_container_width=True, hide_index=True)
+        name = st.selectbox("측정 결과", captures["capture"].tolist(), key="dev_profile_view")
+        st.markdown("##### 상위 함수(누적 시간)")
+        st.dataframe(top_functions(out_dir / f"{name}.prof", 20), use_container_width=True, hide_index=True)
+        st.markdown("##### 메모리 할당 위치(실행 종료 시점)")
+        st.dataframe(top_allocations(out_dir / f"{name}.snap", 20), use_container_width=True, hide_index=True)
+
+
+# =========================================================
+# 병동 공용 DOAC 시작 일정(프로세스 내 모든 세션이 공유)
+# =========================================================
+@st.cache_resource
+def get_doac_scheduler():
+    return DoacScheduler()
+
+
+# =========================================================
+# 앱 시작 UI
+# =========================================================
+def main():
+    session_sync = start_session_sync()
+
+    st.title("🧠 Stroke Helper")
+
+    with st.expander("면책 안내", expanded=True):
+        st.write(
+            "본 애플리케이션은 교육 및 임상 의사결정 보조 목적입니다. "
+            "실제 치료 결정은 최신 가이드라인, 의약품 라벨, 기관 프로토콜, 환자 개별 상황을 종합하여 판단하셔야 합니다."
+        )
+
+    if "is_clinician" not in st.session_state:
+        st.session_state.is_clinician = None
+
+    if st.session_state.is_clinician is None:
+        st.subheader("의료인 여부 확인")
+        c1, c2 = st.columns(2)
+        with c1:
+            if st.button("의료인입니다. 계속 진행합니다."):
+                st.session_state.is_clinician = True
+                st.rerun()
+        with c2:
+            if st.button("의료인이 아닙니다. 종료합니다."):
+                st.session_state.is_clinician = False
+                st.rerun()
+        st.stop()
+
+    if st.session_state.is_clinician is False:
+        st.error("의료인 전용 기능으로 구성되어 있어 사용을 종료합니다.")
+        st.stop()
+
+    if not admit_rerun(session_priority()):
+        st.warning("사용자가 많아 이번 화면 갱신을 건너뛰었습니다. 잠시 후 입력을 다시 바꾸시거나 새로고침해 주십시오.")
+        st.stop()
+
+    with st.sidebar:
+        st.markdown("#### EMR 파일에서 불러오기")
+        emr_file = st.file_uploader("FHIR Bundle/NDJSON 또는 HL7v2 파일", type=["json", "ndjson", "jsonl", "hl7", "txt"], key="emr_file")
+        if emr_file is not None:
+            emr_patients = parse_emr_file(emr_file.name, emr_file.getvalue())
+            if emr_patients.empty:
+                st.warning("파일에서 환자 정보를 찾지 못했습니다.")
             else:
-                st.success(f"AHA 10-year ASCVD risk 추정치는 약 {pce_risk:.1f}%입니다.")
+                emr_pid = st.selectbox("환자 선택", emr_patients["patient_id"].tolist(), key="emr_pid")
+                emr_row = emr_patients[emr_patients["patient_id"] == emr_pid].iloc[0].to_dict()
+                st.button(
+                    "선택한 환자 정보로 입력란을 채웁니다.",
+                    key="emr_fill",
+                    on_click=fill_widgets_from_row,
+                    args=(emr_row,),
+                )
+                st.button(
+                    f"불러온 환자 {len(emr_patients)}명을 모두 환자 목록에 추가합니다.",
+                    key="emr_worklist",
+                    on_click=worklist_add_rows,
+                    args=(emr_patients.to_dict("records"),),
+                )
 
-            st.divider()
-            st.markdown("### 4) ESC SCORE2(또는 SCORE2-OP) 10-year CVD risk 계산(추정치)")
-            st.write("정확한 공식 계산기와 동일한 정밀도는 보장되지 않으며, 교육/보조 목적의 추정치입니다.")
-            r1, r2, r3, r4, r5 = st.columns(5)
-            with r1:
-                s2_age = st.number_input("나이(세)", 40, 89, 65, 1, key="s2_age")
-            with r2:
-                s2_sex = st.selectbox("성별", ["남성", "여성"], key="s2_sex")
-            with r3:
-                s2_smoker = st.checkbox("현재 흡연", key="s2_smoke")
-            with r4:
-                s2_sbp = st.number_input("SBP(mmHg)", 80, 240, 130, 1, key="s2_sbp")
-            with r5:
-                s2_nonhdl = st.number_input("non-HDL-C (mg/dL)", 50, 400, 150, 1, key="s2_nonhdl")
-
-            s2_region = st.selectbox("국가 리스크 클러스터(HeartScore 기준)", ["Low", "Moderate", "High", "Very high"], key="s2_region")
-
-            score2_pct = score2_estimate_percent(s2_age, s2_sex, s2_smoker, s2_sbp, s2_nonhdl, s2_region)
-            esc_cat_from_score = esc_risk_category_from_score2(score2_pct)
-            st.success(f"ESC SCORE2(추정) 10-year CVD risk는 약 {score2_pct:.1f}%이며, 컷오프 기준 위험군은 {esc_cat_from_score}입니다.")
-
-            asc_summary = "\n".join([
-                "ASCVD risk summary",
-                f"- Events: MI={n_mi}, Stroke/TIA={n_stroke}, PAD={n_pad} (total major events={major_events_count})",
-                f"- AHA/ACC very-high-risk: {'Yes' if very_high else 'No'}",
-                f"- AHA high-risk conditions checked: {aha_hr_count}",
-                f"- AHA PCE 10y risk (estimate): {pce_risk:.1f}%" if pce_risk is not None else "- AHA PCE risk: N/A",
-                f"- ESC SCORE2 (estimate): {score2_pct:.1f}% (region={s2_region})",
-                f"- ESC SCORE2 category by cutoff: {esc_cat_from_score}",
+        st.divider()
+        worklist_panel()
+        nihss_alert_panel()
+
+        if profile_dir() is not None:
+            profiling_panel(profile_dir())
+            admission_panel()
+
+    if emr_file is not None and not emr_patients.empty:
+        with st.expander(f"불러온 환자 일괄 계산 결과({len(emr_patients):,}명)"):
+            render_table_view(emr_result_view(emr_file.name, emr_file.getvalue()), "emr_results")
+
+    with st.expander("백그라운드 일괄 계산 작업"):
+        job_panel()
+
+    tab_calc, tab_ref = st.tabs(["🧾 임상정보 입력", "📚 가이드라인 및 근거"])
+
+
+    # =========================================================
+    # 1) 임상정보 입력
+    # =========================================================
+    with tab_calc:
+        t1, t2, t3, t4 = st.tabs(["🧮 점수/계산", "⏱️ ELAN timing", "🧭 MAGIC mechanism", "🫀 Dyslipidemia (ASCVD/LDL)"])
+
+        # ---------------------------
+        # 점수/계산
+        # ---------------------------
+        with t1:
+            st.toggle("점수를 브라우저에서 바로 계산합니다(빠른 입력, '반영'을 누를 때만 서버에서 문구를 만듭니다).",
+                      key=CLIENT_SCORE_TOGGLE_KEY)
+            score_tabs = st.tabs([
+                "NIHSS",
+                "CHA₂DS₂-VASc",
+                "ABCD²",
+                "HAS-BLED",
+                "NOAC 용량(단일 약제)",
+                "NOAC 용량(전체 비교)",
             ])
-            st.code(asc_summary, language="text")
-            copy_to_clipboard_ui(asc_summary, "복사(ASCVD 위험도 요약)", "copy_ascvd_risk")
-
-        # ========== LDL TARGET ==========
-        with ldl_tab:
-            st.markdown("### 1) 현재 LDL-C 및 치료 상태를 입력해 주십시오.")
-            ldl_now = st.number_input("현재 LDL-C (mg/dL)", 10, 400, 100, 1, key="ldl_now")
-            on_hi = st.checkbox("고강도 스타틴 또는 최대내약용량 스타틴을 사용 중입니다.", key="on_hi")
-            on_eze = st.checkbox("Ezetimibe를 병용 중입니다.", key="on_eze")
-            on_pcsk9 = st.checkbox("PCSK9 억제제를 사용 중입니다.", key="on_pcsk9")
 
-            st.divider()
-            st.markdown("### 2) AHA/ACC 기준: 치료 강화 역치(threshold) 및 단계")
-            if has_ascvd:
-                aha_threshold = 55 if very_high else 70
-                st.info(f"임상적 ASCVD가 있으므로 치료 강화 역치는 LDL-C {aha_threshold} mg/dL를 기준으로 판단합니다.")
-                aha_actions = []
-                if not on_hi:
-                    aha_actions.append("고강도 스타틴 또는 최대내약용량 스타틴으로 최적화하시는 것을 고려하실 수 있습니다.")
-                if ldl_now >= aha_threshold:
-                    if not on_eze:
-                        aha_actions.append(f"LDL-C가 {aha_threshold} mg/dL 이상이므로 ezetimibe 추가를 고려하실 수 있습니다.")
-                    elif not on_pcsk9:
-                        aha_actions.append(f"ezetimibe 병용에도 LDL-C가 {aha_threshold} mg/dL 이상이면 PCSK9 억제제 추가를 고려하실 수 있습니다.")
+            # NIHSS
+            with score_tabs[0]:
+                st.subheader("NIHSS")
+                st.write("항목별 점수를 숫자로 입력하시면 총점과 의무기록용 텍스트를 생성합니다.")
+
+                st.text_input(
+                    "간단 입력(항목 번호 뒤에 점수, Enter로 반영)",
+                    key="nihss_compact",
+                    on_change=apply_nihss_compact,
+                    placeholder="예: 1a1 1b0 1c0 2 0 3 1 4 2 5a3 5b0 6a2 6b0 7 1 8 1 9 2 10 1 11 0",
+                    help="입력하지 않은 항목은 현재 값을 유지합니다.",
+                )
+                for err in st.session_state.get(NIHSS_COMPACT_ERRORS_KEY, []):
+                    st.warning(err)
+
+                with st.expander(CLIENT_SCORE_WIDGETS_LABEL) if client_score_panel("nihss") else st.container():
+                    # 일괄 입력: form 안의 항목은 제출할 때 한 번에 반영되어 항목마다 rerun하지 않습니다.
+                    nihss_batch = st.toggle("항목을 모두 입력한 뒤 한 번에 반영합니다(일괄 입력).", key="nihss_batch")
+                    nihss_vals = {}
+                    with st.form("nihss_form", border=False) if nihss_batch else st.container():
+                        for name, mn, mx in NIHSS_ITEMS:
+                            nihss_vals[name] = st.number_input(name, mn, mx, 0, 1, key=f"nihss_{name}")
+                        if nihss_batch:
+                            st.form_submit_button("NIHSS 점수를 반영합니다.")
+                st.caption(f"간단 입력 형식: {format_nihss_scores(nihss_vals)}")
+
+                total = sum(nihss_vals.values())
+                st.success(f"NIHSS 총점은 {total}점입니다.")
+                worklist_note("NIHSS", total)
+
+                facial_side = "Left"
+                if nihss_vals["4. Facial palsy"] > 0:
+                    facial_side = st.radio("Facial palsy 방향을 선택해 주십시오.", ["Left", "Right", "Bilateral"], horizontal=True, key="nihss_facial_side")
+
+                sensory_side = "Left"
+                if nihss_vals["8. Sensory"] > 0:
+                    sensory_side = st.radio("감각저하 방향을 선택해 주십시오.", ["Left", "Right"], horizontal=True, key="nihss_sensory_side")
+
+                ataxia_side = "Left"
+                if nihss_vals["7. Limb ataxia"] > 0:
+                    ataxia_side = st.radio("Ataxia 방향을 선택해 주십시오.", ["Left", "Right", "Bilateral"], horizontal=True, key="nihss_ataxia_side")
+
+                st.divider()
+
+                comp_text = build_nihss_component_text(nihss_vals)
+                st.markdown("#### 의무기록용 NIHSS 구성요소")
+                st.code(comp_text, language="text")
+                copy_to_clipboard_ui(comp_text, "복사(NIHSS 구성요소)", "copy_nihss_components")
+
+                neuro_text = build_neuro_exam_text(nihss_vals, facial_side, sensory_side, ataxia_side)
+                st.markdown("#### 의무기록용 Neurologic examination")
+                st.code(neuro_text, language="text")
+                copy_to_clipboard_ui(neuro_text, "복사(Neurologic examination)", "copy_neuro_exam")
+
+                st.divider()
+                st.markdown("#### 연속 NIHSS 기록(병동 공용)")
+                st.write("현재 점수를 시각과 함께 기록하시면 최선 점수 대비 악화(총점 상승, 의식/운동 항목 악화)를 바로 판정합니다.")
+                timeline = get_nihss_timeline()
+                tl_pid = st.text_input("환자 식별자(병록번호 등)", key="nihss_tl_pid").strip()
+                st.button("현재 NIHSS를 기록합니다.", key="nihss_tl_add", on_click=nihss_timeline_add, args=(nihss_vals,),
+                          disabled=not tl_pid)
+                tl_event = st.session_state.pop(NIHSS_TL_EVENT_KEY, None)
+                if tl_event is not None:
+                    if "error" in tl_event:
+                        st.warning(tl_event["error"])
+                    elif tl_event["level"] == END:
+                        st.error(format_event(tl_event))
+                    elif tl_event["level"] is not None:
+                        st.warning(format_event(tl_event))
                     else:
-                        aha_actions.append("PCSK9 억제제까지 사용 중이면 순응도/2차 원인/다른 옵션을 재평가하시는 것이 합리적입니다.")
+                        st.info(format_event(tl_event))
+                if tl_pid in timeline:
+                    tl_hist = timeline.history(tl_pid)
+                    st.altair_chart(
+                        alt.Chart(tl_hist).mark_line(point=True).encode(
+                            x=alt.X("time:T", title="평가 시각"),
+                            y=alt.Y("total:Q", title="NIHSS 총점"),
+                            tooltip=["time:T", "total:Q"],
+                        ),
+                        use_container_width=True,
+                    )
+                    tl_text = timeline_text(tl_hist)
+                    st.code(tl_text, language="text")
+                    copy_to_clipboard_ui(tl_text, "복사(Serial NIHSS)", "copy_nihss_timeline")
+
+            # CHADS-VASc
+            with score_tabs[1]:
+                st.subheader("CHA₂DS₂-VASc")
+                st.write("입력된 점수에 따라 연간 뇌졸중/전신색전증 위험도를 참고로 표시합니다.")
+                with st.expander(CLIENT_SCORE_WIDGETS_LABEL) if client_score_panel("chads_vasc") else st.container():
+                    score = render_calculator(REGISTRY["chads_vasc"])["score"]
+                worklist_note("CHA₂DS₂-VASc", score)
+
+                row = CHA2DS2_VASC_RISK_TABLE[CHA2DS2_VASC_RISK_TABLE["Score"] == score]
+                if not row.empty:
+                    st.info(f"참고 연간 위험도는 {row.iloc[0]['Annual stroke/systemic embolism risk']}입니다.")
+
+            # ABCD2
+            with score_tabs[2]:
+                st.subheader("ABCD²")
+                st.write("TIA 이후 단기 뇌졸중 재발 위험(2일/7일/90일)을 참고로 표시합니다.")
+                with st.expander(CLIENT_SCORE_WIDGETS_LABEL) if client_score_panel("abcd2") else st.container():
+                    score = render_calculator(REGISTRY["abcd2"])["score"]
+                worklist_note("ABCD²", score)
+
+                if score <= 3:
+                    rr = ABCD2_RISK_TABLE.iloc[0]
+                    st.info("위험군은 Low(0–3)입니다.")
+                elif score <= 5:
+                    rr = ABCD2_RISK_TABLE.iloc[1]
+                    st.warning("위험군은 Moderate(4–5)입니다.")
                 else:
-                    aha_actions.append(f"LDL-C가 {aha_threshold} mg/dL 미만이면 현재 전략을 유지하며 추적하실 수 있습니다.")
-            else:
-                aha_threshold = None
-                st.warning("임상적 ASCVD가 없는 경우에는 10-year ASCVD risk(PCE)를 기반으로 스타틴 적응증 및 강도를 결정하는 접근이 일반적입니다.")
-                aha_actions = [
-                    "10-year ASCVD risk를 참고하여 치료 강도를 결정하실 수 있습니다.",
-                    "LDL-C가 매우 높거나 가족력/다중 위험인자가 있으면 더 적극적 치료를 고려하실 수 있습니다.",
-                ]
+                    rr = ABCD2_RISK_TABLE.iloc[2]
+                    st.error("위험군은 High(6–7)입니다.")
+
+                st.info(f"참고 위험도는 2일 {rr['2-day risk']}, 7일 {rr['7-day risk']}, 90일 {rr['90-day risk']}입니다.")
+
+            # HAS-BLED
+            with score_tabs[3]:
+                st.subheader("HAS-BLED")
+                st.write("항응고 치료 중 출혈 위험 요인을 점검하기 위한 점수입니다.")
+                with st.expander(CLIENT_SCORE_WIDGETS_LABEL) if client_score_panel("has_bled") else st.container():
+                    score = render_calculator(REGISTRY["has_bled"])["score"]
+                worklist_note("HAS-BLED", score)
+
+            # NOAC 단일
+            with score_tabs[4]:
+                st.subheader("NOAC 용량(단일 약제)")
+                st.write("입력값으로 CrCl을 계산하고 선택한 NOAC의 용량(표준/감량)을 표시합니다.")
+                drug = st.selectbox("NOAC 선택", ["Apixaban", "Rivaroxaban", "Edoxaban", "Dabigatran"])
+                age = st.number_input("Age (years)", 0, 120, 75, 1, key="noac_age")
+                sex = st.selectbox("Sex", ["Male", "Female"], key="noac_sex")
+                weight = st.number_input("Weight (kg)", 1.0, 300.0, 70.0, 0.5, key="noac_wt")
+                scr = st.number_input("Serum creatinine (mg/dL)", 0.1, 20.0, 1.0, 0.1, key="noac_scr")
+                female = (sex == "Female")
+                crcl = cockcroft_gault_crcl(age, weight, scr, female)
 
-            for a in aha_actions:
-                st.write(f"- {a}")
+                if crcl is not None:
+                    st.info(f"Cockcroft–Gault CrCl은 약 {crcl:.1f} mL/min입니다.")
+                else:
+                    st.warning("CrCl 계산이 불가능합니다.")
+
+                if drug == "Apixaban":
+                    dose, tag = noac_dose_apixaban(age, weight, scr)
+                elif drug == "Rivaroxaban":
+                    dose, tag = noac_dose_rivaroxaban(crcl)
+                elif drug == "Edoxaban":
+                    dose, tag = noac_dose_edoxaban(crcl, weight)
+                else:
+                    dose, tag = noac_dose_dabigatran(crcl, age)
+
+                st.success(f"{drug} 권장 용량 표시는 '{dose}'이며, 판단 근거는 '{tag}'입니다.")
+
+                with st.expander("What-if: 체중 × SCr에 따른 용량 변화"):
+                    grid = cached_noac_dose_grid(drug, float(age), female)
+                    st.altair_chart(
+                        heatmap_with_marker(
+                            grid, "Weight", "SCr",
+                            color=alt.Color("Dose:N", title="Dose"),
+                            tooltip=["Weight", "SCr", "Dose"],
+                            marker={"Weight": weight, "SCr": scr},
+                        ),
+                        use_container_width=True,
+                    )
+                    st.caption("십자 표시는 현재 입력값이며, 나이/성별은 고정한 상태입니다.")
+
+            # NOAC 전체 비교
+            with score_tabs[5]:
+                st.subheader("NOAC 용량(전체 비교)")
+                st.write("동일 입력값에서 4가지 NOAC의 표준/감량 판단을 한 번에 비교합니다.")
+                age = st.number_input("Age (years)", 0, 120, 75, 1, key="noac_all_age")
+                sex = st.selectbox("Sex", ["Male", "Female"], key="noac_all_sex")
+                weight = st.number_input("Weight (kg)", 1.0, 300.0, 70.0, 0.5, key="noac_all_wt")
+                scr = st.number_input("Serum creatinine (mg/dL)", 0.1, 20.0, 1.0, 0.1, key="noac_all_scr")
+                female = (sex == "Female")
+                crcl = cockcroft_gault_crcl(age, weight, scr, female)
+
+                if crcl is not None:
+                    st.info(f"Cockcroft–Gault CrCl은 약 {crcl:.1f} mL/min입니다.")
+                else:
+                    st.warning("CrCl 계산이 불가능합니다.")
+
+                apx_d, apx_tag = noac_dose_apixaban(age, weight, scr)
+                riva_d, riva_tag = noac_dose_rivaroxaban(crcl)
+                edox_d, edox_tag = noac_dose_edoxaban(crcl, weight)
+                dabi_d, dabi_tag = noac_dose_dabigatran(crcl, age)
+
+                df = pd.DataFrame([
+                    {"NOAC": "Apixaban", "Dose": apx_d, "Decision": apx_tag, "Key rule (summary)": "감량: age≥80, wt≤60, SCr≥1.5 중 2개 이상"},
+                    {"NOAC": "Rivaroxaban", "Dose": riva_d, "Decision": riva_tag, "Key rule (summary)": "CrCl>50: 20mg, CrCl 15–50: 15mg"},
+                    {"NOAC": "Edoxaban", "Dose": edox_d, "Decision": edox_tag, "Key rule (summary)": "감량: CrCl 15–50 또는 wt≤60"},
+                    {"NOAC": "Dabigatran", "Dose": dabi_d, "Decision": dabi_tag, "Key rule (summary)": "CrCl 15–30 및 고령은 라벨 확인 필요"},
+                ])
+                st.dataframe(df, use_container_width=True)
+
+                note = "\n".join([
+                    "NOAC dose comparison (educational):",
+                    f"- Age={age}, Sex={sex}, Weight={weight} kg, SCr={scr} mg/dL, CrCl≈{crcl:.1f} mL/min" if crcl is not None else "- CrCl 계산 불가",
+                    f"- Apixaban: {apx_d} ({apx_tag})",
+                    f"- Rivaroxaban: {riva_d} ({riva_tag})",
+                    f"- Edoxaban: {edox_d} ({edox_tag})",
+                    f"- Dabigatran: {dabi_d} ({dabi_tag})",
+                ])
+                st.code(note, language="text")
+                copy_to_clipboard_ui(note, "복사(NOAC 비교 요약)", "copy_noac_all")
+
+        # ---------------------------
+        # ELAN timing
+        # ---------------------------
+        with t2:
+            st.subheader("ELAN 기반 DOAC 시작 시점 추천")
+            st.write("병변 개수(1–4개)를 선택하고, 병변마다 최소 정보만 입력하시면 자동 분류하여 권고 시간을 표시합니다.")
+            n_lesions = st.selectbox("병변 개수", list(range(1, ELAN_MAX_LESIONS + 1)), index=0, key="elan_n_lesions")
+
+            lesions = []
+            lesion_rows = []
+
+            for i in range(int(n_lesions)):
+                st.markdown(f"##### 병변 {i+1}")
+                c1, c2, c3 = st.columns([1.2, 3.3, 1.5])
+
+                with c1:
+                    circ = st.selectbox(f"순환계(병변 {i+1})", ELAN_CIRCULATIONS, key=f"elan_circ_{i}")
+
+                with c2:
+                    if circ == "후순환계":
+                        posterior_site = st.selectbox(
+                            f"부위(병변 {i+1})",
+                            ELAN_POSTERIOR_SITES,
+                            key=f"elan_post_site_{i}"
+                        )
+                        anterior_pattern = "해당 없음"
+                        anterior_major_pattern = "해당 없음"
+                        anterior_multiterritory = False
+                    else:
+                        posterior_site = "해당 없음"
+                        anterior_pattern = st.selectbox(
+                            f"중등도 판정 패턴(병변 {i+1})",
+                            ELAN_ANTERIOR_PATTERNS,
+                            key=f"elan_ant_pat_{i}",
+                        )
+                        anterior_major_pattern = st.selectbox(
+                            f"중증 판정 패턴(병변 {i+1})",
+                            ELAN_ANTERIOR_MAJOR_PATTERNS,
+                            key=f"elan_ant_major_{i}",
+                        )
+                        anterior_multiterritory = st.checkbox(f"2개 이상 동맥영역 동시 침범(병변 {i+1})", key=f"elan_multi_{i}")
+
+                with c3:
+                    size_gt_1_5 = st.checkbox(f"최대 크기 >1.5cm (병변 {i+1})", key=f"elan_sizegt_{i}")
+
+                sev = elan_severity_for_lesion(
+                    circ=circ,
+                    size_gt_1_5=size_gt_1_5,
+                    anterior_pattern=anterior_pattern,
+                    posterior_site=posterior_site,
+                    anterior_multiterritory=anterior_multiterritory,
+                    anterior_major_pattern=anterior_major_pattern,
+                )
+
+                lesions.append(sev)
+                lesion_rows.append(
+                    {
+                        "Lesion": i + 1,
+                        "Circulation": circ,
+                        "Pattern/Site": posterior_site if circ == "후순환계" else f"{anterior_pattern} / {anterior_major_pattern}",
+                        "Size >1.5cm": size_gt_1_5,
+                        "Severity": sev,
+                    }
+                )
+
+            overall = elan_overall_severity(lesions)
+            reco = elan_recommendation(overall)
 
             st.divider()
-            st.markdown("### 3) ESC/EAS 기준: 위험군별 LDL-C 목표(target) 및 치료 강화 단계")
-            st.write("ESC 위험군은 (1) documented ASCVD 여부 + (2) SCORE2 컷오프 및 주요 동반질환으로 결정되는 경우가 많습니다.")
-
-            # 간단 분류(secondary prevention 우선): ASCVD 있으면 very high로 둠
-            # 반복사건(2년 이내) 입력
-            esc_recurrent = st.checkbox("최대치료에도 2년 이내 재발 사건(recurrent ASCVD)이 있었습니다.", key="esc_recur_ldl")
-            if has_ascvd and esc_recurrent:
-                esc_cat = "Very high (recurrent within 2y)"
-            elif has_ascvd:
-                esc_cat = "Very high"
+            st.success(f"Infarct pattern severity는 {overall}입니다.")
+            worklist_note("ELAN", overall)
+            st.info(f"조기 시작 권고는 {reco}입니다.")
+            st.dataframe(pd.DataFrame(lesion_rows), use_container_width=True)
+
+            # figure: 무조건 로딩 시도
+            st.markdown("#### ELAN 참고 그림")
+            if load_figure("elan_figure.png") is not None:
+                st.image(load_figure("elan_figure.png"), use_container_width=True)
             else:
-                # ASCVD 없으면 SCORE2(추정)로 위험군 컷오프 분류를 사용
-                esc_cat = esc_cat_from_score
+                st.info("같은 폴더에 `elan_figure.png` 파일을 두시면 자동으로 표시됩니다.")
 
-            esc_target = esc_ldl_target_by_category(esc_cat if esc_cat != "Very high (recurrent within 2y)" else "Very high (recurrent within 2y)")
-            st.info(f"ESC/EAS 위험군은 '{esc_cat}'이며, LDL 목표치는 {esc_target}입니다.")
+            elan_note = (
+                f"ELAN infarct pattern: {overall}\n"
+                f"Recommended early DOAC initiation: {reco}\n"
+                f"Rule applied: 2 minor -> moderate, 2 moderate -> major\n"
+            )
+            st.code(elan_note, language="text")
+            copy_to_clipboard_ui(elan_note, "복사(ELAN 결과)", "copy_elan")
 
-            esc_actions = []
-            if esc_cat in ["Low", "Moderate"]:
-                esc_actions.append("생활습관 교정이 기본이며, 위험도 및 LDL 수준에 따라 약물치료를 고려하실 수 있습니다.")
+            st.divider()
+            st.markdown("#### 병동 DOAC 시작 일정")
+            st.write("현재 환자의 ELAN 분류를 발병/입원 시각과 함께 등록하시면 병동 전체의 시작 예정 시각을 정렬하여 표시합니다.")
+            scheduler = get_doac_scheduler()
+            s1, s2, s3 = st.columns(3)
+            with s1:
+                sched_pid = st.text_input("환자 식별자(병록번호 등)", key="elan_sched_pid")
+                onset_unknown = st.checkbox("발병 시각 미상(입원 시각 기준)", key="elan_sched_onset_unknown")
+            with s2:
+                onset_date = st.date_input("발병 일자", key="elan_sched_onset_date", disabled=onset_unknown)
+                onset_time = st.time_input("발병 시각", key="elan_sched_onset_time", disabled=onset_unknown)
+            with s3:
+                adm_date = st.date_input("입원 일자", key="elan_sched_adm_date")
+                adm_time = st.time_input("입원 시각", key="elan_sched_adm_time")
+
+            b1, b2 = st.columns(2)
+            with b1:
+                if st.button("현재 분류로 일정에 등록/갱신합니다.", key="elan_sched_add", disabled=not sched_pid):
+                    scheduler.admit(
+                        sched_pid,
+                        overall,
+                        onset=None if onset_unknown else datetime.combine(onset_date, onset_time),
+                        admission=datetime.combine(adm_date, adm_time),
+                    )
+            with b2:
+                if st.button("DOAC 시작/퇴원으로 일정에서 제외합니다.", key="elan_sched_remove", disabled=sched_pid not in scheduler):
+                    scheduler.remove(sched_pid)
+
+            horizon = st.slider("조회 범위(시간)", 1, 72, 12, 1, key="elan_sched_horizon")
+            due = scheduler.due_within(datetime.now(), horizon)
+            if due:
+                st.dataframe(pd.DataFrame(due), use_container_width=True)
             else:
-                esc_actions.append("고강도 스타틴 또는 최대내약용량 스타틴 치료를 우선 고려하실 수 있습니다.")
-                esc_actions.append("목표 미달 시 ezetimibe 병용을 고려하실 수 있습니다.")
-                esc_actions.append("목표 미달이 지속되면 PCSK9 억제제 추가를 고려하실 수 있습니다.")
-                esc_actions.append("최근 ESC update에서는 목표(target)은 유지하면서도, 상황에 따라 조기 병용(ezetimibe 병용)을 합리적으로 고려할 수 있다는 방향성이 강조됩니다.")
+                st.info(f"향후 {horizon}시간 이내에 시작 예정인 환자가 없습니다.")
+            st.download_button(
+                "일정 내보내기(.ics)",
+                scheduler.to_ics(),
+                file_name="doac_schedule.ics",
+                mime="text/calendar",
+                key="elan_sched_ics",
+                disabled=len(scheduler) == 0,
+            )
 
-            for a in esc_actions:
-                st.write(f"- {a}")
+        # ---------------------------
+        # MAGIC mechanism
+        # ---------------------------
+        with t3:
+            st.subheader("MAGIC 기반 mechanism 분류(단계형 입력)")
+            st.write("선택에 따라 다음 질문이 나타나도록 구성되어 있습니다.")
+
+            if "magic_step" not in st.session_state:
+                reset_magic()
+            st.button("MAGIC 입력을 초기화합니다.", on_click=reset_magic)
+
+            a = st.session_state.magic_answers
+            step = st.session_state.magic_step
+
+            if step == 0:
+                st.markdown("### 1단계")
+                other = st.radio("명확한 다른 원인이 설명 가능한가요?", ["아니요", "예"], horizontal=True, key="magic_other")
+                a["other_determined"] = (other == "예")
+                st.button("다음 단계로 진행합니다.", on_click=magic_goto, args=(99 if a["other_determined"] else 1,))
+
+            if step == 1:
+                st.markdown("### 2단계")
+                lac = st.radio("Lacunar pattern이 의심되나요?", ["아니요", "예"], horizontal=True, key="magic_lacunar")
+                a["lacunar"] = (lac == "예")
+                st.button("다음 단계로 진행합니다.", on_click=magic_goto, args=(2,))
+
+            if step == 2:
+                st.markdown("### 3단계")
+                rel = st.radio("Relevant artery lesion(관련 혈관 병변)이 있나요?", ["아니요", "예"], horizontal=True, key="magic_relevant")
+                a["relevant_artery"] = (rel == "예")
+
+                if a["relevant_artery"] and a.get("lacunar"):
+                    br = st.radio("Branch atheroma/branch disease가 의심되나요?", ["아니요", "예"], horizontal=True, key="magic_branch")
+                    a["branch_atheroma"] = (br == "예")
+                else:
+                    a["branch_atheroma"] = False
 
-            st.divider()
-            st.markdown("### 4) AHA/ACC와 ESC/EAS 결과를 함께 정리합니다.")
-            summary = "\n".join([
-                "LDL strategy summary",
-                f"- Current LDL-C: {ldl_now} mg/dL",
-                f"- On high-intensity/max tolerated statin: {'Yes' if on_hi else 'No'}",
-                f"- On ezetimibe: {'Yes' if on_eze else 'No'}",
-                f"- On PCSK9 inhibitor: {'Yes' if on_pcsk9 else 'No'}",
-                "",
-                "[AHA/ACC]",
-                f"- Clinical ASCVD: {'Yes' if has_ascvd else 'No'}",
-                f"- Very-high-risk: {'Yes' if very_high else 'No'}",
-                f"- Intensification threshold: {aha_threshold} mg/dL" if aha_threshold is not None else "- Primary prevention: risk-based approach",
-                "Actions:",
-                *[f"  • {x}" for x in aha_actions],
-                "",
-                "[ESC/EAS]",
-                f"- Category: {esc_cat}",
-                f"- LDL target: {esc_target}",
-                "Actions:",
-                *[f"  • {x}" for x in esc_actions],
-            ])
-            st.code(summary, language="text")
-            copy_to_clipboard_ui(summary, "복사(LDL 전략 요약)", "copy_ldl_strategy")
+                if a["relevant_artery"] and (not a.get("lacunar")):
+                    ng = st.radio("Non-generic LAA pattern(특이 패턴)에 해당하나요?", ["아니요", "예"], horizontal=True, key="magic_non_generic")
+                    a["non_generic_pattern"] = (ng == "예")
+                else:
+                    a["non_generic_pattern"] = False
+
+                st.button("다음 단계로 진행합니다.", on_click=magic_goto, args=(3,))
+
+            if step == 3:
+                st.markdown("### 4단계")
+                ce = st.radio("Cardioembolic source가 있나요(Hx/ECG/검사)?", ["아니요", "예"], horizontal=True, key="magic_ce")
+                a["ce_source"] = (ce == "예")
+                if a["ce_source"]:
+                    hr = st.radio("High-risk CE로 판단되나요?", ["아니요", "예"], horizontal=True, key="magic_ce_high")
+                    a["ce_high_risk"] = (hr == "예")
+                else:
+                    a["ce_high_risk"] = False
+
+                st.button("결과를 확인합니다.", on_click=magic_goto, args=(99,))
+
+            if step == 99:
+                mech = magic_result_from_answers(a)
+                st.success(f"예측 mechanism은 '{mech}'입니다.")
+                worklist_note("MAGIC", mech)
+
+                st.markdown("#### MAGIC 참고 그림")
+                if load_figure("magic_figure.png") is not None:
+                    st.image(load_figure("magic_figure.png"), use_container_width=True)
+                else:
+                    st.info("같은 폴더에 `magic_figure.png` 파일을 두시면 자동으로 표시됩니다.")
+
+                magic_note = (
+                    f"MAGIC mechanism classification: {mech}\n"
+                    f"- other_determined={a.get('other_determined')}, lacunar={a.get('lacunar')}, relevant_artery={a.get('relevant_artery')}, "
+                    f"branch_atheroma={a.get('branch_atheroma')}, non_generic_pattern={a.get('non_generic_pattern')}, "
+                    f"CE_source={a.get('ce_source')}, CE_high_risk={a.get('ce_high_risk')}\n"
+                )
+                st.code(magic_note, language="text")
+                copy_to_clipboard_ui(magic_note, "복사(MAGIC 결과)", "copy_magic")
+
+        # ---------------------------
+        # Dyslipidemia (ASCVD risk estimation / LDL target)
+        # ---------------------------
+        with t4:
+            st.subheader("Dyslipidemia")
+            st.write("아래에서 ASCVD 위험도 추정과 LDL 목표/치료 전략을 분리하여 확인하실 수 있습니다.")
+
+            asc_tab, ldl_tab = st.tabs(["🧾 ASCVD risk estimation", "🎯 LDL target"])
+
+            # ========== ASCVD RISK ==========
+            with asc_tab:
+                st.markdown("### 1) 임상적 ASCVD 사건 횟수를 입력해 주십시오.")
+                col1, col2, col3 = st.columns(3)
+                with col1:
+                    n_mi = st.number_input("심근경색(MI) 횟수", 0, 20, 0, 1, key="n_mi")
+                with col2:
+                    n_stroke = st.number_input("허혈성 뇌졸중/TIA 횟수", 0, 20, 0, 1, key="n_stroke")
+                with col3:
+                    n_pad = st.number_input("말초동맥질환(PAD) 사건 횟수", 0, 20, 0, 1, key="n_pad")
+
+                has_ascvd = (n_mi + n_stroke + n_pad) > 0
+                major_events_count = n_mi + n_stroke + n_pad
+
+                st.divider()
+                st.markdown("### 2) AHA/ACC very-high-risk 판단(이차예방)")
+                st.write("High-risk conditions는 체크박스로 선택해 주십시오.")
+                checks = []
+                cA, cB, cC, cD = st.columns(4)
+                cols = [cA, cB, cC, cD]
+                for idx, label in enumerate(AHA_HR_CONDITIONS_CHECK):
+                    with cols[idx % 4]:
+                        checks.append(st.checkbox(label, key=f"aha_hr_{idx}"))
+                aha_hr_count = sum(1 for x in checks if x)
+
+                very_high = aha_very_high_risk(major_events_count, aha_hr_count) if has_ascvd else False
+                st.info(f"Major ASCVD 사건 개수는 {major_events_count}개입니다.")
+                st.info(f"High-risk conditions 체크 개수는 {aha_hr_count}개입니다.")
+                st.success(f"AHA/ACC very-high-risk 여부는 {'예' if very_high else '아니오'}입니다.")
+
+                st.divider()
+                st.markdown("### 3) AHA 10-year ASCVD Risk (Pooled Cohort Equations) 계산")
+                st.write("구성요소를 입력하시면 10-year ASCVD risk(%)를 계산하여 표시합니다.")
+                if st.session_state.get(PCE_FILL_WARNING_KEY):
+                    st.warning(st.session_state[PCE_FILL_WARNING_KEY])
+                c1, c2, c3, c4 = st.columns(4)
+                with c1:
+                    pce_sex = st.selectbox("성별", ["Male", "Female"], key="pce_sex")
+                with c2:
+                    pce_race = st.selectbox("인종(계수용)", ["White", "African American"], key="pce_race")
+                with c3:
+                    pce_age = st.number_input("나이(세)", *registry_range("pce", "age"), 1, key="pce_age")
+                with c4:
+                    pce_smoker = st.checkbox("현재 흡연", key="pce_smoker")
+
+                c5, c6, c7, c8 = st.columns(4)
+                with c5:
+                    pce_tc = st.number_input("Total cholesterol (mg/dL)", *registry_range("pce", "tc"), 1, key="pce_tc")
+                with c6:
+                    pce_hdl = st.number_input("HDL-C (mg/dL)", *registry_range("pce", "hdl"), 1, key="pce_hdl")
+                with c7:
+                    pce_sbp = st.number_input("Systolic BP (mmHg)", *registry_range("pce", "sbp"), 1, key="pce_sbp")
+                with c8:
+                    pce_bp_treated = st.checkbox("혈압약 복용 중(HTN treatment)", key="pce_bp_treated")
+
+                pce_dm = st.checkbox("당뇨병", key="pce_dm")
+
+                pce_risk = pce_10y_risk_percent(
+                    sex=pce_sex,
+                    race=pce_race,
+                    age=float(pce_age),
+                    tc=float(pce_tc),
+                    hdl=float(pce_hdl),
+                    sbp=float(pce_sbp),
+                    bp_treated=bool(pce_bp_treated),
+                    smoker=bool(pce_smoker),
+                    diabetes=bool(pce_dm),
+                )
+                if pce_risk is None:
+                    st.warning("입력값을 확인해 주십시오.")
+                else:
+                    st.success(f"AHA 10-year ASCVD risk 추정치는 약 {pce_risk:.1f}%입니다.")
+                    worklist_note("PCE(%)", round(pce_risk, 1))
+                    if st.checkbox("측정 변동성(SBP/콜레스테롤)을 반영한 95% 구간을 표시합니다.", key="pce_mc"):
+                        pce_inputs = (
+                            pce_sex, pce_race, float(pce_age), float(pce_tc), float(pce_hdl), float(pce_sbp),
+                            bool(pce_bp_treated), bool(pce_smoker), bool(pce_dm),
+                        )
+                        pce_band = get_worklist().current().memo("pce_band", pce_inputs, lambda: pce_risk_uncertainty(*pce_inputs))
+                        st.info(
+                            f"중앙값 {pce_band['median']:.1f}% (95% 구간 {pce_band['lo95']:.1f}–{pce_band['hi95']:.1f}%)이며, "
+                            f"5%/7.5%/20% 이상일 확률은 각각 {pce_band['p_ge_5']:.0%}/{pce_band['p_ge_7.5']:.0%}/{pce_band['p_ge_20']:.0%}입니다."
+                        )
+
+                with st.expander("What-if: SBP × Total cholesterol에 따른 10-year risk 변화"):
+                    grid = cached_pce_risk_grid(
+                        pce_sex, pce_race, float(pce_age), float(pce_hdl), bool(pce_bp_treated), bool(pce_smoker), bool(pce_dm)
+                    )
+                    st.altair_chart(
+                        heatmap_with_marker(
+                            grid, "SBP", "TC",
+                            color=alt.Color(
+                                "risk:Q",
+                                title="10y risk (%)",
+                                scale=alt.Scale(type="threshold", domain=[5, 7.5, 20], range=["#2e7d32", "#f9a825", "#ef6c00", "#c62828"]),
+                            ),
+                            tooltip=["SBP", "TC", alt.Tooltip("risk:Q", format=".1f")],
+                            marker={"SBP": pce_sbp, "TC": pce_tc},
+                        ),
+                        use_container_width=True,
+                    )
+                    st.caption("색 경계는 5%/7.5%/20%이며, 십자 표시는 현재 입력값입니다.")
+
+                st.divider()
+                st.markdown("### 4) ESC SCORE2(또는 SCORE2-OP) 10-year CVD risk 계산(추정치)")
+                st.write("정확한 공식 계산기와 동일한 정밀도는 보장되지 않으며, 교육/보조 목적의 추정치입니다.")
+                r1, r2, r3, r4, r5 = st.columns(5)
+                with r1:
+                    s2_age = st.number_input("나이(세)", *registry_range("score2", "age"), 1, key="s2_age")
+                with r2:
+                    s2_sex = st.selectbox("성별", ["남성", "여성"], key="s2_sex")
+                with r3:
+                    s2_smoker = st.checkbox("현재 흡연", key="s2_smoke")
+                with r4:
+                    s2_sbp = st.number_input("SBP(mmHg)", *registry_range("score2", "sbp"), 1, key="s2_sbp")
+                with r5:
+                    s2_nonhdl = st.number_input("non-HDL-C (mg/dL)", 50, 400, 150, 1, key="s2_nonhdl")
+
+                s2_region = st.selectbox("국가 리스크 클러스터(HeartScore 기준)", ["Low", "Moderate", "High", "Very high"], key="s2_region")
+
+                score2_pct = score2_estimate_percent(s2_age, s2_sex, s2_smoker, s2_sbp, s2_nonhdl, s2_region)
+                esc_cat_from_score = esc_risk_category_from_score2(score2_pct)
+                st.success(f"ESC SCORE2(추정) 10-year CVD risk는 약 {score2_pct:.1f}%이며, 컷오프 기준 위험군은 {esc_cat_from_score}입니다.")
+                worklist_note("SCORE2(%)", round(score2_pct, 1))
+                if st.checkbox("측정 변동성(SBP/non-HDL-C)을 반영한 95% 구간을 표시합니다.", key="s2_mc"):
+                    s2_inputs = (s2_age, s2_sex, s2_smoker, s2_sbp, s2_nonhdl, s2_region)
+                    s2_band = get_worklist().current().memo("s2_band", s2_inputs, lambda: score2_risk_uncertainty(*s2_inputs))
+                    st.info(
+                        f"중앙값 {s2_band['median']:.1f}% (95% 구간 {s2_band['lo95']:.1f}–{s2_band['hi95']:.1f}%)이며, "
+                        f"2%/10%/20% 컷오프 이상일 확률은 각각 {s2_band['p_ge_2']:.0%}/{s2_band['p_ge_10']:.0%}/{s2_band['p_ge_20']:.0%}, "
+                        f"다른 위험군으로 재분류될 확률은 {s2_band['p_reclass']:.0%}입니다."
+                    )
+
+                asc_summary = "\n".join([
+                    "ASCVD risk summary",
+                    f"- Events: MI={n_mi}, Stroke/TIA={n_stroke}, PAD={n_pad} (total major events={major_events_count})",
+                    f"- AHA/ACC very-high-risk: {'Yes' if very_high else 'No'}",
+                    f"- AHA high-risk conditions checked: {aha_hr_count}",
+                    f"- AHA PCE 10y risk (estimate): {pce_risk:.1f}%" if pce_risk is not None else "- AHA PCE risk: N/A",
+                    f"- ESC SCORE2 (estimate): {score2_pct:.1f}% (region={s2_region})",
+                    f"- ESC SCORE2 category by cutoff: {esc_cat_from_score}",
+                ])
+                st.code(asc_summary, language="text")
+                copy_to_clipboard_ui(asc_summary, "복사(ASCVD 위험도 요약)", "copy_ascvd_risk")
+
+            # ========== LDL TARGET ==========
+            with ldl_tab:
+                st.markdown("### 1) 현재 LDL-C 및 치료 상태를 입력해 주십시오.")
+                ldl_now = st.number_input("현재 LDL-C (mg/dL)", 10, 400, 100, 1, key="ldl_now")
+                on_hi = st.checkbox("고강도 스타틴 또는 최대내약용량 스타틴을 사용 중입니다.", key="on_hi")
+                on_eze = st.checkbox("Ezetimibe를 병용 중입니다.", key="on_eze")
+                on_pcsk9 = st.checkbox("PCSK9 억제제를 사용 중입니다.", key="on_pcsk9")
+
+                st.divider()
+                st.markdown("### 2) AHA/ACC 기준: 치료 강화 역치(threshold) 및 단계")
+                if has_ascvd:
+                    aha_threshold = 55 if very_high else 70
+                    st.info(f"임상적 ASCVD가 있으므로 치료 강화 역치는 LDL-C {aha_threshold} mg/dL를 기준으로 판단합니다.")
+                    aha_actions = []
+                    if not on_hi:
+                        aha_actions.append("고강도 스타틴 또는 최대내약용량 스타틴으로 최적화하시는 것을 고려하실 수 있습니다.")
+                    if ldl_now >= aha_threshold:
+                        if not on_eze:
+                            aha_actions.append(f"LDL-C가 {aha_threshold} mg/dL 이상이므로 ezetimibe 추가를 고려하실 수 있습니다.")
+                        elif not on_pcsk9:
+                            aha_actions.append(f"ezetimibe 병용에도 LDL-C가 {aha_threshold} mg/dL 이상이면 PCSK9 억제제 추가를 고려하실 수 있습니다.")
+                        else:
+                            aha_actions.append("PCSK9 억제제까지 사용 중이면 순응도/2차 원인/다른 옵션을 재평가하시는 것이 합리적입니다.")
+                    else:
+                        aha_actions.append(f"LDL-C가 {aha_threshold} mg/dL 미만이면 현재 전략을 유지하며 추적하실 수 있습니다.")
+                else:
+                    aha_threshold = None
+                    st.warning("임상적 ASCVD가 없는 경우에는 10-year ASCVD risk(PCE)를 기반으로 스타틴 적응증 및 강도를 결정하는 접근이 일반적입니다.")
+                    aha_actions = [
+                        "10-year ASCVD risk를 참고하여 치료 강도를 결정하실 수 있습니다.",
+                        "LDL-C가 매우 높거나 가족력/다중 위험인자가 있으면 더 적극적 치료를 고려하실 수 있습니다.",
+                    ]
+
+                for a in aha_actions:
+                    st.write(f"- {a}")
+
+                st.divider()
+                st.markdown("### 3) ESC/EAS 기준: 위험군별 LDL-C 목표(target) 및 치료 강화 단계")
+                st.write("ESC 위험군은 (1) documented ASCVD 여부 + (2) SCORE2 컷오프 및 주요 동반질환으로 결정되는 경우가 많습니다.")
+
+                # 간단 분류(secondary prevention 우선): ASCVD 있으면 very high로 둠
+                # 반복사건(2년 이내) 입력
+                esc_recurrent = st.checkbox("최대치료에도 2년 이내 재발 사건(recurrent ASCVD)이 있었습니다.", key="esc_recur_ldl")
+                if has_ascvd and esc_recurrent:
+                    esc_cat = "Very high (recurrent within 2y)"
+                elif has_ascvd:
+                    esc_cat = "Very high"
+                else:
+                    # ASCVD 없으면 SCORE2(추정)로 위험군 컷오프 분류를 사용
+                    esc_cat = esc_cat_from_score
+
+                esc_target = esc_ldl_target_by_category(esc_cat if esc_cat != "Very high (recurrent within 2y)" else "Very high (recurrent within 2y)")
+                st.info(f"ESC/EAS 위험군은 '{esc_cat}'이며, LDL 목표치는 {esc_target}입니다.")
+
+                esc_actions = []
+                if esc_cat in ["Low", "Moderate"]:
+                    esc_actions.append("생활습관 교정이 기본이며, 위험도 및 LDL 수준에 따라 약물치료를 고려하실 수 있습니다.")
+                else:
+                    esc_actions.append("고강도 스타틴 또는 최대내약용량 스타틴 치료를 우선 고려하실 수 있습니다.")
+                    esc_actions.append("목표 미달 시 ezetimibe 병용을 고려하실 수 있습니다.")
+                    esc_actions.append("목표 미달이 지속되면 PCSK9 억제제 추가를 고려하실 수 있습니다.")
+                    esc_actions.append("최근 ESC update에서는 목표(target)은 유지하면서도, 상황에 따라 조기 병용(ezetimibe 병용)을 합리적으로 고려할 수 있다는 방향성이 강조됩니다.")
+
+                for a in esc_actions:
+                    st.write(f"- {a}")
+
+                st.divider()
+                st.markdown("### 4) AHA/ACC와 ESC/EAS 결과를 함께 정리합니다.")
+                summary = "\n".join([
+                    "LDL strategy summary",
+                    f"- Current LDL-C: {ldl_now} mg/dL",
+                    f"- On high-intensity/max tolerated statin: {'Yes' if on_hi else 'No'}",
+                    f"- On ezetimibe: {'Yes' if on_eze else 'No'}",
+                    f"- On PCSK9 inhibitor: {'Yes' if on_pcsk9 else 'No'}",
+                    "",
+                    "[AHA/ACC]",
+                    f"- Clinical ASCVD: {'Yes' if has_ascvd else 'No'}",
+                    f"- Very-high-risk: {'Yes' if very_high else 'No'}",
+                    f"- Intensification threshold: {aha_threshold} mg/dL" if aha_threshold is not None else "- Primary prevention: risk-based approach",
+                    "Actions:",
+                    *[f"  • {x}" for x in aha_actions],
+                    "",
+                    "[ESC/EAS]",
+                    f"- Category: {esc_cat}",
+                    f"- LDL target: {esc_target}",
+                    "Actions:",
+                    *[f"  • {x}" for x in esc_actions],
+                ])
+                st.code(summary, language="text")
+                copy_to_clipboard_ui(summary, "복사(LDL 전략 요약)", "copy_ldl_strategy")
+
+
+    # =========================================================
+    # 2) 가이드라인 및 근거
+    # =========================================================
+    with tab_ref:
+        st.subheader("가이드라인 및 근거")
+        st.write("계산기 및 알고리즘에 사용된 정의와 기준을 표와 설명으로 제공합니다.")
+
+        # 검색어가 있으면 일치하는 절만, 없으면 선택한 분류의 절만 그립니다(나머지 본문은 보내지 않습니다).
+        ref_query = st.text_input("근거 검색", key="ref_query", placeholder="예: 재발, SCORE2, Lp(a), 항응고")
+        if ref_query.strip():
+            hits = get_reference_index().search(ref_query)
+            if hits:
+                st.caption(f"'{ref_query.strip()}' 검색 결과 {len(hits)}개 항목입니다.")
+                for section in hits:
+                    st.caption(section["group"])
+                    render_reference_section(section)
+                    st.divider()
+            else:
+                st.info("일치하는 근거 항목이 없습니다. 다른 표현이나 더 짧은 검색어를 입력해 주십시오.")
+        else:
+            ref_group = st.radio("분류", list(REFERENCE_GROUPS), horizontal=True, key="ref_group", label_visibility="collapsed")
+            if REFERENCE_GROUPS[ref_group]:
+                st.markdown(f"## {REFERENCE_GROUPS[ref_group]}")
+            for section in sections_in_group(ref_group):
+                render_reference_section(section)
+
+    get_worklist().save_active(st.session_state)
+    st.session_state[WORKLIST_STATE_KEY] = get_worklist().to_state()
+    if session_sync is not None:
+        session_sync.snapshot()
 
 
 # =========================================================
-# 2) 가이드라인 및 근거
+# 실행
+# - st.stop()/st.rerun()/예외로 main()이 중간에 끝나도 측정(profiling.py)과 실행 권한(lease)은 finally에서 정리합니다.
 # =========================================================
-with tab_ref:
-    st.subheader("가이드라인 및 근거")
-    st.write("계산기 및 알고리즘에 사용된 정의와 기준을 표와 설명으로 제공합니다.")
-
-    g1, g2, g3, g4 = st.tabs(["📌 ABCD² / CHA₂DS₂-VASc", "⏱️ ELAN", "🧭 MAGIC", "🫀 Dyslipidemia (ESC/AHA)"])
-
-    with g1:
-        st.markdown("### ABCD² 점수 및 단기 뇌졸중 재발 위험(참고)")
-        st.dataframe(ABCD2_RISK_TABLE, use_container_width=True)
-        st.markdown("""
-- ABCD²는 TIA 이후 단기 뇌졸중 재발 위험을 층화하는 점수입니다.  
-- 실제 위험도는 코호트/진료 환경/치료 상황에 따라 달라질 수 있습니다.  
-""")
-
-        st.markdown("### CHA₂DS₂-VASc 점수 및 연간 뇌졸중/전신색전증 위험(참고)")
-        st.dataframe(CHA2DS2_VASC_RISK_TABLE, use_container_width=True)
-        st.markdown("""
-- CHA₂DS₂-VASc는 비판막성 AF에서 항응고 필요성을 판단하는 도구로 널리 사용됩니다.  
-- 연간 위험도 수치는 항응고 치료 여부, 코호트 특성 등에 따라 달라질 수 있습니다.  
-""")
-
-    with g2:
-        st.markdown("### ELAN 알고리즘 기준(요약)")
-        elan_df = pd.DataFrame(
-            [
-                {"Infarct Pattern": "Minor infarct (≤1.5 cm in any territory)", "Early initiation": "≤ 48시간"},
-                {"Infarct Pattern": "Moderate infarct (예: MCA cortical branch, deep MCA branch, internal border zone, ACA/PCA cortical branch)", "Early initiation": "≤ 48시간"},
-                {"Infarct Pattern": "Major infarct (예: entire territory, multiple territories, large posterior lesion 등)", "Early initiation": "6–7일"},
-            ]
-        )
-        st.dataframe(elan_df, use_container_width=True)
-        st.markdown("#### 참고 그림")
-        if Path("elan_figure.png").exists():
-            st.image("elan_figure.png", use_container_width=True)
-        else:
-            st.info("같은 폴더에 `elan_figure.png` 파일을 두시면 자동으로 표시됩니다.")
-
-    with g3:
-        st.markdown("### MAGIC 알고리즘(단계형 구현)")
-        st.markdown("""
-- 본 애플리케이션의 MAGIC 파트는 사용 편의성을 위해 단계형 질문 방식으로 구현되어 있습니다.  
-- 선택에 따라 다음 질문이 나타납니다.  
-""")
-        st.markdown("#### 참고 그림")
-        if Path("magic_figure.png").exists():
-            st.image("magic_figure.png", use_container_width=True)
-        else:
-            st.info("같은 폴더에 `magic_figure.png` 파일을 두시면 자동으로 표시됩니다.")
-
-    with g4:
-        st.markdown("## ESC/EAS 2025 Focused Update 기반 핵심 근거(상세)")
-        st.markdown("""
-### 1) ESC/EAS에서 ‘Documented ASCVD(임상 또는 영상으로 확실한 ASCVD)’ 정의
-- ESC 2025 Focused Update의 Table 3에서 very-high-risk 조건으로 “Documented ASCVD”를 명시합니다.  
-- Documented ASCVD에는 다음이 포함됩니다:  
-  - 이전 ACS(심근경색 또는 불안정 협심증)  
-  - chronic coronary syndromes  
-  - coronary revascularization(PCI, CABG, 기타 혈관 재개통술)  
-  - stroke 및 TIA  
-  - peripheral arterial disease  
-- 또한 영상에서 확실한 ASCVD(관상동맥 CT/조영술 유의미 플라크, 경동맥/대퇴동맥 초음파 플라크, CAC 현저히 상승 등)도 포함됩니다.
-""")
-
-        esc_def_table = pd.DataFrame([{"ESC documented ASCVD 예시": x} for x in ESC_DOC_ASCVDS])
-        st.dataframe(esc_def_table, use_container_width=True)
-
-        st.markdown("""
-### 2) SCORE2/SCORE2-OP 컷오프 기반 위험군(ESC 2025 Table 3 요지)
-- Very high risk: SCORE2 또는 SCORE2-OP ≥20%  
-- High risk: ≥10% and <20%  
-- Moderate risk: ≥2% and <10%  
-- Low risk: <2%
-""")
-
-        st.markdown("""
-### 3) Risk modifiers(추가 위험 수정자) 예시(ESC 2025 Box 1 요지)
-- 가족력(조기 CVD), 고위험 인종, 스트레스/사회적 박탈, 비만/운동부족, 만성 염증성 질환, 정신질환, OSA 등  
-- hs-CRP 상승, Lp(a) 상승 등
-""")
-
-        st.markdown("""
-### 4) 위험도/LDL 수준에 따른 중재 전략(ESC 2025 Table 4 요지)
-- 위험도와 ‘치료 전 LDL-C’ 수준에 따라 생활요법만, 생활요법+약물 고려, 또는 생활요법+동반 약물치료를 제시합니다.  
-- 특히 고위험/초고위험에서는 비교적 낮은 LDL 구간에서도 약물치료 병행을 권고하는 방향성이 나타납니다.
-""")
+begin_rerun(st.session_state, current_session_id())
+completed = False
+try:
+    main()
+    completed = True
+finally:
+    end_rerun(st.session_state, interrupted=not completed)
+    get_admission().release(current_session_id())
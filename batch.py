@@ -0,0 +1,499 @@
+import argparse
+import time
+from functools import partial
+from itertools import islice
+from multiprocessing import Pool
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.parquet as pq
+
+from batch_plan import (
+    CALCULATORS,
+    DEFAULT_CALCULATORS,
+    default_budget,
+    parse_size,
+    plan_batch,
+    rss_report,
+    table_bytes,
+)
+from calculators import MAGIC_ANSWER_KEYS, SCORE2_RISK_REGION, elan_recommendation
+from codes import (
+    CODE_DTYPE,
+    ELAN_SEVERITY_LABELS,
+    ELAN_TIMING_LABELS,
+    MISSING,
+    decode_frame,
+    dictionary_array,
+    to_arrow_table,
+)
+from kernels import elan_lesion_severity_code_np, elan_overall_code_np, magic_result_code_np
+from registry import cohort_groups
+
+
+# =========================================================
+# 코호트 일괄 계산(batch)
+# - 한 행이 한 환자이며, 입력 컬럼은 COHORT_COLUMNS를 따릅니다(결측 허용).
+# - sex는 "Male"/"Female", race는 PCE 계수용 "White"/"African American"입니다.
+# - 진단 플래그 결측은 '없음'으로 간주하고, 수치/성별 결측은 결과도 결측(NaN, 코드/점수는 MISSING)으로 둡니다.
+#   예외: HAS-BLED 신기능은 Cr이 없으면 renal_disease 플래그만 봅니다.
+# - 계산 항목, 입력 열 매핑, 결과 열 이름은 registry.py 선언(group이 있는 계산기)을 그대로 씁니다.
+# =========================================================
+COHORT_COLUMNS = {
+    "patient_id": "string",
+    "age": "float64",
+    "sex": "string",
+    "race": "string",
+    "weight_kg": "float64",
+    "scr_mg_dl": "float64",
+    "tc": "float64",
+    "hdl": "float64",
+    "ldl": "float64",
+    "sbp": "float64",
+    "bp_treated": "boolean",
+    "smoker": "boolean",
+    "diabetes": "boolean",
+    "htn": "boolean",
+    "chf": "boolean",
+    "af": "boolean",
+    "stroke_tia": "boolean",
+    "vascular": "boolean",
+    "renal_disease": "boolean",
+    "liver_disease": "boolean",
+    "bleeding_history": "boolean",
+    "labile_inr": "boolean",
+    "bleeding_drugs": "boolean",
+    "alcohol_excess": "boolean",
+    # 지질 치료 상태(앱 LDL 탭의 on_hi/on_eze/on_pcsk9/esc_recur_ldl과 같은 의미)
+    "on_hi": "boolean",
+    "on_eze": "boolean",
+    "on_pcsk9": "boolean",
+    "recurrent_ascvd": "boolean",
+}
+
+# score_cohort가 계산하는 항목(registry group, batch_plan.CALCULATORS 이름과 같습니다). MAGIC/ELAN은 따로 계산합니다.
+COHORT_GROUPS = cohort_groups()
+COHORT_CALCULATORS = tuple(COHORT_GROUPS)
+
+# MAGIC 답변 열(없거나 결측이면 '아니요')
+MAGIC_COLUMNS = [f"magic_{k}" for k in MAGIC_ANSWER_KEYS]
+
+# ELAN 병변 표(환자당 여러 행)
+LESION_COLUMNS = {
+    "patient_id": "string",
+    "lesion": "int8",
+    "circulation": "string",
+    "posterior_site": "string",
+    "anterior_pattern": "string",
+    "anterior_major_pattern": "string",
+    "multiterritory": "bool",
+    "size_gt_1_5": "bool",
+}
+
+# 결과 중 코드 열과 해당 코드표(codes.CODE_TABLES) 이름입니다. 결측/계산 불가는 -1입니다.
+RESULT_CODE_COLUMNS = {
+    **{col: table for calcs in COHORT_GROUPS.values() for calc in calcs for col, table in calc.code_columns.items()},
+    "magic": "magic",
+    "elan_severity": "elan_severity",
+    "elan_timing": "elan_timing",
+}
+
+
+def empty_cohort() -> pd.DataFrame:
+    return pd.DataFrame({c: pd.Series(dtype=t) for c, t in COHORT_COLUMNS.items()})
+
+
+def conform_cohort(df: pd.DataFrame) -> pd.DataFrame:
+    # 누락 컬럼은 결측으로 추가하고 dtype을 스키마에 맞춥니다.
+    out = df.copy()
+    for col, dtype in COHORT_COLUMNS.items():
+        if col not in out.columns:
+            out[col] = pd.Series(index=out.index, dtype=dtype)
+        else:
+            out[col] = out[col].astype(dtype)
+    return out
+
+
+def _num(df, col):
+    return df[col].astype("float64").to_numpy(na_value=np.nan)
+
+
+def _flag(df, col):
+    return df[col].fillna(False).astype(bool).to_numpy()
+
+
+def _str(df, col):
+    return df[col].astype(object).where(df[col].notna(), None).to_numpy()
+
+
+def _cached(get):
+    # 같은 열을 여러 계산기가 쓰므로 변환은 한 번만 합니다.
+    values = {}
+
+    def cached(col):
+        if col not in values:
+            values[col] = get(col)
+        return values[col]
+    return cached
+
+
+def _cohort_results(n: int, num, flag, text, risk_region: str, calculators=COHORT_CALCULATORS,
+                    float_dtype=np.float64) -> dict:
+    # num/flag/text: 열 이름 → NumPy 배열(수치는 결측 NaN, 플래그는 결측 False, 문자열은 결측 None)
+    # calculators: 계산할 항목(COHORT_CALCULATORS 중), float_dtype: PCE 중간 배열과 실수 결과 열의 dtype
+    getters = {"float64": _cached(num), "boolean": _cached(flag), "string": _cached(text)}
+
+    def column(col):
+        return getters[COHORT_COLUMNS.get(col, "string")](col)
+
+    out, memo = {}, {}
+    for group in calculators:
+        for calc in COHORT_GROUPS[group]:
+            arrays, incomplete = calc.source_arrays(column, n, {"risk_region": risk_region}, memo)
+            results = calc.evaluate_arrays(arrays, incomplete, float_dtype)
+            out.update({col: results[name] for col, name in calc.columns.items()})
+    return out
+
+
+def score_cohort(df: pd.DataFrame, risk_region: str = SCORE2_RISK_REGION, calculators=COHORT_CALCULATORS,
+                 float_dtype=np.float64) -> pd.DataFrame:
+    # 입력 DataFrame과 같은 index의 결과 DataFrame을 반환합니다.
+    df = conform_cohort(df)
+    out = _cohort_results(len(df), lambda c: _num(df, c), lambda c: _flag(df, c), lambda c: _str(df, c), risk_region,
+                          calculators, float_dtype)
+    return pd.DataFrame(out, index=df.index)
+
+
+def _magic_results(n: int, present, flag, unanswered) -> dict:
+    # present: 입력에 있는 MAGIC 답변 열, unanswered(): 답변 열이 모두 결측인 행
+    if not present:
+        return {"magic": np.full(n, MISSING, dtype=CODE_DTYPE)}
+    answers = [flag(c) if c in present else np.zeros(n, dtype=bool) for c in MAGIC_COLUMNS]
+    code = magic_result_code_np(*answers)
+    return {"magic": np.where(unanswered(), MISSING, code).astype(CODE_DTYPE)}
+
+
+def score_magic(df: pd.DataFrame) -> pd.DataFrame:
+    # MAGIC 답변 열이 모두 결측인 행은 MISSING입니다.
+    cols = [c for c in MAGIC_COLUMNS if c in df.columns]
+    out = _magic_results(len(df), cols, lambda c: _flag(df, c), lambda: df[cols].isna().all(axis=1).to_numpy())
+    return pd.DataFrame(out, index=df.index)
+
+
+# ELAN 분류 코드 → 시작 시기 코드
+_ELAN_TIMING_CODES = np.array(
+    [ELAN_TIMING_LABELS.index(elan_recommendation(s)) for s in ELAN_SEVERITY_LABELS] + [MISSING], dtype=CODE_DTYPE
+)
+
+
+def score_elan(lesions: pd.DataFrame) -> pd.DataFrame:
+    # 병변 표 → patient_id별 전체 분류와 DOAC 시작 시기(index=patient_id)
+    sev = elan_lesion_severity_code_np(
+        _str(lesions, "circulation"),
+        _flag(lesions, "size_gt_1_5"),
+        _str(lesions, "anterior_pattern"),
+        _str(lesions, "posterior_site"),
+        _flag(lesions, "multiterritory"),
+        _str(lesions, "anterior_major_pattern"),
+    )
+    owner, pids = pd.factorize(lesions["patient_id"])
+    k = len(ELAN_SEVERITY_LABELS)
+    counts = np.bincount(owner * k + sev, minlength=len(pids) * k).reshape(-1, k)
+    overall = elan_overall_code_np(*counts.T)
+    index = pd.Index(np.asarray(pids, dtype=object), name="patient_id")
+    return pd.DataFrame({"elan_severity": overall, "elan_timing": _ELAN_TIMING_CODES[overall]}, index=index)
+
+
+def attach_elan(df: pd.DataFrame, elan: pd.DataFrame) -> pd.DataFrame:
+    # 환자 행 순서에 맞춰 ELAN 결과를 붙입니다(병변이 없는 환자는 MISSING).
+    out = elan.reindex(df["patient_id"].to_numpy()).fillna(MISSING).astype(CODE_DTYPE)
+    out.index = df.index
+    return out
+
+
+def score_frame(df: pd.DataFrame, risk_region: str = SCORE2_RISK_REGION, calculators=DEFAULT_CALCULATORS,
+                elan: pd.DataFrame = None, float_dtype=np.float64) -> pd.DataFrame:
+    # 입력 열 + 고른 계산기의 결과 열(ELAN은 elan 결과가 있을 때만)
+    parts = [df]
+    cohort = [c for c in COHORT_CALCULATORS if c in calculators]
+    if cohort:
+        parts.append(score_cohort(df, risk_region, cohort, float_dtype))
+    if "magic" in calculators:
+        parts.append(score_magic(df))
+    if elan is not None:
+        parts.append(attach_elan(df, elan))
+    return pd.concat(parts, axis=1)
+
+
+# =========================================================
+# 파일 입출력
+# =========================================================
+ARROW_SUFFIXES = (".arrow", ".feather", ".ipc")
+
+
+def read_cohort(path) -> pd.DataFrame:
+    path = Path(path)
+    if path.suffix == ".parquet":
+        return pd.read_parquet(path)
+    if path.suffix in ARROW_SUFFIXES:
+        with pa.memory_map(str(path)) as source:
+            return pa.ipc.open_file(source).read_all().to_pandas()
+    return pd.read_csv(path)
+
+
+def write_frame(df: pd.DataFrame, path, code_columns: dict = None):
+    # Parquet은 코드 열을 사전 인코딩(int8 + 문구표)으로, CSV는 표시 문구로 기록합니다.
+    path = Path(path)
+    code_columns = {c: t for c, t in (code_columns or {}).items() if c in df.columns}
+    if path.suffix == ".parquet":
+        pq.write_table(to_arrow_table(df, code_columns), path)
+    elif path.suffix in ARROW_SUFFIXES:
+        table = to_arrow_table(df, code_columns)
+        with pa.ipc.new_file(str(path), table.schema) as writer:
+            writer.write_table(table)
+    else:
+        decode_frame(df, code_columns).to_csv(path, index=False)
+
+
+def iter_chunks(path, chunk_rows: int):
+    # 파일을 chunk_rows행 이하의 DataFrame으로 나눠 읽습니다.
+    path = Path(path)
+    if path.suffix == ".parquet":
+        for batch in pq.ParquetFile(path).iter_batches(batch_size=chunk_rows):
+            yield batch.to_pandas()
+    elif path.suffix in ARROW_SUFFIXES:
+        with pa.memory_map(str(path)) as source:
+            reader = pa.ipc.open_file(source)
+            for i in range(reader.num_record_batches):
+                batch = reader.get_batch(i)
+                for start in range(0, batch.num_rows, chunk_rows):
+                    yield batch.slice(start, chunk_rows).to_pandas()
+    else:
+        yield from pd.read_csv(path, chunksize=chunk_rows)
+
+
+def input_profile(path, columns: dict = COHORT_COLUMNS) -> tuple:
+    # 반환: (열 → dtype 표기, 행 수 또는 None). 파일 머리(스키마/메타데이터)만 읽습니다.
+    path = Path(path)
+    if path.suffix == ".parquet":
+        meta = pq.ParquetFile(path).metadata
+        names, n_rows = meta.schema.to_arrow_schema().names, meta.num_rows
+    elif path.suffix in ARROW_SUFFIXES:
+        with pa.memory_map(str(path)) as source:
+            reader = pa.ipc.open_file(source)
+            names = reader.schema.names
+            n_rows = sum(reader.get_record_batch(i).num_rows for i in range(reader.num_record_batches))
+    else:
+        names, n_rows = list(pd.read_csv(path, nrows=0).columns), None
+    types = {c: columns.get(c, "boolean" if c in MAGIC_COLUMNS else "string") for c in names}
+    return types, n_rows
+
+
+class FrameWriter:
+    # chunk 결과를 한 파일에 이어 씁니다(형식은 write_frame과 같습니다).
+    def __init__(self, path, code_columns: dict = None):
+        self.path = Path(path)
+        self.code_columns = code_columns or {}
+        self.rows = 0
+        self._writer = None
+        self._schema = None
+
+    def write(self, df: pd.DataFrame):
+        code_columns = {c: t for c, t in self.code_columns.items() if c in df.columns}
+        if self.path.suffix == ".parquet" or self.path.suffix in ARROW_SUFFIXES:
+            table = to_arrow_table(df, code_columns)
+            if self._writer is None:
+                self._schema = table.schema
+                if self.path.suffix == ".parquet":
+                    self._writer = pq.ParquetWriter(str(self.path), table.schema)
+                else:
+                    self._writer = pa.ipc.new_file(str(self.path), table.schema)
+            elif table.schema != self._schema:
+                # chunk마다 결측만 있는 열의 형이 달라질 수 있어 첫 chunk 스키마에 맞춥니다.
+                table = table.cast(self._schema)
+            self._writer.write_table(table)
+        else:
+            decode_frame(df, code_columns).to_csv(self.path, mode="a" if self.rows else "w", header=not self.rows,
+                                                  index=False)
+        self.rows += len(df)
+
+    def close(self):
+        if self._writer is not None:
+            self._writer.close()
+            self._writer = None
+
+
+# =========================================================
+# Arrow IPC(Feather v2) 파일 일괄 계산(memory map)
+# - 입력 파일을 memory map으로 열어 record batch 단위로 읽습니다. 압축하지 않은 파일이면 결측 없는
+#   float64 열은 매핑된 버퍼를 그대로 NumPy 배열로 보므로 복사본이 생기지 않습니다.
+#   (결측이 있거나 형이 다른 열, 플래그/문자열 열만 batch 크기만큼 변환합니다.)
+# - 매핑된 페이지는 OS 페이지 캐시이므로 같은 파일을 여러 프로세스가 동시에 계산해도 한 벌만 메모리에 올라갑니다.
+# - 출력은 입력 열 + 결과 열(코드 열은 사전 인코딩)의 Arrow IPC 파일이며, 압축하지 않아 다시 매핑해 쓸 수 있습니다.
+# =========================================================
+def _arrow_num(batch: pa.RecordBatch, col: str) -> np.ndarray:
+    if col not in batch.schema.names:
+        return np.full(batch.num_rows, np.nan)
+    arr = batch.column(col)
+    if arr.type == pa.float64() and arr.null_count == 0:
+        return arr.to_numpy(zero_copy_only=True)
+    return pc.fill_null(pc.cast(arr, pa.float64()), np.nan).to_numpy(zero_copy_only=False)
+
+
+def _arrow_flag(batch: pa.RecordBatch, col: str) -> np.ndarray:
+    if col not in batch.schema.names:
+        return np.zeros(batch.num_rows, dtype=bool)
+    return pc.fill_null(pc.cast(batch.column(col), pa.bool_()), False).to_numpy(zero_copy_only=False)
+
+
+def _arrow_str(batch: pa.RecordBatch, col: str) -> np.ndarray:
+    if col not in batch.schema.names:
+        return np.full(batch.num_rows, None, dtype=object)
+    arr = batch.column(col)
+    if pa.types.is_dictionary(arr.type):
+        arr = arr.dictionary_decode()
+    return arr.to_numpy(zero_copy_only=False)
+
+
+def score_arrow_batch(batch: pa.RecordBatch, risk_region: str = SCORE2_RISK_REGION, elan: pd.DataFrame = None,
+                      calculators=DEFAULT_CALCULATORS, float_dtype=np.float64) -> pa.RecordBatch:
+    # 입력 batch 열은 그대로 두고 결과 열을 덧붙인 batch를 반환합니다.
+    flag = partial(_arrow_flag, batch)
+    cohort = [c for c in COHORT_CALCULATORS if c in calculators]
+    out = _cohort_results(batch.num_rows, partial(_arrow_num, batch), flag, partial(_arrow_str, batch), risk_region,
+                          cohort, float_dtype)
+    if "magic" in calculators:
+        present = [c for c in MAGIC_COLUMNS if c in batch.schema.names]
+        out.update(_magic_results(
+            batch.num_rows, present, flag,
+            lambda: np.logical_and.reduce([batch.column(c).is_null().to_numpy(zero_copy_only=False) for c in present]),
+        ))
+    if elan is not None:
+        pids = _arrow_str(batch, "patient_id")
+        out.update(elan.reindex(pids).fillna(MISSING).astype(CODE_DTYPE).to_dict("series"))
+
+    columns, names = list(batch.columns), list(batch.schema.names)
+    for col, values in out.items():
+        values = np.asarray(values)
+        columns.append(dictionary_array(RESULT_CODE_COLUMNS[col], values) if col in RESULT_CODE_COLUMNS else pa.array(values))
+        names.append(col)
+    return pa.RecordBatch.from_arrays(columns, names=names)
+
+
+def score_arrow_file(path, output, risk_region: str = SCORE2_RISK_REGION, lesions: pd.DataFrame = None,
+                     batch_rows: int = 1_000_000, calculators=DEFAULT_CALCULATORS, float_dtype=np.float64) -> int:
+    # 반환: 계산한 행 수
+    elan = score_elan(lesions) if lesions is not None else None
+    rows = 0
+    writer = None
+    with pa.memory_map(str(path)) as source:
+        reader = pa.ipc.open_file(source)
+        try:
+            for i in range(reader.num_record_batches):
+                batch = reader.get_batch(i)
+                for start in range(0, batch.num_rows, batch_rows):
+                    scored = score_arrow_batch(batch.slice(start, batch_rows), risk_region, elan, calculators, float_dtype)
+                    if writer is None:
+                        writer = pa.ipc.new_file(str(output), scored.schema)
+                    writer.write_batch(scored)
+                    rows += scored.num_rows
+        finally:
+            if writer is not None:
+                writer.close()
+    return rows
+
+
+# =========================================================
+# 메모리 예산 실행(batch_plan 참고)
+# - 입력을 plan.chunk_rows행씩 읽어 계산하고 바로 이어 씁니다. 전체 파일을 한 번에 올리지 않습니다.
+# - worker가 여러 개면 chunk를 worker 수만큼 묶어 나눠 계산하고 순서대로 씁니다(한 번에 worker 수 이상 읽지 않습니다).
+#   ELAN 결과 등 공통 인자는 worker를 만들 때 한 번만 넘깁니다.
+# =========================================================
+_WORKER_ARGS = {}
+
+
+def _init_worker(risk_region, calculators, elan, float_dtype):
+    _WORKER_ARGS.update(risk_region=risk_region, calculators=calculators, elan=elan, float_dtype=float_dtype)
+
+
+def _score_job(chunk: pd.DataFrame) -> pd.DataFrame:
+    return score_frame(chunk, **_WORKER_ARGS)
+
+
+def run_batch(path, output, plan, risk_region: str = SCORE2_RISK_REGION, elan: pd.DataFrame = None) -> int:
+    # 반환: 계산한 행 수
+    args = (risk_region, plan.calculators, elan, plan.float_dtype)
+    writer = FrameWriter(output, RESULT_CODE_COLUMNS)
+    chunks = iter_chunks(path, plan.chunk_rows)
+    try:
+        if plan.workers <= 1:
+            _init_worker(*args)
+            for chunk in chunks:
+                writer.write(_score_job(chunk))
+        else:
+            with Pool(plan.workers, initializer=_init_worker, initargs=args) as pool:
+                while True:
+                    window = list(islice(chunks, plan.workers))
+                    if not window:
+                        break
+                    for scored in pool.map(_score_job, window):
+                        writer.write(scored)
+        if not writer.rows:
+            _init_worker(*args)
+            writer.write(_score_job(empty_cohort()))
+    finally:
+        writer.close()
+    return writer.rows
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="코호트 파일(Parquet/CSV/Arrow IPC)에 대해 계산기 결과를 일괄 계산합니다.")
+    parser.add_argument("input")
+    parser.add_argument("-o", "--output", required=True)
+    parser.add_argument("--risk-region", default=SCORE2_RISK_REGION)
+    parser.add_argument("--lesions", help="ELAN 병변 표(Parquet/CSV)")
+    parser.add_argument("--calculators", default=",".join(DEFAULT_CALCULATORS),
+                        help=f"쉼표로 구분(가능: {', '.join(c for c in CALCULATORS if c != 'elan')})")
+    parser.add_argument("--memory-budget", help="예: 4G, 512M (기본: 사용 가능한 메모리의 절반)")
+    parser.add_argument("-j", "--workers", type=int, default=None, help="최대 worker 수(기본: CPU 수)")
+    parser.add_argument("--plan-only", action="store_true", help="실행 계획만 출력합니다.")
+    args = parser.parse_args(argv)
+
+    calculators = [c.strip() for c in args.calculators.split(",") if c.strip()]
+    if args.lesions and "elan" not in calculators:
+        calculators.append("elan")
+    arrow_path = Path(args.input).suffix in ARROW_SUFFIXES and Path(args.output).suffix in ARROW_SUFFIXES
+    budget = parse_size(args.memory_budget) if args.memory_budget else default_budget()
+    column_types, n_rows = input_profile(args.input)
+    fixed = 0
+    if args.lesions:
+        lesion_types, n_lesions = input_profile(args.lesions, LESION_COLUMNS)
+        # CSV는 행 수를 모르므로 파일 크기(한 행 약 100 bytes)로 어림합니다.
+        n_lesions = n_lesions if n_lesions is not None else Path(args.lesions).stat().st_size // 100
+        fixed = table_bytes(lesion_types, n_lesions)
+    try:
+        plan = plan_batch(budget, column_types, calculators, n_rows, args.workers, parallel=not arrow_path,
+                          fixed_bytes=fixed)
+    except ValueError as e:
+        parser.error(str(e))
+    print(plan.describe(), flush=True)
+    if args.plan_only:
+        return
+
+    started = time.perf_counter()
+    lesions = read_cohort(args.lesions) if args.lesions else None
+    if arrow_path:
+        rows = score_arrow_file(args.input, args.output, args.risk_region, lesions, plan.chunk_rows,
+                                plan.calculators, plan.float_dtype)
+    else:
+        elan = score_elan(lesions) if lesions is not None else None
+        del lesions  # 병변 원본은 worker에 넘기지 않습니다.
+        rows = run_batch(args.input, args.output, plan, args.risk_region, elan)
+    print(rss_report(plan, rows, time.perf_counter() - started))
+
+
+if __name__ == "__main__":
+    main()
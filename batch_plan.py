@@ -0,0 +1,226 @@
+import os
+import re
+import sys
+
+import numpy as np
+
+from calculators import MAGIC_ANSWER_KEYS
+from registry import cohort_groups
+
+
+# =========================================================
+# 메모리 예산 기반 일괄 계산 계획(batch plan)
+# - 고른 계산기의 입력/중간/결과 배열 크기로 행당 메모리를 추정하고, 예산 안에서 chunk 행 수와 worker 수를 정합니다.
+#   코호트 항목의 입력/결과 열은 registry.py 선언에서 가져오고, 중간 배열 수(FLOAT_TEMPS)만 여기서 정합니다.
+# - 행당 비용 = 입출력 사본(IO_COPIES벌: 읽기 변환, 결과 합치기, 쓰기 변환) + 계산 중간 배열
+#   여러 worker로 나누면 부모 프로세스도 chunk 입력/결과를 한 벌씩 들고 있으므로 그만큼 더합니다.
+# - chunk와 무관하게 통째로 읽는 표(ELAN 병변 표)는 fixed_bytes로 받아 예산에서 먼저 뺍니다.
+# - worker가 많을수록 빠르지만 chunk가 EFFICIENT_CHUNK_ROWS보다 작아지면 NumPy 호출 비용이 커지므로 worker를 줄입니다.
+#   worker 1개로도 그 크기가 안 되면 PCE 중간 배열을 float32로 바꿔 다시 계산합니다.
+# - 점수 열은 int8, 플래그는 bool로 이미 계산되므로 이 추정에 그대로 반영합니다.
+# =========================================================
+# 열 dtype(batch.COHORT_COLUMNS 표기) → 행당 bytes(pandas 기준, 문자열은 평균 추정치)
+COLUMN_BYTES = {"float64": 8, "boolean": 2, "bool": 1, "int8": 1, "string": 64}
+STRING_BYTES = COLUMN_BYTES["string"]
+
+# 계산 중 동시에 살아 있는 float 배열 수(최대치 추정). 표에 없는 항목은 입력 열 수로 어림합니다.
+FLOAT_TEMPS = {
+    "noac": 6,
+    "chads_vasc": 1,
+    "has_bled": 2,
+    "pce": 16,  # 계수 10 + log 4 + 누적 2
+    "score2": 6,
+}
+
+
+def _cohort_spec(group: str, calcs) -> dict:
+    # 등록부(registry.cohort_groups) 계산기 묶음 → 입력 열, 결과 열(실수 8 bytes, 점수/코드 1 byte)
+    inputs = tuple(dict.fromkeys(c for calc in calcs for c in calc.sources))
+    return {
+        "inputs": inputs,
+        "float_temps": FLOAT_TEMPS.get(group, len(inputs)),
+        "outputs": {col: 8 if calc.outputs[out] == "float" else 1 for calc in calcs for col, out in calc.columns.items()},
+        "reducible": any(calc.reducible for calc in calcs),  # float32로 계산 가능
+    }
+
+
+# 계산기: 입력 열, 계산 중 동시에 살아 있는 float 배열 수, 결과 열 → 행당 bytes
+CALCULATORS = {
+    **{group: _cohort_spec(group, calcs) for group, calcs in cohort_groups().items()},
+    "magic": {
+        "inputs": tuple(f"magic_{k}" for k in MAGIC_ANSWER_KEYS),
+        "float_temps": 1,
+        "outputs": {"magic": 1},
+    },
+    "elan": {
+        "inputs": ("patient_id",),
+        "float_temps": 2,
+        "outputs": {"elan_severity": 1, "elan_timing": 1},
+    },
+}
+DEFAULT_CALCULATORS = tuple(c for c in CALCULATORS if c != "elan")
+
+IO_COPIES = 3
+# import된 pandas/NumPy/pyarrow만으로 프로세스 하나가 쓰는 메모리(측정치를 반올림)
+PROCESS_BASE_BYTES = 160 * 2**20
+MIN_CHUNK_ROWS = 1_000
+EFFICIENT_CHUNK_ROWS = 50_000
+MAX_CHUNK_ROWS = 1_000_000
+# 예산을 주지 않으면 현재 사용 가능한 물리 메모리의 이 비율을 씁니다.
+DEFAULT_BUDGET_FRACTION = 0.5
+FALLBACK_BUDGET_BYTES = 2 * 2**30
+
+_SIZE = re.compile(r"^\s*(\d+(?:\.\d+)?)\s*([KMGT]?)(?:I?B)?\s*$", re.IGNORECASE)
+_UNITS = {"": 1, "K": 2**10, "M": 2**20, "G": 2**30, "T": 2**40}
+
+
+def parse_size(text: str) -> int:
+    # "4G", "512M", "1.5GiB", "1000000" → bytes
+    m = _SIZE.match(str(text))
+    if not m:
+        raise ValueError(f"메모리 크기를 읽을 수 없습니다: {text!r} (예: 4G, 512M)")
+    return int(float(m.group(1)) * _UNITS[m.group(2).upper()])
+
+
+def format_size(n: float) -> str:
+    for unit in ("B", "KiB", "MiB", "GiB"):
+        if abs(n) < 1024 or unit == "GiB":
+            return f"{n:.0f} {unit}" if unit == "B" else f"{n:.1f} {unit}"
+        n /= 1024
+
+
+def available_memory() -> int:
+    try:
+        return os.sysconf("SC_AVPHYS_PAGES") * os.sysconf("SC_PAGE_SIZE")
+    except (ValueError, OSError, AttributeError):
+        return 0
+
+
+def default_budget() -> int:
+    available = available_memory()
+    return int(available * DEFAULT_BUDGET_FRACTION) if available else FALLBACK_BUDGET_BYTES
+
+
+def table_bytes(column_types: dict, n_rows: int) -> int:
+    # 통째로 읽는 표: Arrow 읽기 + pandas 변환 두 벌
+    return 2 * n_rows * sum(COLUMN_BYTES.get(t, STRING_BYTES) for t in column_types.values())
+
+
+def row_bytes(calculators, column_types: dict, float_dtype=np.float64) -> dict:
+    # 반환: {"io": 입출력 한 벌, "temps": 중간 배열, "total": 행당 합계}
+    inputs = set()
+    outputs = 0
+    temps = 0
+    float_size = np.dtype(float_dtype).itemsize
+    for name in calculators:
+        spec = CALCULATORS[name]
+        inputs.update(spec["inputs"])
+        outputs += sum(spec["outputs"].values())
+        temps = max(temps, spec["float_temps"] * (float_size if spec.get("reducible") else 8))
+    io = sum(COLUMN_BYTES.get(column_types.get(c, "string"), STRING_BYTES) for c in column_types) + outputs
+    io += sum(STRING_BYTES for c in inputs if c not in column_types)
+    return {"io": io, "temps": temps, "total": IO_COPIES * io + temps}
+
+
+class BatchPlan:
+    def __init__(self, budget: int, calculators, chunk_rows: int, workers: int, float_dtype, cost: dict,
+                 fixed_bytes: int = 0, note: str = ""):
+        self.budget = budget
+        self.fixed_bytes = fixed_bytes
+        self.calculators = tuple(calculators)
+        self.chunk_rows = chunk_rows
+        self.workers = workers
+        self.float_dtype = np.dtype(float_dtype)
+        self.cost = cost
+        self.note = note
+
+    def estimated_peak(self) -> int:
+        # worker 여러 개면 부모가 chunk 입력/결과 한 벌씩을 더 들고 있습니다.
+        per_worker = PROCESS_BASE_BYTES + self.chunk_rows * self.cost["total"]
+        if self.workers <= 1:
+            return self.fixed_bytes + per_worker
+        return self.fixed_bytes + PROCESS_BASE_BYTES + self.workers * (per_worker + 2 * self.chunk_rows * self.cost["io"])
+
+    def describe(self) -> str:
+        lines = [
+            f"메모리 예산 {format_size(self.budget)}, 예상 최대 {format_size(self.estimated_peak())}",
+            f"계산기: {', '.join(self.calculators)}",
+            f"행당 추정 {self.cost['total']} bytes (입출력 {self.cost['io']} × {IO_COPIES} + 중간 {self.cost['temps']})",
+            f"chunk {self.chunk_rows:,}행, worker {self.workers}개, PCE 중간 배열 {self.float_dtype.name}",
+        ]
+        if self.fixed_bytes:
+            lines.append(f"통째로 읽는 표(ELAN 병변) 추정 {format_size(self.fixed_bytes)}")
+        if self.note:
+            lines.append(self.note)
+        return "\n".join(lines)
+
+
+def _fit_chunk(budget: int, workers: int, cost: dict) -> int:
+    if workers <= 1:
+        return (budget - PROCESS_BASE_BYTES) // cost["total"]
+    share = (budget - (workers + 1) * PROCESS_BASE_BYTES) // workers
+    return share // (cost["total"] + 2 * cost["io"])
+
+
+def plan_batch(budget: int, column_types: dict, calculators=DEFAULT_CALCULATORS, n_rows: int = None,
+               max_workers: int = None, parallel: bool = True, fixed_bytes: int = 0) -> BatchPlan:
+    # column_types: 입력 열 → dtype 표기(COLUMN_BYTES 키), n_rows: 입력 행 수(모르면 None)
+    unknown = [c for c in calculators if c not in CALCULATORS]
+    if unknown:
+        raise ValueError(f"알 수 없는 계산기입니다: {', '.join(unknown)} (가능: {', '.join(CALCULATORS)})")
+    max_workers = max(1, max_workers or os.cpu_count() or 1) if parallel else 1
+    if n_rows is not None:
+        max_workers = max(1, min(max_workers, -(-n_rows // EFFICIENT_CHUNK_ROWS)))
+    row_cap = MAX_CHUNK_ROWS if n_rows is None else max(MIN_CHUNK_ROWS, min(MAX_CHUNK_ROWS, n_rows))
+
+    note = "" if parallel else "Arrow IPC memory map 경로는 한 프로세스로 계산합니다."
+    chunk_budget = budget - fixed_bytes
+    for float_dtype in (np.float64, np.float32):
+        cost = row_bytes(calculators, column_types, float_dtype)
+        for workers in range(max_workers, 0, -1):
+            chunk = _fit_chunk(chunk_budget, workers, cost)
+            per_worker_rows = row_cap if n_rows is None else -(-n_rows // workers)
+            if chunk >= min(EFFICIENT_CHUNK_ROWS, per_worker_rows):
+                chunk = int(min(chunk, row_cap, per_worker_rows))
+                return BatchPlan(budget, calculators, chunk, workers, float_dtype, cost, fixed_bytes, note)
+
+    chunk = _fit_chunk(chunk_budget, 1, cost)
+    if chunk < MIN_CHUNK_ROWS:
+        need = fixed_bytes + PROCESS_BASE_BYTES + MIN_CHUNK_ROWS * cost["total"]
+        raise ValueError(f"메모리 예산 {format_size(budget)}이(가) 너무 작습니다(최소 약 {format_size(need)}).")
+    note = (note + " " if note else "") + "예산이 작아 chunk가 권장 크기보다 작습니다."
+    return BatchPlan(budget, calculators, int(chunk), 1, np.float32, cost, fixed_bytes, note)
+
+
+# =========================================================
+# 실행 후 최대 RSS
+# - Linux는 ru_maxrss가 KiB, macOS는 bytes입니다.
+# - RUSAGE_CHILDREN은 끝난 worker 중 가장 큰 것의 값입니다(합계가 아닙니다).
+# - resource는 Unix 전용이므로 여기서만 불러옵니다. 없으면(Windows) None이고 보고에서 RSS를 뺍니다.
+# =========================================================
+_RSS_UNIT = 1 if sys.platform == "darwin" else 1024
+
+
+def peak_rss():
+    try:
+        import resource
+    except ImportError:
+        return None
+    return {
+        "self": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * _RSS_UNIT,
+        "worker": resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss * _RSS_UNIT,
+    }
+
+
+def rss_report(plan: BatchPlan, rows: int, seconds: float) -> str:
+    rss = peak_rss()
+    text = f"{rows:,}행, {seconds:.1f}초"
+    if rss is None:
+        return text
+    text += f", 최대 RSS {format_size(rss['self'])}"
+    if plan.workers > 1:
+        text += f" (worker 최대 {format_size(rss['worker'])} × {plan.workers})"
+        total = rss["self"] + rss["worker"] * plan.workers
+    else:
+        total = rss["self"]
+    return text + f", 예산 대비 {100.0 * total / plan.budget:.0f}%"
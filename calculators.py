@@ -0,0 +1,561 @@
+import math
+
+
+# =========================================================
+# 공통 유틸/계산
+# =========================================================
+def cockcroft_gault_crcl(age, weight_kg, scr_mg_dl, female: bool):
+    if scr_mg_dl <= 0:
+        return None
+    crcl = ((140 - age) * weight_kg) / (72 * scr_mg_dl)
+    if female:
+        crcl *= 0.85
+    return crcl
+
+
+def chads_vasc_score(chf, htn, age, dm, stroke_tia, vascular, female):
+    score = 0
+    score += 1 if chf else 0
+    score += 1 if htn else 0
+    score += 2 if age >= 75 else (1 if age >= 65 else 0)
+    score += 1 if dm else 0
+    score += 2 if stroke_tia else 0
+    score += 1 if vascular else 0
+    score += 1 if female else 0
+    return score
+
+
+def abcd2_score(age_ge_60, bp_ge_140_90, unilateral_weakness, speech_without_weakness, duration_min, diabetes):
+    score = 0
+    score += 1 if age_ge_60 else 0
+    score += 1 if bp_ge_140_90 else 0
+    if unilateral_weakness:
+        score += 2
+    elif speech_without_weakness:
+        score += 1
+    if duration_min >= 60:
+        score += 2
+    elif 10 <= duration_min <= 59:
+        score += 1
+    score += 1 if diabetes else 0
+    return score
+
+
+# HAS-BLED 'abnormal renal function'의 Cr 기준(≥200 µmol/L)
+HAS_BLED_SCR_MG_DL = 2.26
+
+
+def has_bled_score(htn_sbp_gt160, renal, liver, stroke, bleed, inr_labile, age_gt65, drugs, alcohol):
+    score = 0
+    score += 1 if htn_sbp_gt160 else 0
+    score += 1 if renal else 0
+    score += 1 if liver else 0
+    score += 1 if stroke else 0
+    score += 1 if bleed else 0
+    score += 1 if inr_labile else 0
+    score += 1 if age_gt65 else 0
+    score += 1 if drugs else 0
+    score += 1 if alcohol else 0
+    return score
+
+
+# =========================================================
+# NOAC 용량(단순 규칙 기반 표시)
+# =========================================================
+NOAC_DRUGS = ("Apixaban", "Rivaroxaban", "Edoxaban", "Dabigatran")
+
+
+def noac_dose_apixaban(age, weight_kg, scr_mg_dl):
+    criteria = 0
+    criteria += 1 if age >= 80 else 0
+    criteria += 1 if weight_kg <= 60 else 0
+    criteria += 1 if scr_mg_dl >= 1.5 else 0
+    if criteria >= 2:
+        return "2.5 mg BID", "감량 기준(나이/체중/Cr 중 2개 이상) 충족입니다."
+    return "5 mg BID", "표준 용량입니다."
+
+
+def noac_dose_rivaroxaban(crcl):
+    if crcl is None:
+        return "-", "CrCl 계산이 필요합니다."
+    if crcl > 50:
+        return "20 mg QD (with food)", "표준 용량입니다."
+    if 15 <= crcl <= 50:
+        return "15 mg QD (with food)", "감량(CrCl 15–50)입니다."
+    return "검토 필요", "비권고 또는 전문 검토가 필요합니다."
+
+
+def noac_dose_edoxaban(crcl, weight_kg):
+    if crcl is None:
+        return "-", "CrCl 계산이 필요합니다."
+    if crcl < 15:
+        return "검토 필요", "비권고 또는 전문 검토가 필요합니다."
+    if (15 <= crcl <= 50) or (weight_kg <= 60):
+        return "30 mg QD", "감량(CrCl 15–50 또는 체중≤60)입니다."
+    if crcl > 95:
+        return "라벨 확인 필요", "AF 적응증에서 CrCl>95 제한이 있을 수 있어 확인이 필요합니다."
+    return "60 mg QD", "표준 용량입니다."
+
+
+def noac_dose_dabigatran(crcl, age):
+    if crcl is None:
+        return "-", "CrCl 계산이 필요합니다."
+    if crcl < 15:
+        return "검토 필요", "비권고 또는 전문 검토가 필요합니다."
+    if 15 <= crcl <= 30:
+        return "라벨에 따라 상이", "국가/라벨에 따라 권장 용량이 달라질 수 있습니다."
+    if age >= 80:
+        return "감량 고려", "고령에서는 감량 옵션을 고려하되 라벨 확인이 필요합니다."
+    return "150 mg BID", "표준 용량입니다."
+
+
+# =========================================================
+# NIHSS (숫자 입력 + 친절한 항목명)
+# =========================================================
+NIHSS_ITEMS = [
+    ("1a. Level of consciousness (LOC)", 0, 3),
+    ("1b. LOC questions", 0, 2),
+    ("1c. LOC commands", 0, 2),
+    ("2. Best gaze", 0, 2),
+    ("3. Visual fields", 0, 3),
+    ("4. Facial palsy", 0, 3),
+    ("5a. Motor arm (Left)", 0, 4),
+    ("5b. Motor arm (Right)", 0, 4),
+    ("6a. Motor leg (Left)", 0, 4),
+    ("6b. Motor leg (Right)", 0, 4),
+    ("7. Limb ataxia", 0, 2),
+    ("8. Sensory", 0, 2),
+    ("9. Best language", 0, 3),
+    ("10. Dysarthria", 0, 2),
+    ("11. Extinction and inattention (Neglect)", 0, 2),
+]
+
+# 항목 번호("1a", "5b", "10" 등): 컬럼명/간단 입력용
+NIHSS_CODES = [name.split(".")[0] for name, *_ in NIHSS_ITEMS]
+
+
+def motor_MRC_from_nihss(val: int) -> str:
+    mapping = {0: "V", 1: "IV", 2: "III", 3: "II", 4: "I"}
+    return mapping.get(val, "N/A")
+
+
+def mse_from_nihss_1a(val: int) -> str:
+    mapping = {0: "alert", 1: "mild drowsy", 2: "drowsy", 3: "semicoma"}
+    return mapping.get(val, "unknown")
+
+
+def language_from_nihss_9(val: int) -> str:
+    mapping = {
+        0: "normal",
+        1: "mild aphasia (language score 1)",
+        2: "moderate aphasia (language score 2)",
+        3: "severe aphasia (language score 3)",
+    }
+    return mapping.get(val, "unknown")
+
+
+def build_nihss_component_text(nihss_vals: dict) -> str:
+    total = sum(nihss_vals.values())
+    lines = ["NIHSS components:"]
+    for name, *_ in NIHSS_ITEMS:
+        lines.append(f"- {name}: {nihss_vals[name]}")
+    lines.append(f"NIHSS total: {total}")
+    return "\n".join(lines)
+
+
+def build_neuro_exam_text(nihss_vals: dict, facial_side: str, sensory_side: str, ataxia_side: str) -> str:
+    loc = nihss_vals["1a. Level of consciousness (LOC)"]
+    gaze = nihss_vals["2. Best gaze"]
+    lang = nihss_vals["9. Best language"]
+    dys = nihss_vals["10. Dysarthria"]
+    neglect = nihss_vals["11. Extinction and inattention (Neglect)"]
+    sensory = nihss_vals["8. Sensory"]
+    ataxia = nihss_vals["7. Limb ataxia"]
+
+    arm_l = nihss_vals["5a. Motor arm (Left)"]
+    arm_r = nihss_vals["5b. Motor arm (Right)"]
+    leg_l = nihss_vals["6a. Motor leg (Left)"]
+    leg_r = nihss_vals["6b. Motor leg (Right)"]
+
+    total = sum(nihss_vals.values())
+
+    lines = []
+    lines.append("Neurologic examination:")
+
+    lines.append(f"MSE: {mse_from_nihss_1a(loc)}")
+    lines.append(f"Language function: {language_from_nihss_9(lang)}")
+
+    if gaze == 0:
+        lines.append("EOM: normal")
+    else:
+        lines.append("EOM: gaze preponderance (+)")
+
+    lines.append(f"dysarthria {'(+)' if dys > 0 else '(-)'}")
+
+    lines.append("Motor")
+    lines.append(f"V/V")
+    lines.append(f"V/V")
+    lines.append(f"(Motor grade는 NIHSS motor 점수에 따라 자동으로 표기됩니다.)")
+    lines.append(f"LUE/RUE: {motor_MRC_from_nihss(arm_l)}/{motor_MRC_from_nihss(arm_r)}")
+    lines.append(f"LLE/RLE: {motor_MRC_from_nihss(leg_l)}/{motor_MRC_from_nihss(leg_r)}")
+
+    if sensory > 0:
+        side = sensory_side.lower()
+        lines.append(f"Sensory: {side} hypesthesia (+)")
+    else:
+        lines.append("Sensory: (-)")
+
+    if ataxia > 0:
+        if ataxia_side == "Left":
+            lines.append("Cerebellar function test: left dysmetria (+)")
+        elif ataxia_side == "Right":
+            lines.append("Cerebellar function test: right dysmetria (+)")
+        else:
+            lines.append("Cerebellar function test: bilateral dysmetria (+)")
+    else:
+        lines.append("Cerebellar function test: (-)")
+
+    lines.append(f"neglect {'(+)' if neglect > 0 else '(-)'}")
+
+    facial_val = nihss_vals["4. Facial palsy"]
+    if facial_val > 0:
+        if facial_side == "Left":
+            lines.append("Facial expression: left CTFP")
+        elif facial_side == "Right":
+            lines.append("Facial expression: right CTFP")
+        else:
+            lines.append("Facial expression: bilateral facial palsy (+)")
+    else:
+        lines.append("Facial expression: (-)")
+
+    lines.append(f"NIHSS total: {total}")
+    return "\n".join(lines)
+
+
+# =========================================================
+# ELAN (병변 1–4개, 크기 >1.5cm 체크박스)
+# - PCA cortical branch는 후순환계로 처리합니다.
+# =========================================================
+SEVERITY_ORDER = {"Minor": 1, "Moderate": 2, "Major": 3}
+
+# 입력 화면의 선택지(병변 단위)
+ELAN_MAX_LESIONS = 4
+ELAN_CIRCULATIONS = ["전순환계", "후순환계"]
+ELAN_POSTERIOR_SITES = ["뇌간", "소뇌", "후대뇌동맥 피질 표재 가지", "기타 후순환계"]
+ELAN_ANTERIOR_PATTERNS = [
+    "해당 없음(크기 기준)",
+    "중대뇌동맥 피질 표재 가지",
+    "중대뇌동맥 심부 가지",
+    "경계영역(internal borderzone)",
+    "전대뇌동맥 피질 표재 가지",
+]
+ELAN_ANTERIOR_MAJOR_PATTERNS = [
+    "해당 없음",
+    "전체 영역 침범",
+    "피질 표재 가지 2개 이상",
+    "피질 표재 가지 + 심부 가지 동반",
+]
+
+
+def elan_severity_for_lesion(
+    circ: str,
+    size_gt_1_5: bool,
+    anterior_pattern: str,
+    posterior_site: str,
+    anterior_multiterritory: bool,
+    anterior_major_pattern: str,
+):
+    # 후순환계
+    if circ == "후순환계":
+        # Major: brainstem/cerebellum > 1.5cm
+        if posterior_site in ["뇌간", "소뇌"] and size_gt_1_5:
+            return "Major"
+
+        # Moderate site examples (후순환계에서 PCA cortical branch를 지원)
+        if posterior_site in ["후대뇌동맥 피질 표재 가지"]:
+            return "Moderate"
+
+        # 그 외는 크기 기준으로 단순 분류
+        return "Minor" if not size_gt_1_5 else "Moderate"
+
+    # 전순환계 Major 우선
+    if anterior_major_pattern == "전체 영역 침범":
+        return "Major"
+    if anterior_major_pattern == "피질 표재 가지 2개 이상":
+        return "Major"
+    if anterior_major_pattern == "피질 표재 가지 + 심부 가지 동반":
+        return "Major"
+    if anterior_multiterritory:
+        return "Major"
+
+    # Moderate 패턴 (전순환계)
+    if anterior_pattern in [
+        "중대뇌동맥 피질 표재 가지",
+        "중대뇌동맥 심부 가지",
+        "경계영역(internal borderzone)",
+        "전대뇌동맥 피질 표재 가지",
+    ]:
+        return "Moderate"
+
+    # 그 외는 크기 기준
+    return "Minor" if not size_gt_1_5 else "Moderate"
+
+
+def elan_overall_severity(lesions: list[str]) -> str:
+    base = max(lesions, key=lambda x: SEVERITY_ORDER[x])
+    minor_count = sum(1 for x in lesions if x == "Minor")
+    mod_count = sum(1 for x in lesions if x == "Moderate")
+    if base == "Minor" and minor_count >= 2:
+        return "Moderate"
+    if base in ["Minor", "Moderate"] and mod_count >= 2:
+        return "Major"
+    return base
+
+
+def elan_recommendation(severity: str) -> str:
+    if severity in ["Minor", "Moderate"]:
+        return "≤ 48시간"
+    return "6–7일"
+
+
+# =========================================================
+# MAGIC (단계형)
+# =========================================================
+# 단계별 질문 순서대로의 답변 키
+MAGIC_ANSWER_KEYS = (
+    "other_determined",
+    "lacunar",
+    "relevant_artery",
+    "branch_atheroma",
+    "non_generic_pattern",
+    "ce_source",
+    "ce_high_risk",
+)
+
+
+def magic_result_from_answers(a: dict) -> str:
+    if a.get("other_determined"):
+        return "Other determined"
+
+    if a.get("lacunar"):
+        if a.get("relevant_artery"):
+            if a.get("branch_atheroma"):
+                return "LAA-BR"
+            return "LAA-LC"
+        if a.get("ce_source"):
+            return "CE (high risk)" if a.get("ce_high_risk") else "UD negative"
+        return "SVO"
+
+    if a.get("relevant_artery"):
+        return "LAA-NG" if a.get("non_generic_pattern") else "LAA"
+
+    if a.get("ce_source"):
+        return "CE (high risk)" if a.get("ce_high_risk") else "UD negative"
+
+    return "UD negative"
+
+
+# =========================================================
+# ASCVD / Dyslipidemia (AHA PCE + ESC SCORE2)
+# =========================================================
+def aha_very_high_risk(major_events_count: int, high_risk_conditions_count: int) -> bool:
+    if major_events_count >= 2:
+        return True
+    if major_events_count == 1 and high_risk_conditions_count >= 2:
+        return True
+    return False
+
+
+# AHA high-risk conditions: 체크박스로 변경
+AHA_HR_CONDITIONS_CHECK = [
+    "나이 ≥65세",
+    "당뇨병",
+    "고혈압",
+    "만성신질환(CKD)",
+    "현재 흡연",
+    "심부전",
+    "이전 PCI/CABG",
+    "지속적으로 LDL-C 상승(치료에도)",
+]
+
+# ESC 정의(근거 탭에서 테이블로 상세 노출)
+ESC_DOC_ASCVDS = [
+    "이전 ACS(심근경색 또는 불안정 협심증)",
+    "만성 관상동맥증후군(chronic coronary syndromes)",
+    "관상동맥/말초혈관 재개통술(PCI, CABG 등)",
+    "뇌졸중 또는 TIA",
+    "말초동맥질환(PAD)",
+    "영상에서 확실한 ASCVD(관상동맥 CT/조영술 유의미 플라크, 경동맥/대퇴동맥 플라크, CAC 현저히 상승 등)",
+]
+
+
+# ---------- AHA 10-year ASCVD risk (PCE) ----------
+# 2013 ACC/AHA PCE 계수 기반 (White/AA 남/여) 계산
+# 주의: 이는 교육/의사결정 보조용이며, 공식 도구와 차이가 있을 수 있습니다.
+# PCE가 검증된 입력 범위(양 끝 포함)입니다. 범위 밖이면 계산하지 않습니다(None).
+PCE_DOMAIN = {"age": (40, 79), "tc": (130.0, 320.0), "hdl": (20.0, 100.0), "sbp": (90.0, 200.0)}
+
+PCE_COEFFS = {
+    ("Male", "White"): {
+        "ln_age": 12.344,
+        "ln_tc": 11.853,
+        "ln_age_ln_tc": -2.664,
+        "ln_hdl": -7.990,
+        "ln_age_ln_hdl": 1.769,
+        "ln_sbp_treated": 1.797,
+        "ln_sbp_untreated": 1.764,
+        "smoker": 7.837,
+        "ln_age_smoker": -1.795,
+        "diabetes": 0.658,
+        "mean": 61.18,
+        "baseline_survival": 0.9144,
+    },
+    ("Female", "White"): {
+        "ln_age": -29.799,
+        "ln_age_sq": 4.884,
+        "ln_tc": 13.540,
+        "ln_age_ln_tc": -3.114,
+        "ln_hdl": -13.578,
+        "ln_age_ln_hdl": 3.149,
+        "ln_sbp_treated": 2.019,
+        "ln_sbp_untreated": 1.957,
+        "smoker": 7.574,
+        "ln_age_smoker": -1.665,
+        "diabetes": 0.661,
+        "mean": -29.18,
+        "baseline_survival": 0.9665,
+    },
+    ("Male", "African American"): {
+        "ln_age": 2.469,
+        "ln_age_sq": 0.0,
+        "ln_tc": 0.302,
+        "ln_age_ln_tc": 0.0,
+        "ln_hdl": -0.307,
+        "ln_age_ln_hdl": 0.0,
+        "ln_sbp_treated": 1.916,
+        "ln_sbp_untreated": 1.809,
+        "smoker": 0.549,
+        "ln_age_smoker": 0.0,
+        "diabetes": 0.645,
+        "mean": 19.54,
+        "baseline_survival": 0.8954,
+    },
+    ("Female", "African American"): {
+        "ln_age": 17.114,
+        "ln_age_sq": 0.0,
+        "ln_tc": 0.940,
+        "ln_age_ln_tc": 0.0,
+        "ln_hdl": -18.920,
+        "ln_age_ln_hdl": 4.475,
+        "ln_sbp_treated": 29.291,
+        "ln_sbp_untreated": 27.820,
+        "smoker": 0.691,
+        "ln_age_smoker": 0.0,
+        "diabetes": 0.874,
+        "mean": 86.61,
+        "baseline_survival": 0.9533,
+    },
+}
+
+
+def pce_10y_risk_percent(
+    sex: str,
+    race: str,
+    age: float,
+    tc: float,
+    hdl: float,
+    sbp: float,
+    bp_treated: bool,
+    smoker: bool,
+    diabetes: bool,
+):
+    # input guards: 검증 범위(PCE_DOMAIN) 밖이거나 결측(NaN)이면 외삽하지 않습니다.
+    values = {"age": age, "tc": tc, "hdl": hdl, "sbp": sbp}
+    if not all(lo <= values[k] <= hi for k, (lo, hi) in PCE_DOMAIN.items()):
+        return None
+
+    key = (sex, race)
+    if key not in PCE_COEFFS:
+        return None
+    c = PCE_COEFFS[key]
+
+    ln_age = math.log(age)
+    ln_tc = math.log(tc)
+    ln_hdl = math.log(hdl)
+    ln_sbp = math.log(sbp)
+
+    s = 0.0
+    s += c.get("ln_age", 0) * ln_age
+    if "ln_age_sq" in c and c["ln_age_sq"] != 0:
+        s += c["ln_age_sq"] * (ln_age ** 2)
+
+    s += c.get("ln_tc", 0) * ln_tc
+    s += c.get("ln_age_ln_tc", 0) * ln_age * ln_tc
+
+    s += c.get("ln_hdl", 0) * ln_hdl
+    s += c.get("ln_age_ln_hdl", 0) * ln_age * ln_hdl
+
+    if bp_treated:
+        s += c.get("ln_sbp_treated", 0) * ln_sbp
+    else:
+        s += c.get("ln_sbp_untreated", 0) * ln_sbp
+
+    s += c.get("smoker", 0) * (1 if smoker else 0)
+    s += c.get("ln_age_smoker", 0) * ln_age * (1 if smoker else 0)
+    s += c.get("diabetes", 0) * (1 if diabetes else 0)
+
+    # risk = 1 - S0 ^ exp(s - mean)
+    exp_term = math.exp(s - c["mean"])
+    risk = 1 - (c["baseline_survival"] ** exp_term)
+    return max(0.0, min(1.0, risk)) * 100.0
+
+
+# ---------- ESC SCORE2 (계산 구조 제공 + 추정치) ----------
+# 실제 SCORE2는 국가 리스크 클러스터/연령대/계수/차트가 필요합니다.
+# 이번 구현은 입력값을 기반으로 "추정치"를 계산하여 컷오프(2/10/20%)와 함께 표시합니다.
+SCORE2_REGION_MULT = {"Low": 0.9, "Moderate": 1.0, "High": 1.15, "Very high": 1.3}
+SCORE2_RISK_REGION = "Moderate"
+
+
+def score2_estimate_percent(age, sex, smoker, sbp, non_hdl, risk_region):
+    # 매우 단순한 추정 모델(설명용). 공식 계산기와 다를 수 있습니다.
+    base = 0.0
+    base += (age - 40) * 0.18
+    base += 6.0 if smoker else 0.0
+    base += (sbp - 120) * 0.05
+    base += (non_hdl - 130) * 0.03
+    if sex == "남성":
+        base *= 1.20
+    # risk region multiplier
+    mult = SCORE2_REGION_MULT.get(risk_region, 1.0)
+    base *= mult
+
+    # map to %
+    # base가 0~100 사이로 지나치게 튀지 않도록 sigmoid
+    p = 100.0 / (1.0 + math.exp(-0.07 * (base - 25)))
+    return float(max(0.1, min(50.0, p)))
+
+
+def esc_risk_category_from_score2(score2_percent: float):
+    # ESC 2025 Table 3 cutoffs: <2 low, 2-<10 moderate, 10-<20 high, >=20 very high
+    if score2_percent >= 20:
+        return "Very high"
+    if score2_percent >= 10:
+        return "High"
+    if score2_percent >= 2:
+        return "Moderate"
+    return "Low"
+
+
+def esc_ldl_target_by_category(category: str) -> str:
+    if category == "Very high (recurrent within 2y)":
+        return "<40 mg/dL (및 ≥50% 감소를 목표로 하시는 것이 일반적입니다.)"
+    if category == "Very high":
+        return "<55 mg/dL (및 ≥50% 감소를 목표로 하시는 것이 일반적입니다.)"
+    if category == "High":
+        return "<70 mg/dL (및 ≥50% 감소를 함께 고려하실 수 있습니다.)"
+    if category == "Moderate":
+        return "<100 mg/dL를 목표로 하실 수 있습니다."
+    if category == "Low":
+        return "<116 mg/dL를 목표로 하실 수 있습니다."
+    return "위험도 분류가 필요합니다."
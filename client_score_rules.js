@@ -0,0 +1,16 @@
+// 브라우저 점수 규칙 해석(client_scores.py SCORE_RULES). app.py 컴포넌트와 difftest.py(node)가 이 파일을 그대로 씁니다.
+function points(rule, values) {
+  if (rule.max) return Math.max(...rule.max.map((r) => points(r, values)));
+  const v = values[rule.field];
+  if ("points" in rule) return Number(v) * rule.points;
+  if (rule.bands) {
+    let p = 0;
+    for (const [lo, pts] of rule.bands) if (v >= lo) p = pts;
+    return p;
+  }
+  return rule.match[v] ?? 0;
+}
+
+function scoreTotal(rules, values) {
+  return rules.reduce((sum, rule) => sum + points(rule, values), 0);
+}
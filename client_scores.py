@@ -0,0 +1,151 @@
+import argparse
+import json
+from pathlib import Path
+
+import numpy as np
+
+from calculators import NIHSS_ITEMS
+from reference import ABCD2_RISK_TABLE, CHA2DS2_VASC_RISK_TABLE
+from registry import REGISTRY, Field
+
+
+# =========================================================
+# 브라우저에서 계산하는 점수(NIHSS 총점, CHA₂DS₂-VASc, ABCD², HAS-BLED)
+# - 점수마다 입력 Field(registry.py, NIHSS_ITEMS)와 점수 규칙표, 위험군 표(reference.py)를 JSON 하나(score_spec)로 내보냅니다.
+#   화면 컴포넌트(app.py)는 이 표만으로 입력할 때마다 총점과 위험군을 브라우저에서 계산하고,
+#   "반영" 버튼을 누를 때(의무기록 문구, 작업 목록, 확정 결과가 필요할 때)만 값을 서버로 보냅니다.
+# - 규칙(모두 더합니다):
+#     {"field", "points"}   값 × points(체크는 0/1, NIHSS 항목은 점수 그대로)
+#     {"field", "bands"}    [[하한, 점수], ...] 중 값이 하한 이상인 마지막 점수(없으면 0)
+#     {"field", "match"}    {선택지: 점수}
+#     {"max": [규칙, ...]}  묶은 규칙 중 가장 큰 점수(ABCD² 편측 위약 2 / 위약 없는 언어장애 1)
+# - 위험군: [{"min", "level", "text"}, ...] 중 총점이 min 이상인 마지막 항목입니다.
+# - SCORE_RULES는 calculators.py 스칼라 함수의 기준(나이 65/75, 지속 시간 10/60분 등)을 손으로 옮긴 사본입니다
+#   (스칼라 함수, kernels.py에 이은 세 번째). 같은 값으로 유지되는지는 difftest.py의 client_scores.* 항목이 검사합니다.
+# - 규칙 해석 JS(client_score_rules.js)는 화면 컴포넌트와 difftest.py(node로 실행)가 같은 파일을 씁니다.
+# - rule_total은 같은 규칙표의 NumPy 구현이며, difftest.py가 스칼라 함수와 비교합니다.
+# =========================================================
+CLIENT_SCORE_RULES_JS_PATH = Path(__file__).with_name("client_score_rules.js")
+CLIENT_SCORE_RULES_JS = CLIENT_SCORE_RULES_JS_PATH.read_text(encoding="utf-8")
+
+NIHSS_FIELDS = [
+    Field(name, "int", name, min=mn, max=mx, step=1, key=f"nihss_{name}", column=i % 3)
+    for i, (name, mn, mx) in enumerate(NIHSS_ITEMS)
+]
+
+CLIENT_SCORES = {
+    "nihss": ("NIHSS", NIHSS_FIELDS, "NIHSS 총점은 {score}점입니다."),
+    **{name: (REGISTRY[name].title, REGISTRY[name].inputs, REGISTRY[name].summary)
+       for name in ("chads_vasc", "abcd2", "has_bled")},
+}
+
+SCORE_RULES = {
+    "nihss": [{"field": f.name, "points": 1} for f in NIHSS_FIELDS],
+    "chads_vasc": [
+        {"field": "chf", "points": 1},
+        {"field": "htn", "points": 1},
+        {"field": "age", "bands": [[65, 1], [75, 2]]},
+        {"field": "dm", "points": 1},
+        {"field": "stroke_tia", "points": 2},
+        {"field": "vascular", "points": 1},
+        {"field": "sex", "match": {"Female": 1}},
+    ],
+    "abcd2": [
+        {"field": "age_ge_60", "points": 1},
+        {"field": "bp_ge_140_90", "points": 1},
+        {"max": [{"field": "unilateral_weakness", "points": 2}, {"field": "speech_without_weakness", "points": 1}]},
+        {"field": "duration_min", "bands": [[10, 1], [60, 2]]},
+        {"field": "diabetes", "points": 1},
+    ],
+    "has_bled": [{"field": f.name, "points": 1} for f in REGISTRY["has_bled"].inputs],
+}
+
+
+def _abcd2_band(row: dict, level: str) -> dict:
+    span, group = row["ABCD²"].split(" ")
+    return {
+        "min": int(span.split("–")[0]),
+        "level": level,
+        "text": f"위험군은 {group.strip('()')}({span})입니다. "
+                f"참고 위험도는 2일 {row['2-day risk']}, 7일 {row['7-day risk']}, 90일 {row['90-day risk']}입니다.",
+    }
+
+
+RISK_BANDS = {
+    "chads_vasc": [
+        {"min": int(row["Score"]), "level": "info",
+         "text": f"참고 연간 위험도는 {row['Annual stroke/systemic embolism risk']}입니다."}
+        for row in CHA2DS2_VASC_RISK_TABLE.to_dict("records")
+    ],
+    "abcd2": [_abcd2_band(row, level)
+              for row, level in zip(ABCD2_RISK_TABLE.to_dict("records"), ("info", "warning", "error"))],
+}
+
+
+def _current(field, value):
+    # 세션 값이 없거나 범위 밖이면 기본값으로 시작합니다.
+    try:
+        return field.normalize(value)
+    except (TypeError, ValueError):
+        return field.default
+
+
+def score_spec(name: str, state: dict = None) -> dict:
+    # state: 위젯 key → 현재 값(st.session_state). 컴포넌트는 이 값에서 시작합니다.
+    title, fields, summary = CLIENT_SCORES[name]
+    state = state or {}
+    return {
+        "name": name,
+        "title": title,
+        "summary": summary,
+        "rules": SCORE_RULES[name],
+        "bands": RISK_BANDS.get(name, []),
+        "fields": [
+            {**f.schema(), "key": f.key, "step": f.step, "column": f.column, "value": _current(f, state.get(f.key))}
+            for f in fields
+        ],
+    }
+
+
+def widget_values(name: str, submitted: dict) -> dict:
+    # 컴포넌트가 보낸 {입력 이름: 값} → {위젯 key: 값}(범위/선택지 밖이면 ValueError)
+    fields = CLIENT_SCORES[name][1]
+    unknown = set(submitted) - {f.name for f in fields}
+    if unknown:
+        raise ValueError(f"{name}: 알 수 없는 입력입니다: {', '.join(sorted(unknown))}")
+    return {f.key: f.normalize(submitted.get(f.name)) for f in fields}
+
+
+def rule_points(rule: dict, columns: dict) -> np.ndarray:
+    if "max" in rule:
+        return np.maximum.reduce([rule_points(r, columns) for r in rule["max"]])
+    values = np.asarray(columns[rule["field"]])
+    if "points" in rule:
+        return values.astype(np.int64) * rule["points"]
+    if "bands" in rule:
+        out = np.zeros(len(values), dtype=np.int64)
+        for lo, points in rule["bands"]:
+            out[values >= lo] = points
+        return out
+    return np.array([rule["match"].get(v, 0) for v in values.tolist()], dtype=np.int64)
+
+
+def rule_total(name: str, columns: dict) -> np.ndarray:
+    # 입력 이름 → 배열. 브라우저 계산과 같은 규칙표로 총점을 냅니다.
+    return sum(rule_points(rule, columns) for rule in SCORE_RULES[name])
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description="브라우저 점수 계산용 규칙표(JSON)를 출력합니다.")
+    ap.add_argument("names", nargs="*", help=f"점수 이름({', '.join(CLIENT_SCORES)}; 생략 시 전체)")
+    ap.add_argument("--indent", type=int, default=2)
+    args = ap.parse_args(argv)
+    unknown = [n for n in args.names if n not in CLIENT_SCORES]
+    if unknown:
+        ap.error(f"알 수 없는 점수입니다: {', '.join(unknown)}")
+    specs = [score_spec(name) for name in args.names or CLIENT_SCORES]
+    print(json.dumps(specs, ensure_ascii=False, indent=args.indent))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,149 @@
+import re
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+
+from calculators import (
+    SEVERITY_ORDER,
+    elan_recommendation,
+    esc_ldl_target_by_category,
+    noac_dose_apixaban,
+    noac_dose_dabigatran,
+    noac_dose_edoxaban,
+    noac_dose_rivaroxaban,
+)
+
+
+# =========================================================
+# 결과 코드표(enum)
+# - 대량 결과는 문자열 대신 작은 정수 코드(int8)로 저장하고, 문구는 코드표 한 곳에만 둡니다.
+# - 코드는 각 표의 인덱스이며, 결측/계산 불가는 MISSING(-1)입니다.
+# - 표는 스칼라 함수의 반환 문구로 만들어 화면 표시와 어긋나지 않게 합니다.
+# - 표에 항목을 추가할 때는 기존 코드가 바뀌지 않도록 끝에만 덧붙입니다.
+# =========================================================
+MISSING = -1
+CODE_DTYPE = np.int8
+
+# 약제별 (dose, 근거) 결과 목록입니다. 벡터 커널은 이 목록의 인덱스(용량 class)를 반환합니다.
+# 문구가 스칼라 함수와 어긋나지 않도록, 각 분기에 해당하는 대표 입력으로 스칼라 함수를 호출해 만듭니다.
+NOAC_DOSE_RESULTS = {
+    "Apixaban": (
+        noac_dose_apixaban(60, 70, 1.0),
+        noac_dose_apixaban(80, 60, 1.0),
+    ),
+    "Rivaroxaban": (
+        noac_dose_rivaroxaban(None),
+        noac_dose_rivaroxaban(60),
+        noac_dose_rivaroxaban(30),
+        noac_dose_rivaroxaban(10),
+    ),
+    "Edoxaban": (
+        noac_dose_edoxaban(None, 70),
+        noac_dose_edoxaban(10, 70),
+        noac_dose_edoxaban(30, 70),
+        noac_dose_edoxaban(100, 70),
+        noac_dose_edoxaban(70, 70),
+    ),
+    "Dabigatran": (
+        noac_dose_dabigatran(None, 70),
+        noac_dose_dabigatran(10, 70),
+        noac_dose_dabigatran(20, 70),
+        noac_dose_dabigatran(60, 85),
+        noac_dose_dabigatran(60, 70),
+    ),
+}
+
+
+def _unique(values) -> tuple:
+    return tuple(dict.fromkeys(values))
+
+
+# 약제 공통 용량/근거 문구표("표준 용량입니다." 등은 한 번만 저장됩니다.)
+DOSE_LABELS = _unique(dose for results in NOAC_DOSE_RESULTS.values() for dose, _ in results)
+REASON_LABELS = _unique(reason for results in NOAC_DOSE_RESULTS.values() for _, reason in results)
+
+ESC_CATEGORY_LABELS = ("Low", "Moderate", "High", "Very high", "Very high (recurrent within 2y)")
+LDL_TARGET_LABELS = tuple(esc_ldl_target_by_category(c) for c in ESC_CATEGORY_LABELS)
+# 목표 문구의 "<NN mg/dL"에서 읽은 수치 목표(ESC_CATEGORY_LABELS 순서)
+LDL_TARGET_MG_DL = np.array([float(re.match(r"<(\d+)", t).group(1)) for t in LDL_TARGET_LABELS])
+
+ELAN_SEVERITY_LABELS = tuple(sorted(SEVERITY_ORDER, key=SEVERITY_ORDER.get))
+ELAN_TIMING_LABELS = _unique(elan_recommendation(s) for s in ELAN_SEVERITY_LABELS)
+
+MAGIC_LABELS = ("Other determined", "LAA-BR", "LAA-LC", "CE (high risk)", "UD negative", "SVO", "LAA-NG", "LAA")
+
+SEX_LABELS = ("Male", "Female")
+SIDE_LABELS = ("Left", "Right", "Bilateral")
+
+CODE_TABLES = {
+    "noac_dose": DOSE_LABELS,
+    "noac_reason": REASON_LABELS,
+    "esc_category": ESC_CATEGORY_LABELS,
+    "ldl_target": LDL_TARGET_LABELS,
+    "elan_severity": ELAN_SEVERITY_LABELS,
+    "elan_timing": ELAN_TIMING_LABELS,
+    "magic": MAGIC_LABELS,
+    "sex": SEX_LABELS,
+    "side": SIDE_LABELS,
+}
+
+# 약제별 용량 class → 공통 코드표 인덱스 (MISSING class는 마지막 원소로 조회되도록 -1을 덧붙입니다.)
+NOAC_DOSE_CODES = {
+    drug: np.array([DOSE_LABELS.index(d) for d, _ in results] + [MISSING], dtype=CODE_DTYPE)
+    for drug, results in NOAC_DOSE_RESULTS.items()
+}
+NOAC_REASON_CODES = {
+    drug: np.array([REASON_LABELS.index(r) for _, r in results] + [MISSING], dtype=CODE_DTYPE)
+    for drug, results in NOAC_DOSE_RESULTS.items()
+}
+
+assert all(len(t) < np.iinfo(CODE_DTYPE).max for t in CODE_TABLES.values())
+
+
+# =========================================================
+# 변환
+# =========================================================
+def encode(table: str, labels) -> np.ndarray:
+    # 문구(스칼라 또는 배열) → 코드. 표에 없는 값/None은 MISSING입니다.
+    lookup = {label: i for i, label in enumerate(CODE_TABLES[table])}
+    values = np.asarray(labels, dtype=object)
+    return np.vectorize(lambda v: lookup.get(v, MISSING), otypes=[CODE_DTYPE])(values)
+
+
+def decode(table: str, codes) -> np.ndarray:
+    # 코드 → 문구(object 배열). MISSING은 None입니다.
+    labels = np.array(CODE_TABLES[table] + (None,), dtype=object)
+    codes = np.asarray(codes, dtype=np.int64)
+    return labels[np.where(codes < 0, len(labels) - 1, codes)]
+
+
+def noac_result_codes(drug: str, dose_class):
+    # 용량 class(kernels.noac_dose_*_np 결과, MISSING 허용) → (용량 코드, 근거 코드)
+    dose_class = np.asarray(dose_class, dtype=np.int64)
+    return NOAC_DOSE_CODES[drug][dose_class], NOAC_REASON_CODES[drug][dose_class]
+
+
+def dictionary_array(table: str, codes) -> pa.DictionaryArray:
+    # int8 인덱스 + 문구 사전 한 벌로 이루어진 Arrow 열(MISSING은 null)
+    codes = np.asarray(codes, dtype=CODE_DTYPE)
+    indices = pa.array(codes, type=pa.int8(), mask=codes < 0)
+    return pa.DictionaryArray.from_arrays(indices, pa.array(CODE_TABLES[table], type=pa.string()))
+
+
+def to_arrow_table(df: pd.DataFrame, code_columns: dict) -> pa.Table:
+    # code_columns: {열 이름: 코드표 이름}. 해당 열은 사전 인코딩, 나머지는 그대로 변환합니다.
+    plain = pa.Table.from_pandas(df.drop(columns=list(code_columns)), preserve_index=False)
+    for col, table in code_columns.items():
+        plain = plain.append_column(col, dictionary_array(table, df[col].to_numpy()))
+    return plain.select(list(df.columns))
+
+
+def decode_frame(df: pd.DataFrame, code_columns: dict) -> pd.DataFrame:
+    # 코드 열을 pandas Categorical로 풀어 사람이 읽을 수 있게 합니다(메모리는 코드 그대로 유지).
+    out = df.copy()
+    for col, table in code_columns.items():
+        codes = out[col].to_numpy(dtype=np.int64)
+        out[col] = pd.Categorical.from_codes(np.where(codes < 0, -1, codes), categories=list(CODE_TABLES[table]))
+    return out
+
@@ -0,0 +1,602 @@
+import argparse
+import json
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+import numpy as np
+import pandas as pd
+
+from batch import score_cohort
+from calculators import (
+    ELAN_ANTERIOR_MAJOR_PATTERNS,
+    ELAN_ANTERIOR_PATTERNS,
+    ELAN_CIRCULATIONS,
+    ELAN_MAX_LESIONS,
+    ELAN_POSTERIOR_SITES,
+    HAS_BLED_SCR_MG_DL,
+    MAGIC_ANSWER_KEYS,
+    NOAC_DRUGS,
+    PCE_DOMAIN,
+    SCORE2_REGION_MULT,
+    SCORE2_RISK_REGION,
+    abcd2_score,
+    aha_very_high_risk,
+    build_nihss_component_text,
+    chads_vasc_score,
+    cockcroft_gault_crcl,
+    elan_overall_severity,
+    elan_severity_for_lesion,
+    esc_risk_category_from_score2,
+    has_bled_score,
+    magic_result_from_answers,
+    noac_dose_apixaban,
+    noac_dose_dabigatran,
+    noac_dose_edoxaban,
+    noac_dose_rivaroxaban,
+    pce_10y_risk_percent,
+    score2_estimate_percent,
+)
+from client_scores import CLIENT_SCORE_RULES_JS, CLIENT_SCORES, NIHSS_FIELDS, rule_total, score_spec
+from codes import (
+    ELAN_SEVERITY_LABELS,
+    ESC_CATEGORY_LABELS,
+    MAGIC_LABELS,
+    NOAC_DOSE_RESULTS,
+    decode,
+)
+from incremental import score_cohort_incremental
+from kernels import (
+    abcd2_score_np,
+    aha_very_high_risk_np,
+    chads_vasc_score_np,
+    cockcroft_gault_crcl_np,
+    elan_lesion_severity_code_np,
+    elan_overall_code_np,
+    esc_risk_category_code_np,
+    has_bled_score_np,
+    magic_result_code_np,
+    noac_dose_apixaban_np,
+    noac_dose_dabigatran_np,
+    noac_dose_edoxaban_np,
+    noac_dose_rivaroxaban_np,
+    pce_10y_risk_percent_np,
+    score2_estimate_percent_np,
+)
+from registry import REGISTRY
+
+
+# =========================================================
+# 스칼라 ↔ 고속 경로 차등 검사(differential fuzz)
+# - 계산기마다 무작위 입력과 경계값(CrCl 15/30/50/95, 체중 60, Cr 1.5, 나이 65/75/80 등과 그 바로 위·아래 값)을 섞어 만들고,
+#   calculators.py 스칼라 함수(기준)와 벡터 커널/코드표/batch/증분 캐시 경로의 결과를 비교합니다.
+# - 스칼라 함수는 같은 입력 조합에 한 번만 호출합니다. 범주형 입력은 조합 수가 작아 수백만 행도 몇 초 안에 끝납니다.
+# - 불일치가 있으면 첫 행의 입력을 하나씩 더 단순한 값(False, 첫 선택지, 정수, 가까운 경계값)으로 바꿔 보며
+#   불일치가 유지되는 입력을 재현 호출로 출력합니다. 불일치가 하나라도 있으면 종료 코드는 1입니다.
+# =========================================================
+# 항목당 기본 행 수(전체 약 340만 입력, 커밋마다 돌릴 수 있는 크기). 더 길게 돌릴 때는 -n을 늘립니다.
+DEFAULT_ROWS = 200_000
+# 입력 중 경계값 목록에서 고르는 비율(나머지는 범위 안 무작위)
+BOUNDARY_FRACTION = 0.3
+# 실수 결과 허용 오차. PCE처럼 1 - S0^x 꼴은 위험도가 0에 가까우면 상대 오차가 커지므로 절대 오차도 둡니다.
+FLOAT_RTOL = 1e-9
+FLOAT_ATOL = 1e-9
+
+AGE_BOUNDARIES = (60, 65, 75, 80)
+WEIGHT_BOUNDARIES = (60,)
+SCR_BOUNDARIES = (1.5, HAS_BLED_SCR_MG_DL)
+CRCL_BOUNDARIES = (15, 30, 50, 95)
+SBP_BOUNDARIES = (120, 140, 160)
+DURATION_BOUNDARIES = (10, 59, 60)
+SCORE2_BOUNDARIES = (2, 10, 20)
+
+
+# 생성기: gen(rng, n) → 배열, gen.simpler: 재현 입력을 줄일 때 시도할 값, gen.complexity(v): 작을수록 단순한 값
+class _Bools:
+    dtype = bool
+    simpler = (False,)
+
+    def __call__(self, rng, n):
+        return rng.random(n) < 0.5
+
+    def complexity(self, v):
+        return int(bool(v))
+
+
+class _Choice:
+    dtype = object
+
+    def __init__(self, values):
+        self.values = list(values)
+        self.simpler = self.values[:1]
+
+    def __call__(self, rng, n):
+        out = np.empty(n, dtype=object)
+        out[:] = [self.values[i] for i in rng.integers(0, len(self.values), n)]
+        return out
+
+    def complexity(self, v):
+        return self.values.index(v) if v in self.values else len(self.values)
+
+
+class _Numbers:
+    dtype = np.float64
+
+    def __init__(self, lo, hi, boundaries=(), step=None):
+        # boundaries는 그 값과 바로 위·아래 부동소수점 값을 함께 씁니다. step이 있으면 무작위 값을 그 간격으로 반올림합니다.
+        self.lo, self.hi, self.step = lo, hi, step
+        b = np.asarray(boundaries, dtype=np.float64)
+        self.boundaries = np.concatenate([b, np.nextafter(b, -np.inf), np.nextafter(b, np.inf)]) if b.size else b
+        self.simpler = tuple(float(x) for x in boundaries)
+
+    def __call__(self, rng, n):
+        out = rng.uniform(self.lo, self.hi, n)
+        if self.step:
+            out = np.round(out / self.step) * self.step
+        if self.boundaries.size:
+            pick = rng.random(n) < BOUNDARY_FRACTION
+            out[pick] = rng.choice(self.boundaries, int(pick.sum()))
+        return out
+
+    def complexity(self, v):
+        # 경계값(목록 순서) < 정수 < 소수 첫째 자리 < 그 밖의 값
+        k = len(self.simpler)
+        if _missing(v):
+            return k + 3
+        if v in self.simpler:
+            return self.simpler.index(v)
+        if v == round(v):
+            return k
+        return k + 1 if v == round(v, 1) else k + 2
+
+
+class _Ints:
+    dtype = np.int64
+    simpler = (0,)
+
+    def __init__(self, lo, hi):
+        self.lo, self.hi = lo, hi
+
+    def __call__(self, rng, n):
+        return rng.integers(self.lo, self.hi + 1, n)
+
+    def complexity(self, v):
+        return abs(v)
+
+
+def _missing(x):
+    return x is None or x != x
+
+
+def _or_none(x):
+    return None if _missing(x) else x
+
+
+def _labels(table, codes) -> np.ndarray:
+    # 코드 → 문구(MISSING은 None)
+    return decode(table, codes)
+
+
+def _noac_results(drug: str, dose_class) -> np.ndarray:
+    # 용량 class → 스칼라 함수와 같은 (dose, 근거) tuple
+    results = np.empty(len(NOAC_DOSE_RESULTS[drug]) + 1, dtype=object)
+    results[:-1] = list(NOAC_DOSE_RESULTS[drug])
+    return results[np.asarray(dose_class, dtype=np.int64)]
+
+
+# ---------- 코호트(batch.score_cohort / incremental 캐시) ----------
+_SEXES = ["Male", "Female"]
+_RACES = ["White", "African American"]
+COHORT_ARGS = {
+    "age": _Numbers(18, 100, AGE_BOUNDARIES, step=0.5),
+    "sex": _Choice(_SEXES),
+    "race": _Choice(_RACES),
+    "weight_kg": _Numbers(35, 130, WEIGHT_BOUNDARIES, step=0.1),
+    "scr_mg_dl": _Numbers(0.3, 6, SCR_BOUNDARIES, step=0.01),
+    "tc": _Numbers(100, 320, step=1),
+    "hdl": _Numbers(20, 100, step=1),
+    "sbp": _Numbers(90, 210, SBP_BOUNDARIES, step=1),
+    **{k: _Bools() for k in (
+        "bp_treated", "smoker", "diabetes", "htn", "chf", "stroke_tia", "vascular",
+        "renal_disease", "liver_disease", "bleeding_history", "labile_inr", "bleeding_drugs", "alcohol_excess",
+    )},
+}
+
+
+def _cohort_scalar(age, sex, race, weight_kg, scr_mg_dl, tc, hdl, sbp, bp_treated, smoker, diabetes, htn, chf,
+                   stroke_tia, vascular, renal_disease, liver_disease, bleeding_history, labile_inr, bleeding_drugs,
+                   alcohol_excess):
+    female = sex == "Female"
+    crcl = cockcroft_gault_crcl(age, weight_kg, scr_mg_dl, female)
+    score2 = score2_estimate_percent(age, "여성" if female else "남성", smoker, sbp, tc - hdl, SCORE2_RISK_REGION)
+    return (
+        crcl,
+        noac_dose_apixaban(age, weight_kg, scr_mg_dl),
+        noac_dose_rivaroxaban(crcl),
+        noac_dose_edoxaban(crcl, weight_kg),
+        noac_dose_dabigatran(crcl, age),
+        chads_vasc_score(chf, htn, age, diabetes, stroke_tia, vascular, female),
+        has_bled_score(sbp > 160, renal_disease or scr_mg_dl >= HAS_BLED_SCR_MG_DL, liver_disease, stroke_tia,
+                       bleeding_history, labile_inr, age > 65, bleeding_drugs, alcohol_excess),
+        pce_10y_risk_percent(sex, race, age, tc, hdl, sbp, bp_treated, smoker, diabetes),
+        score2,
+        esc_risk_category_from_score2(score2),
+    )
+
+
+def _cohort_rows(result: pd.DataFrame) -> np.ndarray:
+    # score_cohort 결과 → _cohort_scalar와 같은 tuple
+    columns = [result["crcl"].to_numpy()]
+    for drug in NOAC_DRUGS:
+        d = drug.lower()
+        doses = _labels("noac_dose", result[f"{d}_dose"])
+        reasons = _labels("noac_reason", result[f"{d}_reason"])
+        columns.append([(a, b) if a is not None else None for a, b in zip(doses, reasons)])
+    columns += [
+        result["chads_vasc"].to_numpy(), result["has_bled"].to_numpy(),
+        result["pce_risk"].to_numpy(), result["score2"].to_numpy(),
+        _labels("esc_category", result["esc_category"]),
+    ]
+    out = np.empty(len(result), dtype=object)
+    out[:] = list(zip(*columns))
+    return out
+
+
+def _cohort_frame(columns: dict) -> pd.DataFrame:
+    df = pd.DataFrame(columns)
+    df.insert(0, "patient_id", [f"F{i}" for i in range(len(df))])
+    return df
+
+
+def _cohort_fast(**columns):
+    return _cohort_rows(score_cohort(_cohort_frame(columns)))
+
+
+def _cohort_cached(**columns):
+    # 증분 계산: 빈 보관소로 한 번 계산해 채운 뒤, 두 번째(전부 캐시 적중) 결과를 비교합니다.
+    df = _cohort_frame(columns)
+    with tempfile.TemporaryDirectory() as store:
+        score_cohort_incremental(df, store)
+        result, _ = score_cohort_incremental(df, store)
+    return _cohort_rows(result)
+
+
+def _nihss_total(**items):
+    # 서버 경로(app.py)가 의무기록에 남기는 총점: build_nihss_component_text의 "NIHSS total" 줄
+    return int(build_nihss_component_text(items).rsplit("NIHSS total: ", 1)[1])
+
+
+# 브라우저 계산: 화면 컴포넌트와 같은 규칙 해석 JS(client_score_rules.js)를 node로 실행합니다(node가 없으면 [js] 항목을 뺍니다).
+NODE = shutil.which("node")
+# stdin: {"rules", "rows": [행마다 score_spec의 fields]} → stdout: 총점 목록. 초기값 만들기는 컴포넌트(app.py)와 같습니다.
+_NODE_DRIVER = """
+const { rules, rows } = JSON.parse(require("fs").readFileSync(0, "utf8"));
+const totals = rows.map((fields) => scoreTotal(rules, Object.fromEntries(fields.map((f) => [f.name, f.value]))));
+process.stdout.write(JSON.stringify(totals));
+"""
+
+
+def _js_totals(name: str):
+    # 행마다 세션 값으로 score_spec을 만들고(브라우저가 받는 JSON 그대로) node에서 총점을 냅니다.
+    keys = {f.name: f.key for f in CLIENT_SCORES[name][1]}
+
+    def fast(**columns):
+        specs = [score_spec(name, {keys[k]: v for k, v in zip(columns, row)})
+                 for row in zip(*(c.tolist() for c in columns.values()))]
+        payload = {"rules": specs[0]["rules"],
+                   "rows": [[{"name": f["name"], "value": f["value"]} for f in spec["fields"]] for spec in specs]}
+        done = subprocess.run([NODE, "-e", CLIENT_SCORE_RULES_JS + _NODE_DRIVER], input=json.dumps(payload),
+                              capture_output=True, text=True, encoding="utf-8", check=True)
+        return json.loads(done.stdout)
+
+    return fast
+
+
+# =========================================================
+# 검사 항목
+# - args: 인자 이름 → 생성기, scalar(**인자) → 기준 값, fast(**배열) → 같은 형식의 배열
+# - rtol/atol: 실수 결과의 허용 오차(없으면 FLOAT_RTOL/FLOAT_ATOL), rows: 기본 행 수 대비 비율(느린 항목)
+# =========================================================
+_ANSWER = _Choice([None, True, False])
+_LESION = _Ints(-1, len(ELAN_SEVERITY_LABELS) - 1)  # -1은 병변 없음
+
+CASES = {
+    "chads_vasc_score": {
+        "args": {"chf": _Bools(), "htn": _Bools(), "age": _Numbers(18, 100, AGE_BOUNDARIES), "dm": _Bools(),
+                 "stroke_tia": _Bools(), "vascular": _Bools(), "female": _Bools()},
+        "scalar": chads_vasc_score,
+        "fast": chads_vasc_score_np,
+    },
+    "has_bled_score": {
+        "args": {k: _Bools() for k in ("htn_sbp_gt160", "renal", "liver", "stroke", "bleed", "inr_labile",
+                                        "age_gt65", "drugs", "alcohol")},
+        "scalar": has_bled_score,
+        "fast": has_bled_score_np,
+    },
+    "abcd2_score": {
+        "args": {"age_ge_60": _Bools(), "bp_ge_140_90": _Bools(), "unilateral_weakness": _Bools(),
+                 "speech_without_weakness": _Bools(), "duration_min": _Numbers(0, 240, DURATION_BOUNDARIES + (59.5,)),
+                 "diabetes": _Bools()},
+        "scalar": abcd2_score,
+        "fast": abcd2_score_np,
+    },
+    # 브라우저 계산(client_scores 규칙표)은 같은 표의 NumPy 구현(rule_total)과, 아래 [js] 항목에서 실제 JS(node)로 검사합니다
+    # (화면 입력은 정수 나이/지속 시간). NIHSS 기준은 서버 경로가 의무기록에 쓰는 총점입니다.
+    "client_scores.chads_vasc": {
+        "args": {"chf": _Bools(), "htn": _Bools(), "age": _Ints(18, 100), "dm": _Bools(), "stroke_tia": _Bools(),
+                 "vascular": _Bools(), "sex": _Choice(_SEXES)},
+        "scalar": REGISTRY["chads_vasc"].scalar,
+        "fast": lambda **a: rule_total("chads_vasc", a),
+    },
+    "client_scores.abcd2": {
+        "args": {"age_ge_60": _Bools(), "bp_ge_140_90": _Bools(), "unilateral_weakness": _Bools(),
+                 "speech_without_weakness": _Bools(), "duration_min": _Ints(0, 240), "diabetes": _Bools()},
+        "scalar": abcd2_score,
+        "fast": lambda **a: rule_total("abcd2", a),
+    },
+    "client_scores.has_bled": {
+        "args": {f.name: _Bools() for f in REGISTRY["has_bled"].inputs},
+        "scalar": has_bled_score,
+        "fast": lambda **a: rule_total("has_bled", a),
+    },
+    "client_scores.nihss": {
+        "args": {f.name: _Ints(f.min, f.max) for f in NIHSS_FIELDS},
+        "scalar": _nihss_total,
+        "fast": lambda **a: rule_total("nihss", a),
+    },
+    "cockcroft_gault_crcl": {
+        "args": {"age": _Numbers(18, 100, AGE_BOUNDARIES), "weight_kg": _Numbers(35, 130, WEIGHT_BOUNDARIES),
+                 "scr_mg_dl": _Numbers(-0.5, 6, SCR_BOUNDARIES + (0,)), "female": _Bools()},
+        "scalar": cockcroft_gault_crcl,
+        "fast": cockcroft_gault_crcl_np,
+    },
+    "noac_dose_apixaban": {
+        "args": {"age": _Numbers(18, 100, AGE_BOUNDARIES), "weight_kg": _Numbers(35, 130, WEIGHT_BOUNDARIES),
+                 "scr_mg_dl": _Numbers(0.3, 6, SCR_BOUNDARIES)},
+        "scalar": noac_dose_apixaban,
+        "fast": lambda **a: _noac_results("Apixaban", noac_dose_apixaban_np(**a)),
+    },
+    "noac_dose_rivaroxaban": {
+        "args": {"crcl": _Numbers(0, 150, CRCL_BOUNDARIES + (np.nan,))},
+        "scalar": lambda crcl: noac_dose_rivaroxaban(_or_none(crcl)),
+        "fast": lambda crcl: _noac_results("Rivaroxaban", noac_dose_rivaroxaban_np(crcl)),
+    },
+    "noac_dose_edoxaban": {
+        "args": {"crcl": _Numbers(0, 150, CRCL_BOUNDARIES + (np.nan,)),
+                 "weight_kg": _Numbers(35, 130, WEIGHT_BOUNDARIES)},
+        "scalar": lambda crcl, weight_kg: noac_dose_edoxaban(_or_none(crcl), weight_kg),
+        "fast": lambda **a: _noac_results("Edoxaban", noac_dose_edoxaban_np(**a)),
+    },
+    "noac_dose_dabigatran": {
+        "args": {"crcl": _Numbers(0, 150, CRCL_BOUNDARIES + (np.nan,)), "age": _Numbers(18, 100, AGE_BOUNDARIES)},
+        "scalar": lambda crcl, age: noac_dose_dabigatran(_or_none(crcl), age),
+        "fast": lambda **a: _noac_results("Dabigatran", noac_dose_dabigatran_np(**a)),
+    },
+    "pce_10y_risk_percent": {
+        # 검증 범위(PCE_DOMAIN) 안팎과 양 끝을 모두 넣습니다(범위 밖은 두 경로 모두 결측).
+        "args": {"sex": _Choice(_SEXES + ["Other"]), "race": _Choice(_RACES + ["Asian"]),
+                 "age": _Numbers(-5, 90, (0,) + PCE_DOMAIN["age"]), "tc": _Numbers(-10, 350, (0,) + PCE_DOMAIN["tc"]),
+                 "hdl": _Numbers(-5, 120, (0,) + PCE_DOMAIN["hdl"]),
+                 "sbp": _Numbers(-10, 220, (0,) + PCE_DOMAIN["sbp"] + SBP_BOUNDARIES), "bp_treated": _Bools(),
+                 "smoker": _Bools(), "diabetes": _Bools()},
+        "scalar": pce_10y_risk_percent,
+        "fast": pce_10y_risk_percent_np,
+    },
+    "pce_10y_risk_percent[float32]": {
+        "args": {"sex": _Choice(_SEXES), "race": _Choice(_RACES), "age": _Numbers(*PCE_DOMAIN["age"], PCE_DOMAIN["age"]),
+                 "tc": _Numbers(*PCE_DOMAIN["tc"], PCE_DOMAIN["tc"]), "hdl": _Numbers(*PCE_DOMAIN["hdl"], PCE_DOMAIN["hdl"]),
+                 "sbp": _Numbers(*PCE_DOMAIN["sbp"], PCE_DOMAIN["sbp"] + SBP_BOUNDARIES),
+                 "bp_treated": _Bools(), "smoker": _Bools(), "diabetes": _Bools()},
+        "scalar": pce_10y_risk_percent,
+        "fast": lambda **a: pce_10y_risk_percent_np(**a, dtype=np.float32).astype(np.float64),
+        "atol": 0.005,  # %p; batch_plan이 메모리가 부족할 때 고르는 경로
+    },
+    "score2_estimate_percent": {
+        "args": {"age": _Numbers(18, 100, AGE_BOUNDARIES), "sex": _Choice(["남성", "여성"]), "smoker": _Bools(),
+                 "sbp": _Numbers(90, 210, SBP_BOUNDARIES), "non_hdl": _Numbers(30, 300),
+                 "risk_region": _Choice(list(SCORE2_REGION_MULT) + ["Unknown"])},
+        "scalar": score2_estimate_percent,
+        "fast": score2_estimate_percent_np,
+    },
+    "esc_risk_category_from_score2": {
+        "args": {"score2_percent": _Numbers(0, 50, SCORE2_BOUNDARIES)},
+        "scalar": esc_risk_category_from_score2,
+        "fast": lambda score2_percent: np.asarray(ESC_CATEGORY_LABELS, dtype=object)[
+            esc_risk_category_code_np(score2_percent)],
+    },
+    "aha_very_high_risk": {
+        "args": {"major_events_count": _Ints(0, 4), "high_risk_conditions_count": _Ints(0, 6)},
+        "scalar": aha_very_high_risk,
+        "fast": aha_very_high_risk_np,
+    },
+    "elan_severity_for_lesion": {
+        "args": {"circ": _Choice(ELAN_CIRCULATIONS + [None]), "size_gt_1_5": _Bools(),
+                 "anterior_pattern": _Choice(ELAN_ANTERIOR_PATTERNS + [None]),
+                 "posterior_site": _Choice(ELAN_POSTERIOR_SITES + [None]), "anterior_multiterritory": _Bools(),
+                 "anterior_major_pattern": _Choice(ELAN_ANTERIOR_MAJOR_PATTERNS + [None])},
+        "scalar": elan_severity_for_lesion,
+        "fast": lambda **a: _labels("elan_severity", elan_lesion_severity_code_np(
+            a["circ"], a["size_gt_1_5"], a["anterior_pattern"], a["posterior_site"], a["anterior_multiterritory"],
+            a["anterior_major_pattern"])),
+    },
+    "elan_overall_severity": {
+        # 병변 1개는 항상 있고 나머지는 없을 수 있습니다(-1).
+        "args": {"lesion_1": _Ints(0, len(ELAN_SEVERITY_LABELS) - 1),
+                 **{f"lesion_{i}": _LESION for i in range(2, ELAN_MAX_LESIONS + 1)}},
+        "scalar": lambda **a: elan_overall_severity([ELAN_SEVERITY_LABELS[c] for c in a.values() if c >= 0]),
+        "fast": lambda **a: _labels("elan_severity", elan_overall_code_np(
+            *(sum(np.asarray(c) == k for c in a.values()) for k in range(len(ELAN_SEVERITY_LABELS))))),
+    },
+    "magic_result_from_answers": {
+        # None은 답하지 않은 질문(dict에 키 없음)입니다.
+        "args": {k: _ANSWER for k in MAGIC_ANSWER_KEYS},
+        "scalar": lambda **a: magic_result_from_answers({k: v for k, v in a.items() if v is not None}),
+        "fast": lambda **a: np.asarray(MAGIC_LABELS, dtype=object)[
+            magic_result_code_np(*(np.asarray(v == True, dtype=bool) for v in a.values()))],  # noqa: E712
+    },
+    "batch.score_cohort": {
+        "args": COHORT_ARGS,
+        "scalar": _cohort_scalar,
+        "fast": _cohort_fast,
+        "rows": 0.1,
+    },
+    "incremental.score_cohort_incremental": {
+        "args": COHORT_ARGS,
+        "scalar": _cohort_scalar,
+        "fast": _cohort_cached,
+        "rows": 0.02,
+    },
+}
+
+# [js]: 같은 입력을 세션 값으로 넣어 score_spec → 실제 JS 규칙 해석(node, _js_totals) 결과를 스칼라 함수와 비교합니다.
+# 행마다 score_spec을 만들므로 행 수를 줄입니다. 항목 순서(seed)가 바뀌지 않도록 끝에 붙입니다.
+for _name in CLIENT_SCORES if NODE else ():
+    CASES[f"client_scores.{_name}[js]"] = {**CASES[f"client_scores.{_name}"], "fast": _js_totals(_name), "rows": 0.05}
+
+
+# =========================================================
+# 실행 / 비교 / 재현 입력 줄이기
+# =========================================================
+def _same(a, b, rtol: float, atol: float) -> bool:
+    if isinstance(a, tuple) or isinstance(b, tuple):
+        return (isinstance(a, tuple) and isinstance(b, tuple) and len(a) == len(b)
+                and all(_same(x, y, rtol, atol) for x, y in zip(a, b)))
+    if _missing(a) or _missing(b):
+        return _missing(a) and _missing(b)
+    if isinstance(a, str) or isinstance(b, str):
+        return a == b
+    if isinstance(a, (float, np.floating)) or isinstance(b, (float, np.floating)):
+        return abs(float(a) - float(b)) <= atol + rtol * abs(float(a))
+    return a == b
+
+
+def _call_scalar(fn, kwargs: dict):
+    # 스칼라 함수가 예외를 내면 그 자체를 결과로 보고 비교합니다(고속 경로는 예외 없이 값을 냅니다).
+    try:
+        return fn(**kwargs)
+    except Exception as e:
+        return f"{type(e).__name__}: {e}"
+
+
+def scalar_values(fn, columns: dict) -> np.ndarray:
+    names = list(columns)
+    cache = {}
+    out = np.empty(len(next(iter(columns.values()))), dtype=object)
+    for i, row in enumerate(zip(*(c.tolist() for c in columns.values()))):
+        value = cache.get(row, cache)
+        if value is cache:
+            value = cache[row] = _call_scalar(fn, dict(zip(names, row)))
+        out[i] = value
+    return out
+
+
+def fast_values(fn, columns: dict) -> np.ndarray:
+    # 경계 입력(0 바로 위 등)의 overflow/0 나눗셈 경고는 의도한 것이므로 끕니다.
+    with np.errstate(all="ignore"):
+        values = np.asarray(fn(**columns))
+    return values if values.dtype == object else values.astype(object)
+
+
+def mismatches(case: dict, expected: np.ndarray, actual: np.ndarray) -> np.ndarray:
+    # 대부분은 == 한 번으로 걸러지고, 다른 행만 허용 오차로 다시 봅니다.
+    rtol, atol = case.get("rtol", FLOAT_RTOL), case.get("atol", FLOAT_ATOL)
+    differ = np.flatnonzero(~(expected == actual).astype(bool))
+    return np.array([i for i in differ if not _same(expected[i], actual[i], rtol, atol)], dtype=np.int64)
+
+
+def _single(gen, value) -> np.ndarray:
+    out = np.empty(1, dtype=gen.dtype)
+    out[0] = value
+    return out
+
+
+def check_row(case: dict, row: dict):
+    # 반환: 불일치면 (스칼라 결과, 고속 결과), 같으면 None
+    expected = _call_scalar(case["scalar"], row)
+    try:
+        actual = fast_values(case["fast"], {k: _single(g, row[k]) for k, g in case["args"].items()})[0]
+    except Exception as e:
+        actual = f"{type(e).__name__}: {e}"
+    if _same(expected, actual, case.get("rtol", FLOAT_RTOL), case.get("atol", FLOAT_ATOL)):
+        return None
+    return expected, actual
+
+
+def minimize(case: dict, row: dict) -> dict:
+    # 인자마다 더 단순한 값으로 바꿔도 불일치가 남으면 바꿉니다. 단순도가 줄어들 때만 바꾸므로 반드시 끝납니다.
+    changed = True
+    while changed:
+        changed = False
+        for name, gen in case["args"].items():
+            value = row[name]
+            candidates = list(gen.simpler)
+            if isinstance(value, float) and not _missing(value):
+                candidates += [float(round(value)), round(value, 1)]
+            for candidate in sorted(candidates, key=gen.complexity):
+                if gen.complexity(candidate) >= gen.complexity(value):
+                    break
+                trial = {**row, name: candidate}
+                if check_row(case, trial):
+                    row, changed = trial, True
+                    break
+    return row
+
+
+def run_case(name: str, case: dict, rows: int, rng) -> dict:
+    n = max(1, int(rows * case.get("rows", 1.0)))
+    started = time.perf_counter()
+    columns = {k: gen(rng, n) for k, gen in case["args"].items()}
+    expected = scalar_values(case["scalar"], columns)
+    actual = fast_values(case["fast"], columns)
+    bad = mismatches(case, expected, actual)
+    result = {"case": name, "rows": n, "mismatches": len(bad), "seconds": time.perf_counter() - started}
+    if len(bad):
+        first = {k: c[bad[0]].item() if hasattr(c[bad[0]], "item") else c[bad[0]] for k, c in columns.items()}
+        row = minimize(case, first)
+        result["reproducer"] = row
+        result["outputs"] = check_row(case, row) or (expected[bad[0]], actual[bad[0]])
+    return result
+
+
+def format_call(name: str, row: dict) -> str:
+    return f"{name.split('[')[0]}({', '.join(f'{k}={v!r}' for k, v in row.items())})"
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="계산기 스칼라 함수와 고속 경로(벡터/코드표/batch/캐시)의 결과를 무작위·경계 입력으로 비교합니다.")
+    parser.add_argument("cases", nargs="*", help="검사할 항목(이름 일부, 생략 시 전체)")
+    parser.add_argument("-n", "--rows", type=int, default=DEFAULT_ROWS, help="항목당 입력 행 수")
+    parser.add_argument("--seed", type=int, default=None, help="난수 seed(생략 시 무작위, 실행마다 출력)")
+    parser.add_argument("--list", action="store_true", help="항목 목록만 출력합니다.")
+    args = parser.parse_args(argv)
+
+    if args.list:
+        print("\n".join(CASES))
+        return 0
+    names = [c for c in CASES if not args.cases or any(q in c for q in args.cases)]
+    if not names:
+        parser.error(f"해당하는 항목이 없습니다: {', '.join(args.cases)}")
+    seed = args.seed if args.seed is not None else int(np.random.SeedSequence().entropy % 2**32)
+    print(f"seed {seed}", flush=True)
+    if NODE is None:
+        print("node가 없어 client_scores.*[js] 항목은 건너뜁니다.", flush=True)
+
+    failed = 0
+    for i, name in enumerate(names):
+        # 항목마다 seed에서 갈라진 난수열을 써서, 항목 일부만 다시 실행해도 같은 입력이 나옵니다.
+        rng = np.random.default_rng([seed, list(CASES).index(name)])
+        r = run_case(name, CASES[name], args.rows, rng)
+        print(f"{name:<40} {r['rows']:>10,}행 {r['seconds']:6.1f}초  불일치 {r['mismatches']:,}", flush=True)
+        if r["mismatches"]:
+            failed += 1
+            expected, actual = r["outputs"]
+            print(f"  재현: {format_call(name, r['reproducer'])}")
+            print(f"    스칼라: {expected!r}")
+            print(f"    고속:   {actual!r}")
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,214 @@
+import bisect
+import threading
+from datetime import datetime, timedelta, timezone
+
+import numpy as np
+
+from calculators import SEVERITY_ORDER, elan_recommendation
+
+
+# =========================================================
+# ELAN 기반 DOAC 시작 일정(병동 단위)
+# - 기준 시각은 증상 발생 시각(onset)이며, onset 미상이면 입원 시각을 사용합니다.
+# - Minor/Moderate: 기준 시각 후 48시간 이내
+# - Major: day 6–7 (기준 시각 후 120–168시간)
+# =========================================================
+ELAN_WINDOW_HOURS = {
+    "Minor": (0, 48),
+    "Moderate": (0, 48),
+    "Major": (120, 168),
+}
+
+_EPOCH = datetime(1970, 1, 1)
+
+# admit()의 onset/admission 기본값: 기존 환자의 값을 그대로 둡니다(None은 '미상'으로 바꾸는 것입니다).
+_KEEP = object()
+
+# severity 코드(SEVERITY_ORDER 값)로 바로 인덱싱하는 offset 표(초 단위)
+_START_S = np.zeros(max(SEVERITY_ORDER.values()) + 1, dtype=np.int64)
+_END_S = np.zeros(max(SEVERITY_ORDER.values()) + 1, dtype=np.int64)
+for _sev, (_h0, _h1) in ELAN_WINDOW_HOURS.items():
+    _START_S[SEVERITY_ORDER[_sev]] = _h0 * 3600
+    _END_S[SEVERITY_ORDER[_sev]] = _h1 * 3600
+
+
+def severity_codes(severities) -> np.ndarray:
+    # 문자열 배열 -> SEVERITY_ORDER 코드 (고유값에 대해서만 dict 조회)
+    arr = np.asarray(severities, dtype=object)
+    uniq, inv = np.unique(arr, return_inverse=True)
+    return np.array([SEVERITY_ORDER[x] for x in uniq], dtype=np.int64)[inv].reshape(arr.shape)
+
+
+def doac_windows(onsets, admissions, severities):
+    # 환자 전체에 대해 (anchor, window start, window end)를 datetime64[s] 배열로 계산합니다.
+    onset = np.asarray(onsets, dtype="datetime64[s]")
+    admission = np.asarray(admissions, dtype="datetime64[s]")
+    anchor = np.where(np.isnat(onset), admission, onset)
+    codes = severity_codes(severities)
+    start = anchor + _START_S[codes].astype("timedelta64[s]")
+    end = anchor + _END_S[codes].astype("timedelta64[s]")
+    return anchor, start, end
+
+
+def _to_seconds(dt: datetime) -> int:
+    return int((dt - _EPOCH).total_seconds())
+
+
+def _from_seconds(s: int) -> datetime:
+    return _EPOCH + timedelta(seconds=int(s))
+
+
+def _ics_escape(text: str) -> str:
+    return text.replace("\\", "\\\\").replace(";", "\\;").replace(",", "\\,").replace("\n", "\\n")
+
+
+class DoacScheduler:
+    # 현재 입원 환자의 DOAC 시작 창을 시작 시각 순으로 정렬해 유지합니다.
+    # _keys는 (window start 초, patient_id)의 정렬 리스트이며 bisect로 범위 조회합니다.
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._entries = {}
+        self._keys = []
+
+    def __len__(self):
+        return len(self._entries)
+
+    def __contains__(self, patient_id):
+        return patient_id in self._entries
+
+    def _drop_key(self, patient_id):
+        old = self._entries.get(patient_id)
+        if old is None:
+            return
+        key = (old["start_s"], patient_id)
+        i = bisect.bisect_left(self._keys, key)
+        if i < len(self._keys) and self._keys[i] == key:
+            del self._keys[i]
+
+    def _put(self, entry: dict):
+        self._drop_key(entry["patient_id"])
+        self._entries[entry["patient_id"]] = entry
+        bisect.insort(self._keys, (entry["start_s"], entry["patient_id"]))
+
+    def admit(self, patient_id: str, severity: str, onset=_KEEP, admission=_KEEP):
+        # 신규 입원 또는 기존 환자 갱신(upsert)
+        # onset/admission: datetime, None(미상) 또는 생략(기존 값 유지, 신규 환자면 미상)
+        if severity not in SEVERITY_ORDER:
+            raise ValueError(f"알 수 없는 ELAN severity입니다: {severity}")
+        with self._lock:
+            prev = self._entries.get(patient_id, {})
+            onset = prev.get("onset") if onset is _KEEP else onset
+            admission = prev.get("admission") if admission is _KEEP else admission
+            anchor = onset if onset is not None else admission
+            if anchor is None:
+                raise ValueError("onset 또는 입원 시각 중 하나는 필요합니다.")
+            h0, h1 = ELAN_WINDOW_HOURS[severity]
+            start_s = _to_seconds(anchor) + h0 * 3600
+            self._put(
+                {
+                    "patient_id": patient_id,
+                    "severity": severity,
+                    "onset": onset,
+                    "admission": admission,
+                    "anchor": anchor,
+                    "start_s": start_s,
+                    "end_s": _to_seconds(anchor) + h1 * 3600,
+                }
+            )
+
+    def reclassify(self, patient_id: str, severity: str):
+        if patient_id not in self._entries:
+            raise KeyError(patient_id)
+        self.admit(patient_id, severity)
+
+    def remove(self, patient_id: str):
+        # DOAC 시작 완료 또는 퇴원 시 일정에서 제외합니다.
+        with self._lock:
+            self._drop_key(patient_id)
+            self._entries.pop(patient_id, None)
+
+    def load(self, patient_ids, severities, onsets, admissions):
+        # 병동 전체 일괄 적재: 창 계산은 벡터화, 정렬은 한 번만 수행합니다.
+        anchor, start, end = doac_windows(onsets, admissions, severities)
+        if np.isnat(anchor).any():
+            raise ValueError("onset 또는 입원 시각 중 하나는 필요합니다.")
+        anchor_s = anchor.astype(np.int64)
+        start_s = start.astype(np.int64)
+        end_s = end.astype(np.int64)
+        onset = np.asarray(onsets, dtype="datetime64[s]")
+        admission = np.asarray(admissions, dtype="datetime64[s]")
+        with self._lock:
+            for i, pid in enumerate(patient_ids):
+                self._entries[pid] = {
+                    "patient_id": pid,
+                    "severity": severities[i],
+                    "onset": None if np.isnat(onset[i]) else onset[i].astype(object),
+                    "admission": None if np.isnat(admission[i]) else admission[i].astype(object),
+                    "anchor": _from_seconds(anchor_s[i]),
+                    "start_s": int(start_s[i]),
+                    "end_s": int(end_s[i]),
+                }
+            self._keys = sorted((e["start_s"], pid) for pid, e in self._entries.items())
+
+    def _row(self, entry: dict, now_s: int = None) -> dict:
+        row = {
+            "patient_id": entry["patient_id"],
+            "severity": entry["severity"],
+            "recommendation": elan_recommendation(entry["severity"]),
+            "anchor": entry["anchor"],
+            "window_start": _from_seconds(entry["start_s"]),
+            "window_end": _from_seconds(entry["end_s"]),
+        }
+        if now_s is not None:
+            if now_s > entry["end_s"]:
+                row["status"] = "overdue"
+            elif now_s >= entry["start_s"]:
+                row["status"] = "open"
+            else:
+                row["status"] = "upcoming"
+        return row
+
+    def due_between(self, t0: datetime, t1: datetime) -> list:
+        # window start가 [t0, t1) 구간에 있는 환자
+        with self._lock:
+            lo = bisect.bisect_left(self._keys, (_to_seconds(t0),))
+            hi = bisect.bisect_left(self._keys, (_to_seconds(t1),))
+            return [self._row(self._entries[pid]) for _, pid in self._keys[lo:hi]]
+
+    def due_within(self, now: datetime, hours: float = 12) -> list:
+        # 지금부터 hours 이내에 창이 열리거나 이미 열려 있는(미시작) 환자, 시작 시각 순
+        now_s = _to_seconds(now)
+        with self._lock:
+            hi = bisect.bisect_left(self._keys, (now_s + int(hours * 3600) + 1,))
+            return [self._row(self._entries[pid], now_s) for _, pid in self._keys[:hi]]
+
+    def rows(self) -> list:
+        with self._lock:
+            return [self._row(self._entries[pid]) for _, pid in self._keys]
+
+    def to_ics(self) -> str:
+        stamp = datetime.now(timezone.utc).strftime("%Y%m%dT%H%M%SZ")
+        lines = [
+            "BEGIN:VCALENDAR",
+            "VERSION:2.0",
+            "PRODID:-//Stroke Helper//ELAN DOAC schedule//KO",
+            "CALSCALE:GREGORIAN",
+        ]
+        for row in self.rows():
+            start = row["window_start"].strftime("%Y%m%dT%H%M%S")
+            lines += [
+                "BEGIN:VEVENT",
+                f"UID:{_ics_escape(row['patient_id'])}-{start}@stroke-helper",
+                f"DTSTAMP:{stamp}",
+                f"DTSTART:{start}",
+                f"DTEND:{row['window_end'].strftime('%Y%m%dT%H%M%S')}",
+                "SUMMARY:" + _ics_escape(f"DOAC start window - {row['patient_id']} ({row['severity']})"),
+                "DESCRIPTION:" + _ics_escape(f"ELAN {row['severity']}: {row['recommendation']}"),
+                "END:VEVENT",
+            ]
+        lines.append("END:VCALENDAR")
+        return "\r\n".join(lines) + "\r\n"
+
+    def write_ics(self, path):
+        with open(path, "w", encoding="utf-8", newline="") as f:
+            f.write(self.to_ics())
@@ -0,0 +1,368 @@
+import argparse
+import hashlib
+import inspect
+import os
+import shutil
+import types
+from functools import lru_cache
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+import batch
+import calculators
+import codes
+import kernels
+import registry
+from batch import (
+    COHORT_COLUMNS,
+    COHORT_GROUPS,
+    LESION_COLUMNS,
+    MAGIC_COLUMNS,
+    RESULT_CODE_COLUMNS,
+    SCORE2_RISK_REGION,
+    attach_elan,
+    read_cohort,
+    score_cohort,
+    score_elan,
+    score_magic,
+    write_frame,
+)
+
+
+# =========================================================
+# 증분(incremental) 일괄 계산
+# - 결과를 "입력 내용 해시 → 결과" 형태로 디스크(Parquet)에 보관하고, 새로 들어왔거나 바뀐 행만 다시 계산합니다.
+# - 규칙 버전은 결과 묶음을 계산하는 함수에서 시작해, 거기서 참조하는 규칙 모듈(calculators/codes/kernels/registry/batch)의
+#   함수·클래스 소스와 상수 값, 등록된 계산기 선언만 모아 만든 해시입니다(rule_digest).
+#   계산 로직이 바뀌면 버전이 달라져 이전 결과는 자동으로 쓰이지 않고, 파일 입출력·서비스 코드를 고치면 그대로 쓰입니다.
+# - 결과 묶음(group)별로 따로 보관합니다: cohort(CrCl/NOAC/점수/PCE/SCORE2/ESC), magic, elan(병변 표 기준 환자별)
+# - 다시 계산한 행만 part 파일 하나로 덧붙이므로 갱신 비용은 바뀐 행 수에 비례합니다(기존 결과를 다시 쓰지 않습니다).
+#   part가 MAX_PARTS개를 넘거나, prune 대상(이번 입력에 없는 key)이 보관 행의 PRUNE_FRACTION을 넘으면 하나로 합칩니다.
+# =========================================================
+RULESET_MODULES = (calculators, codes, kernels, registry, batch)
+MAX_PARTS = 16
+PRUNE_FRACTION = 0.25
+
+# score_cohort가 실제로 읽는 입력 열(해시 대상, 등록부 선언 순서)
+COHORT_INPUTS = list(dict.fromkeys(c for calcs in COHORT_GROUPS.values() for calc in calcs for c in calc.sources))
+LESION_INPUTS = [c for c in LESION_COLUMNS if c != "patient_id"]
+
+# column_keys: 열 번호 salt, NaN의 비트 값, 열 결합 곱수
+_GOLDEN = 0x9E3779B97F4A7C15
+_NAN_BITS = np.uint64(0x7FF8000000000001)
+_MULT = np.uint64(0x100000001B3)
+
+_RULE_MODULE_NAMES = frozenset(m.__name__ for m in RULESET_MODULES)
+
+# 결과 묶음 → 규칙 버전의 시작점
+RULE_ROOTS = {
+    "cohort": (batch.score_cohort,),
+    "magic": (batch.score_magic,),
+    "elan": (batch.score_elan, batch.attach_elan),
+}
+
+
+def _const_text(value):
+    # 상수 → 실행마다 같은 문자열(함수나 일반 객체처럼 값으로 나타낼 수 없으면 None)
+    if value is None or isinstance(value, (bool, int, float, str, bytes, np.generic)):
+        return repr(value)
+    if isinstance(value, np.ndarray):
+        if value.dtype == object:
+            return _const_text(value.tolist())
+        return f"array({value.dtype},{value.shape},{hashlib.sha256(value.tobytes()).hexdigest()})"
+    if isinstance(value, (tuple, list, set, frozenset)):
+        items = [_const_text(v) for v in value]
+        if None in items:
+            return None
+        return "[" + ",".join(sorted(items) if isinstance(value, (set, frozenset)) else items) + "]"
+    if isinstance(value, dict):
+        items = [(_const_text(k), _const_text(v)) for k, v in value.items()]
+        if any(None in kv for kv in items):
+            return None
+        return "{" + ",".join(f"{k}:{v}" for k, v in items) + "}"
+    return None
+
+
+def _code_names(code) -> list:
+    names = set(code.co_names)
+    for const in code.co_consts:
+        if isinstance(const, types.CodeType):
+            names.update(_code_names(const))
+    return sorted(names)
+
+
+def _rule_object(value) -> bool:
+    module = value.__module__ if isinstance(value, (types.FunctionType, type)) else type(value).__module__
+    return module in _RULE_MODULE_NAMES
+
+
+# 계산기/입력 선언 중 화면 표시에만 쓰는 속성(규칙 버전에서 뺍니다)
+_DISPLAY_ATTRS = frozenset({"label", "key", "column", "step", "title", "summary", "_cached"})
+
+
+@lru_cache(maxsize=None)
+def rule_digest(group: str) -> str:
+    # RULE_ROOTS[group]에서 참조를 따라가며 규칙 모듈의 함수 소스와 상수 값, 계산기/입력 선언의 속성을 모읍니다.
+    # 클래스는 따라간 코드에서 이름이 쓰인 메서드만 넣습니다(Calculator.source_arrays 등, 화면용 메서드는 빠집니다).
+    parts = {}
+    seen = set()
+    names = set()  # 따라간 코드에 나온 이름(속성 이름 포함)
+    classes = {}
+    stack = [(f"{group}.{i}", root) for i, root in enumerate(RULE_ROOTS[group])]
+    while stack:
+        while stack:
+            label, value = stack.pop()
+            if isinstance(value, type):
+                if _rule_object(value):
+                    classes[id(value)] = value
+                continue
+            if isinstance(value, types.FunctionType):
+                if id(value) in seen or not _rule_object(value):
+                    continue
+                seen.add(id(value))
+                # lambda와 함수 안에서 만든 함수(NOAC 약물별 커널 등)는 이름이 겹치므로 찾아온 경로로 구분합니다.
+                name = label if "<" in value.__qualname__ else f"{value.__module__}.{value.__qualname__}"
+                try:
+                    parts[name] = inspect.getsource(value)
+                except (OSError, TypeError):
+                    parts[name] = value.__code__.co_code.hex()
+                code_names = _code_names(value.__code__)
+                names.update(code_names)
+                namespace = value.__globals__
+                for name in code_names:
+                    ref = namespace.get(name)
+                    if isinstance(ref, types.ModuleType):
+                        if ref.__name__ in _RULE_MODULE_NAMES:
+                            stack.extend((f"{ref.__name__}.{n}", getattr(ref, n)) for n in code_names if hasattr(ref, n))
+                    elif name in namespace:
+                        stack.append((f"{value.__module__}.{name}", ref))
+                for name, cell in zip(value.__code__.co_freevars, value.__closure__ or ()):
+                    stack.append((f"{label}.{name}", cell.cell_contents))
+                continue
+            text = _const_text(value)
+            if text is not None:
+                parts[label] = text
+            elif isinstance(value, (tuple, list, dict)):
+                items = value.items() if isinstance(value, dict) else enumerate(value)
+                stack.extend((f"{label}[{k!r}]", v) for k, v in items)
+            elif _rule_object(value) and id(value) not in seen:
+                # 등록된 계산기와 입력 Field. 커널이 있는 계산기의 스칼라 함수는 일괄 계산에 쓰이지 않습니다.
+                seen.add(id(value))
+                attrs = vars(value)
+                stack.append((label, type(value)))
+                stack.extend((f"{label}.{k}", v) for k, v in attrs.items()
+                             if k not in _DISPLAY_ATTRS and not (k == "scalar" and attrs.get("kernel") is not None))
+        for cls in classes.values():
+            for k, v in vars(cls).items():
+                if k in names and (id(cls), k) not in seen:
+                    seen.add((id(cls), k))
+                    stack.append((f"{cls.__qualname__}.{k}", getattr(v, "fget", v)))
+    text = "\n".join(f"{k}\n{v}" for k, v in sorted(parts.items()))
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+def ruleset_version(group: str, params: str = "") -> str:
+    return hashlib.sha256(f"{rule_digest(group)}|{group}|{params}".encode("utf-8")).hexdigest()[:16]
+
+
+def row_keys(df: pd.DataFrame) -> np.ndarray:
+    # 행 내용 해시(uint64). dtype이 같아야 같은 값이 같은 해시가 되므로 스키마를 맞춘 뒤 호출합니다.
+    return pd.util.hash_pandas_object(df, index=False).to_numpy()
+
+
+def _mix(x: np.ndarray) -> np.ndarray:
+    # splitmix64 마무리 단계(x를 제자리에서 바꿉니다. uint64 곱셈의 넘침은 버립니다)
+    x ^= x >> np.uint64(30)
+    x *= np.uint64(0xBF58476D1CE4E5B9)
+    x ^= x >> np.uint64(27)
+    x *= np.uint64(0x94D049BB133111EB)
+    x ^= x >> np.uint64(31)
+    return x
+
+
+def _column_hash(s: pd.Series, dtype: str) -> np.ndarray:
+    # batch가 계산에 쓰는 값(플래그 결측은 False, 수치 결측은 NaN, 문자열 결측은 None) → uint64
+    if dtype == "boolean":
+        return s.astype(dtype).fillna(False).to_numpy(dtype=np.uint64)
+    if dtype == "float64":
+        values = s.astype(dtype).to_numpy(dtype=np.float64, na_value=np.nan)
+        return np.where(np.isnan(values), _NAN_BITS, values.view(np.uint64))
+    # 문자열은 원래 열에서 고유값을 찾은 뒤 고유값만 dtype을 맞춰 해시합니다(성별/인종처럼 종류가 적습니다). 결측은 0입니다.
+    codes_, uniq = pd.factorize(s)
+    uniq = pd.array(np.asarray(uniq, dtype=object), dtype=dtype).to_numpy(dtype=object)
+    table = np.append(pd.util.hash_array(uniq), np.uint64(0))
+    return table[codes_]
+
+
+def column_keys(df: pd.DataFrame, columns: dict) -> np.ndarray:
+    # 행 내용 해시(uint64). columns: 열 이름 → dtype(batch.COHORT_COLUMNS 형식)이며, 없는 열은 결측 열과 같습니다.
+    # 표 전체를 conform_cohort로 복사하지 않고 열마다 dtype을 맞춰 NumPy에서 섞습니다(열마다 splitmix64 후 다항 결합).
+    keys = np.zeros(len(df), dtype=np.uint64)
+    for i, (col, dtype) in enumerate(columns.items()):
+        s = df[col] if col in df.columns else pd.Series(pd.NA, index=df.index, dtype=dtype)
+        salt = np.uint64((i + 1) * _GOLDEN & 0xFFFFFFFFFFFFFFFF)
+        keys *= _MULT
+        keys += _mix(_column_hash(s, dtype) + salt)
+    return _mix(keys)
+
+
+class ResultStore:
+    # 폴더 하나 = (결과 묶음, 규칙 버전). 그 안의 part 파일들은 key 열(uint64)과 결과 열로 이루어집니다.
+    def __init__(self, root):
+        self.root = Path(root)
+        self.root.mkdir(parents=True, exist_ok=True)
+
+    def _dir(self, group: str, version: str) -> Path:
+        return self.root / f"{group}-{version}"
+
+    def _parts(self, group: str, version: str) -> list:
+        return sorted(self._dir(group, version).glob("part-*.parquet"))
+
+    def load(self, group: str, version: str) -> pd.DataFrame:
+        parts = self._parts(group, version)
+        if not parts:
+            return None
+        table = pd.concat([pd.read_parquet(p) for p in parts]).set_index("key")
+        # 합치기(save) 도중 멈춘 경우 같은 key가 두 part에 있을 수 있습니다(내용은 같습니다).
+        return table if table.index.is_unique else table[~table.index.duplicated(keep="last")]
+
+    def _write(self, group: str, version: str, results: pd.DataFrame) -> Path:
+        # 임시 파일에 쓴 뒤 다음 번호의 part로 옮기고, 같은 묶음의 다른 버전은 지웁니다.
+        folder = self._dir(group, version)
+        folder.mkdir(exist_ok=True)
+        parts = self._parts(group, version)
+        path = folder / f"part-{int(parts[-1].stem[5:]) + 1 if parts else 0:06d}.parquet"
+        tmp = path.with_suffix(".parquet.tmp")
+        results.rename_axis("key").reset_index().to_parquet(tmp, index=False)
+        os.replace(tmp, path)
+        for old in self.root.glob(f"{group}-*"):
+            if old != folder:
+                shutil.rmtree(old) if old.is_dir() else old.unlink()
+        return path
+
+    def append(self, group: str, version: str, results: pd.DataFrame):
+        self._write(group, version, results)
+
+    def save(self, group: str, version: str, results: pd.DataFrame):
+        # 묶음 전체를 part 하나로 다시 씁니다(이전 part는 새 part를 쓴 뒤 지웁니다).
+        path = self._write(group, version, results)
+        for old in self._parts(group, version):
+            if old != path:
+                old.unlink()
+
+    def part_count(self, group: str, version: str) -> int:
+        return len(self._parts(group, version))
+
+
+def _incremental(store: ResultStore, group: str, version: str, keys: np.ndarray, compute, prune: bool):
+    # keys: 행별 해시, compute(위치 배열) → 해당 행들의 결과 DataFrame
+    # 반환: (keys 순서의 결과 DataFrame, 새로 계산한 고유 key 수)
+    table = store.load(group, version)
+    pos = table.index.get_indexer(keys) if table is not None else np.full(len(keys), -1, dtype=np.intp)
+    miss = pos < 0
+    n_fresh = 0
+    if miss.any():
+        # 보관소에 없는 행만 고유 key별로 한 번 계산해 보관 표 뒤에 붙입니다.
+        codes_, uniq = pd.factorize(keys[miss])
+        rows = np.flatnonzero(miss)
+        first = np.empty(len(uniq), dtype=np.int64)
+        first[codes_[::-1]] = rows[::-1]
+        fresh = compute(first)
+        fresh.index = uniq
+        n_fresh = len(uniq)
+        pos[miss] = codes_ + (0 if table is None else len(table))
+        table = fresh if table is None else pd.concat([table, fresh])
+
+    used = np.zeros(len(table), dtype=bool)
+    used[pos] = True
+    n_stale = len(table) - int(used.sum())
+    if prune and n_stale > PRUNE_FRACTION * len(table):
+        pos = np.cumsum(used)[pos] - 1
+        table = table[used]
+        store.save(group, version, table)
+    elif n_fresh and store.part_count(group, version) >= MAX_PARTS:
+        store.save(group, version, table)
+    elif n_fresh:
+        store.append(group, version, table.iloc[len(table) - n_fresh:])
+    result = table.iloc[pos]
+    return result.reset_index(drop=True), n_fresh
+
+
+def _elan_keys(lesions: pd.DataFrame) -> pd.Series:
+    # 환자별 병변 행 해시의 합(uint64, 자리올림 무시). 병변 순서와 무관하게 같은 병변 구성이면 같은 key입니다.
+    lesions = lesions.astype(LESION_COLUMNS)
+    h = row_keys(lesions[LESION_INPUTS])
+    owner, pids = pd.factorize(lesions["patient_id"], sort=False)
+    order = np.argsort(owner, kind="stable")
+    starts = np.r_[0, np.flatnonzero(np.diff(owner[order])) + 1]
+    return pd.Series(np.add.reduceat(h[order], starts), index=np.asarray(pids, dtype=object))
+
+
+def score_cohort_incremental(df: pd.DataFrame, store, lesions: pd.DataFrame = None,
+                             risk_region: str = SCORE2_RISK_REGION, prune: bool = True):
+    # score_cohort + score_magic (+ 병변 표가 있으면 ELAN)와 같은 결과를 반환합니다.
+    # prune=True면 이번 입력에 없는 key의 결과가 보관 행의 PRUNE_FRACTION을 넘을 때 보관소에서 지웁니다(레지스트리 전체 갱신용).
+    # 입력 표 전체를 conform_cohort하지 않고, 해시는 열별로, 계산은 다시 계산할 행만 맞춰서 합니다.
+    store = store if isinstance(store, ResultStore) else ResultStore(store)
+    stats = {}
+
+    keys = column_keys(df, {c: COHORT_COLUMNS[c] for c in COHORT_INPUTS})
+    cohort, stats["cohort"] = _incremental(
+        store, "cohort", ruleset_version("cohort", risk_region), keys,
+        lambda pos: score_cohort(df.iloc[pos], risk_region).reset_index(drop=True), prune,
+    )
+    parts = [cohort]
+
+    magic_cols = [c for c in MAGIC_COLUMNS if c in df.columns]
+    if magic_cols:
+        # MAGIC은 답변 결측(모두 결측이면 MISSING)과 '아니요'가 다르므로 결측을 NaN으로 남겨 해시합니다.
+        magic, stats["magic"] = _incremental(
+            store, "magic", ruleset_version("magic", ",".join(magic_cols)),
+            column_keys(df, dict.fromkeys(magic_cols, "float64")),
+            lambda pos: score_magic(df[magic_cols].iloc[pos].astype("boolean")).reset_index(drop=True), prune,
+        )
+        parts.append(magic)
+
+    if lesions is not None:
+        patient_keys = _elan_keys(lesions)
+        pids = patient_keys.index.to_numpy()
+
+        def compute_elan(pos):
+            chosen = lesions[lesions["patient_id"].isin(pids[pos])]
+            return score_elan(chosen).reindex(pids[pos]).reset_index(drop=True)
+
+        elan, stats["elan"] = _incremental(
+            store, "elan", ruleset_version("elan"), patient_keys.to_numpy(), compute_elan, prune,
+        )
+        elan.index = pids
+        patients = pd.DataFrame({"patient_id": df["patient_id"] if "patient_id" in df.columns else pd.NA},
+                                index=df.index).astype({"patient_id": COHORT_COLUMNS["patient_id"]})
+        parts.append(attach_elan(patients, elan).reset_index(drop=True))
+
+    out = pd.concat(parts, axis=1)
+    out.index = df.index
+    stats["rows"] = len(df)
+    return out, stats
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="바뀐 행만 다시 계산하는 코호트 일괄 계산입니다.")
+    parser.add_argument("input")
+    parser.add_argument("-o", "--output", required=True)
+    parser.add_argument("--store", required=True, help="결과 보관 디렉터리")
+    parser.add_argument("--lesions", help="ELAN 병변 표(Parquet/CSV)")
+    parser.add_argument("--risk-region", default=SCORE2_RISK_REGION)
+    parser.add_argument("--keep-stale", action="store_true", help="이번 입력에 없는 결과도 보관소에 남깁니다.")
+    args = parser.parse_args(argv)
+
+    cohort = read_cohort(args.input)
+    lesions = read_cohort(args.lesions) if args.lesions else None
+    result, stats = score_cohort_incremental(cohort, args.store, lesions, args.risk_region, prune=not args.keep_stale)
+    write_frame(pd.concat([cohort, result], axis=1), args.output, RESULT_CODE_COLUMNS)
+    print(stats)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,434 @@
+import argparse
+import io
+import json
+import re
+from datetime import date
+from pathlib import Path
+
+import pandas as pd
+import pyarrow.parquet as pq
+
+from batch import COHORT_COLUMNS, RESULT_CODE_COLUMNS, conform_cohort, empty_cohort, score_cohort
+from codes import decode_frame, to_arrow_table
+
+
+# =========================================================
+# 로컬 FHIR / HL7v2 파일 → 계산기 입력(코호트 행)
+# - FHIR: Bundle JSON(.json) 또는 Bulk Data NDJSON(.ndjson/.jsonl)
+# - HL7v2: ER7 텍스트(.hl7/.txt), 세그먼트 구분자는 \r 또는 줄바꿈
+# - 파일 전체를 메모리에 올리지 않고 리소스/메시지 단위로 순차 처리합니다.
+# - 같은 환자에 여러 측정값이 있으면 가장 최근 값을 사용합니다.
+# =========================================================
+LOINC_FIELDS = {
+    "29463-7": "weight_kg",
+    "3141-9": "weight_kg",
+    "2160-0": "scr_mg_dl",
+    "38483-4": "scr_mg_dl",
+    "14682-9": "scr_mg_dl",
+    "2093-3": "tc",
+    "14647-2": "tc",
+    "2085-9": "hdl",
+    "14646-4": "hdl",
+    "13457-7": "ldl",
+    "18262-6": "ldl",
+    "2089-1": "ldl",
+    "22748-8": "ldl",
+    "8480-6": "sbp",
+}
+LOINC_SMOKING_STATUS = "72166-2"
+# 현재 흡연으로 보는 SNOMED 값(흡연 상태 관찰)
+SNOMED_CURRENT_SMOKER = {"449868002", "428041000124106", "77176002", "65568007", "428071000124103", "428061000124105"}
+
+# ICD-10 접두사(점 제거) → 코호트 플래그
+ICD10_FLAGS = {
+    "E10": "diabetes", "E11": "diabetes", "E13": "diabetes", "E14": "diabetes",
+    "I10": "htn", "I11": "htn", "I12": "htn", "I13": "htn", "I15": "htn",
+    "I50": "chf",
+    "I48": "af",
+    "I63": "stroke_tia", "I64": "stroke_tia", "G45": "stroke_tia", "Z8673": "stroke_tia",
+    "I21": "vascular", "I22": "vascular", "I252": "vascular", "I70": "vascular", "I739": "vascular",
+    "N185": "renal_disease", "N186": "renal_disease", "Z992": "renal_disease", "Z940": "renal_disease",
+    "K70": "liver_disease", "K72": "liver_disease", "K74": "liver_disease",
+    "D68": "bleeding_history", "D69": "bleeding_history", "K922": "bleeding_history",
+    "I60": "bleeding_history", "I61": "bleeding_history", "I62": "bleeding_history",
+    "F10": "alcohol_excess",
+    "F17": "smoker", "Z720": "smoker",
+}
+SNOMED_FLAGS = {
+    "44054006": "diabetes", "46635009": "diabetes", "73211009": "diabetes",
+    "38341003": "htn", "59621000": "htn",
+    "84114007": "chf", "42343007": "chf",
+    "49436004": "af",
+    "230690007": "stroke_tia", "422504002": "stroke_tia", "266257000": "stroke_tia",
+    "22298006": "vascular", "399211009": "vascular", "399957001": "vascular",
+    "46177005": "renal_disease", "433146000": "renal_disease",
+    "19943007": "liver_disease",
+    "7200002": "alcohol_excess",
+}
+# ATC 접두사 → 약물 플래그(MedicationRequest/MedicationStatement)
+ATC_FLAGS = {
+    "C02": "bp_treated", "C03": "bp_treated", "C07": "bp_treated", "C08": "bp_treated", "C09": "bp_treated",
+    "B01AC": "bleeding_drugs", "M01A": "bleeding_drugs",
+}
+OMB_RACE = {"2106-3": "White", "2054-5": "African American"}
+
+_ICD10_MAX_PREFIX = max(len(k) for k in ICD10_FLAGS)
+_ATC_MAX_PREFIX = max(len(k) for k in ATC_FLAGS)
+
+
+def _prefix_flag(code: str, table: dict, max_len: int):
+    code = code.replace(".", "").upper()
+    for n in range(min(len(code), max_len), 2, -1):
+        flag = table.get(code[:n])
+        if flag:
+            return flag
+    return None
+
+
+def _canonical_value(field: str, value: float, unit: str) -> float:
+    # 단위를 코호트 스키마 단위(kg, mg/dL, mmHg)로 맞춥니다.
+    u = (unit or "").strip().lower().replace("µ", "u").replace("μ", "u")
+    if field == "scr_mg_dl" and u == "umol/l":
+        return value / 88.4
+    if field in ("tc", "hdl", "ldl") and u == "mmol/l":
+        return value * 38.67
+    if field == "weight_kg":
+        if u in ("lb", "lbs", "[lb_av]"):
+            return value * 0.45359237
+        if u == "g":
+            return value / 1000.0
+    return value
+
+
+def _age_on(birth: str, as_of: date):
+    try:
+        y, m, d = int(birth[0:4]), int(birth[4:6] or 1), int(birth[6:8] or 1)
+    except ValueError:
+        return None
+    return as_of.year - y - ((as_of.month, as_of.day) < (m, d))
+
+
+def _ref_id(reference: str) -> str:
+    # "Patient/123", "urn:uuid:abc", 절대 URL 모두 마지막 식별자만 사용합니다.
+    if reference.startswith("urn:uuid:"):
+        return reference[len("urn:uuid:"):]
+    return reference.rstrip("/").split("/")[-1]
+
+
+class CohortBuilder:
+    # 환자별로 가장 최근 측정값과 진단/약물 플래그만 유지하는 누적기입니다.
+    def __init__(self, as_of: date = None):
+        self.as_of = as_of or date.today()
+        self._patients = {}
+        self._stamps = {}
+
+    def __len__(self):
+        return len(self._patients)
+
+    def _patient(self, pid: str) -> dict:
+        rec = self._patients.get(pid)
+        if rec is None:
+            rec = self._patients[pid] = {"patient_id": pid}
+        return rec
+
+    def set_demographics(self, pid, birth=None, sex=None, race=None):
+        rec = self._patient(pid)
+        if birth:
+            rec["age"] = _age_on(birth.replace("-", ""), self.as_of)
+        if sex:
+            rec["sex"] = sex
+        if race:
+            rec["race"] = race
+
+    def set_value(self, pid, field, value, when: str = ""):
+        # 같은 항목은 시각 문자열(ISO/HL7 모두 사전순 = 시간순)이 최신인 값만 유지합니다.
+        key = (pid, field)
+        if when < self._stamps.get(key, ""):
+            return
+        self._stamps[key] = when
+        self._patient(pid)[field] = value
+
+    def set_flag(self, pid, flag):
+        self._patient(pid)[flag] = True
+
+    # ---------- FHIR ----------
+    def add_resource(self, res: dict):
+        rtype = res.get("resourceType")
+        if rtype == "Bundle":
+            for entry in res.get("entry", []):
+                if "resource" in entry:
+                    self.add_resource(entry["resource"])
+        elif rtype == "Patient":
+            self._fhir_patient(res)
+        elif rtype == "Observation":
+            self._fhir_observation(res)
+        elif rtype == "Condition":
+            self._fhir_condition(res)
+        elif rtype in ("MedicationRequest", "MedicationStatement"):
+            self._fhir_medication(res)
+
+    def _fhir_patient(self, res):
+        race = None
+        for ext in res.get("extension", []):
+            for sub in ext.get("extension", []):
+                code = sub.get("valueCoding", {}).get("code")
+                if code in OMB_RACE:
+                    race = OMB_RACE[code]
+        gender = res.get("gender")
+        sex = {"male": "Male", "female": "Female"}.get(gender)
+        self.set_demographics(res.get("id", ""), birth=res.get("birthDate"), sex=sex, race=race)
+
+    def _fhir_observation(self, res):
+        if res.get("status") in ("entered-in-error", "cancelled"):
+            return
+        pid = _ref_id(res.get("subject", {}).get("reference", ""))
+        when = res.get("effectiveDateTime") or res.get("effectivePeriod", {}).get("start") or res.get("issued") or ""
+        for coding in res.get("code", {}).get("coding", []):
+            code = coding.get("code")
+            if code == LOINC_SMOKING_STATUS:
+                codes = {c.get("code") for c in res.get("valueCodeableConcept", {}).get("coding", [])}
+                self.set_value(pid, "smoker", bool(codes & SNOMED_CURRENT_SMOKER), when)
+            elif code in LOINC_FIELDS:
+                self._fhir_quantity(pid, LOINC_FIELDS[code], res.get("valueQuantity"), when)
+        # 혈압 panel(85354-6 등)은 component 안에 SBP가 있습니다.
+        for comp in res.get("component", []):
+            for coding in comp.get("code", {}).get("coding", []):
+                if coding.get("code") in LOINC_FIELDS:
+                    self._fhir_quantity(pid, LOINC_FIELDS[coding["code"]], comp.get("valueQuantity"), when)
+
+    def _fhir_quantity(self, pid, field, qty, when):
+        if not qty or qty.get("value") is None:
+            return
+        unit = qty.get("code") or qty.get("unit")
+        self.set_value(pid, field, _canonical_value(field, float(qty["value"]), unit), when)
+
+    def _fhir_condition(self, res):
+        status = res.get("verificationStatus", {}).get("coding", [{}])[0].get("code")
+        if status in ("refuted", "entered-in-error"):
+            return
+        pid = _ref_id(res.get("subject", {}).get("reference", ""))
+        for coding in res.get("code", {}).get("coding", []):
+            system, code = coding.get("system", ""), coding.get("code", "")
+            if "snomed" in system:
+                flag = SNOMED_FLAGS.get(code)
+            else:
+                flag = _prefix_flag(code, ICD10_FLAGS, _ICD10_MAX_PREFIX)
+            if flag:
+                self.set_flag(pid, flag)
+
+    def _fhir_medication(self, res):
+        pid = _ref_id((res.get("subject") or res.get("patient") or {}).get("reference", ""))
+        for coding in res.get("medicationCodeableConcept", {}).get("coding", []):
+            if "atc" in coding.get("system", "").lower():
+                flag = _prefix_flag(coding.get("code", ""), ATC_FLAGS, _ATC_MAX_PREFIX)
+                if flag:
+                    self.set_flag(pid, flag)
+
+    # ---------- HL7v2 ----------
+    def add_hl7_message(self, segments: list):
+        # segments: 세그먼트 문자열 목록(첫 세그먼트는 MSH)
+        fs, cs = segments[0][3], segments[0][4]
+        pid = ""
+        for seg in segments:
+            fields = seg.split(fs)
+            name = fields[0]
+            get = lambda i: fields[i] if i < len(fields) else ""  # noqa: E731
+            if name == "PID":
+                pid = get(3).split(cs)[0]
+                sex = {"M": "Male", "F": "Female"}.get(get(8))
+                race = OMB_RACE.get(get(10).split(cs)[0])
+                self.set_demographics(pid, birth=get(7)[:8], sex=sex, race=race)
+            elif name == "OBX" and pid:
+                if get(11) in ("W", "D", "X"):
+                    continue
+                code = get(3).split(cs)[0]
+                if code == LOINC_SMOKING_STATUS:
+                    self.set_value(pid, "smoker", get(5).split(cs)[0] in SNOMED_CURRENT_SMOKER, get(14))
+                elif code in LOINC_FIELDS:
+                    try:
+                        value = float(get(5))
+                    except ValueError:
+                        continue
+                    field = LOINC_FIELDS[code]
+                    self.set_value(pid, field, _canonical_value(field, value, get(6).split(cs)[0]), get(14))
+            elif name == "DG1" and pid:
+                flag = _prefix_flag(get(3).split(cs)[0], ICD10_FLAGS, _ICD10_MAX_PREFIX)
+                if flag:
+                    self.set_flag(pid, flag)
+
+    # ---------- 출력 ----------
+    def records(self) -> list:
+        return list(self._patients.values())
+
+    def to_frame(self) -> pd.DataFrame:
+        if not self._patients:
+            return empty_cohort()
+        rows = [{k: v for k, v in r.items() if k in COHORT_COLUMNS} for r in self._patients.values()]
+        return conform_cohort(pd.DataFrame(rows))[list(COHORT_COLUMNS)]
+
+    def clear(self):
+        self._patients.clear()
+        self._stamps.clear()
+
+
+# =========================================================
+# 스트리밍 리더
+# =========================================================
+_ENTRY_RE = re.compile(r'"entry"\s*:\s*\[')
+_CHUNK = 1 << 20
+
+
+def iter_bundle_resources(fp, chunk_size: int = _CHUNK):
+    # Bundle JSON의 entry 배열을 원소 하나씩 decode합니다(전체 문서를 파싱하지 않음).
+    decoder = json.JSONDecoder()
+    buf = ""
+    while True:
+        m = _ENTRY_RE.search(buf)
+        if m:
+            break
+        more = fp.read(chunk_size)
+        if not more:
+            return
+        buf = buf[-32:] + more
+    buf, pos, eof = buf[m.end():], 0, False
+
+    while True:
+        while True:
+            while pos < len(buf) and buf[pos] in " \t\r\n,":
+                pos += 1
+            if pos < len(buf) or eof:
+                break
+            buf, pos = fp.read(chunk_size), 0
+            eof = not buf
+        if pos >= len(buf) or buf[pos] == "]":
+            return
+        try:
+            entry, end = decoder.raw_decode(buf, pos)
+        except json.JSONDecodeError:
+            if eof:
+                raise
+            # 원소가 버퍼 경계에 걸친 경우: 읽는 양을 늘려 재시도합니다.
+            more = fp.read(max(chunk_size, len(buf) - pos))
+            eof = not more
+            buf, pos = buf[pos:] + more, 0
+            continue
+        if "resource" in entry:
+            yield entry["resource"]
+        pos = end
+        if pos >= chunk_size:
+            buf, pos = buf[pos:], 0
+
+
+def iter_ndjson_resources(fp):
+    for line in fp:
+        line = line.strip()
+        if line:
+            yield json.loads(line)
+
+
+def iter_hl7_messages(fp):
+    # universal newline 모드에서 \r, \n, \r\n 모두 세그먼트 구분자로 처리됩니다.
+    segments = []
+    for line in fp:
+        line = line.strip("\r\n\x0b\x1c")
+        if not line:
+            continue
+        if line.startswith("MSH") and segments:
+            yield segments
+            segments = []
+        segments.append(line)
+    if segments:
+        yield segments
+
+
+def detect_format(name: str, head: str) -> str:
+    suffix = Path(name).suffix.lower()
+    if suffix in (".ndjson", ".jsonl"):
+        return "ndjson"
+    if head.lstrip().startswith("MSH"):
+        return "hl7"
+    return "bundle"
+
+
+def ingest_stream(builder: CohortBuilder, fp, name: str = ""):
+    # fp: 텍스트 파일 객체(또는 바이너리 → UTF-8로 감쌈)
+    if not isinstance(fp, io.TextIOBase):
+        fp = io.TextIOWrapper(fp, encoding="utf-8", newline=None)
+    head = fp.read(8)
+    fmt = detect_format(name, head)
+    rest = _Prepend(head, fp)
+    if fmt == "hl7":
+        for msg in iter_hl7_messages(rest):
+            builder.add_hl7_message(msg)
+    elif fmt == "ndjson":
+        for res in iter_ndjson_resources(rest):
+            builder.add_resource(res)
+    else:
+        for res in iter_bundle_resources(rest):
+            builder.add_resource(res)
+
+
+class _Prepend(io.TextIOBase):
+    # 형식 판별용으로 읽은 앞부분을 다시 붙여 주는 얇은 래퍼입니다.
+    def __init__(self, head: str, fp):
+        self._head, self._fp = head, fp
+
+    def read(self, n=-1):
+        if self._head:
+            head, self._head = self._head, ""
+            if n is None or n < 0:
+                return head + self._fp.read()
+            return head + self._fp.read(max(0, n - len(head)))
+        return self._fp.read(n)
+
+    def __iter__(self):
+        rest = self._fp.readline()
+        first, self._head = self._head + rest, ""
+        if first:
+            yield first
+        yield from self._fp
+
+
+def iter_cohort_frames(paths, as_of: date = None, per_file: bool = True):
+    # per_file=True: 파일마다 환자를 내보내고 비웁니다(환자별 Bundle 추출 등, 메모리 일정).
+    # per_file=False: 리소스 종류별로 나뉜 Bulk NDJSON처럼 파일 간 결합이 필요한 경우.
+    builder = CohortBuilder(as_of)
+    for path in paths:
+        with open(path, encoding="utf-8", newline=None) as fp:
+            ingest_stream(builder, fp, str(path))
+        if per_file and len(builder):
+            yield builder.to_frame()
+            builder.clear()
+    if len(builder):
+        yield builder.to_frame()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="로컬 FHIR/HL7 파일을 코호트 입력 파일(Parquet/CSV)로 변환합니다.")
+    parser.add_argument("paths", nargs="+")
+    parser.add_argument("-o", "--output", required=True)
+    parser.add_argument("--join-files", action="store_true", help="파일 간 환자 정보를 결합합니다(Bulk NDJSON).")
+    parser.add_argument("--score", action="store_true", help="계산기 결과 컬럼을 함께 기록합니다.")
+    args = parser.parse_args(argv)
+
+    out = Path(args.output)
+    writer = None
+    first = True
+    for frame in iter_cohort_frames(args.paths, per_file=not args.join_files):
+        if args.score:
+            frame = pd.concat([frame, score_cohort(frame)], axis=1)
+        if out.suffix == ".parquet":
+            table = to_arrow_table(frame, RESULT_CODE_COLUMNS if args.score else {})
+            if writer is None:
+                writer = pq.ParquetWriter(out, table.schema)
+            writer.write_table(table.cast(writer.schema))
+        else:
+            frame = decode_frame(frame, RESULT_CODE_COLUMNS) if args.score else frame
+            frame.to_csv(out, mode="w" if first else "a", header=first, index=False)
+        first = False
+    if writer is not None:
+        writer.close()
+
+
+if __name__ == "__main__":
+    main()
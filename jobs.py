@@ -0,0 +1,263 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+from batch import (
+    DEFAULT_CALCULATORS,
+    RESULT_CODE_COLUMNS,
+    SCORE2_RISK_REGION,
+    FrameWriter,
+    input_profile,
+    iter_chunks,
+    score_frame,
+)
+from batch_plan import default_budget, plan_batch
+from codes import decode_frame
+
+
+# =========================================================
+# 백그라운드 작업 대기열(job queue)
+# - 오래 걸리는 일괄 계산은 화면 스크립트 스레드가 아닌 작업 스레드에서 실행합니다(rerun/websocket을 막지 않습니다).
+# - 작업 상태(진행 행 수, 최근 결과 미리보기, 취소 요청, 결과 파일 경로)는 로컬 SQLite 파일에 기록하므로
+#   세션이 끝나거나 서버가 재시작되어도 같은 목록과 결과를 볼 수 있습니다.
+# - 작업 행에는 만든 프로세스의 boot token(open_job_queue에서 만든 uuid)을 남깁니다. 대기열을 열 때
+#   token이 다른 대기/실행 중 작업은 이전 프로세스와 함께 사라진 것이므로 중단됨으로 표시합니다
+#   (컨테이너에서는 pid가 재시작마다 같으므로 pid로는 판단하지 않습니다).
+#   따라서 작업 폴더 하나는 서버 프로세스 하나가 씁니다. worker가 여럿이면 STROKE_JOB_DIR을 worker마다 따로 둡니다.
+# - 취소는 DB에 요청만 남기고, 작업이 chunk를 마칠 때마다 확인해 멈춥니다(그때까지의 결과 파일은 남깁니다).
+# - 위치: 환경변수 STROKE_JOB_DIR(기본 ~/.stroke_assistant/jobs, 환자 입력/결과가 있으므로 저장소 작업 폴더 밖) 아래
+#   jobs.db, inputs/, outputs/
+# =========================================================
+JOB_DIR_ENV = "STROKE_JOB_DIR"
+DEFAULT_JOB_DIR = Path.home() / ".stroke_assistant" / "jobs"
+JOB_WORKERS = 2
+PREVIEW_ROWS = 20
+JOB_CHUNK_ROWS = 100_000
+# 이 기간이 지난 작업은 purge()에서 기록과 파일을 함께 지웁니다.
+JOB_TTL_SECONDS = 7 * 24 * 3600
+
+QUEUED, RUNNING, CANCELLING = "queued", "running", "cancelling"
+DONE, FAILED, CANCELLED, INTERRUPTED = "done", "failed", "cancelled", "interrupted"
+ACTIVE_STATUSES = (QUEUED, RUNNING, CANCELLING)
+STATUS_LABELS = {
+    QUEUED: "대기", RUNNING: "실행 중", CANCELLING: "취소 중",
+    DONE: "완료", FAILED: "실패", CANCELLED: "취소됨", INTERRUPTED: "중단됨(서버 재시작)",
+}
+
+_COLUMNS = ("id", "kind", "label", "owner", "params", "status", "created", "started", "finished",
+            "rows_done", "rows_total", "message", "input", "output", "preview", "boot")
+
+
+class JobCancelled(Exception):
+    pass
+
+
+class JobStore:
+    def __init__(self, path: str, boot: str = None):
+        # boot: 이 프로세스가 만든 작업에 남길 token(생략 시 새로 만듭니다)
+        self.path = path
+        self.boot = boot or uuid.uuid4().hex
+        self._local = threading.local()
+        with self._conn() as conn:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS jobs (id TEXT PRIMARY KEY, kind TEXT NOT NULL, label TEXT, owner TEXT, "
+                "params TEXT, status TEXT NOT NULL, created REAL NOT NULL, started REAL, finished REAL, "
+                "rows_done INTEGER NOT NULL DEFAULT 0, rows_total INTEGER, message TEXT, input TEXT, output TEXT, "
+                "preview TEXT, boot TEXT)"
+            )
+            # pid 열로 만든 이전 DB에는 boot 열을 더합니다(그 작업들은 recover()에서 중단됨이 됩니다).
+            if "boot" not in {row[1] for row in conn.execute("PRAGMA table_info(jobs)")}:
+                conn.execute("ALTER TABLE jobs ADD COLUMN boot TEXT")
+
+    def _conn(self) -> sqlite3.Connection:
+        # 스레드별 연결(session_store.SQLiteSessionStore와 같은 방식)
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=5.0)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def create(self, kind: str, params: dict, label: str = "", owner: str = "", input_path: str = None,
+               output_path: str = None) -> str:
+        job_id = uuid.uuid4().hex[:12]
+        with self._conn() as conn:
+            conn.execute(
+                "INSERT INTO jobs (id, kind, label, owner, params, status, created, input, output, boot) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (job_id, kind, label, owner, json.dumps(params, ensure_ascii=False), QUEUED, time.time(),
+                 input_path, output_path, self.boot),
+            )
+        return job_id
+
+    def get(self, job_id: str):
+        row = self._conn().execute(f"SELECT {', '.join(_COLUMNS)} FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        return None if row is None else _job_dict(row)
+
+    def list(self, owner: str = None, limit: int = 50) -> list:
+        sql = f"SELECT {', '.join(_COLUMNS)} FROM jobs"
+        args = ()
+        if owner is not None:
+            sql += " WHERE owner = ?"
+            args = (owner,)
+        rows = self._conn().execute(sql + " ORDER BY created DESC LIMIT ?", (*args, limit)).fetchall()
+        return [_job_dict(r) for r in rows]
+
+    def status(self, job_id: str):
+        row = self._conn().execute("SELECT status FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        return None if row is None else row[0]
+
+    def update(self, job_id: str, **fields):
+        with self._conn() as conn:
+            conn.execute(f"UPDATE jobs SET {', '.join(f'{k} = ?' for k in fields)} WHERE id = ?",
+                         (*fields.values(), job_id))
+
+    def transition(self, job_id: str, old: tuple, new: str, **fields) -> bool:
+        # 상태가 old 중 하나일 때만 new로 바꿉니다(취소 요청과 작업 종료가 겹쳐도 한쪽만 반영됩니다).
+        sets = ", ".join(["status = ?", *(f"{k} = ?" for k in fields)])
+        with self._conn() as conn:
+            cur = conn.execute(
+                f"UPDATE jobs SET {sets} WHERE id = ? AND status IN ({', '.join('?' * len(old))})",
+                (new, *fields.values(), job_id, *old),
+            )
+        return cur.rowcount == 1
+
+    def recover(self) -> int:
+        # 다른 boot token(이전 프로세스)으로 대기/실행 중에 남은 작업을 중단됨으로 표시합니다.
+        with self._conn() as conn:
+            return conn.execute(
+                f"UPDATE jobs SET status = ?, finished = ? WHERE status IN ({', '.join('?' * len(ACTIVE_STATUSES))}) "
+                "AND (boot IS NULL OR boot != ?)",
+                (INTERRUPTED, time.time(), *ACTIVE_STATUSES, self.boot),
+            ).rowcount
+
+    def purge(self, ttl: float = JOB_TTL_SECONDS) -> int:
+        cutoff = time.time() - ttl
+        rows = self._conn().execute(
+            f"SELECT id, input, output FROM jobs WHERE created < ? AND status NOT IN "
+            f"({', '.join('?' * len(ACTIVE_STATUSES))})", (cutoff, *ACTIVE_STATUSES)
+        ).fetchall()
+        for job_id, *paths in rows:
+            for p in paths:
+                if p:
+                    Path(p).unlink(missing_ok=True)
+            with self._conn() as conn:
+                conn.execute("DELETE FROM jobs WHERE id = ?", (job_id,))
+        return len(rows)
+
+
+def _job_dict(row) -> dict:
+    job = dict(zip(_COLUMNS, row))
+    job["params"] = json.loads(job["params"] or "{}")
+    job["preview"] = json.loads(job["preview"]) if job["preview"] else []
+    return job
+
+
+class JobContext:
+    # 작업 함수가 진행 상황을 기록하고, 다음 단위를 시작하기 전에 check()로 취소 요청을 확인합니다.
+    def __init__(self, store: JobStore, job_id: str):
+        self.store = store
+        self.job_id = job_id
+
+    def check(self):
+        if self.store.status(self.job_id) == CANCELLING:
+            raise JobCancelled()
+
+    def progress(self, rows_done: int, rows_total: int = None, preview: str = None):
+        # preview: 최근 결과 몇 행의 JSON(records)
+        fields = {"rows_done": rows_done}
+        if rows_total is not None:
+            fields["rows_total"] = rows_total
+        if preview is not None:
+            fields["preview"] = preview
+        self.store.update(self.job_id, **fields)
+
+
+# =========================================================
+# 작업 종류
+# - 함수(ctx, job) → 완료 메시지. job은 JobStore.get() 결과(dict)입니다.
+# =========================================================
+def score_cohort_job(ctx: JobContext, job: dict) -> str:
+    # 코호트 파일 → 입력 열 + 계산기 결과 열(batch.score_frame)을 chunk 단위로 결과 파일에 이어 씁니다.
+    params = job["params"]
+    calculators = params.get("calculators") or list(DEFAULT_CALCULATORS)
+    column_types, n_rows = input_profile(job["input"])
+    # 화면 서버와 같은 프로세스이므로 worker 하나 기준으로 chunk 크기를 정하고, 진행 표시를 위해 JOB_CHUNK_ROWS로 자릅니다.
+    plan = plan_batch(default_budget(), column_types, calculators, n_rows, parallel=False)
+    ctx.progress(0, n_rows)
+    writer = FrameWriter(job["output"], RESULT_CODE_COLUMNS)
+    try:
+        for chunk in iter_chunks(job["input"], min(plan.chunk_rows, JOB_CHUNK_ROWS)):
+            ctx.check()
+            scored = score_frame(chunk, params.get("risk_region", SCORE2_RISK_REGION), calculators,
+                                 float_dtype=plan.float_dtype)
+            writer.write(scored)
+            head = scored.head(PREVIEW_ROWS)
+            codes = {c: t for c, t in RESULT_CODE_COLUMNS.items() if c in head.columns}
+            ctx.progress(writer.rows, preview=decode_frame(head, codes).to_json(orient="records", force_ascii=False))
+    finally:
+        writer.close()
+        ctx.store.update(ctx.job_id, rows_done=writer.rows)
+    return f"{writer.rows:,}행을 계산했습니다."
+
+
+JOB_KINDS = {"score_cohort": score_cohort_job}
+
+
+class JobQueue:
+    def __init__(self, store: JobStore, directory: Path, max_workers: int = JOB_WORKERS):
+        self.store = store
+        self.directory = Path(directory)
+        self.inputs = self.directory / "inputs"
+        self.outputs = self.directory / "outputs"
+        self.inputs.mkdir(parents=True, exist_ok=True)
+        self.outputs.mkdir(parents=True, exist_ok=True)
+        self._pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="stroke-job")
+        self.store.recover()
+        self.store.purge()
+
+    def submit(self, kind: str, params: dict, data: bytes, suffix: str, label: str = "", owner: str = "",
+               output_suffix: str = ".parquet") -> str:
+        # data: 입력 파일 내용(업로드). 결과 파일은 outputs/<작업 id><output_suffix>입니다.
+        if kind not in JOB_KINDS:
+            raise ValueError(f"알 수 없는 작업 종류입니다: {kind}")
+        stem = uuid.uuid4().hex[:12]
+        input_path = self.inputs / f"{stem}{suffix}"
+        input_path.write_bytes(data)
+        job_id = self.store.create(kind, params, label, owner, str(input_path), str(self.outputs / f"{stem}{output_suffix}"))
+        self._pool.submit(self._run, job_id)
+        return job_id
+
+    def cancel(self, job_id: str) -> bool:
+        # 대기 중이면 바로 취소하고, 실행 중이면 다음 chunk 경계에서 멈추도록 요청합니다.
+        if self.store.transition(job_id, (QUEUED,), CANCELLED, finished=time.time(), message="시작 전에 취소했습니다."):
+            return True
+        return self.store.transition(job_id, (RUNNING,), CANCELLING)
+
+    def _run(self, job_id: str):
+        if not self.store.transition(job_id, (QUEUED,), RUNNING, started=time.time()):
+            return
+        job = self.store.get(job_id)
+        ctx = JobContext(self.store, job_id)
+        try:
+            message = JOB_KINDS[job["kind"]](ctx, job)
+        except JobCancelled:
+            rows = self.store.get(job_id)["rows_done"]
+            self.store.transition(job_id, (CANCELLING,), CANCELLED, finished=time.time(),
+                                  message=f"취소했습니다({rows:,}행까지 결과 파일에 기록되어 있습니다).")
+        except Exception as e:
+            self.store.transition(job_id, ACTIVE_STATUSES, FAILED, finished=time.time(), message=f"{type(e).__name__}: {e}")
+        else:
+            self.store.transition(job_id, (RUNNING, CANCELLING), DONE, finished=time.time(), message=message)
+
+
+def open_job_queue(directory: str = None) -> JobQueue:
+    directory = Path(directory or os.environ.get(JOB_DIR_ENV, DEFAULT_JOB_DIR))
+    directory.mkdir(parents=True, exist_ok=True)
+    return JobQueue(JobStore(str(directory / "jobs.db"), boot=uuid.uuid4().hex), directory)
@@ -0,0 +1,259 @@
+import numpy as np
+
+from calculators import (
+    ELAN_ANTERIOR_MAJOR_PATTERNS,
+    ELAN_ANTERIOR_PATTERNS,
+    ELAN_CIRCULATIONS,
+    ELAN_POSTERIOR_SITES,
+    PCE_COEFFS,
+    PCE_DOMAIN,
+    SCORE2_REGION_MULT,
+)
+from codes import ELAN_SEVERITY_LABELS, ESC_CATEGORY_LABELS, MAGIC_LABELS, MISSING
+
+
+# =========================================================
+# 벡터화 계산 커널 (NumPy)
+# - calculators.py의 스칼라 함수와 같은 규칙을 배열 단위로 계산합니다.
+# - 스칼라 함수가 None을 반환하는 입력은 NaN으로 표시합니다.
+# - 문자열/불리언/숫자 인자는 모두 스칼라 또는 같은 길이(브로드캐스트 가능)의 배열을 받습니다.
+# =========================================================
+ESC_SCORE2_CUTOFFS = (2.0, 10.0, 20.0)
+ESC_SCORE2_CATEGORIES = ESC_CATEGORY_LABELS[:4]
+
+
+def _f(x):
+    return np.asarray(x, dtype=np.float64)
+
+
+_PCE_TERMS = (
+    "ln_age", "ln_age_sq", "ln_tc", "ln_age_ln_tc", "ln_hdl", "ln_age_ln_hdl",
+    "ln_sbp_treated", "ln_sbp_untreated", "smoker", "ln_age_smoker", "diabetes",
+    "mean", "baseline_survival",
+)
+_PCE_GROUPS = list(PCE_COEFFS)
+# 그룹(성별, 인종)별 계수 행렬; 마지막 행은 계수가 없는 조합(NaN)
+_PCE_TABLE = np.array(
+    [[PCE_COEFFS[g].get(t, 0.0) for t in _PCE_TERMS] for g in _PCE_GROUPS] + [[np.nan] * len(_PCE_TERMS)]
+)
+
+
+def pce_group_code_np(sex, race):
+    sex = np.asarray(sex, dtype=object)
+    race = np.asarray(race, dtype=object)
+    code = np.full(np.broadcast_shapes(sex.shape, race.shape), len(_PCE_GROUPS), dtype=np.int8)
+    for i, (sx, rc) in enumerate(_PCE_GROUPS):
+        code[(sex == sx) & (race == rc)] = i
+    return code
+
+
+def pce_10y_risk_percent_np(sex, race, age, tc, hdl, sbp, bp_treated, smoker, diabetes, group_code=None,
+                            dtype=np.float64):
+    # group_code를 미리 계산해 넘기면 문자열 비교를 건너뜁니다.
+    # dtype=np.float32이면 중간 배열을 모두 float32로 계산합니다(메모리 절반, 결과 차이 0.001%p 미만).
+    # 검증 범위(PCE_DOMAIN) 검사는 dtype과 관계없이 입력 그대로(float64) 합니다. 범위 밖/결측은 NaN입니다.
+    inputs = {"age": _f(age), "tc": _f(tc), "hdl": _f(hdl), "sbp": _f(sbp)}
+    valid = np.bool_(True)
+    for k, (lo, hi) in PCE_DOMAIN.items():
+        valid = valid & (inputs[k] >= lo) & (inputs[k] <= hi)
+    age, tc, hdl, sbp = (inputs[k].astype(dtype, copy=False) for k in ("age", "tc", "hdl", "sbp"))
+    code = pce_group_code_np(sex, race) if group_code is None else np.asarray(group_code)
+    c = {t: _PCE_TABLE[code, j].astype(dtype, copy=False) for j, t in enumerate(_PCE_TERMS)}
+
+    ln_age = np.log(np.where(valid, age, 1.0))
+    ln_tc = np.log(np.where(valid, tc, 1.0))
+    ln_hdl = np.log(np.where(valid, hdl, 1.0))
+    ln_sbp = np.log(np.where(valid, sbp, 1.0))
+    smk = np.asarray(smoker, dtype=dtype)
+    dm = np.asarray(diabetes, dtype=dtype)
+
+    s = c["ln_age"] * ln_age
+    s = s + c["ln_age_sq"] * ln_age ** 2
+    s = s + (c["ln_tc"] + c["ln_age_ln_tc"] * ln_age) * ln_tc
+    s = s + (c["ln_hdl"] + c["ln_age_ln_hdl"] * ln_age) * ln_hdl
+    s = s + np.where(np.asarray(bp_treated, dtype=bool), c["ln_sbp_treated"], c["ln_sbp_untreated"]) * ln_sbp
+    s = s + (c["smoker"] + c["ln_age_smoker"] * ln_age) * smk
+    s = s + c["diabetes"] * dm
+    risk = 1 - c["baseline_survival"] ** np.exp(s - c["mean"])
+    return np.where(valid, np.clip(risk, 0.0, 1.0) * 100.0, np.nan)
+
+
+def score2_estimate_percent_np(age, sex, smoker, sbp, non_hdl, risk_region):
+    age, sbp, non_hdl = _f(age), _f(sbp), _f(non_hdl)
+    base = (age - 40) * 0.18
+    base = base + np.where(np.asarray(smoker, dtype=bool), 6.0, 0.0)
+    base = base + (sbp - 120) * 0.05
+    base = base + (non_hdl - 130) * 0.03
+    base = np.where(np.asarray(sex, dtype=object) == "남성", base * 1.20, base)
+
+    region = np.asarray(risk_region, dtype=object)
+    mult = np.ones(region.shape)
+    for name, m in SCORE2_REGION_MULT.items():
+        mult = np.where(region == name, m, mult)
+    base = base * mult
+
+    with np.errstate(over="ignore"):
+        p = 100.0 / (1.0 + np.exp(-0.07 * (base - 25)))
+    return np.clip(p, 0.1, 50.0)
+
+
+def esc_risk_category_code_np(score2_percent):
+    # 0=Low, 1=Moderate, 2=High, 3=Very high (ESC_SCORE2_CATEGORIES 인덱스)
+    return np.searchsorted(np.asarray(ESC_SCORE2_CUTOFFS), _f(score2_percent), side="right").astype(np.int8)
+
+
+# ---------- CrCl / NOAC 용량 ----------
+# 용량 class는 codes.NOAC_DOSE_RESULTS[drug]의 인덱스입니다.
+def cockcroft_gault_crcl_np(age, weight_kg, scr_mg_dl, female):
+    age, weight_kg, scr_mg_dl = _f(age), _f(weight_kg), _f(scr_mg_dl)
+    valid = scr_mg_dl > 0
+    crcl = ((140 - age) * weight_kg) / (72 * np.where(valid, scr_mg_dl, 1.0))
+    crcl = np.where(np.asarray(female, dtype=bool), crcl * 0.85, crcl)
+    return np.where(valid, crcl, np.nan)
+
+
+def noac_dose_apixaban_np(age, weight_kg, scr_mg_dl):
+    criteria = (
+        (_f(age) >= 80).astype(np.int8)
+        + (_f(weight_kg) <= 60).astype(np.int8)
+        + (_f(scr_mg_dl) >= 1.5).astype(np.int8)
+    )
+    return (criteria >= 2).astype(np.int8)
+
+
+def noac_dose_rivaroxaban_np(crcl):
+    crcl = _f(crcl)
+    return np.select(
+        [np.isnan(crcl), crcl > 50, (crcl >= 15) & (crcl <= 50)],
+        [0, 1, 2],
+        default=3,
+    ).astype(np.int8)
+
+
+def noac_dose_edoxaban_np(crcl, weight_kg):
+    crcl, weight_kg = _f(crcl), _f(weight_kg)
+    return np.select(
+        [np.isnan(crcl), crcl < 15, ((crcl >= 15) & (crcl <= 50)) | (weight_kg <= 60), crcl > 95],
+        [0, 1, 2, 3],
+        default=4,
+    ).astype(np.int8)
+
+
+def noac_dose_dabigatran_np(crcl, age):
+    crcl, age = _f(crcl), _f(age)
+    return np.select(
+        [np.isnan(crcl), crcl < 15, (crcl >= 15) & (crcl <= 30), age >= 80],
+        [0, 1, 2, 3],
+        default=4,
+    ).astype(np.int8)
+
+
+def noac_dose_class_np(drug: str, age, weight_kg, scr_mg_dl, female):
+    # 단일 약제 탭과 같은 입력으로 용량 class를 계산합니다.
+    if drug == "Apixaban":
+        return noac_dose_apixaban_np(age, weight_kg, scr_mg_dl)
+    crcl = cockcroft_gault_crcl_np(age, weight_kg, scr_mg_dl, female)
+    if drug == "Rivaroxaban":
+        return noac_dose_rivaroxaban_np(crcl)
+    if drug == "Edoxaban":
+        return noac_dose_edoxaban_np(crcl, weight_kg)
+    if drug == "Dabigatran":
+        return noac_dose_dabigatran_np(crcl, age)
+    raise ValueError(f"알 수 없는 NOAC입니다: {drug}")
+
+
+# ---------- 점수(합산형) ----------
+def _b(x):
+    return np.asarray(x, dtype=bool).astype(np.int8)
+
+
+def chads_vasc_score_np(chf, htn, age, dm, stroke_tia, vascular, female):
+    age = _f(age)
+    return (
+        _b(chf) + _b(htn) + np.where(age >= 75, 2, np.where(age >= 65, 1, 0)).astype(np.int8)
+        + _b(dm) + 2 * _b(stroke_tia) + _b(vascular) + _b(female)
+    ).astype(np.int8)
+
+
+def abcd2_score_np(age_ge_60, bp_ge_140_90, unilateral_weakness, speech_without_weakness, duration_min, diabetes):
+    duration_min = _f(duration_min)
+    clinical = np.where(np.asarray(unilateral_weakness, dtype=bool), 2, _b(speech_without_weakness))
+    duration = np.where(duration_min >= 60, 2, np.where((duration_min >= 10) & (duration_min <= 59), 1, 0))
+    return (_b(age_ge_60) + _b(bp_ge_140_90) + clinical + duration + _b(diabetes)).astype(np.int8)
+
+
+def has_bled_score_np(htn_sbp_gt160, renal, liver, stroke, bleed, inr_labile, age_gt65, drugs, alcohol):
+    return (
+        _b(htn_sbp_gt160) + _b(renal) + _b(liver) + _b(stroke) + _b(bleed)
+        + _b(inr_labile) + _b(age_gt65) + _b(drugs) + _b(alcohol)
+    ).astype(np.int8)
+
+
+def aha_very_high_risk_np(major_events_count, high_risk_conditions_count):
+    events = np.asarray(major_events_count)
+    return (events >= 2) | ((events == 1) & (np.asarray(high_risk_conditions_count) >= 2))
+
+
+# ---------- ELAN ----------
+# 코드는 codes.ELAN_SEVERITY_LABELS 인덱스(0=Minor, 1=Moderate, 2=Major)입니다.
+_MINOR, _MODERATE, _MAJOR = (ELAN_SEVERITY_LABELS.index(x) for x in ("Minor", "Moderate", "Major"))
+
+
+def elan_lesion_severity_code_np(circ, size_gt_1_5, anterior_pattern, posterior_site, anterior_multiterritory,
+                                 anterior_major_pattern):
+    circ, anterior_pattern = np.asarray(circ, dtype=object), np.asarray(anterior_pattern, dtype=object)
+    posterior_site = np.asarray(posterior_site, dtype=object)
+    anterior_major_pattern = np.asarray(anterior_major_pattern, dtype=object)
+    size = np.asarray(size_gt_1_5, dtype=bool)
+    by_size = np.where(size, _MODERATE, _MINOR)
+
+    posterior = np.select(
+        [np.isin(posterior_site, ELAN_POSTERIOR_SITES[:2]) & size, posterior_site == ELAN_POSTERIOR_SITES[2]],
+        [_MAJOR, _MODERATE],
+        by_size,
+    )
+    anterior = np.select(
+        [
+            np.isin(anterior_major_pattern, ELAN_ANTERIOR_MAJOR_PATTERNS[1:]) | np.asarray(anterior_multiterritory, dtype=bool),
+            np.isin(anterior_pattern, ELAN_ANTERIOR_PATTERNS[1:]),
+        ],
+        [_MAJOR, _MODERATE],
+        by_size,
+    )
+    return np.where(circ == ELAN_CIRCULATIONS[1], posterior, anterior).astype(np.int8)
+
+
+def elan_overall_code_np(n_minor, n_moderate, n_major):
+    # 환자별 병변 분류 개수 → 전체 분류(2 minor -> moderate, 2 moderate -> major). 병변이 없으면 MISSING
+    n_minor, n_moderate, n_major = np.asarray(n_minor), np.asarray(n_moderate), np.asarray(n_major)
+    return np.select(
+        [
+            n_major > 0,
+            n_moderate >= 2,
+            n_moderate > 0,
+            n_minor >= 2,
+            n_minor > 0,
+        ],
+        [_MAJOR, _MAJOR, _MODERATE, _MODERATE, _MINOR],
+        MISSING,
+    ).astype(np.int8)
+
+
+# ---------- MAGIC ----------
+# 코드는 codes.MAGIC_LABELS 인덱스입니다. 결측 답변은 '아니요'로 봅니다(스칼라 함수의 a.get()과 같음).
+def magic_result_code_np(other_determined, lacunar, relevant_artery, branch_atheroma, non_generic_pattern,
+                         ce_source, ce_high_risk):
+    other, lac, rel, br, ng, ce, hr = (
+        np.asarray(x, dtype=bool)
+        for x in np.broadcast_arrays(
+            other_determined, lacunar, relevant_artery, branch_atheroma, non_generic_pattern, ce_source, ce_high_risk
+        )
+    )
+    code = MAGIC_LABELS.index
+    ce_result = np.where(ce & hr, code("CE (high risk)"), code("UD negative"))
+    lacunar_result = np.select([rel & br, rel, ce], [code("LAA-BR"), code("LAA-LC"), ce_result], code("SVO"))
+    other_result = np.select(
+        [rel & ng, rel, ce], [code("LAA-NG"), code("LAA"), ce_result], code("UD negative")
+    )
+    return np.select([other, lac], [code("Other determined"), lacunar_result], other_result).astype(np.int8)
+
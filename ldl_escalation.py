@@ -0,0 +1,178 @@
+import argparse
+
+import numpy as np
+import pandas as pd
+
+from batch import SCORE2_RISK_REGION, conform_cohort, read_cohort, score_cohort, write_frame
+from codes import ESC_CATEGORY_LABELS, LDL_TARGET_MG_DL, MISSING
+from kernels import aha_very_high_risk_np
+
+
+# =========================================================
+# LDL 목표 도달 / 치료 강화 시뮬레이션(코호트)
+# - LDL 탭과 같은 단계(고강도 스타틴 → ezetimibe → PCSK9 억제제)를 코호트 전체에 벡터로 적용합니다.
+# - 각 단계는 아직 해당 약제를 쓰지 않고, 이전 단계 약제를 쓰는 중이며, 기준치 이상인 환자에게만 적용되고
+#   현재 LDL-C에 단계별 기대 감소율(%)을 곱합니다.
+# - 기준치: ESC는 위험군별 목표(target), AHA는 임상적 ASCVD 환자의 강화 역치(very high 55, 그 외 70)입니다.
+#   AHA 역치가 없는 환자(일차예방)는 AHA 집계에서 제외합니다.
+# - 단계별 결과는 (기준, 해당 단계까지의 감소율) 단위로 보관하므로, 한 단계의 가정을 바꾸면 그 단계부터만 다시 계산합니다.
+# =========================================================
+THERAPY_STEPS = ("statin", "ezetimibe", "pcsk9")
+THERAPY_COLUMNS = {"statin": "on_hi", "ezetimibe": "on_eze", "pcsk9": "on_pcsk9"}
+
+# 단계별 기대 LDL-C 감소율(%), 추가 시점의 LDL-C 기준
+DEFAULT_REDUCTIONS = {"statin": 50.0, "ezetimibe": 22.0, "pcsk9": 55.0}
+
+GUIDELINES = ("esc", "aha")
+AHA_THRESHOLD = 70.0
+AHA_THRESHOLD_VERY_HIGH = 55.0
+
+_VERY_HIGH = ESC_CATEGORY_LABELS.index("Very high")
+_VERY_HIGH_RECURRENT = ESC_CATEGORY_LABELS.index("Very high (recurrent within 2y)")
+
+# 보관할 단계 결과 수(가정 조합별)
+STEP_CACHE_ENTRIES = 64
+
+
+def _flag(df, col):
+    return df[col].fillna(False).to_numpy(dtype=bool)
+
+
+def esc_ldl_category_code(df: pd.DataFrame, esc_category) -> np.ndarray:
+    # 앱과 같은 규칙: documented ASCVD(뇌졸중/TIA, 혈관질환)가 있으면 Very high(2년 내 재발이면 recurrent),
+    # 없으면 SCORE2 컷오프 위험군(esc_category 코드)입니다.
+    ascvd = _flag(df, "stroke_tia") | _flag(df, "vascular")
+    recurrent = ascvd & _flag(df, "recurrent_ascvd")
+    category = np.where(ascvd, _VERY_HIGH, np.asarray(esc_category))
+    return np.where(recurrent, _VERY_HIGH_RECURRENT, category)
+
+
+def aha_threshold_np(df: pd.DataFrame) -> np.ndarray:
+    # 주요 ASCVD 사건 수는 뇌졸중/TIA·혈관질환 플래그 수로, high-risk condition 수는
+    # AHA_HR_CONDITIONS_CHECK 중 코호트 열로 알 수 있는 항목(나이 ≥65, 당뇨, 고혈압, CKD, 흡연, 심부전)으로 셉니다.
+    ascvd_events = _flag(df, "stroke_tia").astype(np.int64) + _flag(df, "vascular")
+    conditions = (
+        (df["age"].to_numpy(dtype=np.float64, na_value=np.nan) >= 65).astype(np.int64)
+        + _flag(df, "diabetes") + _flag(df, "htn") + _flag(df, "smoker")
+        + _flag(df, "chf") + _flag(df, "renal_disease")
+    )
+    very_high = aha_very_high_risk_np(ascvd_events, conditions)
+    return np.where(ascvd_events > 0, np.where(very_high, AHA_THRESHOLD_VERY_HIGH, AHA_THRESHOLD), np.nan)
+
+
+class LdlEscalationSimulator:
+    def __init__(self, df: pd.DataFrame, risk_region: str = SCORE2_RISK_REGION):
+        df = conform_cohort(df)
+        self.ldl = df["ldl"].to_numpy(dtype=np.float64, na_value=np.nan)
+        category = esc_ldl_category_code(df, score_cohort(df, risk_region)["esc_category"].to_numpy())
+        self.esc_category = category
+        self.goals = {
+            "esc": np.where(category == MISSING, np.nan, LDL_TARGET_MG_DL[category]),
+            "aha": aha_threshold_np(df),
+        }
+        self._baseline = {step: _flag(df, col) for step, col in THERAPY_COLUMNS.items()}
+        self._cache = {}
+        self.steps_computed = 0
+
+    def _state(self, guideline: str, reductions: tuple):
+        # reductions: THERAPY_STEPS 앞에서부터의 감소율 → (LDL-C, 단계별 사용 여부, 이번 단계에서 추가된 환자)
+        if not reductions:
+            return self.ldl, self._baseline, np.zeros(len(self.ldl), dtype=bool)
+        key = (guideline, reductions)
+        if key in self._cache:
+            return self._cache[key]
+
+        ldl, on, _ = self._state(guideline, reductions[:-1])
+        k = len(reductions) - 1
+        step = THERAPY_STEPS[k]
+        eligible = ~on[step] & (ldl >= self.goals[guideline])
+        if k:
+            eligible &= on[THERAPY_STEPS[k - 1]]
+        state = (
+            np.where(eligible, ldl * (1 - reductions[-1] / 100.0), ldl),
+            {**on, step: on[step] | eligible},
+            eligible,
+        )
+        self.steps_computed += 1
+        if len(self._cache) >= STEP_CACHE_ENTRIES:
+            self._cache.pop(next(iter(self._cache)))
+        self._cache[key] = state
+        return state
+
+    def _prefixes(self, reductions: dict):
+        values = tuple(float({**DEFAULT_REDUCTIONS, **(reductions or {})}[s]) for s in THERAPY_STEPS)
+        return [values[:k] for k in range(len(values) + 1)]
+
+    def summary(self, reductions: dict = None) -> pd.DataFrame:
+        # 기준 × 단계별: 평가 대상 수, 이 단계에서 추가된 환자 수, 기준 도달 수/비율
+        rows = []
+        for guideline in GUIDELINES:
+            goal = self.goals[guideline]
+            evaluated = ~np.isnan(goal) & ~np.isnan(self.ldl)
+            n = int(evaluated.sum())
+            for prefix in self._prefixes(reductions):
+                ldl, _, added = self._state(guideline, prefix)
+                at_goal = int((ldl[evaluated] < goal[evaluated]).sum())
+                rows.append({
+                    "guideline": guideline,
+                    "step": THERAPY_STEPS[len(prefix) - 1] if prefix else "baseline",
+                    "reduction_pct": prefix[-1] if prefix else 0.0,
+                    "evaluated": n,
+                    "added": int(added.sum()),
+                    "at_goal": at_goal,
+                    "percent": round(100.0 * at_goal / n, 2) if n else None,
+                })
+        return pd.DataFrame(rows)
+
+    def by_category(self, reductions: dict = None) -> pd.DataFrame:
+        # ESC 위험군별 단계 누적 목표 도달 비율(%)
+        goal = self.goals["esc"]
+        evaluated = ~np.isnan(goal) & ~np.isnan(self.ldl)
+        cat = self.esc_category[evaluated]
+        n = np.bincount(cat, minlength=len(ESC_CATEGORY_LABELS))
+        out = {}
+        for prefix in self._prefixes(reductions):
+            ldl, _, _ = self._state("esc", prefix)
+            hit = np.bincount(cat, weights=ldl[evaluated] < goal[evaluated], minlength=len(ESC_CATEGORY_LABELS))
+            out[THERAPY_STEPS[len(prefix) - 1] if prefix else "baseline"] = np.where(n > 0, 100.0 * hit / np.maximum(n, 1), np.nan)
+        return pd.DataFrame(out, index=pd.Index(ESC_CATEGORY_LABELS, name="esc_category")).assign(n=n)
+
+    def trajectory(self, guideline: str = "esc", reductions: dict = None) -> pd.DataFrame:
+        # 환자별 단계 후 LDL-C
+        return pd.DataFrame({
+            f"ldl_{THERAPY_STEPS[len(p) - 1] if p else 'baseline'}": self._state(guideline, p)[0]
+            for p in self._prefixes(reductions)
+        })
+
+
+def _parse_reductions(items) -> dict:
+    # "ezetimibe=25" 형식
+    out = {}
+    for item in items or []:
+        step, value = item.split("=")
+        if step not in THERAPY_STEPS:
+            raise argparse.ArgumentTypeError(f"알 수 없는 단계입니다: {step}")
+        out[step] = float(value)
+    return out
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="코호트 LDL-C 목표 도달과 치료 강화 단계를 시뮬레이션합니다.")
+    parser.add_argument("input")
+    parser.add_argument("--reduction", action="append", metavar="STEP=PCT",
+                        help=f"단계별 기대 감소율(%%), 기본값 {DEFAULT_REDUCTIONS}")
+    parser.add_argument("--risk-region", default=SCORE2_RISK_REGION)
+    parser.add_argument("-o", "--output", help="환자별 단계 후 LDL-C(ESC 기준) 저장 경로")
+    args = parser.parse_args(argv)
+
+    sim = LdlEscalationSimulator(read_cohort(args.input), args.risk_region)
+    reductions = _parse_reductions(args.reduction)
+    print(sim.summary(reductions).to_string(index=False))
+    print()
+    print(sim.by_category(reductions).round(1).to_string())
+    if args.output:
+        write_frame(sim.trajectory("esc", reductions), args.output)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,288 @@
+import json
+import os
+import sqlite3
+import threading
+from datetime import datetime, timedelta
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from calculators import NIHSS_ITEMS
+
+
+# =========================================================
+# 연속 NIHSS 추적(병동 단위)과 조기 신경학적 악화(END) 감지
+# - 환자마다 평가 기록을 (평가 수 × 15항목) int8 배열 + 시각(초) 배열로 보관하고, 용량이 차면 두 배로 늘립니다.
+# - 새 평가가 들어오면 직전 평가 대비 항목별/총점 변화와, 지금까지의 최선(최저) 총점·항목별 최저값 대비 변화를 계산합니다.
+#   최선값은 평가마다 갱신해 두므로 과거 기록을 다시 훑지 않습니다.
+# - 판정(최선값 대비):
+#     END  - 총점 END_TOTAL_POINTS점 이상 상승, 또는 의식(1a) / 운동(5a–6b) 항목이 1점 이상 악화
+#     관찰 - 총점 WATCH_TOTAL_POINTS점 이상 상승
+# - 병동 알림은 추가만 하는 목록이며, 화면은 자기 cursor 이후의 새 알림만 읽습니다(확인 비용 = 새 평가 수).
+#   cursor는 지금까지 나온 알림의 일련번호이며, 메모리에는 최근 MAX_ALERTS건만 남깁니다.
+# - 평가와 알림은 SQLite 파일(NihssStore)에 함께 기록하고, 서버가 다시 시작되면 평가를 순서대로 다시 넣어
+#   환자별 최선값과 현재 판정을 복원합니다(알림은 최근 MAX_ALERTS건을 읽습니다).
+#   파일은 서버 프로세스 하나가 씁니다. worker가 여럿이면 병동(STROKE_NIHSS_STORE)마다 worker 하나를 둡니다.
+# - 저장소 선택: 환경변수 STROKE_NIHSS_STORE
+#     "sqlite:///경로.db"(기본 ~/.stroke_assistant/nihss.db, 환자 기록이 있으므로 저장소 작업 폴더 밖) / "memory"(프로세스 내 보관)
+# =========================================================
+NIHSS_ITEM_NAMES = tuple(name for name, _, _ in NIHSS_ITEMS)
+N_ITEMS = len(NIHSS_ITEM_NAMES)
+ITEM_MAX = np.array([mx for _, _, mx in NIHSS_ITEMS], dtype=np.int8)
+LOC_ITEMS = ("1a. Level of consciousness (LOC)",)
+MOTOR_ITEMS = ("5a. Motor arm (Left)", "5b. Motor arm (Right)", "6a. Motor leg (Left)", "6b. Motor leg (Right)")
+_KEY_ITEMS = np.array([NIHSS_ITEM_NAMES.index(n) for n in LOC_ITEMS + MOTOR_ITEMS])
+
+END_TOTAL_POINTS = 4
+WATCH_TOTAL_POINTS = 2
+INITIAL_CAPACITY = 8
+MAX_ALERTS = 500
+
+NIHSS_STORE_ENV = "STROKE_NIHSS_STORE"
+DEFAULT_NIHSS_STORE = Path.home() / ".stroke_assistant" / "nihss.db"
+
+END, WATCH = "END", "관찰"
+
+_EPOCH = datetime(1970, 1, 1)
+
+
+def scores_array(nihss_vals: dict) -> np.ndarray:
+    # {항목 이름: 점수} → NIHSS_ITEMS 순서의 int8 배열(범위 밖이면 ValueError)
+    scores = np.array([int(nihss_vals[name]) for name in NIHSS_ITEM_NAMES], dtype=np.int16)
+    bad = [NIHSS_ITEM_NAMES[i] for i in np.flatnonzero((scores < 0) | (scores > ITEM_MAX))]
+    if bad:
+        raise ValueError(f"점수 범위를 벗어난 항목이 있습니다: {', '.join(bad)}")
+    return scores.astype(np.int8)
+
+
+class PatientNihss:
+    __slots__ = ("patient_id", "scores", "times", "n", "best_items", "best_total")
+
+    def __init__(self, patient_id: str):
+        self.patient_id = patient_id
+        self.scores = np.zeros((INITIAL_CAPACITY, N_ITEMS), dtype=np.int8)
+        self.times = np.zeros(INITIAL_CAPACITY, dtype=np.int64)
+        self.n = 0
+        self.best_items = None  # 항목별 지금까지의 최저값
+        self.best_total = None
+
+    def append(self, scores: np.ndarray, t_s: int) -> dict:
+        # 반환: 이번 평가의 변화와 판정(첫 평가면 기준값으로만 기록)
+        if self.n == len(self.times):
+            self.scores = np.concatenate([self.scores, np.zeros_like(self.scores)])
+            self.times = np.concatenate([self.times, np.zeros_like(self.times)])
+        current = scores.astype(np.int16)
+        total = int(current.sum())
+        event = {"patient_id": self.patient_id, "index": self.n, "time": _EPOCH + timedelta(seconds=t_s),
+                 "total": total, "delta": 0, "rise": 0, "item_delta": {}, "level": None, "reasons": []}
+        if self.n:
+            item_delta = current - self.scores[self.n - 1]
+            event["delta"] = int(item_delta.sum())
+            event["rise"] = total - self.best_total
+            event["item_delta"] = {NIHSS_ITEM_NAMES[i]: int(item_delta[i]) for i in np.flatnonzero(item_delta)}
+            rise_text = f"총점이 최선 {self.best_total}점보다 {event['rise']}점 높습니다"
+            worse = [NIHSS_ITEM_NAMES[i] for i in _KEY_ITEMS if current[i] > self.best_items[i]]
+            if event["rise"] >= END_TOTAL_POINTS:
+                event["reasons"].append(rise_text)
+            if worse:
+                event["reasons"].append("악화 항목: " + ", ".join(worse))
+            if event["reasons"]:
+                event["level"] = END
+            elif event["rise"] >= WATCH_TOTAL_POINTS:
+                event["level"] = WATCH
+                event["reasons"].append(rise_text)
+            self.best_items = np.minimum(self.best_items, current)
+            self.best_total = min(self.best_total, total)
+        else:
+            self.best_items = current
+            self.best_total = total
+        self.scores[self.n] = scores
+        self.times[self.n] = t_s
+        self.n += 1
+        return event
+
+    def history(self) -> pd.DataFrame:
+        scores = self.scores[: self.n]
+        df = pd.DataFrame(scores, columns=list(NIHSS_ITEM_NAMES))
+        df.insert(0, "time", pd.to_datetime(self.times[: self.n], unit="s"))
+        df["total"] = scores.sum(axis=1, dtype=np.int16)
+        return df
+
+
+# =========================================================
+# 저장소
+# - 평가는 (환자, 시각, 항목 점수 int8 bytes), 알림은 판정 event JSON으로 기록합니다.
+# - 알림 id는 일련번호이며 NihssTimeline의 cursor와 같습니다. 최근 MAX_ALERTS건보다 오래된 알림은 기록할 때 지웁니다.
+# =========================================================
+def _event_json(event: dict) -> str:
+    return json.dumps({**event, "time": event["time"].isoformat()}, ensure_ascii=False)
+
+
+def _event_from_json(text: str) -> dict:
+    event = json.loads(text)
+    event["time"] = datetime.fromisoformat(event["time"])
+    return event
+
+
+class NihssStore:
+    def __init__(self, path: str):
+        self.path = path
+        self._local = threading.local()
+        with self._conn() as conn:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS assessments (id INTEGER PRIMARY KEY AUTOINCREMENT, "
+                "patient_id TEXT NOT NULL, t_s INTEGER NOT NULL, scores BLOB NOT NULL)"
+            )
+            conn.execute("CREATE TABLE IF NOT EXISTS alerts (id INTEGER PRIMARY KEY AUTOINCREMENT, event TEXT NOT NULL)")
+
+    def _conn(self) -> sqlite3.Connection:
+        # 스레드별 연결(session_store.SQLiteSessionStore와 같은 방식)
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=5.0)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def add(self, patient_id: str, t_s: int, scores: np.ndarray, event: dict = None, keep_alerts: int = MAX_ALERTS):
+        with self._conn() as conn:
+            conn.execute("INSERT INTO assessments (patient_id, t_s, scores) VALUES (?, ?, ?)",
+                         (patient_id, t_s, scores.tobytes()))
+            if event is not None:
+                alert_id = conn.execute("INSERT INTO alerts (event) VALUES (?)", (_event_json(event),)).lastrowid
+                conn.execute("DELETE FROM alerts WHERE id <= ?", (alert_id - keep_alerts,))
+
+    def assessments(self):
+        # 기록 순서대로 (환자, 시각, 점수 배열)
+        for patient_id, t_s, blob in self._conn().execute("SELECT patient_id, t_s, scores FROM assessments ORDER BY id"):
+            yield patient_id, t_s, np.frombuffer(blob, dtype=np.int8)
+
+    def alerts(self, limit: int = MAX_ALERTS) -> tuple:
+        # 반환: (오래된 순 알림 목록, 마지막 알림 id)
+        rows = self._conn().execute("SELECT id, event FROM alerts ORDER BY id DESC LIMIT ?", (limit,)).fetchall()
+        last = self._conn().execute("SELECT seq FROM sqlite_sequence WHERE name = 'alerts'").fetchone()
+        return [_event_from_json(event) for _, event in reversed(rows)], (last[0] if last else 0)
+
+    def remove(self, patient_id: str):
+        with self._conn() as conn:
+            conn.execute("DELETE FROM assessments WHERE patient_id = ?", (patient_id,))
+
+
+def open_nihss_store(url: str = None):
+    # None을 반환하면 프로세스 안에만 보관합니다.
+    url = url or os.environ.get(NIHSS_STORE_ENV, f"sqlite:///{DEFAULT_NIHSS_STORE}")
+    if url == "memory":
+        return None
+    if not url.startswith("sqlite:///"):
+        raise ValueError(f"지원하지 않는 NIHSS 저장소입니다: {url}")
+    path = Path(url[len("sqlite:///"):]).expanduser()
+    path.parent.mkdir(parents=True, exist_ok=True)
+    return NihssStore(str(path))
+
+
+class NihssTimeline:
+    # 병동 전체(프로세스 내 모든 세션)가 공유하는 연속 NIHSS 기록입니다.
+    def __init__(self, store: NihssStore = None, max_alerts: int = MAX_ALERTS):
+        self._lock = threading.Lock()
+        self._patients = {}
+        self.store = store
+        self.max_alerts = max_alerts
+        self.alerts = []  # END/관찰 판정이 난 최근 평가(최대 max_alerts건)
+        self.alert_base = 0  # alerts[0] 앞에서 지운 알림 수(cursor = alert_base + len(alerts))
+        self.flagged = {}  # 환자 → 마지막 판정(판정 없이 평가되면 해제)
+        if store is not None:
+            self._load()
+
+    def __len__(self):
+        return len(self._patients)
+
+    def __contains__(self, patient_id):
+        return patient_id in self._patients
+
+    def _append(self, patient_id: str, scores: np.ndarray, t_s: int) -> dict:
+        patient = self._patients.get(patient_id)
+        if patient is None:
+            patient = self._patients[patient_id] = PatientNihss(patient_id)
+        event = patient.append(scores, t_s)
+        if event["level"] is not None:
+            self.flagged[patient_id] = event
+        else:
+            self.flagged.pop(patient_id, None)
+        return event
+
+    def _load(self):
+        for patient_id, t_s, scores in self.store.assessments():
+            self._append(patient_id, scores, t_s)
+        self.alerts, last = self.store.alerts(self.max_alerts)
+        self.alert_base = last - len(self.alerts)
+
+    def record(self, patient_id: str, nihss_vals: dict, when: datetime = None) -> dict:
+        scores = scores_array(nihss_vals)
+        t_s = int(((when or datetime.now()) - _EPOCH).total_seconds())
+        with self._lock:
+            patient = self._patients.get(patient_id)
+            if patient is not None and patient.n and t_s < patient.times[patient.n - 1]:
+                raise ValueError("직전 평가보다 이른 시각의 평가는 기록할 수 없습니다.")
+            event = self._append(patient_id, scores, t_s)
+            alert = event if event["level"] is not None else None
+            if self.store is not None:
+                self.store.add(patient_id, t_s, scores, alert, self.max_alerts)
+            if alert is not None:
+                self.alerts.append(alert)
+                if len(self.alerts) > self.max_alerts:
+                    drop = len(self.alerts) - self.max_alerts
+                    del self.alerts[:drop]
+                    self.alert_base += drop
+        return event
+
+    def cursor(self) -> int:
+        # 지금까지의 알림 끝 위치(새 세션은 여기서 시작해 이후 알림만 받습니다)
+        with self._lock:
+            return self.alert_base + len(self.alerts)
+
+    def new_alerts(self, cursor: int) -> tuple:
+        # 반환: (cursor 이후 알림 목록, 새 cursor). 이미 지운 알림은 건너뜁니다.
+        with self._lock:
+            return self.alerts[max(cursor - self.alert_base, 0):], self.alert_base + len(self.alerts)
+
+    def flagged_events(self) -> list:
+        # 현재 END/관찰 상태인 환자의 마지막 판정(END 먼저, 최근 순)
+        with self._lock:
+            events = list(self.flagged.values())
+        return sorted(events, key=lambda e: (e["level"] != END, -e["time"].timestamp()))
+
+    def history(self, patient_id: str) -> pd.DataFrame:
+        with self._lock:
+            patient = self._patients.get(patient_id)
+            return pd.DataFrame() if patient is None else patient.history()
+
+    def remove(self, patient_id: str):
+        # 퇴원 시 기록과 표시를 지웁니다(이미 나간 알림은 목록에 남습니다).
+        with self._lock:
+            self._patients.pop(patient_id, None)
+            self.flagged.pop(patient_id, None)
+            if self.store is not None:
+                self.store.remove(patient_id)
+
+
+def format_event(event: dict) -> str:
+    text = f"{event['patient_id']} {event['time']:%m-%d %H:%M} NIHSS {event['total']}점"
+    if event["index"]:
+        text += f"(직전 대비 {event['delta']:+d})"
+    if event["level"] is not None:
+        text += f" [{event['level']}] " + "; ".join(event["reasons"])
+    return text
+
+
+def timeline_text(history: pd.DataFrame) -> str:
+    # 의무기록용 연속 NIHSS 요약
+    lines = ["Serial NIHSS:"]
+    prev = None
+    for row in history.itertuples(index=False):
+        total = int(row.total)
+        change = "" if prev is None else f" ({total - prev:+d})"
+        lines.append(f"- {row.time:%Y-%m-%d %H:%M}: {total}{change}")
+        prev = total
+    return "\n".join(lines)
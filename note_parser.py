@@ -0,0 +1,262 @@
+import argparse
+import json
+import os
+import re
+from multiprocessing import Pool
+from pathlib import Path
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+from calculators import (
+    NIHSS_CODES,
+    NIHSS_ITEMS,
+    language_from_nihss_9,
+    motor_MRC_from_nihss,
+    mse_from_nihss_1a,
+)
+
+
+# =========================================================
+# NIHSS / Neurologic examination 기록 역파싱
+# - build_nihss_component_text / build_neuro_exam_text가 만든 형식을 다시 항목 점수로 되돌립니다.
+# - 패턴과 역매핑 표는 NIHSS_ITEMS와 표기 함수로부터 모듈 로드 시 한 번만 만듭니다.
+# - 문서 전체에 정규식 하나(finditer)로 한 번만 훑습니다.
+# =========================================================
+_ITEM_INDEX = {name: i for i, (name, *_) in enumerate(NIHSS_ITEMS)}
+_ITEM_MAX = [mx for _, _, mx in NIHSS_ITEMS]
+
+_MRC_TO_NIHSS = {motor_MRC_from_nihss(v): v for v in range(5)}
+_MSE_TO_NIHSS = {mse_from_nihss_1a(v): v for v in range(4)}
+_LANG_TO_NIHSS = {language_from_nihss_9(v): v for v in range(4)}
+
+_I_LOC = _ITEM_INDEX["1a. Level of consciousness (LOC)"]
+_I_LANG = _ITEM_INDEX["9. Best language"]
+_I_ARM_L = _ITEM_INDEX["5a. Motor arm (Left)"]
+_I_ARM_R = _ITEM_INDEX["5b. Motor arm (Right)"]
+_I_LEG_L = _ITEM_INDEX["6a. Motor leg (Left)"]
+_I_LEG_R = _ITEM_INDEX["6b. Motor leg (Right)"]
+
+_SIDE = {"left": "Left", "right": "Right", "bilateral": "Bilateral"}
+
+
+def _alt(options) -> str:
+    return "|".join(re.escape(x) for x in sorted(options, key=len, reverse=True))
+
+
+NOTE_PATTERN = re.compile(
+    "|".join(
+        [
+            rf"^- (?P<item>{_alt(_ITEM_INDEX)}): (?P<value>\d+)[ \t]*$",
+            r"^NIHSS total: (?P<total>\d+)[ \t]*$",
+            rf"^(?P<limb>LUE/RUE|LLE/RLE): (?P<left>{_alt(_MRC_TO_NIHSS)})/(?P<right>{_alt(_MRC_TO_NIHSS)})[ \t]*$",
+            rf"^MSE: (?P<mse>{_alt(_MSE_TO_NIHSS)})[ \t]*$",
+            rf"^Language function: (?P<lang>{_alt(_LANG_TO_NIHSS)})[ \t]*$",
+            r"^Facial expression: (?:(?P<facial>left|right) CTFP|(?P<facial_bi>bilateral) facial palsy \(\+\))[ \t]*$",
+            r"^Sensory: (?P<sensory>left|right|bilateral) hypesthesia \(\+\)[ \t]*$",
+            r"^Cerebellar function test: (?P<ataxia>left|right|bilateral) dysmetria \(\+\)[ \t]*$",
+        ]
+    ),
+    re.M,
+)
+
+
+def parse_note(text: str) -> dict:
+    # 반환값:
+    # - items: NIHSS_ITEMS 순서의 점수 목록(알 수 없으면 None)
+    # - stated_totals: 기록에 적힌 "NIHSS total" 값들
+    # - facial_side / sensory_side / ataxia_side: "Left"/"Right"/"Bilateral" 또는 None
+    # - consistent: 항목이 모두 있고 합계/중복 기재값이 서로 맞으면 True
+    comp = [None] * len(NIHSS_ITEMS)
+    exam = [None] * len(NIHSS_ITEMS)
+    totals = []
+    sides = {"facial_side": None, "sensory_side": None, "ataxia_side": None}
+    conflict = False
+
+    for m in NOTE_PATTERN.finditer(text):
+        g = m.groupdict()
+        if g["item"] is not None:
+            i = _ITEM_INDEX[g["item"]]
+            v = int(g["value"])
+            if v > _ITEM_MAX[i] or (comp[i] is not None and comp[i] != v):
+                conflict = True
+            comp[i] = v
+        elif g["total"] is not None:
+            totals.append(int(g["total"]))
+        elif g["limb"] is not None:
+            li, ri = (_I_ARM_L, _I_ARM_R) if g["limb"] == "LUE/RUE" else (_I_LEG_L, _I_LEG_R)
+            exam[li] = _MRC_TO_NIHSS[g["left"]]
+            exam[ri] = _MRC_TO_NIHSS[g["right"]]
+        elif g["mse"] is not None:
+            exam[_I_LOC] = _MSE_TO_NIHSS[g["mse"]]
+        elif g["lang"] is not None:
+            exam[_I_LANG] = _LANG_TO_NIHSS[g["lang"]]
+        elif g["facial"] is not None or g["facial_bi"] is not None:
+            sides["facial_side"] = _SIDE[g["facial"] or g["facial_bi"]]
+        elif g["sensory"] is not None:
+            sides["sensory_side"] = _SIDE[g["sensory"]]
+        elif g["ataxia"] is not None:
+            sides["ataxia_side"] = _SIDE[g["ataxia"]]
+
+    # 구성요소 목록을 우선하고, 빠진 항목은 신경학적 검사에서 정확히 복원되는 값으로 채웁니다.
+    items = []
+    for c, e in zip(comp, exam):
+        if c is not None and e is not None and c != e:
+            conflict = True
+        items.append(c if c is not None else e)
+
+    complete = all(v is not None for v in items)
+    total = sum(items) if complete else None
+    consistent = complete and not conflict and all(t == total for t in totals)
+    return {"items": items, "total": total, "stated_totals": totals, **sides, "consistent": consistent}
+
+
+def nihss_dict_from_items(items: list) -> dict:
+    # build_nihss_component_text 등에 바로 넣을 수 있는 {항목명: 점수} 형태
+    return {name: v for (name, *_), v in zip(NIHSS_ITEMS, items)}
+
+
+# =========================================================
+# 간단 점수 문자열("1a1 1b0 1c0 2 0 3 1 4 2 5a 3 ...")
+# - 항목 번호(NIHSS_CODES) 뒤에 점수 한 자리를 씁니다. 사이의 공백/":"/"="는 있어도 없어도 됩니다.
+#   점수는 항목 최대값이 4 이하이므로 항상 한 자리이며, "2031"처럼 붙여 써도 나뉩니다.
+# - 정규식 하나로 한 번만 훑고, 항목 사이에 구분자(공백 , ; /) 외의 글자가 있으면 오류로 알립니다.
+# =========================================================
+_CODE_ITEM = {code.lower(): name for code, (name, *_) in zip(NIHSS_CODES, NIHSS_ITEMS)}
+SCORE_STRING_PATTERN = re.compile(
+    r"(" + _alt(_CODE_ITEM) + r")\s*[:=]?\s*(\d)",
+    re.IGNORECASE,
+)
+_SEPARATORS = re.compile(r"[\s,;/]*")
+
+
+def parse_nihss_scores(text: str):
+    # 반환: ({항목명: 점수}, 오류 문구 목록). 문자열에 없는 항목은 결과에 넣지 않습니다.
+    values, errors, pos = {}, [], 0
+    for m in SCORE_STRING_PATTERN.finditer(text):
+        gap = text[pos:m.start()]
+        if not _SEPARATORS.fullmatch(gap):
+            errors.append(f"인식할 수 없는 입력입니다: '{gap.strip()}'")
+        pos = m.end()
+        name = _CODE_ITEM[m.group(1).lower()]
+        value = int(m.group(2))
+        if name in values:
+            errors.append(f"{m.group(1)} 항목이 두 번 입력되었습니다.")
+        elif value > _ITEM_MAX[_ITEM_INDEX[name]]:
+            errors.append(f"{m.group(1)} 항목 점수 {value}는 최대값 {_ITEM_MAX[_ITEM_INDEX[name]]}을 넘습니다.")
+        else:
+            values[name] = value
+    if not _SEPARATORS.fullmatch(text[pos:]):
+        errors.append(f"인식할 수 없는 입력입니다: '{text[pos:].strip()}'")
+    return values, errors
+
+
+def format_nihss_scores(values: dict) -> str:
+    # {항목명: 점수} → 간단 점수 문자열(parse_nihss_scores의 역). 숫자로 끝나는 번호는 점수와 띄어 씁니다.
+    return " ".join(
+        f"{code}{'' if code[-1].isalpha() else ' '}{values[name]}"
+        for code, (name, *_) in zip(NIHSS_CODES, NIHSS_ITEMS)
+        if name in values
+    )
+
+
+# =========================================================
+# 대량 처리(다중 프로세스)
+# - 입력: .txt(파일 하나 = 문서 하나) 또는 .jsonl({"id": ..., "text": ...} 한 줄 = 문서 하나)
+# - 출력 행: doc_id, nihss_<code>(-1=알 수 없음), total, stated_total, 방향, consistent
+# =========================================================
+ITEM_COLUMNS = [f"nihss_{c}" for c in NIHSS_CODES]
+NOTE_SCHEMA = pa.schema(
+    [("doc_id", pa.string())]
+    + [(col, pa.int8()) for col in ITEM_COLUMNS]
+    + [
+        ("total", pa.int16()),
+        ("stated_total", pa.int16()),
+        ("facial_side", pa.string()),
+        ("sensory_side", pa.string()),
+        ("ataxia_side", pa.string()),
+        ("consistent", pa.bool_()),
+    ]
+)
+
+
+def note_row(doc_id: str, text: str) -> dict:
+    r = parse_note(text)
+    row = {"doc_id": doc_id}
+    row.update({col: -1 if v is None else v for col, v in zip(ITEM_COLUMNS, r["items"])})
+    row["total"] = -1 if r["total"] is None else r["total"]
+    row["stated_total"] = r["stated_totals"][-1] if r["stated_totals"] else -1
+    row["facial_side"] = r["facial_side"]
+    row["sensory_side"] = r["sensory_side"]
+    row["ataxia_side"] = r["ataxia_side"]
+    row["consistent"] = r["consistent"]
+    return row
+
+
+def iter_documents(paths):
+    for path in paths:
+        path = Path(path)
+        if path.is_dir():
+            yield from iter_documents(sorted(p for p in path.rglob("*") if p.suffix in (".txt", ".jsonl")))
+        elif path.suffix == ".jsonl":
+            with open(path, encoding="utf-8") as f:
+                for n, line in enumerate(f):
+                    if line.strip():
+                        doc = json.loads(line)
+                        yield str(doc.get("id", f"{path.name}:{n}")), doc["text"]
+        else:
+            yield str(path), path.read_text(encoding="utf-8")
+
+
+def _parse_batch(batch):
+    return [note_row(doc_id, text) for doc_id, text in batch]
+
+
+def _batches(docs, size):
+    batch = []
+    for doc in docs:
+        batch.append(doc)
+        if len(batch) >= size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def iter_parsed_frames(docs, workers: int = None, batch_size: int = 2000):
+    # 문서 묶음 단위로 worker에 나눠 보내고, 입력 순서대로 DataFrame을 내보냅니다.
+    workers = workers or os.cpu_count() or 1
+    if workers == 1:
+        for batch in _batches(docs, batch_size):
+            yield pd.DataFrame(_parse_batch(batch))
+        return
+    with Pool(workers) as pool:
+        for rows in pool.imap(_parse_batch, _batches(docs, batch_size)):
+            yield pd.DataFrame(rows)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="NIHSS/Neurologic examination 기록 보관본을 구조화 데이터로 변환합니다.")
+    parser.add_argument("paths", nargs="+", help=".txt/.jsonl 파일 또는 디렉터리")
+    parser.add_argument("-o", "--output", required=True, help="출력 Parquet 파일")
+    parser.add_argument("-j", "--workers", type=int, default=None)
+    parser.add_argument("--batch-size", type=int, default=2000)
+    args = parser.parse_args(argv)
+
+    writer = None
+    n_docs = n_inconsistent = 0
+    for frame in iter_parsed_frames(iter_documents(args.paths), args.workers, args.batch_size):
+        table = pa.Table.from_pandas(frame, schema=NOTE_SCHEMA, preserve_index=False)
+        if writer is None:
+            writer = pq.ParquetWriter(args.output, NOTE_SCHEMA)
+        writer.write_table(table)
+        n_docs += len(frame)
+        n_inconsistent += int((~frame["consistent"]).sum())
+    if writer is not None:
+        writer.close()
+    print(f"{n_docs} documents, {n_inconsistent} inconsistent")
+
+
+if __name__ == "__main__":
+    main()
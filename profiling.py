@@ -0,0 +1,238 @@
+import argparse
+import cProfile
+import json
+import os
+import pstats
+import threading
+import time
+import tracemalloc
+from datetime import datetime
+from pathlib import Path
+
+import pandas as pd
+
+
+# =========================================================
+# 재실행(rerun) 단위 성능 측정(개발자용)
+# - 환경변수 STROKE_PROFILE_DIR이 설정된 경우에만 사용할 수 있습니다.
+# - 요청한 세션의 다음 N회 실행에 대해 cProfile(.prof)과 tracemalloc(.snap)을 함께 기록합니다.
+# - 파일마다 같은 이름의 .json에 세션 식별자, 실행 번호, 실행을 일으킨 위젯(값이 바뀐 키)을 남깁니다.
+# - tracemalloc은 프로세스 전체에 걸리므로 동시에 하나의 측정만 진행하며, 다른 세션의 요청은 다음 실행으로 미룹니다.
+# - 진행 중인 측정은 _active 하나로 관리합니다. 측정한 세션이 다시 실행되지 않아(탭을 닫은 경우 등)
+#   CAPTURE_MAX_SECONDS가 지나도록 끝나지 않은 측정은 어느 세션이든 다음 실행 시작 때 회수하고,
+#   그 측정이 켠 tracemalloc도 끕니다. 회수된 측정은 나중에 finish()가 불려도 기록하지 않습니다.
+# =========================================================
+PROFILE_DIR_ENV = "STROKE_PROFILE_DIR"
+TRACEMALLOC_FRAMES = 10
+CAPTURE_MAX_SECONDS = 300
+
+_capture_lock = threading.Lock()
+_active = None
+
+
+def profile_dir():
+    path = os.environ.get(PROFILE_DIR_ENV)
+    return Path(path) if path else None
+
+
+def _fingerprint(value) -> str:
+    try:
+        return repr(value)[:200]
+    except Exception:
+        return type(value).__name__
+
+
+def changed_keys(state, previous: dict) -> tuple:
+    # 직전 실행 종료 시점과 비교해 값이 달라진 키(= 이번 실행을 일으킨 위젯 후보)와 현재 지문을 반환합니다.
+    # "_"로 시작하는 내부 키는 제외합니다.
+    current = {str(k): _fingerprint(state[k]) for k in state if not str(k).startswith("_")}
+    changed = sorted(k for k, v in current.items() if previous.get(k) != v)
+    return changed, current
+
+
+class RerunCapture:
+    def __init__(self, out_dir: Path, session_id: str, run_no: int, trigger: list):
+        self.out_dir = out_dir
+        self.session_id = session_id
+        self.run_no = run_no
+        self.trigger = trigger
+        self.profile = cProfile.Profile()
+        self.started_tracemalloc = False
+        self.t0 = None
+        self.started = None
+
+    def start(self) -> bool:
+        global _active
+        with _capture_lock:
+            if _active is not None:
+                return False
+            _active = self
+            self.started = time.monotonic()
+            try:
+                if not tracemalloc.is_tracing():
+                    tracemalloc.start(TRACEMALLOC_FRAMES)
+                    self.started_tracemalloc = True
+                self.t0 = time.perf_counter()
+                self.profile.enable()
+            except Exception:
+                self._release()
+                raise
+        return True
+
+    def finish(self, interrupted: bool = False) -> Path:
+        # 회수된 측정이면 None을 반환합니다(그 사이 다른 측정이 tracemalloc을 쓰고 있을 수 있습니다).
+        self.profile.disable()
+        with _capture_lock:
+            if _active is not self:
+                return None
+            try:
+                wall_ms = (time.perf_counter() - self.t0) * 1000
+                snapshot = tracemalloc.take_snapshot()
+                peak_kb = tracemalloc.get_traced_memory()[1] / 1024
+            finally:
+                self._release()
+
+        self.out_dir.mkdir(parents=True, exist_ok=True)
+        stem = f"{datetime.now():%Y%m%d-%H%M%S}_{self.session_id[:8]}_{self.run_no:03d}"
+        base = self.out_dir / stem
+        self.profile.dump_stats(base.with_suffix(".prof"))
+        snapshot.dump(str(base.with_suffix(".snap")))
+        meta = {
+            "session_id": self.session_id,
+            "run": self.run_no,
+            "trigger": self.trigger,
+            "wall_ms": round(wall_ms, 2),
+            "peak_kb": round(peak_kb, 1),
+            # st.stop()/st.rerun()/예외로 스크립트 끝에 도달하지 못한 경우
+            "interrupted": interrupted,
+            "created": datetime.now().isoformat(timespec="seconds"),
+        }
+        base.with_suffix(".json").write_text(json.dumps(meta, ensure_ascii=False, indent=2), encoding="utf-8")
+        return base
+
+    def _release(self):
+        # _capture_lock을 잡은 상태에서 부릅니다.
+        global _active
+        if self.started_tracemalloc:
+            tracemalloc.stop()
+            self.started_tracemalloc = False
+        if _active is self:
+            _active = None
+
+
+def reclaim_stale(max_seconds: float = CAPTURE_MAX_SECONDS) -> bool:
+    # 오래 끝나지 않은 측정을 회수합니다. 그 실행의 스레드는 이미 끝났으므로 profiler는 함께 사라집니다.
+    with _capture_lock:
+        if _active is None or time.monotonic() - _active.started < max_seconds:
+            return False
+        _active._release()
+        return True
+
+
+# =========================================================
+# Streamlit 세션 연동
+# - begin_rerun()은 스크립트 맨 앞에서, end_rerun()은 스크립트 본문을 감싼 try/finally에서 호출합니다.
+#   st.stop()/st.rerun()/예외로 끝에 닿지 못한 실행은 interrupted=True로 기록합니다.
+# - 남은 측정 횟수와 직전 값 지문은 세션 상태의 "_profile_" 키에 둡니다.
+# =========================================================
+def request_capture(state, n_runs: int):
+    state["_profile_remaining"] = int(n_runs)
+    state["_profile_run_no"] = 0
+
+
+def begin_rerun(state, session_id: str):
+    out_dir = profile_dir()
+    if out_dir is None:
+        return None
+
+    reclaim_stale()
+    leftover = state.get("_profile_active")
+    if leftover is not None:
+        state["_profile_active"] = None
+        leftover.finish(interrupted=True)
+
+    changed, current = changed_keys(state, state.get("_profile_last_values", {}))
+    state["_profile_last_values"] = current
+    if state.get("_profile_remaining", 0) <= 0:
+        return None
+
+    run_no = state.get("_profile_run_no", 0) + 1
+    capture = RerunCapture(out_dir, session_id, run_no, changed)
+    if not capture.start():
+        return None
+    state["_profile_run_no"] = run_no
+    state["_profile_remaining"] -= 1
+    state["_profile_active"] = capture
+    return capture
+
+
+def end_rerun(state, interrupted: bool = False):
+    if profile_dir() is None:
+        return None
+    state["_profile_last_values"] = changed_keys(state, {})[1]
+    capture = state.get("_profile_active")
+    if capture is None:
+        return None
+    state["_profile_active"] = None
+    return capture.finish(interrupted)
+
+
+# =========================================================
+# 결과 조회
+# =========================================================
+def list_captures(out_dir) -> pd.DataFrame:
+    rows = []
+    for meta_path in sorted(Path(out_dir).glob("*.json"), reverse=True):
+        meta = json.loads(meta_path.read_text(encoding="utf-8"))
+        rows.append({"capture": meta_path.stem, **meta, "trigger": ", ".join(meta["trigger"]) or "(알 수 없음)"})
+    return pd.DataFrame(rows, columns=["capture", "created", "session_id", "run", "trigger", "wall_ms", "peak_kb", "interrupted"])
+
+
+def top_functions(prof_path, n: int = 25, sort: str = "cumulative") -> pd.DataFrame:
+    stats = pstats.Stats(str(prof_path))
+    rows = []
+    for (filename, lineno, func), (cc, nc, tt, ct, _) in stats.stats.items():
+        rows.append(
+            {
+                "function": f"{func} ({Path(filename).name}:{lineno})",
+                "ncalls": nc,
+                "tottime_ms": tt * 1000,
+                "cumtime_ms": ct * 1000,
+            }
+        )
+    key = {"cumulative": "cumtime_ms", "tottime": "tottime_ms", "ncalls": "ncalls"}[sort]
+    return pd.DataFrame(rows).sort_values(key, ascending=False).head(n).reset_index(drop=True)
+
+
+def top_allocations(snap_path, n: int = 25, group_by: str = "lineno") -> pd.DataFrame:
+    # 실행 종료 시점까지 남아 있는 할당을 위치별로 합산합니다(측정 모듈 자신의 할당은 제외합니다).
+    snapshot = tracemalloc.Snapshot.load(str(snap_path)).filter_traces(
+        [tracemalloc.Filter(False, tracemalloc.__file__), tracemalloc.Filter(False, __file__)]
+    )
+    rows = []
+    for stat in snapshot.statistics(group_by)[:n]:
+        frame = stat.traceback[0]
+        rows.append({"site": f"{Path(frame.filename).name}:{frame.lineno}", "size_kb": stat.size / 1024, "count": stat.count})
+    return pd.DataFrame(rows, columns=["site", "size_kb", "count"])
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="rerun 측정 결과(.prof/.snap)의 상위 함수와 메모리 할당 위치를 출력합니다.")
+    parser.add_argument("capture", nargs="?", help="측정 이름(확장자 제외). 생략 시 목록을 출력합니다.")
+    parser.add_argument("--dir", default=os.environ.get(PROFILE_DIR_ENV, "."))
+    parser.add_argument("-n", type=int, default=25)
+    parser.add_argument("--sort", choices=["cumulative", "tottime", "ncalls"], default="cumulative")
+    args = parser.parse_args(argv)
+
+    with pd.option_context("display.max_rows", None, "display.width", 200, "display.max_colwidth", 100):
+        if args.capture is None:
+            print(list_captures(args.dir).to_string(index=False))
+            return
+        base = Path(args.dir) / args.capture
+        print(top_functions(base.with_suffix(".prof"), args.n, args.sort).to_string(index=False))
+        print()
+        print(top_allocations(base.with_suffix(".snap"), args.n).to_string(index=False))
+
+
+if __name__ == "__main__":
+    main()
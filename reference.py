@@ -0,0 +1,214 @@
+import math
+import re
+import unicodedata
+from collections import Counter, defaultdict
+
+import pandas as pd
+
+from calculators import ESC_DOC_ASCVDS
+
+
+# =========================================================
+# 참고용 위험도 표 (ABCD2 / CHA2DS2-VASc)
+# =========================================================
+ABCD2_RISK_TABLE = pd.DataFrame(
+    [
+        {"ABCD²": "0–3 (Low)", "2-day risk": "1.0%", "7-day risk": "1.2%", "90-day risk": "3.1%"},
+        {"ABCD²": "4–5 (Moderate)", "2-day risk": "4.1%", "7-day risk": "5.9%", "90-day risk": "9.8%"},
+        {"ABCD²": "6–7 (High)", "2-day risk": "8.1%", "7-day risk": "11.7%", "90-day risk": "17.8%"},
+    ]
+)
+
+CHA2DS2_VASC_RISK_TABLE = pd.DataFrame(
+    [
+        {"Score": 0, "Annual stroke/systemic embolism risk": "0.2%"},
+        {"Score": 1, "Annual stroke/systemic embolism risk": "0.6%"},
+        {"Score": 2, "Annual stroke/systemic embolism risk": "2.2%"},
+        {"Score": 3, "Annual stroke/systemic embolism risk": "3.2%"},
+        {"Score": 4, "Annual stroke/systemic embolism risk": "4.8%"},
+        {"Score": 5, "Annual stroke/systemic embolism risk": "7.2%"},
+        {"Score": 6, "Annual stroke/systemic embolism risk": "9.7%"},
+        {"Score": 7, "Annual stroke/systemic embolism risk": "11.2%"},
+        {"Score": 8, "Annual stroke/systemic embolism risk": "10.8%"},
+        {"Score": 9, "Annual stroke/systemic embolism risk": "12.2%"},
+    ]
+)
+
+ELAN_REFERENCE_TABLE = pd.DataFrame(
+    [
+        {"Infarct Pattern": "Minor infarct (≤1.5 cm in any territory)", "Early initiation": "≤ 48시간"},
+        {"Infarct Pattern": "Moderate infarct (예: MCA cortical branch, deep MCA branch, internal border zone, ACA/PCA cortical branch)", "Early initiation": "≤ 48시간"},
+        {"Infarct Pattern": "Major infarct (예: entire territory, multiple territories, large posterior lesion 등)", "Early initiation": "6–7일"},
+    ]
+)
+
+ESC_DOC_ASCVD_TABLE = pd.DataFrame([{"ESC documented ASCVD 예시": x} for x in ESC_DOC_ASCVDS])
+
+
+# =========================================================
+# 가이드라인 및 근거 문서
+# - 화면의 "가이드라인 및 근거" 탭 내용을 절(section) 단위 문서로 보관합니다.
+# - 절: id, group(분류 탭 이름), title, body(markdown), table(DataFrame 또는 None), figure(그림 파일명 또는 None)
+# - 새 근거 자료는 REFERENCE_SECTIONS에 절을 추가하면 화면과 검색 색인에 함께 반영됩니다.
+# =========================================================
+REFERENCE_GROUPS = {
+    "📌 ABCD² / CHA₂DS₂-VASc": None,
+    "⏱️ ELAN": None,
+    "🧭 MAGIC": None,
+    "🫀 Dyslipidemia (ESC/AHA)": "ESC/EAS 2025 Focused Update 기반 핵심 근거(상세)",
+}
+_G_SCORE, _G_ELAN, _G_MAGIC, _G_LIPID = REFERENCE_GROUPS
+
+REFERENCE_SECTIONS = [
+    {
+        "id": "abcd2",
+        "group": _G_SCORE,
+        "title": "ABCD² 점수 및 단기 뇌졸중 재발 위험(참고)",
+        "table": ABCD2_RISK_TABLE,
+        "body": """
+- ABCD²는 TIA 이후 단기 뇌졸중 재발 위험을 층화하는 점수입니다.
+- 실제 위험도는 코호트/진료 환경/치료 상황에 따라 달라질 수 있습니다.
+""",
+    },
+    {
+        "id": "cha2ds2_vasc",
+        "group": _G_SCORE,
+        "title": "CHA₂DS₂-VASc 점수 및 연간 뇌졸중/전신색전증 위험(참고)",
+        "table": CHA2DS2_VASC_RISK_TABLE,
+        "body": """
+- CHA₂DS₂-VASc는 비판막성 AF에서 항응고 필요성을 판단하는 도구로 널리 사용됩니다.
+- 연간 위험도 수치는 항응고 치료 여부, 코호트 특성 등에 따라 달라질 수 있습니다.
+""",
+    },
+    {
+        "id": "elan",
+        "group": _G_ELAN,
+        "title": "ELAN 알고리즘 기준(요약)",
+        "table": ELAN_REFERENCE_TABLE,
+        "figure": "elan_figure.png",
+    },
+    {
+        "id": "magic",
+        "group": _G_MAGIC,
+        "title": "MAGIC 알고리즘(단계형 구현)",
+        "body": """
+- 본 애플리케이션의 MAGIC 파트는 사용 편의성을 위해 단계형 질문 방식으로 구현되어 있습니다.
+- 선택에 따라 다음 질문이 나타납니다.
+""",
+        "figure": "magic_figure.png",
+    },
+    {
+        "id": "esc_documented_ascvd",
+        "group": _G_LIPID,
+        "title": "1) ESC/EAS에서 ‘Documented ASCVD(임상 또는 영상으로 확실한 ASCVD)’ 정의",
+        "body": """
+- ESC 2025 Focused Update의 Table 3에서 very-high-risk 조건으로 “Documented ASCVD”를 명시합니다.
+- Documented ASCVD에는 다음이 포함됩니다:
+  - 이전 ACS(심근경색 또는 불안정 협심증)
+  - chronic coronary syndromes
+  - coronary revascularization(PCI, CABG, 기타 혈관 재개통술)
+  - stroke 및 TIA
+  - peripheral arterial disease
+- 또한 영상에서 확실한 ASCVD(관상동맥 CT/조영술 유의미 플라크, 경동맥/대퇴동맥 초음파 플라크, CAC 현저히 상승 등)도 포함됩니다.
+""",
+        "table": ESC_DOC_ASCVD_TABLE,
+    },
+    {
+        "id": "esc_score2_categories",
+        "group": _G_LIPID,
+        "title": "2) SCORE2/SCORE2-OP 컷오프 기반 위험군(ESC 2025 Table 3 요지)",
+        "body": """
+- Very high risk: SCORE2 또는 SCORE2-OP ≥20%
+- High risk: ≥10% and <20%
+- Moderate risk: ≥2% and <10%
+- Low risk: <2%
+""",
+    },
+    {
+        "id": "esc_risk_modifiers",
+        "group": _G_LIPID,
+        "title": "3) Risk modifiers(추가 위험 수정자) 예시(ESC 2025 Box 1 요지)",
+        "body": """
+- 가족력(조기 CVD), 고위험 인종, 스트레스/사회적 박탈, 비만/운동부족, 만성 염증성 질환, 정신질환, OSA 등
+- hs-CRP 상승, Lp(a) 상승 등
+""",
+    },
+    {
+        "id": "esc_intervention_strategy",
+        "group": _G_LIPID,
+        "title": "4) 위험도/LDL 수준에 따른 중재 전략(ESC 2025 Table 4 요지)",
+        "body": """
+- 위험도와 ‘치료 전 LDL-C’ 수준에 따라 생활요법만, 생활요법+약물 고려, 또는 생활요법+동반 약물치료를 제시합니다.
+- 특히 고위험/초고위험에서는 비교적 낮은 LDL 구간에서도 약물치료 병행을 권고하는 방향성이 나타납니다.
+""",
+    },
+]
+
+
+def sections_in_group(group: str) -> list:
+    return [s for s in REFERENCE_SECTIONS if s["group"] == group]
+
+
+# =========================================================
+# 전문 검색(역색인)
+# - 한국어는 띄어쓰기/조사 때문에 단어 단위로는 잘 맞지 않으므로, 단어마다 글자 2-gram으로 나눠 색인합니다.
+#   ("재발" → "재발", "재발률" → "재발", "발률") 영문/숫자도 같은 방식이라 부분 일치(PCSK9 ↔ pcsk)가 됩니다.
+# - 점수: 질의 n-gram 중 절에 있는 것의 idf 비율(coverage)이 MIN_COVERAGE 이상인 절만, coverage → tf-idf 순으로 정렬합니다.
+# =========================================================
+NGRAM = 2
+MIN_COVERAGE = 0.75
+_WORD = re.compile(r"\w+")
+
+
+def tokenize(text: str) -> list:
+    text = unicodedata.normalize("NFKC", text).lower()
+    grams = []
+    for word in _WORD.findall(text):
+        if len(word) <= NGRAM:
+            grams.append(word)
+        else:
+            grams.extend(word[i:i + NGRAM] for i in range(len(word) - NGRAM + 1))
+    return grams
+
+
+def section_text(section: dict) -> str:
+    parts = [section["group"], section["title"], section.get("body") or ""]
+    table = section.get("table")
+    if table is not None:
+        parts.extend(map(str, table.columns))
+        parts.extend(table.astype(str).to_numpy().ravel())
+    return "\n".join(parts)
+
+
+class ReferenceIndex:
+    def __init__(self, sections=REFERENCE_SECTIONS):
+        self.sections = list(sections)
+        self.postings = defaultdict(dict)  # gram → {절 번호: 빈도}
+        self.lengths = []
+        for i, section in enumerate(self.sections):
+            counts = Counter(tokenize(section_text(section)))
+            self.lengths.append(sum(counts.values()))
+            for gram, tf in counts.items():
+                self.postings[gram][i] = tf
+        n = len(self.sections)
+        self.idf = {gram: math.log(1 + n / len(docs)) for gram, docs in self.postings.items()}
+
+    def search(self, query: str, limit: int = None) -> list:
+        grams = set(tokenize(query))
+        if not grams:
+            return []
+        # 색인에 없는 n-gram도 분모에는 넣어 오타/무관 질의가 걸리지 않게 합니다.
+        unseen_idf = math.log(1 + len(self.sections))
+        total = sum(self.idf.get(g, unseen_idf) for g in grams)
+        matched = defaultdict(float)
+        weight = defaultdict(float)
+        for gram in grams:
+            idf = self.idf.get(gram)
+            if idf is None:
+                continue
+            for i, tf in self.postings[gram].items():
+                matched[i] += idf
+                weight[i] += idf * tf / self.lengths[i]
+        hits = [(matched[i] / total, weight[i], i) for i in matched if matched[i] / total >= MIN_COVERAGE]
+        hits.sort(key=lambda h: (-h[0], -h[1], h[2]))
+        return [self.sections[i] for _, _, i in hits[:limit]]
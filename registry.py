@@ -0,0 +1,668 @@
+import argparse
+import json
+import time
+from functools import lru_cache
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import numpy as np
+import pandas as pd
+
+from calculators import (
+    HAS_BLED_SCR_MG_DL,
+    MAGIC_ANSWER_KEYS,
+    NOAC_DRUGS,
+    PCE_DOMAIN,
+    SCORE2_REGION_MULT,
+    SCORE2_RISK_REGION,
+    abcd2_score,
+    chads_vasc_score,
+    cockcroft_gault_crcl,
+    esc_risk_category_from_score2,
+    has_bled_score,
+    magic_result_from_answers,
+    noac_dose_apixaban,
+    noac_dose_dabigatran,
+    noac_dose_edoxaban,
+    noac_dose_rivaroxaban,
+    pce_10y_risk_percent,
+    score2_estimate_percent,
+)
+from codes import CODE_DTYPE, CODE_TABLES, MISSING, SEX_LABELS, encode, noac_result_codes
+from kernels import (
+    abcd2_score_np,
+    chads_vasc_score_np,
+    cockcroft_gault_crcl_np,
+    esc_risk_category_code_np,
+    has_bled_score_np,
+    magic_result_code_np,
+    noac_dose_class_np,
+    pce_10y_risk_percent_np,
+    score2_estimate_percent_np,
+)
+
+
+# =========================================================
+# 계산기 등록부(registry)
+# - 계산기마다 입력(Field), 결과(이름 → 종류), 스칼라 함수, (있으면) 벡터 커널을 한 번 선언합니다.
+#   화면 입력 위젯(app.render_calculator), 캐시된 단건 평가, 코호트 열 매핑과 일괄 평가, JSON 서비스가 모두 이 선언에서 나옵니다.
+# - group을 적은 계산기는 코호트 일괄 계산 항목이 됩니다(batch.score_cohort, batch_plan, jobs, incremental이 모두
+#   cohort_groups()로 이 선언을 씁니다). 한 묶음에 여러 계산기를 둘 수 있습니다(예: noac = CrCl + NOAC 4종).
+# - 결과 종류: "float"(결측 NaN), "int"(점수, int8, 결측 MISSING), 그 밖의 문자열은 codes.CODE_TABLES 코드표 이름입니다.
+#   스칼라 함수는 코드 결과를 문구로, 커널은 코드로 반환합니다. 결과가 여럿이면 선언 순서의 tuple입니다.
+# - 커널이 없으면 일괄 평가는 고유한 입력 조합마다 스칼라 함수를 한 번씩 호출합니다.
+# - 일괄 평가에서 수치/선택 입력이 결측인 행은 결과도 결측입니다(플래그 결측은 '없음').
+#   체크 입력이라도 수치 열에서 만들면(예: HAS-BLED SBP >160) 그 열이 결측인 행은 결측이며,
+#   optional로 적은 열만 예외입니다(예: HAS-BLED 신기능은 Cr이 없으면 renal_disease 플래그만 봅니다).
+# =========================================================
+EVAL_CACHE_ENTRIES = 1024
+NUMERIC_KINDS = ("int", "float")
+
+
+class Field:
+    def __init__(self, name: str, kind: str, label: str, default=None, min=None, max=None, step=None, options=None,
+                 key: str = None, column: int = 0, source=None, transform=None, optional=()):
+        # kind: "bool" / "int" / "float" / "choice"
+        # key: 화면 위젯 key(생략 시 "<계산기>_<이름>"), column: 화면 열 위치
+        # source: 코호트 열 이름(또는 tuple), transform(*열 배열) → 입력 배열(생략 시 첫 열 그대로)
+        # optional: source 중 결측이어도 행을 결측으로 보지 않는 수치 열
+        self.name = name
+        self.kind = kind
+        self.label = label
+        self.options = list(options) if options is not None else None
+        if default is None:
+            default = {"bool": False, "choice": self.options[0] if self.options else None}.get(kind, min or 0)
+        self.default = default
+        self.min, self.max, self.step = min, max, step
+        self.key = key
+        self.column = column
+        self.source = (source,) if isinstance(source, str) else tuple((name,) if source is None else source)
+        self.transform = transform
+        self.optional = (optional,) if isinstance(optional, str) else tuple(optional)
+
+    def normalize(self, value):
+        # 서비스/단건 평가 입력 검사: 결측은 기본값으로 채우지 않습니다(기본값은 화면 위젯의 시작값입니다).
+        if value is None:
+            raise ValueError(f"{self.name}: 값이 없습니다.")
+        if self.kind == "bool":
+            if not isinstance(value, (bool, np.bool_)):
+                raise ValueError(f"{self.name}: {value!r}은(는) true/false가 아닙니다.")
+            return bool(value)
+        if isinstance(value, (bool, np.bool_)):
+            raise ValueError(f"{self.name}: {value!r}은(는) 수치가 아닙니다.")
+        if self.kind == "choice":
+            if value not in self.options:
+                raise ValueError(f"{self.name}: {value!r}은(는) 선택지({', '.join(map(str, self.options))})에 없습니다.")
+            return value
+        value = int(value) if self.kind == "int" else float(value)
+        if (self.min is not None and value < self.min) or (self.max is not None and value > self.max):
+            raise ValueError(f"{self.name}: {value}은(는) 범위({self.min}–{self.max}) 밖입니다.")
+        return value
+
+    def coerce(self, values) -> np.ndarray:
+        # 코호트 열 → 입력 배열(bool은 결측 False, 수치는 결측 NaN, 선택은 결측 None)
+        if self.kind == "bool":
+            values = np.asarray(values)
+            return values if values.dtype == bool else pd.array(values, dtype="boolean").fillna(False).to_numpy(dtype=bool)
+        if self.kind in NUMERIC_KINDS:
+            if isinstance(values, np.ndarray) and values.dtype == np.float64:
+                return values
+            return pd.to_numeric(pd.Series(values), errors="coerce").to_numpy(dtype=np.float64, na_value=np.nan)
+        values = pd.Series(values, dtype=object)
+        return values.where(values.notna(), None).to_numpy()
+
+    def schema(self) -> dict:
+        out = {"name": self.name, "kind": self.kind, "label": self.label, "default": self.default}
+        out.update({k: getattr(self, k) for k in ("min", "max", "options") if getattr(self, k) is not None})
+        return out
+
+
+def _cohort_column(df: pd.DataFrame, col: str) -> np.ndarray:
+    s = df[col]
+    if pd.api.types.is_bool_dtype(s.dtype):
+        return s.fillna(False).to_numpy(dtype=bool)
+    if pd.api.types.is_numeric_dtype(s.dtype):
+        return s.to_numpy(dtype=np.float64, na_value=np.nan)
+    return s.astype(object).where(s.notna(), None).to_numpy()
+
+
+class Calculator:
+    def __init__(self, name: str, title: str, inputs, outputs: dict, scalar, kernel=None, summary=None, group=None,
+                 columns=None, reducible=False):
+        # summary: 결과 dict → 한 줄 요약(문자열이면 format 틀)
+        # group: 코호트 일괄 계산 항목 이름(생략 시 단건/registry batch 전용), columns: 결과 이름 → 일괄 결과 열 이름
+        # reducible: 커널이 dtype 인자로 float32 중간 배열을 쓸 수 있음(batch_plan 참고)
+        self.name = name
+        self.title = title
+        self.inputs = list(inputs)
+        self.outputs = dict(outputs)
+        self.scalar = scalar
+        self.kernel = kernel
+        self.summary = summary
+        self.group = group
+        self.column_names = dict(columns or {})
+        self.reducible = reducible
+        for field in self.inputs:
+            field.key = field.key or f"{name}_{field.name}"
+        self._cached = lru_cache(maxsize=EVAL_CACHE_ENTRIES)(self._evaluate)
+
+    @property
+    def columns(self) -> dict:
+        # 일괄 결과 열 이름 → 결과 이름(결과가 하나면 계산기 이름이 곧 열 이름, column_names가 있으면 그 이름)
+        default = {out: self.name if len(self.outputs) == 1 else f"{self.name}_{out}" for out in self.outputs}
+        return {self.column_names.get(out, col): out for out, col in default.items()}
+
+    @property
+    def sources(self) -> tuple:
+        # 코호트에서 읽는 열(선언 순서, 중복 없이)
+        return tuple(dict.fromkeys(c for f in self.inputs for c in f.source))
+
+    def field(self, name: str) -> Field:
+        return next(f for f in self.inputs if f.name == name)
+
+    @property
+    def code_columns(self) -> dict:
+        # batch.write_frame에 넘길 코드 열 → 코드표 이름
+        return {col: self.outputs[out] for col, out in self.columns.items() if self.outputs[out] in CODE_TABLES}
+
+    def normalize(self, values: dict) -> tuple:
+        unknown = set(values) - {f.name for f in self.inputs}
+        if unknown:
+            raise ValueError(f"{self.name}: 알 수 없는 입력입니다: {', '.join(sorted(unknown))}")
+        return tuple(f.normalize(values.get(f.name)) for f in self.inputs)
+
+    def _evaluate(self, key: tuple) -> tuple:
+        result = self.scalar(**{f.name: v for f, v in zip(self.inputs, key)})
+        return tuple(zip(self.outputs, result if len(self.outputs) > 1 else (result,)))
+
+    def evaluate(self, values: dict = None, **kwargs) -> dict:
+        # 같은 입력이면 보관한 결과를 씁니다(rerun/서비스 반복 요청).
+        return dict(self._cached(self.normalize({**(values or {}), **kwargs})))
+
+    def describe(self, result: dict) -> str:
+        if self.summary is None:
+            return ", ".join(f"{k} = {v}" for k, v in result.items())
+        return self.summary(result) if callable(self.summary) else self.summary.format(**result)
+
+    def input_arrays(self, df: pd.DataFrame, fixed: dict = None) -> tuple:
+        # 반환: (입력 이름 → 배열, 결측 행)
+        # fixed: 모든 행에 같은 값을 쓸 입력(예: SCORE2 risk_region). 열이 없는 입력(source=())은 기본값입니다.
+        fixed = fixed or {}
+        missing = sorted({c for f in self.inputs if f.name not in fixed for c in f.source if c not in df.columns})
+        if missing:
+            raise ValueError(f"{self.name}: 입력 열이 없습니다: {', '.join(missing)}")
+        return self.source_arrays(lambda c: _cohort_column(df, c), len(df), fixed)
+
+    def source_arrays(self, column, n: int, fixed: dict = None, memo: dict = None) -> tuple:
+        # column(열 이름) → NumPy 배열(플래그는 결측 False, 수치는 결측 NaN의 float64, 문자열은 결측 None)
+        # batch는 DataFrame/Arrow record batch 모두 이 경로로 입력을 만듭니다.
+        # memo: 여러 계산기가 같은 열(성별 등)을 쓸 때 변환과 결측 검사를 한 번만 하도록 함께 넘기는 dict
+        fixed = fixed or {}
+        memo = {} if memo is None else memo
+        out = {}
+        incomplete = np.zeros(n, dtype=bool)
+        for f in self.inputs:
+            if not f.source or f.name in fixed:
+                value = f.normalize(fixed.get(f.name, f.default))
+                out[f.name] = np.full(n, value, dtype={"bool": bool, "choice": object}.get(f.kind, np.float64))
+                continue
+            key = (f.kind, f.source, f.optional) if f.transform is None else None
+            hit = memo.get(key)
+            if hit is None:
+                columns = [column(c) for c in f.source]
+                missing = np.zeros(n, dtype=bool)
+                for c, values in zip(f.source, columns):
+                    if values.dtype == np.float64 and c not in f.optional:
+                        missing |= np.isnan(values)
+                values = f.coerce(f.transform(*columns) if f.transform else columns[0])
+                if f.kind in NUMERIC_KINDS:
+                    missing |= np.isnan(values)
+                elif f.kind == "choice":
+                    missing |= pd.isna(values)
+                hit = values, missing
+                if key is not None:
+                    memo[key] = hit
+            out[f.name] = hit[0]
+            incomplete |= hit[1]
+        return out, incomplete
+
+    def evaluate_arrays(self, arrays: dict, incomplete: np.ndarray = None, float_dtype=np.float64) -> dict:
+        # 입력 배열 → 결과 이름별 배열(코드 결과는 코드, int는 int8, 실수는 float_dtype)
+        # incomplete: 결측 행(source_arrays 결과). 생략하면 입력 배열의 수치 NaN/선택 결측으로 구합니다.
+        n = len(next(iter(arrays.values())))
+        if incomplete is None:
+            incomplete = np.zeros(n, dtype=bool)
+            for f in self.inputs:
+                if f.kind in NUMERIC_KINDS:
+                    incomplete |= np.isnan(arrays[f.name])
+                elif f.kind == "choice":
+                    incomplete |= pd.isna(arrays[f.name])
+
+        if self.kernel is not None:
+            kwargs = {"dtype": float_dtype} if self.reducible else {}
+            with np.errstate(all="ignore"):
+                raw = self.kernel(**arrays, **kwargs)
+            raw = raw if len(self.outputs) > 1 else (raw,)
+        else:
+            raw = self._scalar_columns(arrays, n)
+
+        out = {}
+        for (name, kind), values in zip(self.outputs.items(), raw):
+            if kind == "float":
+                out[name] = np.where(incomplete, np.nan, np.asarray(values, dtype=np.float64)).astype(float_dtype, copy=False)
+            else:
+                out[name] = np.where(incomplete, MISSING, np.asarray(values)).astype(CODE_DTYPE)
+        return out
+
+    def _scalar_columns(self, arrays: dict, n: int) -> list:
+        # 고유한 입력 조합마다 스칼라 함수를 한 번 호출하고, 코드 결과는 문구 → 코드로 바꿉니다.
+        cache = {}
+        results = []
+        for row in zip(*(a.tolist() for a in arrays.values())):
+            hit = cache.get(row)
+            if hit is None:
+                try:
+                    hit = cache[row] = tuple(v for _, v in self._evaluate(row))
+                except (TypeError, ValueError):
+                    hit = cache[row] = (None,) * len(self.outputs)
+            results.append(hit)
+        columns = list(zip(*results)) if results else [()] * len(self.outputs)
+        out = []
+        for kind, values in zip(self.outputs.values(), columns):
+            if kind in CODE_TABLES:
+                out.append(encode(kind, list(values)))
+            elif kind == "float":
+                out.append(np.array([np.nan if v is None else v for v in values], dtype=np.float64))
+            else:
+                out.append(np.array([MISSING if v is None else v for v in values], dtype=np.int64))
+        return out
+
+    def evaluate_frame(self, df: pd.DataFrame, **fixed) -> pd.DataFrame:
+        # 코호트 DataFrame → 같은 index의 결과 DataFrame(열 이름은 columns 참고)
+        out = self.evaluate_arrays(*self.input_arrays(df, fixed))
+        return pd.DataFrame({col: out[name] for col, name in self.columns.items()}, index=df.index)
+
+    def schema(self) -> dict:
+        return {
+            "name": self.name,
+            "title": self.title,
+            "inputs": [f.schema() for f in self.inputs],
+            "outputs": {k: (list(CODE_TABLES[v]) if v in CODE_TABLES else v) for k, v in self.outputs.items()},
+            "vectorized": self.kernel is not None,
+        }
+
+
+REGISTRY = {}
+
+
+def register(calc: Calculator) -> Calculator:
+    if calc.name in REGISTRY:
+        raise ValueError(f"이미 등록된 계산기입니다: {calc.name}")
+    REGISTRY[calc.name] = calc
+    return calc
+
+
+def get_calculator(name: str) -> Calculator:
+    try:
+        return REGISTRY[name]
+    except KeyError:
+        raise ValueError(f"알 수 없는 계산기입니다: {name} (가능: {', '.join(REGISTRY)})") from None
+
+
+def cohort_groups() -> dict:
+    # 코호트 일괄 계산 항목 → 계산기 목록(등록 순서)
+    groups = {}
+    for calc in REGISTRY.values():
+        if calc.group is not None:
+            groups.setdefault(calc.group, []).append(calc)
+    return groups
+
+
+# =========================================================
+# 등록된 계산기
+# - 위젯 key/문구는 기존 화면과 같게 두어 세션 복원·작업 목록·EMR 채우기가 그대로 동작합니다.
+# - source/transform은 batch.COHORT_COLUMNS 열에서 입력을 만드는 방법입니다.
+# - 수치 입력의 min/max는 화면 위젯 범위이자 코호트 행을 위젯에 채울 때의 범위입니다(app.registry_range).
+#   PCE는 검증된 입력 범위(calculators.PCE_DOMAIN)를 쓰며, 스칼라 함수와 커널도 이 범위 밖에서는 결과를 내지 않습니다.
+# =========================================================
+def _female(sex):
+    return np.asarray(sex, dtype=object) == "Female"
+
+
+_SEX = dict(kind="choice", label="Sex", options=SEX_LABELS)
+_AGE = dict(kind="int", label="Age (years)", default=75, min=0, max=120, step=1)
+_WEIGHT = dict(kind="float", label="Weight (kg)", default=70.0, min=1.0, max=300.0, step=0.5, source="weight_kg")
+_SCR = dict(kind="float", label="Serum creatinine (mg/dL)", default=1.0, min=0.1, max=20.0, step=0.1,
+            source="scr_mg_dl")
+
+
+def _crcl_summary(r: dict) -> str:
+    if r["crcl"] is None:
+        return "CrCl 계산이 불가능합니다."
+    return f"Cockcroft–Gault CrCl은 약 {r['crcl']:.1f} mL/min입니다."
+
+
+_RENAL_INPUTS = lambda: [Field("age", **_AGE), Field("sex", **_SEX), Field("weight_kg", **_WEIGHT),  # noqa: E731
+                         Field("scr_mg_dl", **_SCR)]
+
+
+def _noac_inputs(drug: str) -> list:
+    # Apixaban 감량 기준(나이/체중/Cr)은 성별을 쓰지 않으므로 성별이 없어도 계산합니다.
+    return [f for f in _RENAL_INPUTS() if drug != "Apixaban" or f.name != "sex"]
+
+
+register(Calculator(
+    "crcl", "Cockcroft–Gault CrCl",
+    inputs=_RENAL_INPUTS(),
+    outputs={"crcl": "float"},
+    scalar=lambda age, sex, weight_kg, scr_mg_dl: cockcroft_gault_crcl(age, weight_kg, scr_mg_dl, sex == "Female"),
+    kernel=lambda age, sex, weight_kg, scr_mg_dl: cockcroft_gault_crcl_np(age, weight_kg, scr_mg_dl, _female(sex)),
+    summary=_crcl_summary,
+    group="noac",
+))
+
+
+def _noac_scalar(drug: str):
+    def scalar(age, weight_kg, scr_mg_dl, sex=None):
+        if drug == "Apixaban":
+            return noac_dose_apixaban(age, weight_kg, scr_mg_dl)
+        crcl = cockcroft_gault_crcl(age, weight_kg, scr_mg_dl, sex == "Female")
+        if drug == "Rivaroxaban":
+            return noac_dose_rivaroxaban(crcl)
+        if drug == "Edoxaban":
+            return noac_dose_edoxaban(crcl, weight_kg)
+        return noac_dose_dabigatran(crcl, age)
+    return scalar
+
+
+def _noac_kernel(drug: str):
+    def kernel(age, weight_kg, scr_mg_dl, sex=None):
+        return noac_result_codes(drug, noac_dose_class_np(drug, age, weight_kg, scr_mg_dl, _female(sex)))
+    return kernel
+
+
+for _drug in NOAC_DRUGS:
+    register(Calculator(
+        f"noac_{_drug.lower()}", f"NOAC 용량({_drug})",
+        inputs=_noac_inputs(_drug),
+        outputs={"dose": "noac_dose", "reason": "noac_reason"},
+        scalar=_noac_scalar(_drug),
+        kernel=_noac_kernel(_drug),
+        summary=f"{_drug} 권장 용량 표시는 '{{dose}}'이며, 판단 근거는 '{{reason}}'입니다.",
+        group="noac",
+        columns={"dose": f"{_drug.lower()}_dose", "reason": f"{_drug.lower()}_reason"},
+    ))
+
+register(Calculator(
+    "chads_vasc", "CHA₂DS₂-VASc",
+    inputs=[
+        Field("chf", "bool", "Congestive HF/LV dysfunction", key="cv_chf", column=0),
+        Field("htn", "bool", "Hypertension", key="cv_htn", column=0),
+        Field("dm", "bool", "Diabetes mellitus", key="cv_dm", column=0, source="diabetes"),
+        Field("age", "int", "Age", default=70, min=0, max=120, step=1, key="cv_age", column=1),
+        Field("stroke_tia", "bool", "Prior stroke/TIA/thromboembolism", key="cv_stroke", column=1),
+        Field("vascular", "bool", "Vascular disease (MI/PAD/aortic plaque)", key="cv_vascular", column=1),
+        Field("sex", key="cv_sex", column=2, **_SEX),
+    ],
+    outputs={"score": "int"},
+    scalar=lambda chf, htn, age, dm, stroke_tia, vascular, sex: chads_vasc_score(
+        chf, htn, age, dm, stroke_tia, vascular, sex == "Female"),
+    kernel=lambda chf, htn, age, dm, stroke_tia, vascular, sex: chads_vasc_score_np(
+        chf, htn, age, dm, stroke_tia, vascular, _female(sex)),
+    summary="CHA₂DS₂-VASc 점수는 {score}점입니다.",
+    group="chads_vasc",
+))
+
+register(Calculator(
+    "abcd2", "ABCD²",
+    inputs=[
+        Field("age_ge_60", "bool", "Age ≥60", column=0, source="age", transform=lambda age: age >= 60),
+        Field("diabetes", "bool", "Diabetes", column=0),
+        Field("bp_ge_140_90", "bool", "BP ≥140/90 at presentation", column=1),
+        Field("duration_min", "int", "Symptom duration (minutes)", default=20, min=0, max=10000, step=5, column=1),
+        Field("unilateral_weakness", "bool", "Unilateral weakness", column=2),
+        Field("speech_without_weakness", "bool", "Speech impairment without weakness", column=2),
+    ],
+    outputs={"score": "int"},
+    scalar=abcd2_score,
+    kernel=abcd2_score_np,
+    summary="ABCD² 점수는 {score}점입니다.",
+))
+
+register(Calculator(
+    "has_bled", "HAS-BLED",
+    inputs=[
+        Field("htn_sbp_gt160", "bool", "Hypertension (SBP >160)", key="hb_htn160", column=0,
+              source="sbp", transform=lambda sbp: sbp > 160),
+        Field("renal", "bool", "Abnormal renal function", key="hb_renal", column=0,
+              source=("renal_disease", "scr_mg_dl"), transform=lambda renal, scr: renal | (scr >= HAS_BLED_SCR_MG_DL),
+              optional="scr_mg_dl"),
+        Field("liver", "bool", "Abnormal liver function", key="hb_liver", column=0, source="liver_disease"),
+        Field("stroke", "bool", "Stroke history", key="hb_stroke", column=1, source="stroke_tia"),
+        Field("bleed", "bool", "Bleeding history/predisposition", key="hb_bleed", column=1, source="bleeding_history"),
+        Field("inr_labile", "bool", "Labile INR (if on warfarin)", key="hb_inr", column=1, source="labile_inr"),
+        Field("age_gt65", "bool", "Age >65", key="hb_age65", column=2, source="age", transform=lambda age: age > 65),
+        Field("drugs", "bool", "Drugs predisposing to bleeding (antiplatelet/NSAID)", key="hb_drugs", column=2,
+              source="bleeding_drugs"),
+        Field("alcohol", "bool", "Alcohol use (excess)", key="hb_alcohol", column=2, source="alcohol_excess"),
+    ],
+    outputs={"score": "int"},
+    scalar=has_bled_score,
+    kernel=has_bled_score_np,
+    summary="HAS-BLED 점수는 {score}점입니다.",
+    group="has_bled",
+))
+
+
+register(Calculator(
+    "pce", "AHA/ACC PCE 10년 ASCVD 위험",
+    inputs=[
+        Field("sex", **_SEX),
+        Field("race", "choice", "Race", options=("White", "African American")),
+        Field("age", "int", "Age (years)", 60, *PCE_DOMAIN["age"], step=1),
+        Field("tc", "float", "Total cholesterol (mg/dL)", 200.0, *PCE_DOMAIN["tc"], step=1.0),
+        Field("hdl", "float", "HDL (mg/dL)", 50.0, *PCE_DOMAIN["hdl"], step=1.0),
+        Field("sbp", "float", "Systolic BP (mmHg)", 130.0, *PCE_DOMAIN["sbp"], step=1.0),
+        Field("bp_treated", "bool", "On BP treatment"),
+        Field("smoker", "bool", "Current smoker"),
+        Field("diabetes", "bool", "Diabetes"),
+    ],
+    outputs={"risk": "float"},
+    scalar=pce_10y_risk_percent,
+    kernel=pce_10y_risk_percent_np,
+    summary=lambda r: "PCE 계산이 불가능합니다." if r["risk"] is None else f"PCE 10년 ASCVD 위험도는 {r['risk']:.1f}%입니다.",
+    group="pce",
+    columns={"risk": "pce_risk"},
+    reducible=True,
+))
+
+
+def _score2_scalar(age, sex, smoker, sbp, tc, hdl, risk_region):
+    score2 = score2_estimate_percent(age, "여성" if sex == "Female" else "남성", smoker, sbp, tc - hdl, risk_region)
+    return score2, esc_risk_category_from_score2(score2)
+
+
+def _score2_kernel(age, sex, smoker, sbp, tc, hdl, risk_region):
+    score2 = score2_estimate_percent_np(age, np.where(_female(sex), "여성", "남성"), smoker, sbp, tc - hdl, risk_region)
+    return score2, esc_risk_category_code_np(score2)
+
+
+register(Calculator(
+    "score2", "ESC SCORE2(추정)",
+    inputs=[
+        Field("age", "int", "Age (years)", default=65, min=40, max=89, step=1),
+        Field("sex", **_SEX),
+        Field("smoker", "bool", "Current smoker"),
+        Field("sbp", "float", "Systolic BP (mmHg)", default=130.0, min=80.0, max=240.0, step=1.0),
+        Field("tc", "float", "Total cholesterol (mg/dL)", default=200.0, min=50.0, max=500.0, step=1.0),
+        Field("hdl", "float", "HDL (mg/dL)", default=50.0, min=5.0, max=200.0, step=1.0),
+        Field("risk_region", "choice", "Risk region", default=SCORE2_RISK_REGION, options=SCORE2_REGION_MULT,
+              source=()),
+    ],
+    outputs={"score2": "float", "category": "esc_category"},
+    scalar=_score2_scalar,
+    kernel=_score2_kernel,
+    summary="SCORE2 추정치는 {score2:.1f}%이며, 위험군은 {category}입니다.",
+    group="score2",
+    columns={"score2": "score2", "category": "esc_category"},
+))
+
+register(Calculator(
+    "magic", "MAGIC mechanism",
+    inputs=[Field(k, "bool", k, source=f"magic_{k}") for k in MAGIC_ANSWER_KEYS],
+    outputs={"mechanism": "magic"},
+    scalar=lambda **a: magic_result_from_answers(a),
+    kernel=lambda **a: magic_result_code_np(*(a[k] for k in MAGIC_ANSWER_KEYS)),
+    summary="MAGIC 분류 결과는 {mechanism}입니다.",
+))
+
+
+# =========================================================
+# 명령줄: 목록 / JSON 서비스 / 일괄 계산 / 경로별 속도
+# - serve: GET /calculators → 스키마 목록, POST /calculators/<이름> → 입력 객체(또는 객체 배열)의 결과
+#   입력은 모두 필요하며, 빠졌거나 체크 입력이 true/false가 아니거나 범위 밖이면 400입니다.
+#   표준 라이브러리 HTTP 서버이므로 병원 내부망 시험용입니다(인증/TLS 없음).
+# =========================================================
+DEFAULT_PORT = 8765
+PROFILE_ROWS = 20_000
+PROFILE_DISTINCT = 100  # 캐시 경로: 반복되는 고유 입력 수
+
+
+def _respond(calc: Calculator, values: dict) -> dict:
+    result = calc.evaluate(values)
+    return {"result": result, "summary": calc.describe(result)}
+
+
+class _Handler(BaseHTTPRequestHandler):
+    def _send(self, status: int, body):
+        data = json.dumps(body, ensure_ascii=False).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json; charset=utf-8")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def do_GET(self):
+        if self.path.rstrip("/") != "/calculators":
+            return self._send(404, {"error": "GET /calculators 만 지원합니다."})
+        self._send(200, [c.schema() for c in REGISTRY.values()])
+
+    def do_POST(self):
+        prefix = "/calculators/"
+        name = self.path[len(prefix):].strip("/") if self.path.startswith(prefix) else ""
+        if name not in REGISTRY:
+            return self._send(404, {"error": f"알 수 없는 계산기입니다: {name}"})
+        calc = REGISTRY[name]
+        try:
+            body = json.loads(self.rfile.read(int(self.headers.get("Content-Length") or 0)) or b"{}")
+            if isinstance(body, list):
+                return self._send(200, [_respond(calc, v) for v in body])
+            self._send(200, _respond(calc, body))
+        except (ValueError, TypeError, AttributeError) as e:
+            self._send(400, {"error": str(e)})
+
+    def log_message(self, format, *args):
+        pass
+
+
+def serve(host: str = "127.0.0.1", port: int = DEFAULT_PORT):
+    server = ThreadingHTTPServer((host, port), _Handler)
+    print(f"http://{host}:{server.server_port}/calculators", flush=True)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+def sample_inputs(calc: Calculator, n: int, rng) -> dict:
+    # 입력 범위 안의 무작위 배열(속도 측정용)
+    out = {}
+    for f in calc.inputs:
+        if f.kind == "bool":
+            out[f.name] = rng.random(n) < 0.3
+        elif f.kind == "choice":
+            out[f.name] = np.array(f.options, dtype=object)[rng.integers(0, len(f.options), n)]
+        else:
+            lo, hi = f.min if f.min is not None else 0, f.max if f.max is not None else 100
+            values = rng.uniform(lo, hi, n)
+            out[f.name] = np.round(values) if f.kind == "int" else np.round(values, 1)
+    return out
+
+
+def profile(calc: Calculator, n: int, rng) -> dict:
+    # 반환: 경로별 초당 행 수(scalar: 매번 계산, cached: 고유 입력 PROFILE_DISTINCT개 반복, frame: 배열 경로)
+    arrays = sample_inputs(calc, n, rng)
+    rows = [dict(zip(arrays, r)) for r in zip(*(a.tolist() for a in arrays.values()))]
+    repeated = [rows[i % PROFILE_DISTINCT] for i in range(n)]
+    timings = {}
+    for path, run in (
+        ("scalar", lambda: [calc._evaluate(calc.normalize(r)) for r in rows]),
+        ("cached", lambda: [calc.evaluate(r) for r in repeated]),
+        ("frame", lambda: calc.evaluate_arrays(arrays)),
+    ):
+        calc._cached.cache_clear()
+        started = time.perf_counter()
+        run()
+        timings[path] = n / max(time.perf_counter() - started, 1e-9)
+    return timings
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="등록된 계산기를 목록/JSON 서비스/일괄 계산/속도 측정으로 사용합니다.")
+    sub = parser.add_subparsers(dest="command", required=True)
+    sub.add_parser("list", help="계산기와 입력 목록을 출력합니다.")
+    p = sub.add_parser("serve", help="JSON HTTP 서비스를 실행합니다.")
+    p.add_argument("--host", default="127.0.0.1")
+    p.add_argument("--port", type=int, default=DEFAULT_PORT)
+    p = sub.add_parser("batch", help="코호트 파일(Parquet/CSV/Arrow IPC)에 계산기를 적용합니다.")
+    p.add_argument("input")
+    p.add_argument("-o", "--output", required=True)
+    p.add_argument("--calculators", required=True, help=f"쉼표로 구분(가능: {', '.join(REGISTRY)})")
+    p.add_argument("--risk-region", default=SCORE2_RISK_REGION)
+    p = sub.add_parser("profile", help="계산기별 스칼라/캐시/배열 경로 속도를 비교합니다.")
+    p.add_argument("calculators", nargs="*", help="생략 시 전체")
+    p.add_argument("-n", "--rows", type=int, default=PROFILE_ROWS)
+    p.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args(argv)
+
+    if args.command == "list":
+        for calc in REGISTRY.values():
+            mode = "vector" if calc.kernel is not None else "scalar"
+            print(f"{calc.name:<18} {mode:<7} {calc.title}")
+            print(f"{'':<27}입력: {', '.join(f.name for f in calc.inputs)}")
+        return
+    if args.command == "serve":
+        serve(args.host, args.port)
+        return
+    try:
+        names = args.calculators if args.command == "profile" else args.calculators.split(",")
+        calcs = [get_calculator(n.strip()) for n in names if n.strip()] or list(REGISTRY.values())
+    except ValueError as e:
+        parser.error(str(e))
+    if args.command == "profile":
+        rng = np.random.default_rng(args.seed)
+        print(f"{'계산기':<18} {'scalar':>12} {'cached':>12} {'frame':>12}  (행/초)")
+        for calc in calcs:
+            t = profile(calc, args.rows, rng)
+            print(f"{calc.name:<18} {t['scalar']:>12,.0f} {t['cached']:>12,.0f} {t['frame']:>12,.0f}", flush=True)
+        return
+
+    from batch import read_cohort, write_frame  # batch가 이 모듈을 import합니다.
+
+    df = read_cohort(args.input)
+    fixed = {"risk_region": args.risk_region}
+    frames, code_columns = [], {}
+    for calc in calcs:
+        try:
+            names = {f.name for f in calc.inputs}
+            frames.append(calc.evaluate_frame(df, **{k: v for k, v in fixed.items() if k in names}))
+        except ValueError as e:
+            parser.error(str(e))
+        code_columns.update(calc.code_columns)
+    write_frame(pd.concat(frames, axis=1), args.output, code_columns)
+    print(f"{len(df):,}행 → {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,145 @@
+import numpy as np
+
+from calculators import PCE_DOMAIN
+from kernels import (
+    ESC_SCORE2_CUTOFFS,
+    esc_risk_category_code_np,
+    pce_10y_risk_percent_np,
+    pce_group_code_np,
+    score2_estimate_percent_np,
+)
+
+
+# =========================================================
+# 측정 변동성을 반영한 위험도 불확실성 구간(Monte Carlo)
+# - SBP는 정규분포(절대 SD), 지질은 로그정규분포(CV)로 측정값을 흔들어 재계산합니다.
+# - 로그정규 교란은 중앙값을 보존하므로, 결과 중앙값은 점추정치와 거의 같게 나옵니다.
+# - 기본값은 교육용 가정치이며 기관 데이터로 조정하실 수 있습니다.
+# - PCE는 검증 범위(PCE_DOMAIN) 밖이면 결측이므로, 흔든 측정값은 범위 끝으로 자르고
+#   점추정치가 결측인 환자(입력이 범위 밖)는 구간도 결측으로 둡니다.
+# =========================================================
+SBP_SD_MMHG = 10.0
+LIPID_CV = {"tc": 0.07, "hdl": 0.07, "non_hdl": 0.08}
+DEFAULT_N_SAMPLES = 20000
+PCE_CUTOFFS = (5.0, 7.5, 20.0)
+
+# 한 번에 만드는 (환자 × 표본) 배열 원소 수 상한(메모리 보호용)
+_MAX_ELEMENTS = 4_000_000
+
+
+def _normal(rng, x, sd, n):
+    return np.maximum(x[:, None] + sd * rng.standard_normal((x.shape[0], n)), 1.0)
+
+
+def _lognormal(rng, x, cv, n):
+    sigma = np.sqrt(np.log1p(cv ** 2))
+    return x[:, None] * np.exp(sigma * rng.standard_normal((x.shape[0], n)))
+
+
+def _summarize(samples, point, cutoffs):
+    lo, med, hi = np.quantile(samples, [0.025, 0.5, 0.975], axis=1)
+    out = {"point": point, "median": med, "lo95": lo, "hi95": hi}
+    for c in cutoffs:
+        out[f"p_ge_{c:g}"] = np.where(np.isnan(point), np.nan, (samples >= c).mean(axis=1))
+    return out
+
+
+def _run(n_patients, n_samples, chunk_fn):
+    chunk = max(1, _MAX_ELEMENTS // n_samples)
+    parts = [chunk_fn(slice(i, min(i + chunk, n_patients))) for i in range(0, n_patients, chunk)]
+    return {k: np.concatenate([p[k] for p in parts]) for k in parts[0]}
+
+
+def _squeeze(result: dict, scalar_input: bool):
+    if not scalar_input:
+        return result
+    return {k: float(v[0]) for k, v in result.items()}
+
+
+def pce_risk_uncertainty(
+    sex,
+    race,
+    age,
+    tc,
+    hdl,
+    sbp,
+    bp_treated,
+    smoker,
+    diabetes,
+    n_samples: int = DEFAULT_N_SAMPLES,
+    sbp_sd: float = SBP_SD_MMHG,
+    tc_cv: float = LIPID_CV["tc"],
+    hdl_cv: float = LIPID_CV["hdl"],
+    cutoffs=PCE_CUTOFFS,
+    seed: int = 0,
+):
+    scalar_input = np.ndim(age) == 0 and np.ndim(sex) == 0
+    sex, race, age, tc, hdl, sbp, bp_treated, smoker, diabetes = (
+        np.atleast_1d(x) for x in np.broadcast_arrays(
+            np.asarray(sex, dtype=object), np.asarray(race, dtype=object),
+            np.asarray(age, dtype=np.float64), np.asarray(tc, dtype=np.float64),
+            np.asarray(hdl, dtype=np.float64), np.asarray(sbp, dtype=np.float64),
+            np.asarray(bp_treated, dtype=bool), np.asarray(smoker, dtype=bool),
+            np.asarray(diabetes, dtype=bool),
+        )
+    )
+    group = pce_group_code_np(sex, race)
+    rng = np.random.default_rng(seed)
+
+    def chunk_fn(sl):
+        point = pce_10y_risk_percent_np(None, None, age[sl], tc[sl], hdl[sl], sbp[sl],
+                                        bp_treated[sl], smoker[sl], diabetes[sl], group_code=group[sl])
+        col = (slice(None), None)
+        samples = pce_10y_risk_percent_np(
+            None, None, age[sl][col],
+            np.clip(_lognormal(rng, tc[sl], tc_cv, n_samples), *PCE_DOMAIN["tc"]),
+            np.clip(_lognormal(rng, hdl[sl], hdl_cv, n_samples), *PCE_DOMAIN["hdl"]),
+            np.clip(_normal(rng, sbp[sl], sbp_sd, n_samples), *PCE_DOMAIN["sbp"]),
+            bp_treated[sl][col], smoker[sl][col], diabetes[sl][col],
+            group_code=group[sl][col],
+        )
+        samples[np.isnan(point)] = np.nan
+        return _summarize(samples, point, cutoffs)
+
+    return _squeeze(_run(age.shape[0], n_samples, chunk_fn), scalar_input)
+
+
+def score2_risk_uncertainty(
+    age,
+    sex,
+    smoker,
+    sbp,
+    non_hdl,
+    risk_region,
+    n_samples: int = DEFAULT_N_SAMPLES,
+    sbp_sd: float = SBP_SD_MMHG,
+    non_hdl_cv: float = LIPID_CV["non_hdl"],
+    cutoffs=ESC_SCORE2_CUTOFFS,
+    seed: int = 0,
+):
+    scalar_input = np.ndim(age) == 0 and np.ndim(sex) == 0
+    age, sex, smoker, sbp, non_hdl, risk_region = (
+        np.atleast_1d(x) for x in np.broadcast_arrays(
+            np.asarray(age, dtype=np.float64), np.asarray(sex, dtype=object),
+            np.asarray(smoker, dtype=bool), np.asarray(sbp, dtype=np.float64),
+            np.asarray(non_hdl, dtype=np.float64), np.asarray(risk_region, dtype=object),
+        )
+    )
+    rng = np.random.default_rng(seed)
+
+    def chunk_fn(sl):
+        point = score2_estimate_percent_np(age[sl], sex[sl], smoker[sl], sbp[sl], non_hdl[sl], risk_region[sl])
+        col = (slice(None), None)
+        samples = score2_estimate_percent_np(
+            age[sl][col], sex[sl][col], smoker[sl][col],
+            _normal(rng, sbp[sl], sbp_sd, n_samples),
+            _lognormal(rng, non_hdl[sl], non_hdl_cv, n_samples),
+            risk_region[sl][col],
+        )
+        out = _summarize(samples, point, cutoffs)
+        # 점추정치와 다른 ESC 위험군으로 분류될 확률
+        point_cat = esc_risk_category_code_np(point)
+        out["p_reclass"] = (esc_risk_category_code_np(samples) != point_cat[:, None]).mean(axis=1)
+        return out
+
+    return _squeeze(_run(age.shape[0], n_samples, chunk_fn), scalar_input)
@@ -0,0 +1,63 @@
+import numpy as np
+import pandas as pd
+
+from codes import NOAC_DOSE_RESULTS
+from kernels import noac_dose_class_np, pce_10y_risk_percent_np
+from registry import REGISTRY
+
+
+# =========================================================
+# What-if 민감도 격자
+# - 두 입력을 격자로 펼쳐 한 번의 벡터 호출로 계산합니다.
+# - 결과는 heatmap용 long-form DataFrame(셀 경계 x0/x1/y0/y1 포함)으로 반환합니다.
+# - 축 기본 범위는 입력 위젯의 허용 범위(registry.py 입력 선언)를 따릅니다.
+# =========================================================
+PCE_SBP_AXIS = np.arange(REGISTRY["pce"].field("sbp").min, REGISTRY["pce"].field("sbp").max + 1, 5, dtype=np.float64)
+PCE_TC_AXIS = np.arange(REGISTRY["pce"].field("tc").min, REGISTRY["pce"].field("tc").max + 1, 10, dtype=np.float64)
+NOAC_WEIGHT_AXIS = np.arange(30, 150.1, 2.5)
+NOAC_SCR_AXIS = np.round(np.arange(0.4, 4.01, 0.1), 2)
+
+
+def _cells(x_axis, y_axis, x_name, y_name) -> pd.DataFrame:
+    # 축 값마다 셀 경계를 인접 값의 중간점으로 잡습니다(등간격이 아니어도 동작).
+    def edges(axis):
+        mid = (axis[1:] + axis[:-1]) / 2
+        return np.r_[axis[0] - (mid[0] - axis[0]), mid], np.r_[mid, axis[-1] + (axis[-1] - mid[-1])]
+
+    x0, x1 = edges(x_axis)
+    y0, y1 = edges(y_axis)
+    xi, yi = np.meshgrid(np.arange(len(x_axis)), np.arange(len(y_axis)))
+    xi, yi = xi.ravel(), yi.ravel()
+    return pd.DataFrame(
+        {
+            x_name: x_axis[xi],
+            y_name: y_axis[yi],
+            "x0": x0[xi],
+            "x1": x1[xi],
+            "y0": y0[yi],
+            "y1": y1[yi],
+        }
+    )
+
+
+def pce_risk_grid(sex, race, age, hdl, bp_treated, smoker, diabetes,
+                  sbp_axis=PCE_SBP_AXIS, tc_axis=PCE_TC_AXIS) -> pd.DataFrame:
+    # SBP × TC 격자의 10-year ASCVD risk(%)
+    sbp_axis, tc_axis = np.asarray(sbp_axis, dtype=np.float64), np.asarray(tc_axis, dtype=np.float64)
+    risk = pce_10y_risk_percent_np(
+        sex, race, age, tc_axis[:, None], hdl, sbp_axis[None, :], bp_treated, smoker, diabetes
+    )
+    df = _cells(sbp_axis, tc_axis, "SBP", "TC")
+    df["risk"] = risk.ravel()
+    return df
+
+
+def noac_dose_grid(drug: str, age, female, weight_axis=NOAC_WEIGHT_AXIS, scr_axis=NOAC_SCR_AXIS) -> pd.DataFrame:
+    # 체중 × SCr 격자의 NOAC 용량 class (NOAC_DOSE_RESULTS 인덱스 및 표시 문구)
+    weight_axis, scr_axis = np.asarray(weight_axis, dtype=np.float64), np.asarray(scr_axis, dtype=np.float64)
+    code = noac_dose_class_np(drug, age, weight_axis[None, :], scr_axis[:, None], female)
+    df = _cells(weight_axis, scr_axis, "Weight", "SCr")
+    df["dose_class"] = code.ravel()
+    labels = np.array([dose for dose, _ in NOAC_DOSE_RESULTS[drug]], dtype=object)
+    df["Dose"] = labels[df["dose_class"].to_numpy()]
+    return df
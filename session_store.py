@@ -0,0 +1,210 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+import zlib
+from datetime import date, datetime, time as dtime
+
+
+# =========================================================
+# 세션 상태 외부 저장소
+# - 세션별 상태(st.session_state의 사용자 키/위젯 키)를 압축 JSON으로 저장하고 다른 worker에서 복원합니다.
+# - 저장 대상은 JSON으로 표현 가능한 값과 date/time/datetime이며, 그 밖의 값(업로드 파일 등)은 건너뜁니다.
+# - 저장소 선택: 환경변수 STROKE_SESSION_STORE
+#     "memory"(기본, 프로세스 내 보관) / "sqlite:///경로.db"(여러 worker 공유) / "none"(사용 안 함)
+# =========================================================
+SESSION_STORE_ENV = "STROKE_SESSION_STORE"
+DEFAULT_STORE_URL = "memory"
+
+# 이 기간 동안 갱신되지 않은 세션은 purge()에서 삭제하고, 지우기 전이라도 load()에서 돌려주지 않습니다.
+SESSION_TTL_SECONDS = 12 * 3600
+# purge_if_due: 프로세스마다 이 간격에 한 번 purge()를 부릅니다(open_session_store에서 한 번은 바로 부릅니다).
+PURGE_INTERVAL_SECONDS = 600
+
+_TAGS = {"__date__": date.fromisoformat, "__time__": dtime.fromisoformat, "__datetime__": datetime.fromisoformat}
+
+
+def _encode_value(v):
+    # 변환할 수 없으면 TypeError를 냅니다(호출 측에서 해당 키를 건너뜁니다).
+    if v is None or isinstance(v, (bool, int, float, str)):
+        return v
+    if isinstance(v, datetime):
+        return {"__datetime__": v.isoformat()}
+    if isinstance(v, date):
+        return {"__date__": v.isoformat()}
+    if isinstance(v, dtime):
+        return {"__time__": v.isoformat()}
+    if isinstance(v, (list, tuple)):
+        return [_encode_value(x) for x in v]
+    if isinstance(v, dict):
+        return {str(k): _encode_value(x) for k, x in v.items()}
+    raise TypeError(type(v).__name__)
+
+
+def _decode_hook(d: dict):
+    if len(d) == 1:
+        (tag, value), = d.items()
+        if tag in _TAGS:
+            return _TAGS[tag](value)
+    return d
+
+
+def encode_state(state, exclude=(), exclude_prefixes=()) -> bytes:
+    out = {}
+    for key in state:
+        key = str(key)
+        if key in exclude or key.startswith(tuple(exclude_prefixes)):
+            continue
+        try:
+            out[key] = _encode_value(state[key])
+        except TypeError:
+            continue
+    return zlib.compress(json.dumps(out, ensure_ascii=False, sort_keys=True, separators=(",", ":")).encode("utf-8"))
+
+
+def decode_state(blob: bytes) -> dict:
+    return json.loads(zlib.decompress(blob).decode("utf-8"), object_hook=_decode_hook)
+
+
+# =========================================================
+# 저장소 구현
+# - 모두 load(sid) / save(sid, blob) / delete(sid) / purge(ttl)와 마지막 purge 시각(last_purge)을 제공합니다.
+# =========================================================
+class MemorySessionStore:
+    # 한 프로세스 안에서만 유지됩니다(재연결/세션 만료 후 복원용, 단일 worker 배포).
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._data = {}
+        self.last_purge = 0.0
+
+    def load(self, sid: str):
+        with self._lock:
+            item = self._data.get(sid)
+        return None if item is None or item[0] < time.time() - SESSION_TTL_SECONDS else item[1]
+
+    def save(self, sid: str, blob: bytes):
+        with self._lock:
+            self._data[sid] = (time.time(), blob)
+
+    def delete(self, sid: str):
+        with self._lock:
+            self._data.pop(sid, None)
+
+    def purge(self, ttl: float = SESSION_TTL_SECONDS) -> int:
+        self.last_purge = time.time()
+        cutoff = self.last_purge - ttl
+        with self._lock:
+            stale = [sid for sid, (t, _) in self._data.items() if t < cutoff]
+            for sid in stale:
+                del self._data[sid]
+        return len(stale)
+
+
+class SQLiteSessionStore:
+    # 같은 호스트(또는 공유 볼륨)의 여러 worker 프로세스가 하나의 DB 파일을 함께 씁니다.
+    def __init__(self, path: str):
+        self.path = path
+        self._local = threading.local()
+        self.last_purge = 0.0
+        with self._conn() as conn:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS sessions (sid TEXT PRIMARY KEY, updated REAL NOT NULL, state BLOB NOT NULL)"
+            )
+
+    def _conn(self) -> sqlite3.Connection:
+        # 연결은 스레드별로 하나씩 열어 재사용합니다(Streamlit은 세션마다 다른 스레드에서 실행됩니다).
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=5.0)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def load(self, sid: str):
+        row = self._conn().execute(
+            "SELECT state FROM sessions WHERE sid = ? AND updated >= ?", (sid, time.time() - SESSION_TTL_SECONDS)
+        ).fetchone()
+        return None if row is None else row[0]
+
+    def save(self, sid: str, blob: bytes):
+        with self._conn() as conn:
+            conn.execute(
+                "INSERT INTO sessions (sid, updated, state) VALUES (?, ?, ?) "
+                "ON CONFLICT(sid) DO UPDATE SET updated = excluded.updated, state = excluded.state",
+                (sid, time.time(), blob),
+            )
+
+    def delete(self, sid: str):
+        with self._conn() as conn:
+            conn.execute("DELETE FROM sessions WHERE sid = ?", (sid,))
+
+    def purge(self, ttl: float = SESSION_TTL_SECONDS) -> int:
+        self.last_purge = time.time()
+        with self._conn() as conn:
+            return conn.execute("DELETE FROM sessions WHERE updated < ?", (self.last_purge - ttl,)).rowcount
+
+
+def purge_if_due(store, interval: float = PURGE_INTERVAL_SECONDS) -> int:
+    # 화면 실행마다 불러도 되며, 직전 purge 뒤 interval이 지났을 때만 지웁니다.
+    if time.time() - store.last_purge < interval:
+        return 0
+    return store.purge()
+
+
+def open_session_store(url: str = None):
+    # None을 반환하면 외부 저장을 사용하지 않습니다.
+    url = url or os.environ.get(SESSION_STORE_ENV, DEFAULT_STORE_URL)
+    if url == "none":
+        return None
+    if url == "memory":
+        store = MemorySessionStore()
+    elif url.startswith("sqlite:///"):
+        store = SQLiteSessionStore(url[len("sqlite:///"):])
+    else:
+        raise ValueError(f"지원하지 않는 세션 저장소입니다: {url}")
+    store.purge()
+    return store
+
+
+# =========================================================
+# Streamlit 세션 연동
+# - 세션 식별자는 URL query parameter(sid)로 유지하여 어느 worker로 재연결되어도 같은 상태를 찾습니다.
+# - 스냅샷이 직전과 같으면 저장소에 다시 쓰지 않습니다.
+# - "_"로 시작하는 키는 세션 내부용으로 보고 저장하지 않습니다.
+# =========================================================
+SID_PARAM = "sid"
+_PRIVATE_PREFIX = "_session_store_"
+
+
+class SessionSync:
+    def __init__(self, store, session_state, sid: str, transient_keys=()):
+        self.store = store
+        self.state = session_state
+        self.sid = sid
+        self.transient_keys = frozenset(transient_keys)
+
+    def restore(self) -> bool:
+        # 세션의 첫 실행에서만 복원합니다(위젯이 만들어지기 전에 호출해야 합니다).
+        flag = _PRIVATE_PREFIX + "restored"
+        if self.state.get(flag):
+            return False
+        self.state[flag] = True
+        blob = self.store.load(self.sid)
+        if blob is None:
+            return False
+        for key, value in decode_state(blob).items():
+            if key not in self.transient_keys and key not in self.state:
+                self.state[key] = value
+        self.state[_PRIVATE_PREFIX + "last"] = blob
+        return True
+
+    def snapshot(self) -> bool:
+        blob = encode_state(self.state, self.transient_keys, ("_",))
+        last = _PRIVATE_PREFIX + "last"
+        if self.state.get(last) == blob:
+            return False
+        self.store.save(self.sid, blob)
+        self.state[last] = blob
+        return True
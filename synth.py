@@ -0,0 +1,279 @@
+import argparse
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+from batch import ARROW_SUFFIXES, LESION_COLUMNS, MAGIC_COLUMNS, conform_cohort
+from calculators import (
+    ELAN_ANTERIOR_MAJOR_PATTERNS,
+    ELAN_ANTERIOR_PATTERNS,
+    ELAN_CIRCULATIONS,
+    ELAN_MAX_LESIONS,
+    ELAN_POSTERIOR_SITES,
+    HAS_BLED_SCR_MG_DL,
+    MAGIC_ANSWER_KEYS,
+    NIHSS_CODES,
+    NIHSS_ITEMS,
+)
+
+
+# =========================================================
+# 합성(가상) 환자 코호트 생성기 — 부하/대량 처리 시험용
+# - 실제 환자 정보는 전혀 사용하지 않으며, 분포는 시험용 가정치입니다.
+# - 잠재 표준정규 변수들을 상관행렬로 묶어(가우시안 copula) 한 번에 뽑고, 각 변수의 분포로 변환합니다.
+# - 같은 seed와 chunk 크기면 항상 같은 데이터가 나옵니다(chunk마다 [seed, chunk 번호]로 난수열을 만듭니다).
+# - 출력: 환자 표(COHORT_COLUMNS + NIHSS 항목 + MAGIC 답변 + 병변 수)와 ELAN 병변 표(환자당 1–4행)
+# =========================================================
+LATENT_VARS = ("age", "weight", "scr", "tc", "hdl", "sbp", "risk", "severity")
+
+# 잠재 변수 간 기본 상관계수(지정하지 않은 쌍은 0입니다)
+# risk: 혈관 위험인자 성향, severity: 뇌졸중 중증도(NIHSS/병변 크기)
+DEFAULT_CORRELATIONS = {
+    ("age", "scr"): 0.30,
+    ("age", "sbp"): 0.30,
+    ("age", "weight"): -0.15,
+    ("age", "risk"): 0.40,
+    ("weight", "sbp"): 0.20,
+    ("weight", "tc"): 0.10,
+    ("weight", "hdl"): -0.25,
+    ("tc", "hdl"): 0.20,
+    ("sbp", "risk"): 0.30,
+    ("scr", "risk"): 0.20,
+    ("risk", "severity"): 0.20,
+}
+
+FEMALE_RATE = 0.42
+AFRICAN_AMERICAN_RATE = 0.10
+ELAN_LESION_COUNT_P = (0.55, 0.25, 0.12, 0.08)
+
+# 플래그별 (기본 유병률, risk 잠재변수 계수)
+FLAG_MODEL = {
+    "htn": (0.60, 0.9),
+    "diabetes": (0.28, 0.6),
+    "smoker": (0.22, 0.3),
+    "chf": (0.08, 0.7),
+    "af": (0.22, 0.5),
+    "stroke_tia": (0.55, 0.3),
+    "vascular": (0.15, 0.8),
+    "liver_disease": (0.03, 0.2),
+    "bleeding_history": (0.06, 0.4),
+    "labile_inr": (0.03, 0.2),
+    "bleeding_drugs": (0.35, 0.5),
+    "alcohol_excess": (0.07, 0.2),
+}
+
+NIHSS_COLUMNS = [f"nihss_{c}" for c in NIHSS_CODES]
+
+
+def correlation_matrix(correlations: dict = None) -> np.ndarray:
+    corr = dict(DEFAULT_CORRELATIONS)
+    corr.update(correlations or {})
+    idx = {v: i for i, v in enumerate(LATENT_VARS)}
+    m = np.eye(len(LATENT_VARS))
+    for (a, b), r in corr.items():
+        if a not in idx or b not in idx or a == b:
+            raise ValueError(f"알 수 없는 변수 쌍입니다: {a}, {b}")
+        m[idx[a], idx[b]] = m[idx[b], idx[a]] = r
+    try:
+        np.linalg.cholesky(m)
+    except np.linalg.LinAlgError:
+        raise ValueError("상관계수 조합이 양의 정부호 행렬이 아닙니다.") from None
+    return m
+
+
+def _logit(p):
+    return np.log(p / (1 - p))
+
+
+def _bernoulli(rng, logit):
+    return rng.random(logit.shape) < 1 / (1 + np.exp(-logit))
+
+
+def _pick(rng, options, n, p=None) -> np.ndarray:
+    return np.asarray(options, dtype=object)[rng.choice(len(options), size=n, p=p)]
+
+
+def _ids(start: int, n: int) -> np.ndarray:
+    return np.char.add("S", np.char.zfill(np.arange(start, start + n).astype(str), 9)).astype(object)
+
+
+def _patients(rng, n, start, chol):
+    z = rng.standard_normal((n, len(LATENT_VARS))) @ chol.T
+    zv = dict(zip(LATENT_VARS, z.T))
+    female = rng.random(n) < FEMALE_RATE
+
+    age = np.clip(np.round(68 + 13 * zv["age"]), 18, 100)
+    weight = np.clip(np.round(np.where(female, 58, 70) * np.exp(0.17 * zv["weight"]) * 2) / 2, 30, 150)
+    scr = np.clip(np.round(np.where(female, 0.72, 0.92) * np.exp(0.28 * zv["scr"]), 2), 0.3, 10.0)
+    # 나이/지질/혈압은 실제 측정으로 나올 만한 범위로만 자릅니다. PCE 검증 범위(PCE_DOMAIN) 밖 행(40세 미만,
+    # TC 320 초과 등)도 일부러 남겨 두며, 그 행의 pce_risk는 batch 경로와 같이 결측(NaN)입니다.
+    tc = np.clip(np.round(185 + 40 * zv["tc"]), 80, 400)
+    hdl = np.clip(np.round(np.where(female, 55, 46) + 12 * zv["hdl"]), 10, 120)
+    tg = 130 * np.exp(0.45 * rng.standard_normal(n))
+    ldl = np.clip(np.round(tc - hdl - tg / 5), 10, 400)
+    sbp = np.clip(np.round(138 + 20 * zv["sbp"]), 80, 240)
+
+    df = pd.DataFrame(
+        {
+            "patient_id": _ids(start, n),
+            "age": age,
+            "sex": np.where(female, "Female", "Male"),
+            "race": np.where(rng.random(n) < AFRICAN_AMERICAN_RATE, "African American", "White"),
+            "weight_kg": weight,
+            "scr_mg_dl": scr,
+            "tc": tc,
+            "hdl": hdl,
+            "ldl": ldl,
+            "sbp": sbp,
+        }
+    )
+    for flag, (p, beta) in FLAG_MODEL.items():
+        df[flag] = _bernoulli(rng, _logit(p) + beta * zv["risk"])
+    df["htn"] |= sbp >= 160
+    df["bp_treated"] = df["htn"] & (rng.random(n) < 0.8)
+    df["renal_disease"] = (scr >= HAS_BLED_SCR_MG_DL) | (rng.random(n) < 0.02)
+    # 지질 치료는 단계적으로 추가된 상태(스타틴 → ezetimibe → PCSK9)로 만듭니다.
+    secondary = (df["stroke_tia"] | df["vascular"]).to_numpy()
+    df["on_hi"] = _bernoulli(rng, _logit(0.45) + 1.0 * secondary)
+    df["on_eze"] = df["on_hi"] & (rng.random(n) < 0.25)
+    df["on_pcsk9"] = df["on_eze"] & (rng.random(n) < 0.10)
+    df["recurrent_ascvd"] = secondary & (rng.random(n) < 0.06)
+    return conform_cohort(df), zv["severity"]
+
+
+def _nihss(rng, n, severity) -> dict:
+    # 항목별 Binomial(최대점수, p). p는 중증도에 따라 커지고, 운동 항목은 병변 반대쪽에 몰리도록 합니다.
+    base = 1 / (1 + np.exp(-(-1.6 + 1.2 * severity)))
+    left_lesion = rng.random(n) < 0.5
+    out = {}
+    for (name, _, mx), col in zip(NIHSS_ITEMS, NIHSS_COLUMNS):
+        p = base
+        if "(Left)" in name:
+            p = np.where(left_lesion, 0.15 * base, base)
+        elif "(Right)" in name:
+            p = np.where(left_lesion, base, 0.15 * base)
+        out[col] = rng.binomial(mx, p).astype(np.int8)
+    return out
+
+
+def _magic(rng, n, af, risk_flags) -> dict:
+    # 단계형 질문 흐름을 따릅니다. 묻지 않는 단계는 결측(NA)입니다(앱과 같은 방식으로 하위 답은 False).
+    other = rng.random(n) < 0.08
+    lacunar = rng.random(n) < 0.25
+    relevant = _bernoulli(rng, _logit(0.30) + 0.8 * risk_flags)
+    branch = relevant & lacunar & (rng.random(n) < 0.4)
+    non_generic = relevant & ~lacunar & (rng.random(n) < 0.2)
+    ce_source = np.where(af, rng.random(n) < 0.9, rng.random(n) < 0.1)
+    ce_high = ce_source & (rng.random(n) < np.where(af, 0.8, 0.3))
+    values = dict(zip(MAGIC_ANSWER_KEYS, (other, lacunar, relevant, branch, non_generic, ce_source, ce_high)))
+    out = {}
+    for key, col in zip(MAGIC_ANSWER_KEYS, MAGIC_COLUMNS):
+        s = pd.array(values[key], dtype="boolean")
+        if key != "other_determined":
+            s[other] = pd.NA
+        out[col] = s
+    return out
+
+
+def _lesions(rng, patient_id, severity) -> tuple:
+    n = len(patient_id)
+    count = rng.choice(np.arange(1, ELAN_MAX_LESIONS + 1), size=n, p=ELAN_LESION_COUNT_P).astype(np.int8)
+    owner = np.repeat(np.arange(n), count)
+    m = len(owner)
+    sev = severity[owner]
+    # 환자 안에서의 병변 번호(1부터)
+    lesion = np.arange(m) - np.repeat(np.cumsum(count) - count, count) + 1
+
+    posterior = rng.random(m) < 0.25
+    major_logit = -2.2 + 0.9 * sev
+    major = _bernoulli(rng, major_logit)
+    major_pattern = np.where(
+        major & ~posterior,
+        _pick(rng, ELAN_ANTERIOR_MAJOR_PATTERNS[1:], m),
+        ELAN_ANTERIOR_MAJOR_PATTERNS[0],
+    )
+    df = pd.DataFrame(
+        {
+            "patient_id": patient_id[owner],
+            "lesion": lesion,
+            "circulation": np.where(posterior, ELAN_CIRCULATIONS[1], ELAN_CIRCULATIONS[0]),
+            "posterior_site": np.where(posterior, _pick(rng, ELAN_POSTERIOR_SITES, m), "해당 없음"),
+            "anterior_pattern": np.where(
+                posterior, "해당 없음", _pick(rng, ELAN_ANTERIOR_PATTERNS, m, p=(0.4, 0.2, 0.2, 0.1, 0.1))
+            ),
+            "anterior_major_pattern": np.where(posterior, "해당 없음", major_pattern),
+            "multiterritory": ~posterior & (rng.random(m) < 0.05),
+            "size_gt_1_5": _bernoulli(rng, -0.6 + 0.8 * sev),
+        }
+    )
+    return df.astype(LESION_COLUMNS), count
+
+
+def generate_cohort(n: int, seed: int = 0, correlations: dict = None, start: int = 0, chunk_index: int = 0):
+    # (환자 DataFrame, 병변 DataFrame)을 반환합니다.
+    rng = np.random.default_rng([seed, chunk_index])
+    chol = np.linalg.cholesky(correlation_matrix(correlations))
+    patients, severity = _patients(rng, n, start, chol)
+    risk_flags = patients[["htn", "diabetes", "smoker", "vascular"]].sum(axis=1).to_numpy() - 1.0
+    nihss = _nihss(rng, n, severity)
+    magic = _magic(rng, n, patients["af"].to_numpy(), risk_flags)
+    lesions, count = _lesions(rng, patients["patient_id"].to_numpy(), severity)
+    extra = pd.DataFrame({**nihss, **magic, "elan_n_lesions": count}, index=patients.index)
+    return pd.concat([patients, extra], axis=1), lesions
+
+
+def iter_cohort_chunks(n: int, seed: int = 0, correlations: dict = None, chunk_size: int = 250_000):
+    for i, start in enumerate(range(0, n, chunk_size)):
+        yield generate_cohort(min(chunk_size, n - start), seed, correlations, start=start, chunk_index=i)
+
+
+# =========================================================
+# CLI
+# =========================================================
+def _parse_corr(items) -> dict:
+    # "age:sbp=0.4" 형식
+    out = {}
+    for item in items or []:
+        pair, value = item.split("=")
+        a, b = pair.split(":")
+        out[(a.strip(), b.strip())] = float(value)
+    return out
+
+
+def lesions_path(output) -> Path:
+    output = Path(output)
+    return output.with_name(f"{output.stem}_lesions{output.suffix}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="시험용 합성 환자 코호트(Parquet/CSV/Arrow IPC)를 만듭니다.")
+    parser.add_argument("-n", "--rows", type=int, required=True)
+    parser.add_argument("-o", "--output", required=True, help="환자 표 경로(.parquet/.csv/.arrow). 병변 표는 <이름>_lesions로 저장됩니다.")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--chunk-size", type=int, default=250_000)
+    parser.add_argument("--corr", action="append", metavar="A:B=R", help=f"잠재 변수 상관계수({', '.join(LATENT_VARS)})")
+    args = parser.parse_args(argv)
+
+    out, les_out = Path(args.output), lesions_path(args.output)
+    writers = {}
+    for i, (patients, lesions) in enumerate(iter_cohort_chunks(args.rows, args.seed, _parse_corr(args.corr), args.chunk_size)):
+        for path, frame in ((out, patients), (les_out, lesions)):
+            if path.suffix == ".parquet" or path.suffix in ARROW_SUFFIXES:
+                table = pa.Table.from_pandas(frame, preserve_index=False)
+                if path not in writers:
+                    if path.suffix == ".parquet":
+                        writers[path] = pq.ParquetWriter(path, table.schema)
+                    else:
+                        writers[path] = pa.ipc.new_file(str(path), table.schema)
+                writers[path].write_table(table)
+            else:
+                frame.to_csv(path, mode="w" if i == 0 else "a", header=i == 0, index=False)
+    for w in writers.values():
+        w.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,139 @@
+import re
+import threading
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+
+from codes import to_arrow_table
+
+
+# =========================================================
+# 대용량 결과 표 보기(서버 측 정렬/필터/페이지)
+# - 데이터는 Arrow 표 한 벌로 두고, 화면에는 현재 페이지 행만 보냅니다.
+# - 정렬 순서(열·방향별)와 필터 결과(열·조건별)는 처음 요청될 때 한 번 계산해 보관합니다.
+#   페이지를 넘기거나 같은 조건으로 다시 실행할 때는 보관한 인덱스에서 잘라내기만 합니다.
+#   정렬 순서는 열 수 × 2개로 끝나지만, 필터 조건은 입력할 때마다 새 key이므로 MASK_CACHE_ENTRIES개까지만 둡니다.
+# - 만든 페이지(Arrow 표)도 보관하므로, 데이터와 조건이 같으면 다시 만들거나 pandas로 변환하지 않습니다.
+# - 필터 조건: 숫자 열은 ">=50", "<3", "=2", "10..20" 같은 비교/범위, 그 밖의 열은 대소문자 무시 부분 일치입니다.
+# =========================================================
+DEFAULT_PAGE_SIZE = 50
+PAGE_CACHE_ENTRIES = 32
+MASK_CACHE_ENTRIES = 16
+
+_COMPARE = re.compile(r"^\s*(<=|>=|<|>|=|==|!=)\s*(-?\d+(?:\.\d+)?)\s*$")
+_RANGE = re.compile(r"^\s*(-?\d+(?:\.\d+)?)\s*\.\.\s*(-?\d+(?:\.\d+)?)\s*$")
+_OPS = {"<": pc.less, "<=": pc.less_equal, ">": pc.greater, ">=": pc.greater_equal,
+        "=": pc.equal, "==": pc.equal, "!=": pc.not_equal}
+
+
+def _is_numeric(t: pa.DataType) -> bool:
+    return pa.types.is_integer(t) or pa.types.is_floating(t)
+
+
+def _remember(cache: dict, key, value, limit: int):
+    # 가장 먼저 넣은 항목부터 지웁니다.
+    if len(cache) >= limit:
+        cache.pop(next(iter(cache)))
+    cache[key] = value
+
+
+class ArrowTableView:
+    def __init__(self, data, code_columns: dict = None):
+        # data: pa.Table 또는 DataFrame(code_columns는 사전 인코딩할 코드 열, codes.to_arrow_table 참고)
+        if isinstance(data, pd.DataFrame):
+            data = to_arrow_table(data, {c: t for c, t in (code_columns or {}).items() if c in data.columns})
+        self.table = data.combine_chunks()
+        self.num_rows = self.table.num_rows
+        self._order = {}
+        self._masks = {}
+        self._pages = {}
+        # st.cache_resource로 여러 세션이 같은 보기를 공유하므로 보관소 갱신은 잠금 안에서 합니다.
+        # page()가 잠근 채로 정렬/필터를 부르므로 재진입 가능한 잠금입니다.
+        self._lock = threading.RLock()
+
+    @property
+    def columns(self) -> list:
+        return self.table.column_names
+
+    def sort_order(self, column: str, descending: bool = False) -> np.ndarray:
+        key = (column, descending)
+        with self._lock:
+            if key not in self._order:
+                col = self.table.column(column)
+                if pa.types.is_dictionary(col.type):
+                    self._order[key] = self._dictionary_order(col.combine_chunks(), descending)
+                else:
+                    order = "descending" if descending else "ascending"
+                    self._order[key] = pc.sort_indices(
+                        self.table, sort_keys=[(column, order)], null_placement="at_end"
+                    ).to_numpy()
+            return self._order[key]
+
+    @staticmethod
+    def _dictionary_order(arr: pa.DictionaryArray, descending: bool) -> np.ndarray:
+        # 사전 문구의 순위로 바꿔 정렬합니다(결측은 맨 뒤).
+        rank = np.empty(len(arr.dictionary), dtype=np.int64)
+        rank[pc.sort_indices(arr.dictionary).to_numpy()] = np.arange(len(arr.dictionary))
+        keys = rank[pc.fill_null(arr.indices, 0).to_numpy(zero_copy_only=False)]
+        if descending:
+            keys = -keys
+        keys = np.where(arr.is_valid().to_numpy(zero_copy_only=False), keys, np.iinfo(np.int64).max)
+        return np.argsort(keys, kind="stable")
+
+    def filter_mask(self, column: str, condition: str) -> np.ndarray:
+        key = (column, condition.strip())
+        with self._lock:
+            if key not in self._masks:
+                _remember(self._masks, key, self._evaluate(self.table.column(column), condition.strip()),
+                          MASK_CACHE_ENTRIES)
+            return self._masks[key]
+
+    def _evaluate(self, col: pa.ChunkedArray, condition: str) -> np.ndarray:
+        if _is_numeric(col.type):
+            m = _RANGE.match(condition)
+            if m:
+                lo, hi = float(m.group(1)), float(m.group(2))
+                mask = pc.fill_null(pc.and_(pc.greater_equal(col, lo), pc.less_equal(col, hi)), False)
+                return mask.to_numpy(zero_copy_only=False)
+            m = _COMPARE.match(condition)
+            if m:
+                mask = pc.fill_null(_OPS[m.group(1)](col, float(m.group(2))), False)
+                return mask.to_numpy(zero_copy_only=False)
+        if pa.types.is_dictionary(col.type):
+            # 사전(문구표)에서만 비교하고 행에는 인덱스로 펼칩니다.
+            arr = col.combine_chunks()
+            hit = pc.match_substring(arr.dictionary, condition, ignore_case=True).to_numpy(zero_copy_only=False)
+            idx = pc.fill_null(arr.indices, 0).to_numpy(zero_copy_only=False)
+            return hit[idx] & arr.is_valid().to_numpy(zero_copy_only=False)
+        text = col if pa.types.is_string(col.type) or pa.types.is_large_string(col.type) else pc.cast(col, pa.string())
+        return pc.fill_null(pc.match_substring(text, condition, ignore_case=True), False).to_numpy(zero_copy_only=False)
+
+    def row_indices(self, sort_by: str = None, descending: bool = False, filters: dict = None) -> np.ndarray:
+        rows = self.sort_order(sort_by, descending) if sort_by else np.arange(self.num_rows)
+        conditions = [(c, v) for c, v in (filters or {}).items() if v and v.strip()]
+        if conditions:
+            mask = np.ones(self.num_rows, dtype=bool)
+            for column, condition in conditions:
+                mask &= self.filter_mask(column, condition)
+            rows = rows[mask[rows]]
+        return rows
+
+    def page(self, page: int = 0, page_size: int = DEFAULT_PAGE_SIZE, sort_by: str = None,
+             descending: bool = False, filters: dict = None):
+        # 반환: (페이지 Arrow 표, 조건에 맞는 전체 행 수, 전체 페이지 수)
+        key = (page, page_size, sort_by, descending, tuple(sorted((filters or {}).items())))
+        with self._lock:
+            return self._page(key, page, page_size, sort_by, descending, filters)
+
+    def _page(self, key, page, page_size, sort_by, descending, filters):
+        if key in self._pages:
+            return self._pages[key]
+        rows = self.row_indices(sort_by, descending, filters)
+        n_pages = max(1, -(-len(rows) // page_size))
+        page = min(max(page, 0), n_pages - 1)
+        chunk = self.table.take(pa.array(rows[page * page_size:(page + 1) * page_size]))
+        result = (chunk, len(rows), n_pages)
+        _remember(self._pages, key, result, PAGE_CACHE_ENTRIES)
+        return result
@@ -0,0 +1,173 @@
+import argparse
+import os
+import sys
+import tempfile
+import threading
+import time
+import urllib.request
+from pathlib import Path
+
+import pandas as pd
+
+
+# =========================================================
+# 서버 시작 전 예열(warm-up)
+# - 사용법: python warmup.py [--ready-file 경로] [-- streamlit run 옵션...]
+# - Streamlit 서버를 띄우기 전에 같은 프로세스에서 모듈 import, 정적 표/조회 구조 생성,
+#   계산 커널 첫 호출, 앱 전체의 가상 실행(AppTest)을 마칩니다. 참고 그림은 가상 실행에서 한 번 디코딩해
+#   화면 폭 PNG로 보관됩니다(app.py load_figure).
+# - st.cache_data / st.cache_resource는 프로세스 전역이므로 가상 실행에서 채운 캐시를 첫 사용자가 그대로 씁니다.
+# - 가상 실행은 실제 NIHSS 기록, 세션 저장소, 작업 대기열을 열지 않도록 메모리/임시 폴더 저장소를 씁니다.
+#   app.py는 저장소 위치를 캐시 key에 넣으므로 이때 만든 저장소 객체는 실제 실행에서 쓰이지 않습니다.
+# - 준비 신호: 예열이 끝난 뒤에야 서버가 열리므로 /_stcore/health가 곧 readiness입니다.
+#   파일 기반 probe가 필요하면 --ready-file(또는 STROKE_READY_FILE)에 health 응답 확인 후 파일을 만듭니다.
+# =========================================================
+READY_FILE_ENV = "STROKE_READY_FILE"
+APP_PATH = Path(__file__).with_name("app.py")
+
+
+def _timed(timings: dict, name: str, fn, *args):
+    t0 = time.perf_counter()
+    result = fn(*args)
+    timings[name] = round((time.perf_counter() - t0) * 1000, 1)
+    return result
+
+
+def warm_imports():
+    # 모듈 로드 시 만들어지는 표(NIHSS 패턴, 코드표, PCE 계수표, NOAC 결과표 등)가 여기서 모두 준비됩니다.
+    import altair  # noqa: F401
+    import pyarrow  # noqa: F401
+    import streamlit  # noqa: F401
+
+    import batch  # noqa: F401
+    import calculators  # noqa: F401
+    import codes  # noqa: F401
+    import doac_schedule  # noqa: F401
+    import ingest  # noqa: F401
+    import kernels  # noqa: F401
+    import note_parser  # noqa: F401
+    import reference  # noqa: F401
+    import risk_uncertainty  # noqa: F401
+    import sensitivity  # noqa: F401
+
+
+def warm_kernels():
+    # NumPy ufunc/dtype 경로와 pandas 변환 경로를 한 번씩 통과시킵니다.
+    from batch import score_cohort
+    from calculators import NIHSS_ITEMS, build_neuro_exam_text, build_nihss_component_text
+    from note_parser import parse_note
+    from risk_uncertainty import pce_risk_uncertainty, score2_risk_uncertainty
+    from sensitivity import noac_dose_grid, pce_risk_grid
+
+    cohort = pd.DataFrame(
+        {
+            "patient_id": ["w1", "w2"],
+            "age": [72.0, 55.0],
+            "sex": ["Female", "Male"],
+            "race": ["White", "African American"],
+            "weight_kg": [58.0, 80.0],
+            "scr_mg_dl": [1.3, 0.9],
+            "tc": [210.0, 180.0],
+            "hdl": [45.0, 50.0],
+            "sbp": [150.0, 128.0],
+        }
+    )
+    score_cohort(cohort)
+    pce_risk_grid("Male", "White", 60, 50, False, False, False)
+    for drug in ("Apixaban", "Rivaroxaban", "Edoxaban", "Dabigatran"):
+        noac_dose_grid(drug, 75, False)
+    pce_risk_uncertainty("Male", "White", 60, 200, 50, 130, False, False, False, n_samples=1000)
+    score2_risk_uncertainty(65, "남성", False, 130, 150, "Moderate", n_samples=1000)
+
+    items = {name: min(1, mx) for name, _, mx in NIHSS_ITEMS}
+    parse_note(build_nihss_component_text(items) + "\n" + build_neuro_exam_text(items, "Left", "Left", "Left"))
+
+
+def warm_app(app_path=APP_PATH):
+    from jobs import JOB_DIR_ENV
+    from nihss_timeline import NIHSS_STORE_ENV
+    from session_store import SESSION_STORE_ENV
+
+    saved = {k: os.environ.get(k) for k in (NIHSS_STORE_ENV, SESSION_STORE_ENV, JOB_DIR_ENV)}
+    with tempfile.TemporaryDirectory(prefix="stroke-warmup-") as job_dir:
+        os.environ.update({NIHSS_STORE_ENV: "memory", SESSION_STORE_ENV: "memory", JOB_DIR_ENV: job_dir})
+        try:
+            _run_app(app_path)
+        finally:
+            for k, v in saved.items():
+                if v is None:
+                    os.environ.pop(k, None)
+                else:
+                    os.environ[k] = v
+
+
+def _run_app(app_path):
+    # 의료인 확인 후 모든 탭(Streamlit은 탭 내용을 모두 실행합니다)과 MC 구간 표시를 한 번씩 실행합니다.
+    from streamlit.testing.v1 import AppTest
+
+    at = AppTest.from_file(str(app_path), default_timeout=300)
+    at.run()
+    at.button[0].click().run()
+    at.checkbox(key="pce_mc").check()
+    at.checkbox(key="s2_mc").check()
+    at.run()
+    # 근거 검색 색인(st.cache_resource)을 만들어 둡니다.
+    at.text_input(key="ref_query").input("재발").run()
+    if at.exception:
+        raise RuntimeError(f"예열 실행 중 오류가 발생했습니다: {at.exception[0].message}")
+
+
+def warm_up(app_path=APP_PATH, run_app: bool = True) -> dict:
+    timings = {}
+    # app.py의 `from calculators import ...`가 AppTest에서도 풀리도록 앱 폴더를 경로에 둡니다.
+    sys.path.insert(0, str(Path(app_path).resolve().parent))
+    _timed(timings, "imports", warm_imports)
+    _timed(timings, "kernels", warm_kernels)
+    if run_app:
+        _timed(timings, "app", warm_app, app_path)
+    return timings
+
+
+def _write_ready_file_when_healthy(path: str, interval: float = 0.5):
+    from streamlit import config
+
+    while True:
+        try:
+            url = f"http://127.0.0.1:{config.get_option('server.port')}/_stcore/health"
+            with urllib.request.urlopen(url, timeout=2) as resp:
+                if resp.status == 200:
+                    Path(path).write_text(time.strftime("%Y-%m-%dT%H:%M:%S"), encoding="utf-8")
+                    return
+        except OSError:
+            pass
+        time.sleep(interval)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="예열을 마친 뒤 Streamlit 서버를 시작합니다.")
+    parser.add_argument("--app", default=str(APP_PATH))
+    parser.add_argument("--ready-file", default=os.environ.get(READY_FILE_ENV))
+    parser.add_argument("--skip-app-run", action="store_true", help="앱 가상 실행을 생략합니다(import/커널 예열만).")
+    parser.add_argument("--warm-only", action="store_true", help="예열 소요 시간만 출력하고 종료합니다.")
+    parser.add_argument("streamlit_args", nargs=argparse.REMAINDER, help="-- 뒤의 인자는 streamlit run에 전달합니다.")
+    args = parser.parse_args(argv)
+
+    if args.ready_file:
+        Path(args.ready_file).unlink(missing_ok=True)
+    timings = warm_up(args.app, run_app=not args.skip_app_run)
+    print("warm-up (ms):", timings, flush=True)
+    if args.warm_only:
+        return
+
+    if args.ready_file:
+        threading.Thread(target=_write_ready_file_when_healthy, args=(args.ready_file,), daemon=True).start()
+
+    from streamlit.web import cli
+
+    extra = args.streamlit_args[1:] if args.streamlit_args[:1] == ["--"] else args.streamlit_args
+    sys.argv = ["streamlit", "run", args.app, *extra]
+    sys.exit(cli.main())
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,122 @@
+import copy
+import itertools
+
+import pandas as pd
+
+
+# =========================================================
+# 다환자 작업 목록(worklist)
+# - 환자마다 입력값을 위젯 key 목록(fields) 순서의 tuple 하나로 보관합니다(환자별 session key를 따로 만들지 않습니다).
+# - 환자를 바꿀 때: 현재 입력을 지금 환자 기록에 담고, 고른 환자의 tuple을 session_state에 되돌립니다.
+#   값이 없던 key(UNSET)는 session_state에서 지워 위젯 기본값이 쓰이게 합니다.
+# - 환자별 결과 보관(memo): 이름별로 마지막 입력과 결과 한 벌만 두므로, 같은 입력으로 돌아오면 다시 계산하지 않습니다.
+# - 환자별 요약(notes)은 목록 화면에 그대로 보여 주며, 다른 환자를 다시 계산하지 않습니다.
+# - to_state/load_state: 세션 외부 저장용 dict입니다. 위젯 key 목록은 한 번만 적고 환자마다 값 목록만 두며,
+#   UNSET은 UNSET_TAG로 적습니다. memo는 다시 계산할 수 있으므로 저장하지 않습니다.
+#   불러올 때는 저장된 key 이름으로 값을 맞추므로 fields가 바뀌어도 다른 위젯에 값이 들어가지 않습니다.
+# =========================================================
+class _Unset:
+    __slots__ = ()
+
+    def __repr__(self):
+        return "UNSET"
+
+
+UNSET = _Unset()
+UNSET_TAG = {"__unset__": True}
+
+
+class PatientRecord:
+    __slots__ = ("pid", "label", "values", "memos", "notes")
+
+    def __init__(self, pid: str, label: str, values: tuple):
+        self.pid = pid
+        self.label = label
+        self.values = values
+        self.memos = {}  # 이름 → (입력 tuple, 결과)
+        self.notes = {}  # 목록 화면용 요약 값
+
+    def memo(self, name: str, inputs: tuple, compute):
+        hit = self.memos.get(name)
+        if hit is not None and hit[0] == inputs:
+            return hit[1]
+        result = compute()
+        self.memos[name] = (inputs, result)
+        return result
+
+
+class Worklist:
+    def __init__(self, fields):
+        self.fields = tuple(fields)
+        self.records = {}
+        self.active = None
+        # 목록에 환자가 없을 때(단일 환자 사용)의 memo/notes 보관용
+        self.scratch = PatientRecord("", "", ())
+        self._ids = itertools.count(1)
+
+    def __len__(self):
+        return len(self.records)
+
+    def capture(self, state) -> tuple:
+        # 가변 값(dict/list)은 복사해 다음 입력과 섞이지 않게 합니다.
+        return tuple(copy.copy(state[k]) if k in state else UNSET for k in self.fields)
+
+    def values_from(self, mapping: dict) -> tuple:
+        return tuple(mapping.get(k, UNSET) for k in self.fields)
+
+    def add(self, label: str, values: tuple) -> str:
+        pid = f"p{next(self._ids)}"
+        self.records[pid] = PatientRecord(pid, label or f"환자 {len(self.records) + 1}", values)
+        return pid
+
+    def remove(self, pid: str):
+        self.records.pop(pid, None)
+        if self.active == pid:
+            self.active = None
+
+    def current(self) -> PatientRecord:
+        return self.records.get(self.active, self.scratch)
+
+    def save_active(self, state):
+        record = self.records.get(self.active)
+        if record is not None:
+            record.values = self.capture(state)
+
+    def restore(self, pid: str, state):
+        for key, value in zip(self.fields, self.records[pid].values):
+            if value is UNSET:
+                state.pop(key, None)
+            else:
+                state[key] = copy.copy(value)
+        self.active = pid
+
+    def switch(self, pid: str, state):
+        if pid == self.active:
+            return
+        self.save_active(state)
+        self.restore(pid, state)
+
+    def to_state(self) -> dict:
+        return {
+            "fields": list(self.fields),
+            "active": self.active,
+            "records": [
+                [r.pid, r.label, [UNSET_TAG if v is UNSET else v for v in r.values], dict(r.notes)]
+                for r in self.records.values()
+            ],
+        }
+
+    def load_state(self, saved: dict):
+        fields = saved["fields"]
+        for pid, label, values, notes in saved["records"]:
+            values = [UNSET if v == UNSET_TAG else v for v in values]
+            record = PatientRecord(pid, label, self.values_from(dict(zip(fields, values))))
+            record.notes.update(notes)
+            self.records[pid] = record
+        self.active = saved["active"] if saved["active"] in self.records else None
+        last = max((int(pid[1:]) for pid in self.records), default=0)
+        self._ids = itertools.count(last + 1)
+
+    def overview(self) -> pd.DataFrame:
+        rows = [{"환자": r.label, **r.notes} for r in self.records.values()]
+        return pd.DataFrame(rows)